@@ -108,9 +108,13 @@ def init_permissions_provider():
 def init_extra_listeners():
   """Initializes listeners for additional services"""
   from ggrc.automapper import register_automapping_listeners
+  from ggrc.builder.json import register_stub_cache_listeners
+  from ggrc.cache.adjacency import register_adjacency_listeners
   from ggrc.snapshotter.listeners import register_snapshot_listeners
+  register_adjacency_listeners()
   register_automapping_listeners()
   register_snapshot_listeners()
+  register_stub_cache_listeners()
 
 
 def _enable_debug_toolbar():
@@ -191,6 +195,29 @@ def _display_sql_queries():
       return response
 
 
+def _log_permission_check_profile():
+  """Set up logging of permission check counts of every request."""
+  if not getattr(settings, "PERMISSION_CHECK_PROFILE", False):
+    return
+
+  # pylint: disable=unused-variable,unused-argument
+  @app.teardown_request
+  def log_permission_checks(exc):
+    """Log the numbers of single and batched permission checks.
+
+    Teardown runs after streamed responses are generated, so checks made
+    while streaming are counted too.
+    """
+    from flask import request
+    from ggrc.rbac.permissions import get_check_profile
+    profile = get_check_profile()
+    if profile:
+      logger.info("Permission checks for %s %s: %s",
+                  request.method, request.path,
+                  ", ".join("{}={}".format(name, count)
+                            for name, count in sorted(profile.items())))
+
+
 setup_error_handlers(app)
 init_models(app)
 configure_flask_login(app)
@@ -207,3 +234,4 @@ notifications.register_notification_listeners()
 _enable_debug_toolbar()
 _enable_jasmine()
 _display_sql_queries()
+_log_permission_check_profile()
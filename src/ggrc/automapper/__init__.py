@@ -5,7 +5,7 @@ from datetime import datetime
 from logging import getLogger
 import collections
 
-from sqlalchemy.sql.expression import tuple_
+from sqlalchemy import and_
 
 from ggrc import db
 from ggrc import models
@@ -38,7 +38,7 @@ class AutomapperGenerator(object):
     self.processed = set()
     self.queue = set()
     self.cache = collections.defaultdict(set)
-    self.instance_cache = {}
+    self.attr_cache = {}
     self.auto_mappings = set()
     if use_benchmark:
       self.benchmark = benchmark
@@ -46,47 +46,16 @@ class AutomapperGenerator(object):
       self.benchmark = with_nop
 
   def related(self, obj):
+    from ggrc.cache import adjacency
     if obj in self.cache:
       return self.cache[obj]
     # Pre-fetch neighborhood for enqueued object since we're gonna need that
     # results in a few steps. This drastically reduces number of queries.
     stubs = {s for rel in self.queue for s in rel}
     stubs.add(obj)
-    # Union is here to convince mysql to use two separate indices and
-    # merge te results. Just using `or` results in a full-table scan
-    # Manual column list avoids loading the full object which would also try to
-    # load related objects
-    cols = db.session.query(
-        Relationship.source_type, Relationship.source_id,
-        Relationship.destination_type, Relationship.destination_id)
-    relationships = cols.filter(
-        tuple_(Relationship.source_type, Relationship.source_id).in_(
-            [(s.type, s.id) for s in stubs]
-        )
-    ).union_all(
-        cols.filter(
-            tuple_(Relationship.destination_type,
-                   Relationship.destination_id).in_(
-                       [(s.type, s.id) for s in stubs]))
-    ).all()
-    batch_requests = collections.defaultdict(set)
-    for (src_type, src_id, dst_type, dst_id) in relationships:
-      src = Stub(src_type, src_id)
-      dst = Stub(dst_type, dst_id)
-      # only store a neighbor if we queried for it since this way we know
-      # we'll be storing complete neighborhood by the end of the loop
-      batch_requests[src_type].add(src_id)
-      batch_requests[dst_type].add(dst_id)
-      if src in stubs:
-        self.cache[src].add(dst)
-      if dst in stubs:
-        self.cache[dst].add(src)
-
-    for type_, ids in batch_requests.iteritems():
-      model = getattr(models.all_models, type_)
-      instances = model.query.filter(model.id.in_(ids))
-      for instance in instances:
-        self.instance_cache[Stub(type_, instance.id)] = instance
+    stubs.difference_update(self.cache)
+    for stub, neighbors in adjacency.get_neighbors(stubs).iteritems():
+      self.cache[Stub(*stub)] = {Stub(*neighbor) for neighbor in neighbors}
     return self.cache[obj]
 
   def relate(self, src, dst):
@@ -163,19 +132,25 @@ class AutomapperGenerator(object):
           "automapping_id": parent_relationship.id}
           for src, dst in self.auto_mappings
           if (src, dst) != original]))  # (src, dst) is sorted
+      from ggrc.cache import adjacency
+      adjacency.invalidate(
+          stub for entry in self.auto_mappings for stub in entry)
       cache = get_cache(create=True)
       if cache:
-        # Add inserted relationships into new objects collection of the cache,
-        # so that they will be logged within event and appropriate revisions
-        # will be created.
-        cache.new.update(
-            (relationship, relationship.log_json())
-            for relationship in Relationship.query.filter_by(
-                automapping_id=parent_relationship.id,
-                modified_by_id=current_user.id,
-                created_at=now,
-                updated_at=now,
-            )
+        # Inserted relationships are not loaded into the session. Their
+        # revision content is built from the inserted rows and stored in the
+        # bulk collection of the cache, so that revisions and full text
+        # entries for all of them are written with a few bulk inserts.
+        table = Relationship.__table__
+        rows = db.session.execute(table.select().where(and_(
+            table.c.automapping_id == parent_relationship.id,
+            table.c.modified_by_id == current_user.id,
+            table.c.created_at == now,
+            table.c.updated_at == now,
+        )))
+        cache.bulk_new.update(
+            ((Relationship.__name__, row.id), Relationship.row_log_json(row))
+            for row in rows
         )
 
   def _step(self, src, dst):
@@ -192,36 +167,59 @@ class AutomapperGenerator(object):
         if entry not in self.processed:
           self.queue.add(entry)
 
+  def _load_attrs(self, obj, names):
+    """Load stubs of the given attributes for all queued objects of a type.
+
+    Instances are loaded in a single query for the object and all queued
+    objects of the same type, and only stubs of the attribute values are
+    kept, so the traversal does not hold on to full instances.
+    """
+    model = getattr(models.all_models, obj.type)
+    stubs = {s for entry in self.queue for s in entry if s.type == obj.type}
+    stubs.add(obj)
+    stubs = {s for s in stubs
+             if any((s, name) not in self.attr_cache for name in names)}
+    for stub in stubs:
+      for name in names:
+        self.attr_cache[stub, name] = None
+    instances = model.query.filter(model.id.in_([s.id for s in stubs]))
+    for instance in instances:
+      stub = Stub(obj.type, instance.id)
+      for name in names:
+        if not hasattr(instance, name):
+          continue
+        values = getattr(instance, name)
+        if not isinstance(values, collections.Iterable):
+          values = [values]
+        self.attr_cache[stub, name] = [
+            Stub(value.type, value.id) if value is not None else None
+            for value in values
+        ]
+
   def _step_implicit(self, src, dst, implicit):
+    if not implicit:
+      return
     if not hasattr(models.all_models, src.type):
       logger.warning('Automapping by attr: cannot find model %s', src.type)
       return
-    instance = self.instance_cache.get(src)
-    if instance is None:
-      model = getattr(models.all_models, src.type)
-      instance = model.query.filter(model.id == src.id).first()
-      self.instance_cache[src] = instance
-    if instance is None:
-      logger.warning("Automapping by attr: cannot load model %s: %s",
-                     src.type, src.id)
-      return
-    for attr in implicit:
-      if hasattr(instance, attr.name):
-        values = getattr(instance, attr.name)
-        if not isinstance(values, collections.Iterable):
-          values = [values]
-        for value in values:
-          if value is not None:
-            entry = self.relate(Stub(value.type, value.id), dst)
-            if entry not in self.processed:
-              self.queue.add(entry)
-          else:
-            logger.warning('Automapping by attr: %s is None', attr.name)
-      else:
+    names = [attr.name for attr in implicit]
+    if any((src, name) not in self.attr_cache for name in names):
+      self._load_attrs(src, names)
+    for name in names:
+      values = self.attr_cache[src, name]
+      if values is None:
         logger.warning(
             'Automapping by attr: object %s has no attribute %s',
-            src, attr.name,
+            src, name,
         )
+        continue
+      for value in values:
+        if value is not None:
+          entry = self.relate(value, dst)
+          if entry not in self.processed:
+            self.queue.add(entry)
+        else:
+          logger.warning('Automapping by attr: %s is None', name)
 
   def _ensure_relationship(self, src, dst):
     if dst in self.cache.get(src, []):
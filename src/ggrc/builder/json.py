@@ -6,14 +6,20 @@
 # pylint: disable=no-name-in-module
 # false positive for RelationshipProperty
 
+import operator
+import threading
+from collections import OrderedDict
 from datetime import datetime
 
 from flask import g
+from flask import has_app_context
 import iso8601
 import sqlalchemy
+from sqlalchemy import event
 from sqlalchemy.ext.associationproxy import AssociationProxy
 from sqlalchemy.orm.attributes import InstrumentedAttribute
 from sqlalchemy.orm.properties import RelationshipProperty
+from sqlalchemy.orm.session import Session
 from werkzeug.exceptions import BadRequest
 
 import ggrc.builder
@@ -28,6 +34,10 @@ from ggrc.utils import url_for
 from ggrc.utils import view_url_for
 
 
+# Number of compiled publishers kept per model, see Builder.get_publisher.
+PUBLISHER_CACHE_SIZE = 64
+
+
 def get_json_builder(obj):
   """Instantiate or retrieve a JSON representation builder for the given
   object.
@@ -294,148 +304,66 @@ class UpdateAttrHandler(object):
     return json_obj.get(attr_name)
 
 
-"""
-Builder strategy:
-  * For each non-present attribute, return an "AttributeBuilder" instance
-    which describes the objects needed to complete the representation.
-  * Maintain a set of requested (type, condition, stub_only?) tuples
-  * stub_only? tuples can be requested en-masse via UNION queries
-  * non-stub_only? tuples can override stub_only? tuples with identical
-    conditions
-  * When all available object representations have been built:
-
-Query types:
-  (type, id) -> explicit link
-  (type, { keyX: valX, ... }) -> an actual query
-    note, keyX row/object values must be included in response to distinguish
-    results from aggregated queries on the same type
-  (type, [id, { keyX: valX, ... }, id2, { keyY: valY }, ...]) ->
-    an already-aggregated list of conditions
-
-Query combination:
-  (type, id) -> aggregate into "id IN (...)"
-  (type, {}) -> aggregate into "...OR keyX = valX OR keyY = valY"
+# Number of stub conditions resolved with a single query.
+STUB_CHUNK_SIZE = 500
 
-Query construction:
-  pass
+_local = threading.local()
 
-Result storing:
-  { type: { id: <result>, (keyX, ...): { (valX, ...): [<result>, ...] } } }
 
-Result dispatch:
-  singles = { (type, id): [<Builder>, ...] }
-"""
-
-
-def build_type_query(type_, result_spec):
+def _get_type_column(mapper):
+  """Get a column with the type name of objects of a mapper."""
+  if len(list(mapper.self_and_descendants)) == 1:
+    return sqlalchemy.literal(mapper.class_.__name__)
+  # Handle polymorphic types with CASE
+  return sqlalchemy.case(
+      value=mapper.polymorphic_on,
+      whens={
+          val: mapper.class_.__name__
+          for val, mapper in mapper.polymorphic_map.items()
+      })
+
+
+def load_stubs(type_, keys, vals):
+  """Load link objects of objects of a type matching key column values.
+
+  Args:
+    type_: the name of the model.
+    keys: tuple of names of the key columns.
+    vals: collection of tuples of key column values.
+
+  Returns:
+    dict of (type_, keys, val) -> link object dict, or None if no object
+    matches val.
+  """
+  stubs = {(type_, keys, val): None for val in vals}
   model = ggrc.models.get_model(type_)
+  if model is None:
+    return stubs
   mapper = model._sa_class_manager.mapper
-  columns = []
-  columns_indexes = {}
-  if len(list(mapper.self_and_descendants)) == 1:
-    type_column = sqlalchemy.literal(mapper.class_.__name__)
-  else:
-    # Handle polymorphic types with CASE
-    type_column = sqlalchemy.case(
-        value=mapper.polymorphic_on,
-        whens={
-            val: mapper.class_.__name__
-            for val, mapper in mapper.polymorphic_map.items()
-        })
-  columns.append(type_column)
-  columns_indexes['type'] = 0
-  columns.append(model.id)
-  columns_indexes['id'] = 1
-  columns.append(mapper.c.context_id)
-  columns_indexes['context_id'] = 2
-  columns.append(mapper.c.updated_at)
-  columns_indexes['updated_at'] = 3
-
-  conditions = {}
-  for keys, vals in result_spec.items():
-    for key in keys:
-      if key not in columns_indexes:
-        columns_indexes[key] = len(columns)
-        columns.append(mapper.c[key])
-    conditions.setdefault(keys, []).extend(vals.keys())
-
-  where_clauses = []
-  for keys, vals in conditions.items():
+  key_columns = [mapper.c[key] for key in keys]
+  query = db.session.query(
+      _get_type_column(mapper), model.id, mapper.c.context_id, *key_columns)
+  vals = list(vals)
+  for start in range(0, len(vals), STUB_CHUNK_SIZE):
+    chunk = vals[start:start + STUB_CHUNK_SIZE]
     if len(keys) == 1:
-      # If the key is singular, use `IN (...)`
-      where_clauses.append(
-          columns[columns_indexes[keys[0]]].in_([v[0] for v in vals]))
+      condition = key_columns[0].in_([val[0] for val in chunk])
     else:
-      # If multiple keys, build `OR` of multiple `AND` clauses
-      clauses = []
-      cols = [columns[columns_indexes[k]] for k in keys]
-      for val in vals:
-        # Now build OR clause with (key, val) pairs
-        clause = []
-        for i, _ in enumerate(val):
-          clause.append(cols[i] == val[i])
-        clauses.append(sqlalchemy.and_(*clause))
-      where_clauses.append(sqlalchemy.or_(*clauses))
-  where_clause = sqlalchemy.or_(*where_clauses)
-
-  query = db.session.query(*columns).filter(where_clause)
-
-  return columns_indexes, query
-
-
-def build_stub_union_query(queries):
-  results = {}
-  for (type_, conditions) in queries:
-    if isinstance(conditions, (int, long, str, unicode)):
-      # Assume `id` query
-      keys, vals = ('id',), (conditions,)
-      results.setdefault(type_, {}).setdefault(keys, {}).setdefault(vals, [])
-    elif isinstance(conditions, dict):
-      keys, vals = zip(*sorted(conditions.items()))
-      results.setdefault(type_, {}).setdefault(keys, {}).setdefault(vals, [])
-    else:
-      # FIXME: Handle aggregated conditions recursively
-      pass
-
-  column_count = 0
-  type_column_indexes = {}
-  type_queries = {}
-  for (type_, result_spec) in results.items():
-    columns_indexes, query = build_type_query(type_, result_spec)
-    type_column_indexes[type_] = columns_indexes
-    type_queries[type_] = query
-    if len(columns_indexes) > column_count:
-      column_count = len(columns_indexes)
-
-  for (type_, query) in type_queries.items():
-    for _ in range(column_count - len(type_column_indexes[type_])):
-      query = query.add_column(sqlalchemy.literal(None))
-    type_queries[type_] = query
-
-  queries_for_union = type_queries.values()
-  if len(queries_for_union) == 0:
-    query = None
-  elif len(queries_for_union) == 1:
-    query = queries_for_union[0]
-  else:
-    query = db.session.query(
-        sqlalchemy.sql.expression.union(
-            *[q for q in type_queries.values()]).alias('union_query'))
-  return results, type_column_indexes, query
-
-
-def _render_stub_from_match(match, type_columns):
-  type_ = match[type_columns['type']]
-  id_ = match[type_columns['id']]
-  return {
-      'type': type_,
-      'id': id_,
-      'context_id': match[type_columns['context_id']],
-      'href': url_for(type_, id=id_),
-  }
+      condition = sqlalchemy.tuple_(*key_columns).in_(chunk)
+    for row in query.filter(condition):
+      stub_key = (type_, keys, tuple(row[3:]))
+      assert stubs.get(stub_key) is None, (stub_key, row)
+      stubs[stub_key] = {
+          'type': row[0],
+          'id': row[1],
+          'context_id': row[2],
+          'href': url_for(row[0], id=row[1]),
+      }
+  return stubs
 
 
 class LazyStubRepresentation(object):
+  """Placeholder for a link object that is resolved in bulk."""
 
   def __init__(self, type_, conditions):
     self.type = type_
@@ -443,82 +371,116 @@ class LazyStubRepresentation(object):
       conditions = {'id': conditions}
     self.conditions = conditions
     self.condition_key, self.condition_val = zip(*sorted(conditions.items()))
-
-  def get_matches(self, results):
-    return results\
-        .get(self.type, {})\
-        .get(self.condition_key, {})\
-        .get(self.condition_val, [])
-
-  def render(self, results, type_columns):
-    matches = self.get_matches(results)
-    assert len(matches) <= 1, (results, self.type, self.condition_key,
-                               self.condition_val)
-    if len(matches) == 1:
-      return _render_stub_from_match(matches[0], type_columns[self.type])
-    else:
-      return None
+    self.stub_key = (type_, self.condition_key, self.condition_val)
 
 
-def walk_representation(obj):  # noqa
-  if isinstance(obj, dict):
-    for key, value in obj.items():
-      if isinstance(value, dict):
-        for attr in walk_representation(value):
-          yield attr
-      elif isinstance(value, (list, tuple)):
-        for attr in walk_representation(value):
-          yield attr
-      else:
-        yield value, key, obj
-  elif isinstance(obj, (list, tuple)):
-    for index, value in enumerate(obj):
-      if isinstance(value, dict):
-        for attr in walk_representation(value):
-          yield attr
-      elif isinstance(value, (list, tuple)):
-        for attr in walk_representation(value):
-          yield attr
-      else:
-        yield value, index, obj
+class StubCollector(object):
+  """Resolves lazy stubs without walking the published representation.
 
+  Stubs are registered with the container and the key they are published
+  under, and are replaced by link objects loaded with one IN query per type
+  and key columns. Loaded link objects are cached, so the same object is
+  loaded only once per request.
+  """
 
-def gather_queries(resource):
-  queries = []
-  for val, key, obj in walk_representation(resource):
-    if isinstance(val, LazyStubRepresentation):
-      queries.append((val.type, val.conditions))
-  return queries
+  def __init__(self):
+    self.placements = []
+    self.cache = {}
 
+  def place(self, container, key, value):
+    """Register stubs of a value published under container[key].
 
-def reify_representation(resource, results, type_columns):
-  for val, key, obj in walk_representation(resource):
-    if isinstance(val, LazyStubRepresentation):
-      obj[key] = val.render(results, type_columns)
-  return resource
+    Returns:
+      the value.
+    """
+    if isinstance(value, LazyStubRepresentation):
+      self.placements.append((container, key, value))
+    elif isinstance(value, list):
+      for index, item in enumerate(value):
+        if isinstance(item, LazyStubRepresentation):
+          self.placements.append((value, index, item))
+    return value
+
+  def resolve(self):
+    """Replace all registered stubs with link objects."""
+    placements, self.placements = self.placements, []
+    cache = self.cache
+    missing = {}
+    for _, _, stub in placements:
+      if stub.stub_key not in cache:
+        missing.setdefault((stub.type, stub.condition_key), set()).add(
+            stub.condition_val)
+    for (type_, keys), vals in missing.iteritems():
+      cache.update(load_stubs(type_, keys, vals))
+    for container, key, stub in placements:
+      if container[key] is stub:
+        link = cache[stub.stub_key]
+        container[key] = dict(link) if link is not None else None
+
+  def clear_cache(self):
+    self.cache = {}
+
+
+def get_stub_collector():
+  """Get the stub collector of the current request or thread.
+
+  Outside of an app context the collector of the thread lives only until
+  the next ``publish_representation``, so background workers do not keep
+  resolved stubs for the life of the thread.
+  """
+  if has_app_context():
+    collector = getattr(g, "stub_collector", None)
+    if collector is None:
+      collector = g.stub_collector = StubCollector()
+    return collector
+  if not hasattr(_local, "stub_collector"):
+    _local.stub_collector = StubCollector()
+  return _local.stub_collector
 
 
 def publish_representation(resource):
-  queries = gather_queries(resource)
+  """Replace lazy stubs of published objects with link objects.
 
-  if len(queries) == 0:
-    return resource
+  All stubs published since the last call are resolved, including the ones
+  in ``resource``.
+
+  Returns:
+    the resource.
+  """
+  get_stub_collector().resolve()
+  if not has_app_context():
+    _local.__dict__.pop("stub_collector", None)
+  return resource
+
+
+def _clear_stub_cache(session, flush_context):
+  """Flushed changes may change the context of cached link objects."""
+  # pylint: disable=unused-argument
+  if has_app_context():
+    collector = getattr(g, "stub_collector", None)
   else:
-    results, type_columns, query = build_stub_union_query(queries)
-    rows = query.all()
-    for row in rows:
-      type_ = row[0]
-      for columns, matches in results[type_].items():
-        vals = tuple(row[type_columns[type_][c]] for c in columns)
-        if vals in matches:
-          matches[vals].append(row)
+    collector = getattr(_local, "stub_collector", None)
+  if collector is not None:
+    collector.clear_cache()
+
 
-    return reify_representation(resource, results, type_columns)
+def register_stub_cache_listeners():
+  event.listen(Session, "after_flush", _clear_stub_cache)
 
 
 class Builder(AttributeInfo):
   """JSON Dictionary builder for ggrc.models.* objects and their mixins."""
 
+  def __init__(self, tgt_class):
+    super(Builder, self).__init__(tgt_class)
+    self._tgt_class = tgt_class
+    # Compiled publishers by frozenset of inclusions of published attributes,
+    # from the least recently used
+    self._publishers = OrderedDict()
+    self._publishers_lock = threading.Lock()
+    self._published_names = {getattr(attr, "attr_name", attr)
+                             for attr in self._publish_attrs}
+
   def generate_link_object_for(
           self, obj, inclusions, include, inclusion_filter):
     """Generate a link object for this object. If there are property paths
@@ -531,13 +493,14 @@ class Builder(AttributeInfo):
     result = {
         'id': obj.id, 'type': type(obj).__name__, 'href': url_for(obj),
         'context_id': obj.context_id}
+    collector = get_stub_collector()
     for path in inclusions:
       if not isinstance(path, basestring):
         attr_name, remaining_path = path[0], path[1:]
       else:
         attr_name, remaining_path = path, ()
-      result[attr_name] = self.publish_attr(
-          obj, attr_name, remaining_path, include, inclusion_filter)
+      result[attr_name] = collector.place(result, attr_name, self.publish_attr(
+          obj, attr_name, remaining_path, include, inclusion_filter))
     return result
 
   def publish_link_collection(
@@ -669,11 +632,102 @@ class Builder(AttributeInfo):
 
     return result
 
-  def _publish_attrs_for(
-          self, obj, attrs, json_obj, inclusions=None, inclusion_filter=None):
-    if inclusions is None:
-      inclusions = []
-    for attr in attrs:
+  def _compile_relationship(self, attr_name, class_attr, inclusions, include):
+    """Compile publishing of a relationship, see publish_relationship."""
+    prop = class_attr.property
+    if prop.uselist:
+      def publish_collection(obj, inclusion_filter):
+        return self.publish_link_collection(
+            getattr(obj, attr_name), inclusions, include, inclusion_filter)
+      return publish_collection
+    if include or prop.backref:
+      def publish_link(obj, inclusion_filter):
+        return self.publish_link(
+            obj, attr_name, inclusions, include, inclusion_filter)
+      return publish_link
+    get_value = operator.attrgetter(list(prop.local_columns)[0].key)
+    if prop.mapper.class_.__mapper__.polymorphic_on is not None:
+      get_target = operator.attrgetter(attr_name)
+
+      def publish_polymorphic_stub(obj, _):
+        value = get_value(obj)
+        if value is None:
+          return None
+        return LazyStubRepresentation(
+            get_target(obj).__class__.__name__, value)
+      return publish_polymorphic_stub
+    target_type = prop.mapper.class_.__name__
+
+    def publish_stub(obj, _):
+      value = get_value(obj)
+      if value is None:
+        return None
+      return LazyStubRepresentation(target_type, value)
+    return publish_stub
+
+  def _compile_association_proxy(self, attr_name, class_attr, inclusions,
+                                 include):
+    """Compile publishing of an association proxy, see publish_attr."""
+    if getattr(class_attr, 'publish_raw', False):
+      get_raw = operator.attrgetter(attr_name)
+
+      def publish_raw(obj, _):
+        published_attr = get_raw(obj)
+        if hasattr(published_attr, "copy"):
+          return published_attr.copy()
+        return published_attr
+      return publish_raw
+
+    def publish_association_proxy(obj, inclusion_filter):
+      return self.publish_association_proxy(
+          obj, attr_name, class_attr, inclusions, include, inclusion_filter)
+    return publish_association_proxy
+
+  def _compile_property(self, attr_name, inclusions, include):
+    """Compile publishing of a polymorphic link property, see publish_attr."""
+    if not inclusions or include:
+      get_id = operator.attrgetter('{0}_id'.format(attr_name))
+      get_type = operator.attrgetter('{0}_type'.format(attr_name))
+
+      def publish_property_stub(obj, _):
+        if get_id(obj):
+          return LazyStubRepresentation(get_type(obj), get_id(obj))
+        return None
+      return publish_property_stub
+
+    def publish_property_link(obj, inclusion_filter):
+      return self.publish_link(
+          obj, attr_name, inclusions, include, inclusion_filter)
+    return publish_property_link
+
+  def _compile_attr(self, attr_name, inclusions, include):
+    """Compile publishing of a single attribute, see publish_attr.
+
+    Returns:
+      function of (obj, inclusion_filter) that returns the published value.
+    """
+    class_attr = getattr(self._tgt_class, attr_name)
+
+    if isinstance(class_attr, AssociationProxy):
+      return self._compile_association_proxy(
+          attr_name, class_attr, inclusions, include)
+    elif isinstance(class_attr, InstrumentedAttribute) and \
+            isinstance(class_attr.property, RelationshipProperty):
+      return self._compile_relationship(
+          attr_name, class_attr, inclusions, include)
+    elif class_attr.__class__.__name__ == 'property':
+      return self._compile_property(attr_name, inclusions, include)
+    get_attr = operator.attrgetter(attr_name)
+    return lambda obj, _: get_attr(obj)
+
+  def _compile_publisher(self, inclusions):
+    """Compile a flat publisher of all published attributes.
+
+    Attribute types are resolved once, so publishing an object only calls
+    the compiled function of each attribute.
+    """
+    attr_publishers = []
+    for attr in self._publish_attrs:
       if hasattr(attr, '__call__'):
         attr_name = attr.attr_name
       else:
@@ -683,9 +737,39 @@ class Builder(AttributeInfo):
         if inclusion[0] == attr_name:
           local_inclusion = inclusion
           break
-      json_obj[attr_name] = self.publish_attr(
-          obj, attr_name, local_inclusion[1:], len(local_inclusion) > 0,
-          inclusion_filter)
+      attr_publishers.append((attr_name, self._compile_attr(
+          attr_name, local_inclusion[1:], len(local_inclusion) > 0)))
+
+    def publisher(obj, json_obj, inclusion_filter):
+      place = get_stub_collector().place
+      for attr_name, publish_attr in attr_publishers:
+        json_obj[attr_name] = place(
+            json_obj, attr_name, publish_attr(obj, inclusion_filter))
+    return publisher
+
+  def get_publisher(self, inclusions):
+    """Get the compiled publisher for a set of inclusions.
+
+    Inclusions of attributes that are not published are ignored. Publishers
+    are compiled on first use and the PUBLISHER_CACHE_SIZE most recently used
+    ones are kept, since nested inclusions come from request parameters.
+
+    Returns:
+      function of (obj, json_obj, inclusion_filter).
+    """
+    key = frozenset(inclusion for inclusion in inclusions
+                    if inclusion and inclusion[0] in self._published_names)
+    with self._publishers_lock:
+      publisher = self._publishers.pop(key, None)
+      if publisher is not None:
+        self._publishers[key] = publisher
+        return publisher
+    publisher = self._compile_publisher(tuple(key))
+    with self._publishers_lock:
+      self._publishers[key] = publisher
+      while len(self._publishers) > PUBLISHER_CACHE_SIZE:
+        self._publishers.popitem(last=False)
+    return publisher
 
   def publish_attrs(self, obj, json_obj, extra_inclusions, inclusion_filter):
     """Translate the state represented by ``obj`` into the JSON dictionary
@@ -705,8 +789,7 @@ class Builder(AttributeInfo):
     """
     inclusions = tuple((attr,) for attr in self._include_links)
     inclusions = tuple(set(inclusions).union(set(extra_inclusions)))
-    return self._publish_attrs_for(
-        obj, self._publish_attrs, json_obj, inclusions, inclusion_filter)
+    return self.get_publisher(inclusions)(obj, json_obj, inclusion_filter)
 
   @classmethod
   def do_update_attrs(cls, obj, json_obj, attrs):
@@ -0,0 +1,325 @@
+# Copyright (C) 2017 Google Inc.
+# Licensed under http://www.apache.org/licenses/LICENSE-2.0 <see LICENSE file>
+
+"""In-process cache of relationship neighbors of objects.
+
+The cache maps an object stub ``(type, id)`` to the set of stubs of all
+objects that are mapped to it with a row in the relationships table, in
+either direction. Missing neighbor sets are loaded in batches with a single
+UNION ALL query per chunk of objects.
+
+Entries of both endpoints are removed when relationships are inserted,
+updated or deleted through the ORM, and by code that writes relationships
+with bulk statements by calling ``invalidate``. They are removed again when
+the session is committed or rolled back. Committed changes bump a generation
+counter in the shared memcache tier and every process drops its entries once
+per request when it sees a generation it did not produce. Without the shared
+tier the cache only lives for a single request.
+
+Loaded neighbors are returned but not cached if the session has uncommitted
+relationship changes, or if entries were invalidated or the generation
+changed since its transaction began, since the transaction may read a
+snapshot from before the changes were committed.
+"""
+
+import threading
+
+import flask
+from sqlalchemy import event
+from sqlalchemy import inspect
+from sqlalchemy.orm.session import Session
+from sqlalchemy.sql.expression import tuple_
+
+from ggrc import db
+from ggrc import settings
+from ggrc.cache.localcache import LocalCache
+
+
+# Number of objects whose neighbors are loaded with a single query.
+CHUNK_SIZE = 500
+
+GENERATION_KEY = "relationships:adjacency_generation"
+
+_lock = threading.Lock()
+_state = {
+    "cache": None,
+    "generation": None,
+    # Incremented on every in-process invalidation, so that neighbors loaded
+    # by transactions that began before an invalidation are not cached.
+    "invalidations": 0,
+}
+
+# session.info key of the invalidation count and the generation at the
+# beginning of the transaction
+BEGIN_STATE = "adjacency_begin"
+
+
+def _get_local_cache():
+  """Get the in-process adjacency cache."""
+  with _lock:
+    if _state["cache"] is None:
+      _state["cache"] = LocalCache(
+          size=getattr(settings, "ADJACENCY_CACHE_SIZE", 50000),
+          ttl=getattr(settings, "ADJACENCY_CACHE_TTL", 300),
+      )
+    return _state["cache"]
+
+
+def _get_shared_client():
+  """Get the shared memcache client or None if memcache is disabled."""
+  if not getattr(settings, "MEMCACHE_MECHANISM", False):
+    return None
+  from ggrc.cache.memcache import create_client
+  return create_client()
+
+
+def _count_invalidation():
+  with _lock:
+    _state["invalidations"] += 1
+
+
+def _get_invalidations():
+  with _lock:
+    return _state["invalidations"]
+
+
+def _has_pending(session):
+  """Check if the session has uncommitted relationship changes."""
+  return bool(session.info.get("adjacency_pending") or
+              session.info.get("adjacency_pending_all"))
+
+
+def _can_store(session):
+  """Check if neighbors loaded in the transaction of a session are current.
+
+  Committed changes of other threads are seen as invalidations and the ones
+  of other processes as a changed generation.
+  """
+  begin = session.info.get(BEGIN_STATE)
+  if begin is None or _has_pending(session):
+    return False
+  invalidations, generation = begin
+  if invalidations != _get_invalidations():
+    return False
+  client = _get_shared_client()
+  if client is None:
+    return True
+  return generation is not None and client.get(GENERATION_KEY) == generation
+
+
+def _sync():
+  """Drop cached entries that may be stale, once per request."""
+  if flask.has_request_context():
+    if getattr(flask.g, "adjacency_cache_synced", False):
+      return
+    flask.g.adjacency_cache_synced = True
+  client = _get_shared_client()
+  generation = None
+  if client is not None:
+    generation = client.get(GENERATION_KEY)
+    if generation is None and client.add(GENERATION_KEY, 0):
+      generation = 0
+  cache = _get_local_cache()
+  with _lock:
+    if generation is None or generation != _state["generation"]:
+      cache.clean()
+      _state["generation"] = generation
+
+
+def _bump_generation():
+  """Tell other processes that committed relationships changed."""
+  client = _get_shared_client()
+  if client is None:
+    return
+  generation = client.incr(GENERATION_KEY, initial_value=0)
+  with _lock:
+    # Entries of this process stay valid if no other process committed
+    # changes since the last sync.
+    if _state["generation"] is not None and \
+       generation == _state["generation"] + 1:
+      _state["generation"] = generation
+    else:
+      _state["generation"] = None
+
+
+def _load(stubs):
+  """Load neighbors of objects from the relationships table."""
+  from ggrc.models.relationship import Relationship
+  neighbors = {stub: set() for stub in stubs}
+  columns = db.session.query(
+      Relationship.source_type, Relationship.source_id,
+      Relationship.destination_type, Relationship.destination_id)
+  stubs = list(stubs)
+  for start in range(0, len(stubs), CHUNK_SIZE):
+    chunk = stubs[start:start + CHUNK_SIZE]
+    # Union is here to convince mysql to use two separate indices and
+    # merge the results. Just using `or` results in a full-table scan.
+    query = columns.filter(
+        tuple_(Relationship.source_type, Relationship.source_id).in_(chunk)
+    ).union_all(
+        columns.filter(
+            tuple_(Relationship.destination_type,
+                   Relationship.destination_id).in_(chunk))
+    )
+    for src_type, src_id, dst_type, dst_id in query:
+      src = (src_type, src_id)
+      dst = (dst_type, dst_id)
+      if src in neighbors:
+        neighbors[src].add(dst)
+      if dst in neighbors:
+        neighbors[dst].add(src)
+  return {stub: frozenset(values) for stub, values in neighbors.iteritems()}
+
+
+def _filter(neighbors, types):
+  if types is None:
+    return set(neighbors)
+  return {stub for stub in neighbors if stub[0] in types}
+
+
+def get_neighbors(stubs, types=None):
+  """Get neighbors of multiple objects.
+
+  Args:
+    stubs: iterable of (type, id) tuples.
+    types: optional collection of neighbor types to return.
+
+  Returns:
+    dict of (type, id) -> set of (type, id) of mapped objects.
+  """
+  stubs = {(type_, id_) for type_, id_ in stubs}
+  if not stubs:
+    return {}
+  _sync()
+  cache = _get_local_cache()
+  neighbors = cache.get_multi(stubs)
+  missing = stubs.difference(neighbors)
+  if missing:
+    loaded = _load(missing)
+    if _can_store(db.session()):
+      cache.add_multi(loaded)
+    neighbors.update(loaded)
+  return {stub: _filter(neighbors[stub], types) for stub in stubs}
+
+
+def get_neighbors_of(stub, types=None):
+  """Get neighbors of a single object."""
+  return get_neighbors([stub], types)[tuple(stub)]
+
+
+def get_two_hop(stubs, types=None, via_types=None):
+  """Get objects mapped to the neighbors of the given objects.
+
+  Args:
+    stubs: iterable of (type, id) tuples.
+    types: optional collection of types of the returned objects.
+    via_types: optional collection of types of the intermediate neighbors.
+
+  Returns:
+    dict of (type, id) -> set of (type, id) of objects two hops away,
+    excluding the object itself.
+  """
+  first = get_neighbors(stubs, via_types)
+  second = get_neighbors(
+      {stub for neighbors in first.itervalues() for stub in neighbors},
+      types)
+  return {
+      stub: {far for near in neighbors for far in second[near]} - {stub}
+      for stub, neighbors in first.iteritems()
+  }
+
+
+def invalidate(stubs, session=None):
+  """Remove neighbors of objects whose relationships were changed.
+
+  The stubs are also removed after the session is committed or rolled back
+  and other processes are notified on commit.
+
+  Args:
+    stubs: iterable of (type, id) tuples.
+    session: Session that changed the relationships, db.session by default.
+  """
+  stubs = {(type_, id_) for type_, id_ in stubs}
+  if not stubs:
+    return
+  _count_invalidation()
+  _get_local_cache().remove_multi(stubs)
+  if session is None:
+    session = db.session()
+  session.info.setdefault("adjacency_pending", set()).update(stubs)
+
+
+def invalidate_all(session=None):
+  """Remove all cached neighbors, e.g. after a bulk INSERT ... SELECT.
+
+  Args:
+    session: Session that changed the relationships, db.session by default.
+  """
+  _count_invalidation()
+  _get_local_cache().clean()
+  if session is None:
+    session = db.session()
+  session.info["adjacency_pending_all"] = True
+
+
+def _handle_relationship_change(mapper, connection, target):
+  """Invalidate neighbors of both old and new endpoints of a relationship."""
+  # pylint: disable=unused-argument
+  state = inspect(target)
+  stubs = set()
+  for side in ("source", "destination"):
+    types = state.attrs[side + "_type"].history
+    ids = state.attrs[side + "_id"].history
+    stubs.update((type_, id_)
+                 for type_ in types.sum() or [getattr(target, side + "_type")]
+                 for id_ in ids.sum() or [getattr(target, side + "_id")])
+  invalidate(stubs, session=state.session)
+
+
+def _remove_pending(session):
+  """Remove entries changed by the session from the in-process cache.
+
+  Returns:
+    True if the session changed any relationships.
+  """
+  session.info.pop(BEGIN_STATE, None)
+  pending = session.info.pop("adjacency_pending", None)
+  pending_all = session.info.pop("adjacency_pending_all", False)
+  if pending or pending_all:
+    _count_invalidation()
+  if pending_all:
+    _get_local_cache().clean()
+    return True
+  if pending:
+    _get_local_cache().remove_multi(pending)
+    return True
+  return False
+
+
+def _handle_after_begin(session, transaction, connection):
+  """Record the state of the cache when a transaction begins."""
+  # pylint: disable=unused-argument
+  if transaction.nested:
+    return
+  with _lock:
+    session.info[BEGIN_STATE] = (_state["invalidations"],
+                                 _state["generation"])
+
+
+def _handle_after_commit(session):
+  if _remove_pending(session):
+    _bump_generation()
+
+
+def _handle_after_rollback(session):
+  _remove_pending(session)
+
+
+def register_adjacency_listeners():
+  """Invalidate cached neighbors on relationship changes."""
+  from ggrc.models.relationship import Relationship
+  for event_name in ("after_insert", "after_update", "after_delete"):
+    event.listen(Relationship, event_name, _handle_relationship_change)
+  event.listen(Session, "after_begin", _handle_after_begin)
+  event.listen(Session, "after_commit", _handle_after_commit)
+  event.listen(Session, "after_rollback", _handle_after_rollback)
@@ -0,0 +1,124 @@
+# Copyright (C) 2017 Google Inc.
+# Licensed under http://www.apache.org/licenses/LICENSE-2.0 <see LICENSE file>
+
+"""In-process fake of the App Engine memcache client.
+
+Set ``MEMCACHE_CLIENT`` to ``ggrc.cache.fakememcache.Client`` to use the
+shared cache tier without a memcache service, e.g. in tests and local
+development.
+"""
+
+import threading
+from copy import deepcopy
+
+DELETE_ITEM_MISSING = 1
+DELETE_SUCCESSFUL = 2
+
+
+class Client(object):
+  """Implements the part of the memcache client API that is used by GGRC.
+
+  All clients share a single storage, like clients of a memcache service do.
+  Values are copied on reads and writes, as they would be pickled by
+  memcache. Expiration times are ignored.
+  """
+
+  _storage = {}
+  _lock = threading.Lock()
+
+  def get(self, key):
+    with self._lock:
+      return deepcopy(self._storage.get(key))
+
+  gets = get
+
+  def get_multi(self, keys, key_prefix='', namespace=None, for_cas=False):
+    # pylint: disable=unused-argument
+    with self._lock:
+      return {key: deepcopy(self._storage[key_prefix + key])
+              for key in keys if key_prefix + key in self._storage}
+
+  def set(self, key, value, time=0):
+    # pylint: disable=unused-argument
+    with self._lock:
+      self._storage[key] = deepcopy(value)
+    return True
+
+  def set_multi(self, mapping, time=0, key_prefix=''):
+    # pylint: disable=unused-argument
+    with self._lock:
+      for key, value in mapping.iteritems():
+        self._storage[key_prefix + key] = deepcopy(value)
+    return []
+
+  def add(self, key, value, time=0):
+    return not self.add_multi({key: value}, time)
+
+  def add_multi(self, mapping, time=0, key_prefix=''):
+    """Add values for keys that are not stored yet.
+
+    Returns:
+      List of keys that were not added.
+    """
+    # pylint: disable=unused-argument
+    not_added = []
+    with self._lock:
+      for key, value in mapping.iteritems():
+        if key_prefix + key in self._storage:
+          not_added.append(key)
+        else:
+          self._storage[key_prefix + key] = deepcopy(value)
+    return not_added
+
+  def cas(self, key, value, time=0):
+    return not self.cas_multi({key: value}, time)
+
+  def cas_multi(self, mapping, time=0, key_prefix=''):
+    """Replace values of keys that are stored.
+
+    Returns:
+      List of keys that were not replaced.
+    """
+    # pylint: disable=unused-argument
+    not_set = []
+    with self._lock:
+      for key, value in mapping.iteritems():
+        if key_prefix + key in self._storage:
+          self._storage[key_prefix + key] = deepcopy(value)
+        else:
+          not_set.append(key)
+    return not_set
+
+  def incr(self, key, delta=1, namespace=None, initial_value=None):
+    """Increment a stored integer.
+
+    Returns:
+      New value or None if the key is not stored and no initial value is
+      given.
+    """
+    # pylint: disable=unused-argument
+    with self._lock:
+      value = self._storage.get(key, initial_value)
+      if value is None:
+        return None
+      self._storage[key] = value + delta
+      return self._storage[key]
+
+  def delete(self, key, seconds=0):
+    # pylint: disable=unused-argument
+    with self._lock:
+      if self._storage.pop(key, None) is None:
+        return DELETE_ITEM_MISSING
+    return DELETE_SUCCESSFUL
+
+  def delete_multi(self, keys, seconds=0, key_prefix=''):
+    # pylint: disable=unused-argument
+    with self._lock:
+      for key in keys:
+        self._storage.pop(key_prefix + key, None)
+    return True
+
+  def flush_all(self):
+    with self._lock:
+      self._storage.clear()
+    return True
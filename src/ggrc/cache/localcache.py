@@ -1,41 +1,107 @@
 # Copyright (C) 2017 Google Inc.
 # Licensed under http://www.apache.org/licenses/LICENSE-2.0 <see LICENSE file>
 
-from collections import OrderedDict
-from cache import Cache
-from cache import all_cache_entries
-
 """
 LocalCache implements the caching mechanism that is local to
 the AppEngine instance
 """
 
+import threading
+import time
+from collections import OrderedDict
+
+from cache import Cache
+from cache import all_cache_entries
+
 
 class LocalCache(Cache):
   """ LocalCache inherits from cache and it provides caching mechanism that is
       local to a particular GGRC instance
 
+      Entries are evicted in least recently used order when the cache holds
+      more than `size` entries and expire `ttl` seconds after they were
+      added.
+
       Attributes:
-        cache_entries: Ordered dictionary containing resource id as key and
-        value as JSON object (dictionary)
+        cache_entries: Ordered dictionary containing cache key as key and
+        (expiry time, value) as value, ordered from the least recently used
   """
 
-  cache_entries = OrderedDict()
-
-  def __init__(self):
+  def __init__(self, size=10000, ttl=60):
     self.name = 'local'
+    self.size = size
+    self.ttl = ttl
+    self.cache_entries = OrderedDict()
+    self.lock = threading.Lock()
 
     for cache_entry in all_cache_entries():
       if cache_entry.cache_type is self.name:
         self.supported_resources[cache_entry.model_plural] = \
             cache_entry.class_name
 
-    for key in self.supported_resources.keys():
-      self.cache_entries['collection:' + key] = {}
-
   def get_name(self):
     return self.name
 
+  def get_multi(self, keys):
+    """ Get entries for the given keys
+
+    Args:
+      keys: list of cache keys
+
+    Returns:
+      dictionary of cache key -> value for all keys present in cache
+    """
+    now = time.time()
+    data = {}
+    with self.lock:
+      for key in keys:
+        entry = self.cache_entries.pop(key, None)
+        if entry is None:
+          continue
+        expiry, value = entry
+        if expiry < now:
+          continue
+        # Reinsert the entry to mark it as the most recently used
+        self.cache_entries[key] = entry
+        data[key] = value
+    return data
+
+  def add_multi(self, data, expiration_time=0):
+    """ Add entries to cache, replacing existing entries
+
+    Args:
+      data: dictionary of cache key -> value
+      expiration_time: optional TTL in seconds, defaults to the cache TTL
+
+    Returns:
+      list of keys that were not added, which is always empty
+    """
+    expiry = time.time() + (expiration_time or self.ttl)
+    with self.lock:
+      for key, value in data.iteritems():
+        self.cache_entries.pop(key, None)
+        self.cache_entries[key] = (expiry, value)
+      while len(self.cache_entries) > self.size:
+        self.cache_entries.popitem(last=False)
+    return []
+
+  def update_multi(self, data, expiration_time=0):
+    return self.add_multi(data, expiration_time)
+
+  def remove_multi(self, keys, lockadd_seconds=0):
+    """ Remove entries with the given keys from cache
+
+    Args:
+      keys: list of cache keys
+
+    Returns:
+      True
+    """
+    with self.lock:
+      for key in keys:
+        self.cache_entries.pop(key, None)
+    return True
+
   def get(self, category, resource, filter):
     """ Get data from local cache for the specified filter
 
@@ -51,23 +117,23 @@ class LocalCache(Cache):
     """
     if not self.is_caching_supported(category, resource):
       return None
-
     cache_key = self.get_key(category, resource)
-    if cache_key is None:
-      return None
-
-    entries = self.cache_entries.get(cache_key)
-    if entries is None:
-      return None
-
     ids, attrs = self.parse_filter(filter)
-    if ids is None and attrs is None:
+    if ids is None:
       return None
-    else:
-      if ids is None:
-        return self.get_data(entries.keys(), entries, attrs)
-      else:
-        return self.get_data(ids, entries, attrs)
+    keys = ["{}:{}".format(cache_key, id_) for id_ in ids]
+    entries = self.get_multi(keys)
+    data = OrderedDict()
+    for id_, key in zip(ids, keys):
+      if key not in entries:
+        #  ALL or None Policy: if a key is not in cache, stop processing and
+        #  continue as before going to Data-ORM layer
+        return None
+      attrvalues = entries[key] or {}
+      targetattrs = attrvalues.keys() if attrs is None else attrs
+      data[id_] = {attr: attrvalues[attr] for attr in targetattrs
+                   if attr in attrvalues}
+    return data
 
   def add(self, category, resource, data, expiration_time=0):
     """ Add data to local cache for the specified data
@@ -84,25 +150,14 @@ class LocalCache(Cache):
     if not self.is_caching_supported(category, resource):
       return None
     cache_key = self.get_key(category, resource)
-    if cache_key is None:
-      return None
-    if self.cache_entries is None:
-      return None
-    entries = self.cache_entries.get(cache_key)
-    if entries is None:
-      return None
-
-    # TODO(dan): Should we perform deep copy of data
-    for key in data.keys():
-      entries[key] = data.get(key)
-
-    return entries
+    self.add_multi({"{}:{}".format(cache_key, key): value
+                    for key, value in data.iteritems()}, expiration_time)
+    return data
 
   def update(self, category, resource, data, expiration_time=0):
     """ Update data in local cache for the specified data
-    TODO(dan): updates is not available for local cache
     """
-    return None
+    return self.add(category, resource, data, expiration_time)
 
   def remove(self, category, resource, data, lockadd_seconds=0):
     """ Remove data from local cache for the specified data
@@ -118,62 +173,17 @@ class LocalCache(Cache):
     if not self.is_caching_supported(category, resource):
       return None
     cache_key = self.get_key(category, resource)
-    if cache_key is None:
-      return None
-    if self.cache_entries is None:
-      return None
-    entries = self.cache_entries.get(cache_key)
-
-    for key in data.keys():
-      del entries[key]
-
-    return entries
-
-  def get_data(self, keys, cacheitems, attrs):
-    """ Get data from cache for the given set of keys and attributes in cache
-        TODO(dan): all or none default policy is implemeted here, it should be
-        in cachemanager
-    Args:
-      keys: set of keys to search from local cache
-      cacheitems: cache entries
-      attrs:  set of attributes to search from local cache
-
-    Returns:
-      None on any errors
-      mapping of DTO formatted string, e.g. JSON string representation
-    """
-    data = OrderedDict()
-
-    for key in keys:
-      if key not in cacheitems:
-        #  ALL or None Policy: if a key is not in cache, stop processing and
-        #  continue as before going to Data-ORM layer
-        return None
-      attrvalues = cacheitems.get(key)
-      targetattrs = None
-      if attrs is None and attrvalues is not None:
-        targetattrs = attrvalues.keys()
-      elif attrvalues is None:
-        # Do nothing as there are no attrs to get
-        continue
-      else:
-        targetattrs = attrs
-
-      attr_dict = {}
-      for attr in targetattrs:
-        if attr in attrvalues:
-          attr_dict[attr] = attrvalues.get(attr)
-
-      data[key] = attr_dict
-
+    self.remove_multi(["{}:{}".format(cache_key, key) for key in data])
     return data
 
   def clean(self):
     """ Cleanup
     """
-    self.cache_entries.clear()
+    with self.lock:
+      self.cache_entries.clear()
+    return True
 
   def __repr__(self):
     """ Print content of cache
     """
-    return str(self.cache_entries.keys()) + str(self.cache_entries.values())
+    return str(self.cache_entries.keys())
@@ -2,16 +2,32 @@
 # Licensed under http://www.apache.org/licenses/LICENSE-2.0 <see LICENSE file>
 
 
+import sys
+
 from google.appengine.api import memcache
 from cache import Cache
 from cache import all_cache_entries
 from collections import OrderedDict
 from copy import deepcopy
 
+from ggrc import settings
+
 """
     Memcache implements the remote AppEngine Memcache mechanism
 
 """
+
+
+def create_client():
+  """Create a client of the memcache class set in MEMCACHE_CLIENT setting."""
+  client_name = getattr(settings, "MEMCACHE_CLIENT", None)
+  if not client_name:
+    return memcache.Client()
+  module_name, class_name = client_name.rsplit(".", 1)
+  __import__(module_name)
+  return getattr(sys.modules[module_name], class_name)()
+
+
 class MemCache(Cache):
   def __init__(self):
     self.name = 'memcache'
@@ -20,7 +36,7 @@ class MemCache(Cache):
     for cache_entry in all_cache_entries():
       if cache_entry.cache_type is self.name:
         self.supported_resources[cache_entry.model_plural]=cache_entry.class_name
-        self.memcache_client = memcache.Client()
+        self.memcache_client = create_client()
 
   def get_name(self):
     return self.name
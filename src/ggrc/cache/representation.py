@@ -0,0 +1,261 @@
+# Copyright (C) 2017 Google Inc.
+# Licensed under http://www.apache.org/licenses/LICENSE-2.0 <see LICENSE file>
+
+"""Two tier cache of published object representations.
+
+Representations returned by collection GET requests are cached in a bounded
+in-process LRU cache with a short TTL and in the shared memcache tier.
+
+Both tiers store a single entry per object under its memcache key
+(``collection:<table plural>:<id>``). The entry holds the ``updated_at`` of
+the object and its representations for every requested set of ``__include``
+properties, so a representation is matched by type, id, updated_at and
+include set. The in-process tier stores representations pickled, so that
+callers that modify returned representations in place, e.g. by permission
+filtering, do not change the cached copies.
+
+Entries are removed from both tiers by the memcache invalidation hooks of
+write requests. Changes of related objects do not change ``updated_at``, so
+write requests also bump a generation counter in the shared tier. Entries of
+the in-process tier record the generation they were stored at and are only
+used while it is current, which costs one shared tier lookup per request.
+"""
+
+import cPickle
+import threading
+import time
+from collections import defaultdict
+
+from ggrc import settings
+from ggrc.cache.localcache import LocalCache
+
+
+# Number of keys in a single request to the shared tier.
+CHUNK_SIZE = 32
+
+GENERATION_KEY = "representation:generation"
+
+_local_cache = None
+_local_cache_lock = threading.Lock()
+
+_stats = defaultdict(lambda: defaultdict(float))
+_stats_lock = threading.Lock()
+
+
+def get_local_cache():
+  """Get the in-process cache tier."""
+  global _local_cache  # pylint: disable=global-statement
+  with _local_cache_lock:
+    if _local_cache is None:
+      _local_cache = LocalCache(
+          size=getattr(settings, "REPRESENTATION_CACHE_SIZE", 10000),
+          ttl=getattr(settings, "REPRESENTATION_CACHE_TTL", 30),
+      )
+  return _local_cache
+
+
+def invalidate_local(keys):
+  """Remove entries with the given keys from the in-process tier."""
+  if keys:
+    get_local_cache().remove_multi(keys)
+
+
+def bump_generation(shared):
+  """Invalidate in-process tiers of all processes.
+
+  Args:
+    shared: Cache object of the shared tier, e.g. MemCache.
+  """
+  shared.memcache_client.incr(GENERATION_KEY, initial_value=0)
+
+
+def get_include_key(includes):
+  """Get a key of the __include property set of a request."""
+  if not includes:
+    return ""
+  return ",".join(sorted(set(includes.split(","))))
+
+
+def _get_representation(entry, updated_at, include_key):
+  """Get a representation from a cache entry if the entry is up to date."""
+  if not isinstance(entry, dict) or entry.get("updated_at") != updated_at:
+    return None
+  return entry.get("representations", {}).get(include_key)
+
+
+def _freeze(entry, generation):
+  """Get a copy of an entry with pickled representations for the local tier."""
+  return {
+      "generation": generation,
+      "updated_at": entry["updated_at"],
+      "representations": {
+          include_key: cPickle.dumps(representation, cPickle.HIGHEST_PROTOCOL)
+          for include_key, representation
+          in entry.get("representations", {}).iteritems()
+      },
+  }
+
+
+def _chunks(keys):
+  keys = list(keys)
+  for start in range(0, len(keys), CHUNK_SIZE):
+    yield keys[start:start + CHUNK_SIZE]
+
+
+def _record(model_name, lookups, local_hits, shared_hits, elapsed):
+  """Store statistics of a single cache lookup."""
+  with _stats_lock:
+    stats = _stats[model_name]
+    stats["lookups"] += 1
+    stats["objects"] += lookups
+    stats["local_hits"] += local_hits
+    stats["shared_hits"] += shared_hits
+    stats["time"] += elapsed
+
+
+def get_report():
+  """Get hit ratio and lookup latency of the cache for every model."""
+  report = {}
+  with _stats_lock:
+    for model_name, stats in _stats.iteritems():
+      hits = stats["local_hits"] + stats["shared_hits"]
+      report[model_name] = {
+          "lookups": int(stats["lookups"]),
+          "objects": int(stats["objects"]),
+          "local_hits": int(stats["local_hits"]),
+          "shared_hits": int(stats["shared_hits"]),
+          "misses": int(stats["objects"] - hits),
+          "hit_ratio": hits / stats["objects"] if stats["objects"] else 0.0,
+          "avg_latency_ms": 1000 * stats["time"] / stats["lookups"],
+      }
+  return report
+
+
+def reset_report():
+  with _stats_lock:
+    _stats.clear()
+
+
+class RepresentationCache(object):
+  """Representation cache for the objects of a single request.
+
+  Args:
+    shared: Cache object of the shared tier, e.g. MemCache, or None.
+  """
+
+  def __init__(self, shared=None):
+    self.local = get_local_cache()
+    self.shared = shared
+    # Entries read from the shared tier, used to merge representations of
+    # new include sets into existing entries.
+    self._shared_entries = {}
+    self._generation = None
+    self._generation_loaded = False
+
+  def _get_generation(self):
+    """Get the generation of the shared tier, loaded once per request.
+
+    Returns:
+      the generation, 0 without the shared tier or None if the in-process
+      tier can't be validated.
+    """
+    if self.shared is None:
+      return 0
+    if not self._generation_loaded:
+      client = self.shared.memcache_client
+      generation = client.get(GENERATION_KEY)
+      if generation is None and client.add(GENERATION_KEY, 0):
+        generation = 0
+      self._generation = generation
+      self._generation_loaded = True
+    return self._generation
+
+  def get(self, model_name, keys, include_key):
+    """Get cached representations.
+
+    Args:
+      model_name: Name of the model, used for the statistics.
+      keys: dict of cache key -> updated_at of the object.
+      include_key: Key of the __include property set.
+    Returns:
+      dict of cache key -> representation for all cache hits.
+    """
+    start = time.time()
+    resources = {}
+    generation = self._get_generation()
+    local_entries = {}
+    if generation is not None:
+      local_entries = self.local.get_multi(keys.keys())
+    for key, entry in local_entries.iteritems():
+      if entry.get("generation") != generation:
+        continue
+      representation = _get_representation(entry, keys[key], include_key)
+      if representation is not None:
+        resources[key] = cPickle.loads(representation)
+    local_hits = len(resources)
+
+    missing = [key for key in keys if key not in resources]
+    if missing and self.shared is not None:
+      found = {}
+      for chunk in _chunks(missing):
+        found.update(self.shared.get_multi(chunk) or {})
+      self._shared_entries.update(found)
+      promoted = {}
+      for key, entry in found.iteritems():
+        representation = _get_representation(entry, keys[key], include_key)
+        if representation is not None:
+          resources[key] = representation
+          promoted[key] = _freeze(entry, generation)
+      if generation is not None:
+        self.local.add_multi(promoted)
+
+    _record(model_name, len(keys), local_hits, len(resources) - local_hits,
+            time.time() - start)
+    return resources
+
+  def _get_unblocked_keys(self, keys):
+    """Get keys that are not blocked by DeleteOp entries of write requests."""
+    if self.shared is None:
+      return list(keys)
+    blocked = set()
+    for chunk in _chunks(keys):
+      blockers = ["DeleteOp:{}".format(key) for key in chunk]
+      blocked.update(self.shared.get_multi(blockers) or {})
+    return [key for key in keys if "DeleteOp:{}".format(key) not in blocked]
+
+  def add(self, keys, representations, include_key):
+    """Add representations to both cache tiers.
+
+    Objects modified by write requests that did not finish yet are skipped.
+
+    Args:
+      keys: dict of cache key -> updated_at of the object.
+      representations: dict of cache key -> representation.
+      include_key: Key of the __include property set.
+    """
+    entries = {}
+    for key in self._get_unblocked_keys(representations.keys()):
+      entry = self._shared_entries.get(key)
+      if isinstance(entry, dict) and entry.get("updated_at") == keys[key]:
+        entry = {
+            "updated_at": entry["updated_at"],
+            "representations": dict(entry.get("representations", {})),
+        }
+      else:
+        entry = {"updated_at": keys[key], "representations": {}}
+      entry["representations"][include_key] = representations[key]
+      entries[key] = entry
+    generation = self._get_generation()
+    if generation is not None:
+      self.local.add_multi({key: _freeze(entry, generation)
+                            for key, entry in entries.iteritems()})
+    if self.shared is None:
+      return
+    existing = {key: entry for key, entry in entries.iteritems()
+                if key in self._shared_entries}
+    new = {key: entry for key, entry in entries.iteritems()
+           if key not in self._shared_entries}
+    for chunk in _chunks(existing):
+      self.shared.update_multi({key: existing[key] for key in chunk})
+    for chunk in _chunks(new):
+      self.shared.add_multi({key: new[key] for key in chunk})
@@ -59,33 +59,48 @@ class Converter(object):
     self.response_data = []
     self.exportable = get_exportables()
     self.indexer = get_indexer()
+    # Optional BackgroundTask used for reporting progress.
+    self.task = kwargs.get("task")
 
   def to_array(self):
     self.block_converters_from_ids()
-    self.handle_row_data()
-    return self.to_block_array()
+    return list(self.generate_csv_rows())
 
-  def to_block_array(self):
+  def generate_csv_rows(self):
     """ exporting each in it's own block separated by empty lines
 
-    Generate 2d array where each cell represents a cell in a csv file
+    Generate rows where each cell represents a cell in a csv file. All rows
+    have the same length and objects are loaded in chunks while the rows are
+    consumed, so block converters must be created before.
     """
-    csv_data = []
+    width = max([len(block.fields) for block in self.block_converters] or [0])
+    empty_line = [""] * (width + 1)
+    rows_total = sum(len(block.object_ids) for block in self.block_converters)
+    rows_done = 0
     for block_converter in self.block_converters:
-      csv_header, csv_body = block_converter.to_array()
       # multi block csv must have first column empty
-      two_empty_lines = [[], []]
-      block_data = csv_header + csv_body + two_empty_lines
-      for line in block_data:
-        line.insert(0, "")
-      block_data[0][0] = "Object type"
-      block_data[1][0] = block_converter.name
-      csv_data.extend(block_data)
-    return csv_data
+      first_column = ["Object type", block_converter.name]
+      header = block_converter.generate_csv_header()
+      for index, line in enumerate(header):
+        yield [first_column[index]] + line + [""] * (width - len(line))
+      for line in block_converter.generate_csv_body():
+        yield [""] + line + [""] * (width - len(line))
+        rows_done += 1
+        if rows_done % block_converter.EXPORT_CHUNK_SIZE == 0:
+          self.report_progress(rows_done, rows_total)
+      yield list(empty_line)
+      yield list(empty_line)
+
+  def report_progress(self, rows_done, rows_total):
+    """Store the number of processed rows on the background task."""
+    if self.task is not None:
+      self.task.set_progress(rows_done=rows_done, rows_total=rows_total)
 
   def import_csv(self):
     self.block_converters_from_csv()
     self.row_converters_from_csv()
+    for block_converter in self.block_converters:
+      block_converter.preload_objects(self.priority_columns)
     self.handle_priority_columns()
     self.import_objects()
     self.import_secondary_objects()
@@ -119,7 +134,6 @@ class Converter(object):
                                        fields=fields, object_ids=object_ids,
                                        class_name=class_name)
       block_converter.check_block_restrictions()
-      block_converter.row_converters_from_ids()
       self.block_converters.append(block_converter)
 
   def block_converters_from_csv(self):
@@ -145,9 +159,14 @@ class Converter(object):
     self.block_converters.sort(key=lambda x: order[x.name])
 
   def import_objects(self):
+    rows_total = sum(len(block.rows) for block in self.block_converters)
+    rows_done = 0
     for converter in self.block_converters:
+      converter.preload_objects()
       converter.handle_row_data()
       converter.import_objects()
+      rows_done += len(converter.rows)
+      self.report_progress(rows_done, rows_total)
 
   def import_secondary_objects(self):
     for converter in self.block_converters:
@@ -26,6 +26,7 @@ from ggrc.converters import errors
 from ggrc.converters import get_shared_unique_rules
 from ggrc.converters import pre_commit_checks
 from ggrc.converters.base_row import RowConverter
+from ggrc.converters.object_cache import ObjectCache
 from ggrc.converters.import_helper import get_column_order
 from ggrc.converters.import_helper import get_object_column_definitions
 from ggrc.services.common import get_modified_objects
@@ -44,6 +45,11 @@ logger = getLogger(__name__)
 CACHE_EXPIRY_IMPORT = 600
 
 
+def _identifier(obj):
+  """Get the identifier of a mapped object used in the mapping columns."""
+  return getattr(obj, "slug", getattr(obj, "email", None))
+
+
 class BlockConverter(object):
   # pylint: disable=too-many-public-methods
 
@@ -75,6 +81,9 @@ class BlockConverter(object):
 
   """
 
+  # Number of objects loaded at once when exporting a block.
+  EXPORT_CHUNK_SIZE = 1000
+
   def get_unique_counts_dict(self, object_class):
     """ get a the varible for storing unique counts
 
@@ -108,6 +117,7 @@ class BlockConverter(object):
     self.row_errors = []
     self.row_warnings = []
     self.row_converters = []
+    self.object_cache = ObjectCache()
     self.ignore = False
     self._has_non_importable_columns = False
     # For import contains model name from csv file.
@@ -169,10 +179,39 @@ class BlockConverter(object):
       self._ca_definitions_cache = self._create_ca_definitions_cache()
     return self._ca_definitions_cache
 
-  def _create_mapping_cache(self):
-    """Create mapping cache for object in the current block."""
-    def identifier(obj):
-      return getattr(obj, "slug", getattr(obj, "email", None))
+  def _get_mapped_objects(self, relationships):
+    """Get objects mapped to block objects with relationships.
+
+    Returns:
+      list of (id of a block object, type of the mapped object, object).
+    """
+    mapped = []
+    for rel in relationships:
+      try:
+        if rel.source_type == self.object_class.__name__:
+          if rel.destination:
+            mapped.append(
+                (rel.source_id, rel.destination_type, rel.destination))
+        elif rel.source:
+          mapped.append(
+              (rel.destination_id, rel.source_type, rel.source))
+      except AttributeError:
+        # Some relationships have an invalid state in the database and make
+        # rel.source or rel.destination fail. These relationships are
+        # ignored everywhere and should eventually be purged from the db
+        logger.error("Failed adding object to relationship cache. "
+                     "Rel id: %s", rel.id)
+    return mapped
+
+  def _create_mapping_cache(self, object_ids=None):
+    """Create mapping cache for object in the current block.
+
+    Args:
+      object_ids (list of int): ids of objects for which the cache is
+        created. Defaults to all objects of the block.
+    """
+    if object_ids is None:
+      object_ids = self.object_ids
 
     relationship = models.Relationship
 
@@ -181,30 +220,26 @@ class BlockConverter(object):
         relationships = relationship.eager_query().filter(or_(
             and_(
                 relationship.source_type == self.object_class.__name__,
-                relationship.source_id.in_(self.object_ids),
+                relationship.source_id.in_(object_ids),
             ),
             and_(
                 relationship.destination_type == self.object_class.__name__,
-                relationship.destination_id.in_(self.object_ids),
+                relationship.destination_id.in_(object_ids),
             )
         )).all()
       with benchmark("building cache"):
-        cache = defaultdict(lambda: defaultdict(list))
-        for rel in relationships:
-          try:
-            if rel.source_type == self.object_class.__name__:
-              if rel.destination:
-                cache[rel.source_id][rel.destination_type].append(
-                    identifier(rel.destination))
-            elif rel.source:
-              cache[rel.destination_id][rel.source_type].append(
-                  identifier(rel.source))
-          except AttributeError:
-            # Some relationships have an invalid state in the database and make
-            # rel.source or rel.destination fail. These relationships are
-            # ignored everywhere and should eventually be purged from the db
-            logger.error("Failed adding object to relationship cache. "
-                         "Rel id: %s", rel.id)
+        mapped = self._get_mapped_objects(relationships)
+      if self.operation == 'export':
+        with benchmark("filter mapped objects by read permissions"):
+          allowed = permissions.allowed_mask("read", [
+              (type_, obj.id, getattr(obj, "context_id", None))
+              for _, type_, obj in mapped
+          ])
+          mapped = [item for item, is_allowed in zip(mapped, allowed)
+                    if is_allowed]
+      cache = defaultdict(lambda: defaultdict(list))
+      for object_id, type_, obj in mapped:
+        cache[object_id][type_].append(_identifier(obj))
       return cache
 
   def get_mapping_cache(self):
@@ -244,12 +279,13 @@ class BlockConverter(object):
     return map(list, zip(*headers))
 
   def generate_csv_body(self):
-    """ Generate 2D array populated with object values """
-    return [r.to_array(self.fields) for r in self.row_converters]
+    """ Generate rows populated with object values """
+    for row_converter in self.generate_row_converters():
+      yield row_converter.to_array(self.fields)
 
   def to_array(self):
     csv_header = self.generate_csv_header()
-    csv_body = self.generate_csv_body()
+    csv_body = list(self.generate_csv_body())
     return csv_header, csv_body
 
   def get_header_names(self):
@@ -310,17 +346,57 @@ class BlockConverter(object):
                          headers=self.headers, index=i)
       self.row_converters.append(row)
 
-  def row_converters_from_ids(self):
-    """ Generate a row converter object for every csv row """
+  def preload_objects(self, field_list=None):
+    """Load objects referenced by all rows of the block in bulk.
+
+    Every call starts with a new cache, so objects imported by previous
+    blocks are found and objects that did not exist are looked up again.
+
+    Args:
+      field_list (list of strings): optional list of columns whose referenced
+        objects are loaded. All columns are used by default.
+    """
+    self.object_cache = ObjectCache()
+    if self.ignore or not self.object_class:
+      return
+    lookups = defaultdict(set)
+    for index, (attr_name, header) in enumerate(self.headers.items()):
+      if field_list is not None and attr_name not in field_list:
+        continue
+      for row in self.rows:
+        if attr_name in ("slug", "email"):
+          keys = [(self.object_class, attr_name, row[index].strip())]
+        else:
+          keys = header["handler"].get_lookup_keys(row[index], **header)
+        for model, key, value in keys:
+          lookups[(model, key)].add(value)
+    for (model, key), values in lookups.iteritems():
+      self.object_cache.preload(model, key, values)
+
+  def generate_row_converters(self):
+    """Generate a row converter with handled data for every exported object.
+
+    Objects are loaded in chunks of ids and each chunk gets its own mapping
+    cache, so only the objects of a single chunk are held in memory. Rows
+    are generated in the order of object_ids, which is the order of the
+    export query.
+    """
     if self.ignore or not self.object_ids:
       return
-    self.row_converters = []
-    objects = self.object_class.eager_query().filter(
-        self.object_class.id.in_(self.object_ids)).all()
-    for i, obj in enumerate(objects):
-      row = RowConverter(self, self.object_class, obj=obj,
-                         headers=self.headers, index=i)
-      self.row_converters.append(row)
+    object_ids = list(OrderedDict.fromkeys(self.object_ids))
+    index = 0
+    for start in range(0, len(object_ids), self.EXPORT_CHUNK_SIZE):
+      chunk_ids = object_ids[start:start + self.EXPORT_CHUNK_SIZE]
+      self._mapping_cache = self._create_mapping_cache(chunk_ids)
+      objects = {obj.id: obj for obj in self.object_class.eager_query().filter(
+          self.object_class.id.in_(chunk_ids))}
+      for obj in (objects[id_] for id_ in chunk_ids if id_ in objects):
+        row = RowConverter(self, self.object_class, obj=obj,
+                           headers=self.headers, index=index)
+        row.handle_row_data()
+        index += 1
+        yield row
+    self._mapping_cache = None
 
   def handle_row_data(self, field_list=None):
     """Call handle row data on all row converters.
@@ -376,6 +452,7 @@ class BlockConverter(object):
     return info
 
   def import_secondary_objects(self, slugs_dict):
+    self.preload_objects()
     for row_converter in self.row_converters:
       row_converter.setup_secondary_objects(slugs_dict)
 
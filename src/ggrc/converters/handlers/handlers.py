@@ -80,6 +80,24 @@ class ColumnHandler(object):
                      value=self.value)
       self.row_converter.set_ignore()
 
+  @classmethod
+  def get_lookup_keys(cls, raw_value, **options):
+    """Get objects that the handler looks up for a raw column value.
+
+    Objects referenced by all rows of a block are loaded in bulk before the
+    handlers for the rows are created.
+
+    Returns:
+      list of (model, key, value) tuples.
+    """
+    # pylint: disable=unused-argument
+    return []
+
+  def get_object(self, model, key, value):
+    """Get an object by a unique key from the block object cache."""
+    cache = self.row_converter.block_converter.object_cache
+    return cache.get(model, key, value)
+
   def set_value(self):
     "set value for current culumn after parsing"
     self.value = self.parse_item()
@@ -175,8 +193,9 @@ class DeleteColumnHandler(ColumnHandler):
       else:
         indexer = self.row_converter.block_converter.converter.indexer
         if indexer is not None:
-          for o in tr.session.deleted:
-            indexer.delete_record(o.id, o.__class__.__name__, commit=False)
+          indexer.delete_records(
+              [(o.__class__.__name__, o.id) for o in tr.session.deleted],
+              commit=False)
         tr.commit()
 
 
@@ -219,6 +238,11 @@ class DirectiveKindColumnHandler(ColumnHandler):
 class UserColumnHandler(ColumnHandler):
   """ Handler for primary and secondary contacts """
 
+  @classmethod
+  def get_lookup_keys(cls, raw_value, **options):
+    return [(Person, "email", line.strip().lower())
+            for line in raw_value.splitlines() if line.strip()]
+
   def get_users_list(self):
     users = set()
     email_lines = self.raw_value.splitlines()
@@ -235,7 +259,7 @@ class UserColumnHandler(ColumnHandler):
   def get_person(self, email):
     new_objects = self.row_converter.block_converter.converter.new_objects
     if email not in new_objects[Person]:
-      new_objects[Person][email] = Person.query.filter_by(email=email).first()
+      new_objects[Person][email] = self.get_object(Person, "email", email)
     return new_objects[Person].get(email)
 
   def parse_item(self):
@@ -407,6 +431,14 @@ class MappingColumnHandler(ColumnHandler):
     self.unmap = self.key.startswith(AttributeInfo.UNMAPPING_PREFIX)
     super(MappingColumnHandler, self).__init__(row_converter, key, **options)
 
+  @classmethod
+  def get_lookup_keys(cls, raw_value, **options):
+    mapping_object = get_exportables().get(options.get("attr_name", ""))
+    if mapping_object is None or not hasattr(mapping_object, "slug"):
+      return []
+    return [(mapping_object, "slug", slug.strip().lower())
+            for slug in raw_value.splitlines() if slug.strip()]
+
   def parse_item(self):
     """Parse a list of slugs to be mapped.
 
@@ -433,7 +465,7 @@ class MappingColumnHandler(ColumnHandler):
     slugs = set([slug.lower() for slug in lines if slug.strip()])
     objects = []
     for slug in slugs:
-      obj = class_.query.filter_by(slug=slug).first()
+      obj = self.get_object(class_, "slug", slug)
       if obj:
         if permissions.is_allowed_update_for(obj):
           objects.append(obj)
@@ -545,8 +577,11 @@ class ParentColumnHandler(ColumnHandler):
 
   parent = None
 
-  def __init__(self, row_converter, key, **options):
-    super(ParentColumnHandler, self).__init__(row_converter, key, **options)
+  @classmethod
+  def get_lookup_keys(cls, raw_value, **options):
+    if cls.parent is None or not raw_value.strip():
+      return []
+    return [(cls.parent, "slug", raw_value.strip())]
 
   def parse_item(self):
     """ get parent object """
@@ -557,7 +592,7 @@ class ParentColumnHandler(ColumnHandler):
     slug = self.raw_value
     obj = self.new_objects.get(self.parent, {}).get(slug)
     if obj is None:
-      obj = self.parent.query.filter(self.parent.slug == slug).first()
+      obj = self.get_object(self.parent, "slug", slug)
     if obj is None:
       self.add_error(errors.UNKNOWN_OBJECT,
                      object_type=self.parent._inflector.human_singular.title(),
@@ -596,25 +631,31 @@ class ParentColumnHandler(ColumnHandler):
 
 class ProgramColumnHandler(ParentColumnHandler):
 
-  def __init__(self, row_converter, key, **options):
-    self.parent = Program
-    super(ProgramColumnHandler, self).__init__(row_converter, key, **options)
+  parent = Program
 
 
 class SectionDirectiveColumnHandler(MappingColumnHandler):
 
+  ALLOWED_DIRECTIVES = [Policy, Regulation, Standard, Contract]
+
+  @classmethod
+  def get_lookup_keys(cls, raw_value, **options):
+    if not raw_value.strip():
+      return []
+    return [(directive_class, "slug", raw_value.strip())
+            for directive_class in cls.ALLOWED_DIRECTIVES]
+
   def get_directive_from_slug(self, directive_class, slug):
     if slug in self.new_objects[directive_class]:
       return self.new_objects[directive_class][slug]
-    return directive_class.query.filter_by(slug=slug).first()
+    return self.get_object(directive_class, "slug", slug)
 
   def parse_item(self):
     """ get a directive from slug """
-    allowed_directives = [Policy, Regulation, Standard, Contract]
     if self.raw_value == "":
       return None
     slug = self.raw_value
-    for directive_class in allowed_directives:
+    for directive_class in self.ALLOWED_DIRECTIVES:
       directive = self.get_directive_from_slug(directive_class, slug)
       if directive is not None:
         return [directive]
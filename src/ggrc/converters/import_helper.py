@@ -68,6 +68,28 @@ def generate_csv_string(csv_data):
   return body
 
 
+def generate_csv_chunks(csv_rows, chunk_size=65536):
+  """Generate a csv file in parts from rows of unicode strings.
+
+  Args:
+    csv_rows (iterable of lists): rows of the csv file. All rows are expected
+      to have the same length.
+    chunk_size (int): minimum size of generated parts in bytes.
+  """
+  output_buffer = StringIO()
+  writer = csv.writer(output_buffer)
+  for row in csv_rows:
+    writer.writerow([val.encode("utf-8") for val in row])
+    if output_buffer.tell() >= chunk_size:
+      yield output_buffer.getvalue()
+      output_buffer.seek(0)
+      output_buffer.truncate()
+  body = output_buffer.getvalue()
+  output_buffer.close()
+  if body:
+    yield body
+
+
 def extract_relevant_data(csv_data):
   """ Split csv data into data and metadata """
   striped_data = [[unicode.strip(c) for c in line]
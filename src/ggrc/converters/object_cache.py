@@ -0,0 +1,56 @@
+# Copyright (C) 2017 Google Inc.
+# Licensed under http://www.apache.org/licenses/LICENSE-2.0 <see LICENSE file>
+
+"""Cache for objects referenced in imported csv files."""
+
+from collections import defaultdict
+
+from ggrc.utils import benchmark
+
+
+class ObjectCache(object):
+  """Objects indexed by model and a unique key such as slug or email.
+
+  Objects referenced by all rows of a block are loaded with a single IN query
+  for each model and key, instead of one query per row. Values that were not
+  preloaded are queried one by one. Keys are compared case insensitively, as
+  they are in the database.
+  """
+
+  CHUNK_SIZE = 1000
+
+  def __init__(self):
+    self._objects = defaultdict(dict)
+
+  @staticmethod
+  def _normalize(value):
+    if isinstance(value, basestring):  # noqa
+      return value.strip().lower()
+    return value
+
+  def preload(self, model, key, values):
+    """Load all objects of a model with any of the given key values.
+
+    Values that do not match any object are cached as None.
+    """
+    cache = self._objects[(model, key)]
+    values = {self._normalize(value) for value in values if value}
+    values.difference_update(cache)
+    if not values:
+      return
+    column = getattr(model, key)
+    values = list(values)
+    with benchmark("Preload {} by {}".format(model.__name__, key)):
+      for start in range(0, len(values), self.CHUNK_SIZE):
+        chunk = values[start:start + self.CHUNK_SIZE]
+        cache.update(dict.fromkeys(chunk))
+        for obj in model.query.filter(column.in_(chunk)):
+          cache[self._normalize(getattr(obj, key))] = obj
+
+  def get(self, model, key, value):
+    """Get an object by a unique key value or None if it does not exist."""
+    cache = self._objects[(model, key)]
+    normalized = self._normalize(value)
+    if normalized not in cache:
+      cache[normalized] = model.query.filter_by(**{key: value}).first()
+    return cache[normalized]
@@ -9,6 +9,7 @@ import collections
 import datetime
 import functools
 import operator
+import time
 
 import flask
 import sqlalchemy as sa
@@ -17,6 +18,7 @@ from sqlalchemy.orm import load_only
 from ggrc import db
 from ggrc import models
 from ggrc.snapshotter import rules
+from ggrc.snapshotter.indexer import REVISION_PROPERTY
 from ggrc.login import is_creator
 from ggrc.fulltext.mysql import MysqlRecordProperty as Record
 from ggrc.models import inflector
@@ -25,8 +27,8 @@ from ggrc.models.relationship_helper import RelationshipHelper
 from ggrc.models.custom_attribute_definition import CustomAttributeDefinition
 from ggrc.models.custom_attribute_value import CustomAttributeValue
 from ggrc.converters import get_exportables
-from ggrc.rbac import context_query_filter
 from ggrc.utils import query_helpers, benchmark, convert_date_format
+from ggrc.utils.permission_filter import get_permission_filter
 from ggrc_basic_permissions import UserRole
 
 
@@ -34,6 +36,37 @@ class BadQueryException(Exception):
   pass
 
 
+# Attribute name maps of models, they only depend on the model classes.
+_ATTR_NAME_MAPS = {}
+
+
+def get_attr_name_map(tgt_class):
+  """Get a map of lowercase display names to attribute names of a model.
+
+  Example:
+      {"program url": ("url", None), "code": ("slug", None), ...}
+
+  Returns:
+    dict of display name -> (attribute name, custom filter or None).
+  """
+  if tgt_class not in _ATTR_NAME_MAPS:
+    attr_name_map = {}
+    aliases = AttributeInfo.gather_aliases(tgt_class)
+    for key, value in aliases.items():
+      filter_by = None
+      if isinstance(value, dict):
+        filter_name = value.get("filter_by", None)
+        if filter_name is not None:
+          filter_by = getattr(tgt_class, filter_name, None)
+        name = value["display_name"]
+      else:
+        name = value
+      if name:
+        attr_name_map[name.lower()] = (key.lower(), filter_by)
+    _ATTR_NAME_MAPS[tgt_class] = attr_name_map
+  return _ATTR_NAME_MAPS[tgt_class]
+
+
 # pylint: disable=too-few-public-methods
 
 class QueryHelper(object):
@@ -92,12 +125,17 @@ class QueryHelper(object):
 
   """
 
-  def __init__(self, query, ca_disabled=False):
+  def __init__(self, query, ca_disabled=False, explain=False):
     self.object_map = {o.__name__: o for o in models.all_models.all_models}
     self.query = self._clean_query(query)
     self.ca_disabled = ca_disabled
+    self.explain = explain
     self._set_attr_name_map()
     self._count = 0
+    # ids fetched with batched queries, by id() of the object query
+    self._batched_ids = {}
+    # title -> set of "is date" flags of CADs, by definition type
+    self._cad_types = {}
 
   def _set_attr_name_map(self):
     """ build a map for attributes names and display names
@@ -115,20 +153,7 @@ class QueryHelper(object):
       if object_name == "Snapshot":
         child_type = self._get_snapshot_child_type(object_query)
         tgt_class = getattr(models.all_models, child_type, object_class)
-      aliases = AttributeInfo.gather_aliases(tgt_class)
-      self.attr_name_map[tgt_class] = {}
-      for key, value in aliases.items():
-        filter_by = None
-        if isinstance(value, dict):
-          filter_name = value.get("filter_by", None)
-          if filter_name is not None:
-            filter_by = getattr(tgt_class, filter_name, None)
-          name = value["display_name"]
-        else:
-          name = value
-        if name:
-          self.attr_name_map[tgt_class][name.lower()] = (key.lower(),
-                                                         filter_by)
+      self.attr_name_map[tgt_class] = get_attr_name_map(tgt_class)
 
   def _get_snapshot_child_type(self, object_query):
     """Return child_type for snapshot from a query"""
@@ -249,11 +274,93 @@ class QueryHelper(object):
     Returns:
       list of dicts: same query as the input with all ids that match the filter
     """
+    self._batch_ids()
     for object_query in self.query:
       ids = self._get_ids(object_query)
       object_query["ids"] = ids
     return self.query
 
+  @classmethod
+  def _is_independent(cls, expression):
+    """Check if an expression does not depend on other object queries.
+
+    Expressions with "__previous__" need the results of a previous query and
+    "similar" filters pass their weights to the ordering through flask.g.
+    """
+    if not isinstance(expression, dict):
+      return True
+    if expression.get("object_name") == "__previous__" or \
+       expression.get("op", {}).get("name") == "similar":
+      return False
+    return (cls._is_independent(expression.get("left")) and
+            cls._is_independent(expression.get("right")))
+
+  def _is_batchable(self, object_query):
+    """Check if ids of an object query can be fetched with other queries."""
+    expression = object_query.get("filters", {}).get("expression")
+    return (expression is not None and
+            not object_query.get("limit") and
+            not object_query.get("order_by") and
+            self._is_independent(expression))
+
+  def _batch_ids(self):
+    """Fetch ids of all batchable object queries with a single statement.
+
+    Ids of object queries without limit and ordering that do not depend on
+    other object queries are selected with one UNION ALL statement, with the
+    index of the object query in the batch as the first column. The ids are
+    picked up by _get_ids.
+    """
+    batch = [object_query for object_query in self.query
+             if self._is_batchable(object_query)]
+    if len(batch) < 2:
+      return
+    statements = []
+    build_times = []
+    for index, object_query in enumerate(batch):
+      start = time.time()
+      query = self._build_ids_query(object_query)
+      build_times.append(time.time() - start)
+      object_class = self.object_map[object_query["object_name"]]
+      statements.append(query.with_entities(
+          sa.literal(index).label("query_index"),
+          object_class.id,
+      ).statement)
+    statement = sa.union_all(*statements)
+    results = [[] for _ in batch]
+    start = time.time()
+    with benchmark("Get batched ids: _batch_ids"):
+      for index, id_ in db.session.execute(statement):
+        results[index].append(id_)
+    execution_time = time.time() - start
+    for object_query, ids, build_time in zip(batch, results, build_times):
+      self._batched_ids[id(object_query)] = ids
+      self._explain(object_query, statement, build_time, execution_time,
+                    batch_size=len(batch))
+
+  def _explain(self, object_query, statement, build_time, execution_time,
+               batch_size=1):
+    """Add the generated SQL and timings to an object query in explain mode.
+
+    Args:
+      object_query: the object query to explain.
+      statement: the executed statement; statements of batched object queries
+                 are shared by the whole batch.
+      build_time: seconds spent building the filter expression.
+      execution_time: seconds spent executing the statement.
+      batch_size: the number of object queries in the executed statement.
+    """
+    if not self.explain:
+      return
+    compiled = statement.compile(dialect=db.engine.dialect)
+    object_query["explain"] = {
+        "sql": unicode(compiled),
+        "params": compiled.params,
+        "build_time": build_time,
+        "execution_time": execution_time,
+        "batch_size": batch_size,
+    }
+
   @staticmethod
   def _get_type_query(model, permission_type):
     """Filter by contexts and resources
@@ -261,20 +368,13 @@ class QueryHelper(object):
     Prepare query to filter models based on the available contexts and
     resources for the given type of object.
     """
-    contexts, resources = query_helpers.get_context_resource(
-        model_name=model.__name__, permission_type=permission_type
+    return get_permission_filter(
+        model.__name__,
+        model.id,
+        model.context_id,
+        permission_type=permission_type,
     )
 
-    if contexts is not None:
-      if resources:
-        resource_sql = model.id.in_(resources)
-      else:
-        resource_sql = sa.sql.false()
-
-      return sa.or_(
-          context_query_filter(model.context_id, contexts),
-          resource_sql)
-
   def _get_objects(self, object_query):
     """Get a set of objects described in the filters."""
 
@@ -296,14 +396,21 @@ class QueryHelper(object):
 
     return objects
 
-  def _get_ids(self, object_query):
-    """Get a set of ids of objects described in the filters."""
+  def _build_ids_query(self, object_query, ordered=True):
+    """Build a query for ids of objects described in the filters.
+
+    Args:
+      object_query: the object query to build.
+      ordered: False to skip "order_by" of the object query.
 
+    Returns:
+      Query selecting object ids or None if the object query has no filters.
+    """
     object_name = object_query["object_name"]
     expression = object_query.get("filters", {}).get("expression")
 
     if expression is None:
-      return set()
+      return None
     object_class = self.object_map[object_name]
     query = db.session.query(object_class.id)
 
@@ -325,40 +432,78 @@ class QueryHelper(object):
       )
       if filter_expression is not None:
         query = query.filter(filter_expression)
-    if object_query.get("order_by"):
+    if ordered and object_query.get("order_by"):
       with benchmark("Sorting: _get_ids > order_by"):
         query = self._apply_order_by(
             object_class,
             query,
             object_query["order_by"],
         )
+    return query
+
+  def _get_ids(self, object_query):
+    """Get a set of ids of objects described in the filters."""
+
+    ids = self._batched_ids.pop(id(object_query), None)
+    if ids is not None:
+      object_query["total"] = len(ids)
+      return ids
+
+    start = time.time()
+    query = self._build_ids_query(object_query)
+    if query is None:
+      return set()
+    build_time = time.time() - start
+
+    start = time.time()
     with benchmark("Apply limit"):
       limit = object_query.get("limit")
       if limit:
         ids, total = self._apply_limit(query, limit)
       else:
-        ids = [obj.id for obj in query]
+        ids = self._select_ids(query)
         total = len(ids)
       object_query["total"] = total
+    self._explain(object_query, query.statement, build_time,
+                  time.time() - start)
+    self._clear_similar_objects_query()
+    return ids
 
+  def _count_query(self, object_query):
+    """Build a COUNT query for objects described in the filters.
+
+    Returns:
+      Query selecting the number of objects without any ordering or None if
+      the object query has no filters.
+    """
+    query = self._build_ids_query(object_query, ordered=False)
+    if query is None:
+      return None
+    object_class = self.object_map[object_query["object_name"]]
+    return query.with_entities(sa.func.count(object_class.id))
+
+  @staticmethod
+  def _clear_similar_objects_query():
     if hasattr(flask.g, "similar_objects_query"):
       # delete similar_objects_query for the case when several queries are
       # POSTed in one request, the first one filters by similarity and the
       # second one doesn't but tries to sort by __similarity__
       delattr(flask.g, "similar_objects_query")
-    return ids
 
   @staticmethod
-  def _apply_limit(query, limit):
-    """Apply limits for pagination.
+  def _select_ids(query):
+    """Get ids selected by a query without creating ORM result rows."""
+    return [id_ for id_, in db.session.execute(query.statement)]
+
+  @staticmethod
+  def _parse_limit(limit):
+    """Validate limits for pagination.
 
     Args:
-      query: filter query;
-      limit: a tuple of indexes in format (from, to); objects is sliced to
-            objects[from, to].
+      limit: a tuple of indexes in format (from, to).
 
     Returns:
-      matched objects ids and total count.
+      (from, to) tuple of integers.
     """
     try:
       first, last = limit
@@ -370,20 +515,35 @@ class QueryHelper(object):
       raise BadQueryException("Limit cannot contain negative numbers.")
     elif first >= last:
       raise BadQueryException("Limit start should be smaller than end.")
-    else:
-      page_size = last - first
-      with benchmark("Apply limit: _apply_limit > query_limit"):
-        # Note: limit request syntax is limit:[0,10]. We are counting
-        # offset from 0 as the offset of the initial row for sql is 0 (not 1).
-        ids = [obj.id for obj in query.limit(page_size).offset(first)]
-      with benchmark("Apply limit: _apply_limit > query_count"):
-        if len(ids) < page_size:
-          total = len(ids) + first
-        else:
-          # Note: using func.count() as query.count() is generating additional
-          # subquery
-          count_q = query.statement.with_only_columns([sa.func.count()])
-          total = db.session.execute(count_q).scalar()
+    return first, last
+
+  @classmethod
+  def _apply_limit(cls, query, limit):
+    """Apply limits for pagination.
+
+    Args:
+      query: filter query;
+      limit: a tuple of indexes in format (from, to); objects is sliced to
+            objects[from, to].
+
+    Returns:
+      matched objects ids and total count.
+    """
+    first, last = cls._parse_limit(limit)
+    page_size = last - first
+    with benchmark("Apply limit: _apply_limit > query_limit"):
+      # Note: limit request syntax is limit:[0,10]. We are counting
+      # offset from 0 as the offset of the initial row for sql is 0 (not 1).
+      ids = cls._select_ids(query.limit(page_size).offset(first))
+    with benchmark("Apply limit: _apply_limit > query_count"):
+      if len(ids) < page_size:
+        total = len(ids) + first
+      else:
+        # Note: using func.count() as query.count() is generating additional
+        # subquery
+        count_q = query.order_by(None).statement.with_only_columns(
+            [sa.func.count()])
+        total = db.session.execute(count_q).scalar()
 
     return ids, total
 
@@ -570,19 +730,9 @@ class QueryHelper(object):
         Returns:
           (bool, bool) - flags indicating the presence of date and non-date CA.
         """
-        cad_query = db.session.query(CustomAttributeDefinition).filter(
-          CustomAttributeDefinition.title == title,
-          CustomAttributeDefinition.definition_type == definition_type,
-        )
-        date_cad = bool(cad_query.filter(
-          CustomAttributeDefinition.
-              attribute_type == CustomAttributeDefinition.ValidTypes.DATE,
-        ).count())
-        non_date_cad = bool(cad_query.filter(
-          CustomAttributeDefinition.
-              attribute_type != CustomAttributeDefinition.ValidTypes.DATE,
-        ).count())
-        return date_cad, non_date_cad
+        is_date_flags = self._get_cad_types(definition_type).get(
+            title.lower(), ())
+        return True in is_date_flags, False in is_date_flags
 
       if not isinstance(o_key, basestring):
         return [value]
@@ -814,7 +964,8 @@ class QueryHelper(object):
     def text_search(text):
       """Filter by fulltext search.
 
-      The search is done only in fields indexed for fulltext search.
+      The search is done only in fields indexed for fulltext search, the
+      revision markers of snapshot records are not searched.
 
       Args:
         text: the text we are searching for.
@@ -826,6 +977,7 @@ class QueryHelper(object):
       return object_class.id.in_(
           db.session.query(Record.key).filter(
               Record.type == object_class.__name__,
+              Record.property != REVISION_PROPERTY,
               Record.content.ilike(u"%{}%".format(text)),
           ),
       )
@@ -979,6 +1131,24 @@ class QueryHelper(object):
 
     return ops.get(exp["op"]["name"], unknown)()
 
+  def _get_cad_types(self, definition_type):
+    """Get date flags of CADs by lowercase title, loaded once per helper.
+
+    Returns:
+      dict of title -> set of booleans, True for date CADs and False for CADs
+      of other types with that title.
+    """
+    if definition_type not in self._cad_types:
+      cad = CustomAttributeDefinition
+      cad_types = collections.defaultdict(set)
+      query = db.session.query(cad.title, cad.attribute_type).filter(
+          cad.definition_type == definition_type)
+      for title, attribute_type in query:
+        cad_types[title.lower()].add(
+            attribute_type == cad.ValidTypes.DATE)
+      self._cad_types[definition_type] = cad_types
+    return self._cad_types[definition_type]
+
   def _slugs_to_ids(self, object_name, slugs):
     """Convert SLUG to proper ids for the given objec."""
     object_class = self.object_map.get(object_name)
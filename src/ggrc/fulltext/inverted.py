@@ -0,0 +1,215 @@
+# Copyright (C) 2017 Google Inc.
+# Licensed under http://www.apache.org/licenses/LICENSE-2.0 <see LICENSE file>
+
+"""Full text indexer with an inverted token index.
+
+Besides the records in ``fulltext_record_properties`` this indexer stores the
+normalized tokens of all searchable properties in the ``fulltext_record_terms``
+posting table. Search terms are matched as token prefixes through the index
+on the posting table instead of a ``LIKE '%term%'`` scan of the record
+contents, and the postings of all words in a query are intersected.
+
+To use this indexer set ``FULLTEXT_INDEXER`` to
+``ggrc.fulltext.inverted.InvertedIndexer`` and run a full reindex to build
+the postings.
+"""
+
+import re
+
+from sqlalchemy import and_
+from sqlalchemy.sql.expression import select
+from sqlalchemy.sql.expression import tuple_
+
+from ggrc import db
+from ggrc.fulltext.mysql import MysqlIndexer
+from ggrc.fulltext.mysql import MysqlRecordProperty
+
+
+TERM_LENGTH = 64
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+# Escape character for LIKE patterns. Backslash is avoided because it needs to
+# be escaped differently in MySQL string literals.
+LIKE_ESCAPE = "!"
+
+
+class MysqlRecordTerm(db.Model):
+  """Posting of a single token of an indexed property."""
+  # pylint: disable=too-few-public-methods
+  __tablename__ = 'fulltext_record_terms'
+
+  term = db.Column(db.String(TERM_LENGTH), primary_key=True)
+  type = db.Column(db.String(64), primary_key=True)
+  key = db.Column(db.Integer, primary_key=True)
+  property = db.Column(db.String(64), primary_key=True)
+
+  __table_args__ = (
+      db.Index('ix_fulltext_record_terms_type_key', 'type', 'key'),
+  )
+
+
+MysqlRecordTermShadow = db.Table(
+    'fulltext_record_terms_shadow',
+    db.metadata,
+    *[column.copy() for column in MysqlRecordTerm.__table__.columns]
+)
+
+
+def tokenize(content):
+  """Get a set of normalized tokens from a property value."""
+  if content is None:
+    return set()
+  if isinstance(content, str):
+    content = content.decode("utf-8", "ignore")
+  elif not isinstance(content, unicode):  # noqa
+    content = unicode(content)  # noqa
+  return {token[:TERM_LENGTH] for token in TOKEN_RE.findall(content.lower())}
+
+
+def _escape_like(value):
+  """Escape LIKE wildcards in a value."""
+  for char in (LIKE_ESCAPE, "%", "_"):
+    value = value.replace(char, LIKE_ESCAPE + char)
+  return value
+
+
+class InvertedIndexer(MysqlIndexer):
+  """Mysql indexer that matches search terms with a token posting table."""
+
+  terms_type = MysqlRecordTerm
+  shadow_terms_table = MysqlRecordTermShadow
+
+  def __init__(self, settings, table=None, terms_table=None):
+    super(InvertedIndexer, self).__init__(settings, table=table)
+    self._terms_table = terms_table
+
+  @property
+  def terms_table(self):
+    """Table that holds the postings of this indexer."""
+    if self._terms_table is not None:
+      return self._terms_table
+    return self.terms_type.__table__
+
+  def get_shadow_indexer(self):
+    return self.__class__(None, table=self.shadow_table,
+                          terms_table=self.shadow_terms_table)
+
+  def _get_shadow_tables(self):
+    return super(InvertedIndexer, self)._get_shadow_tables() + [
+        (self.terms_type.__tablename__, self.shadow_terms_table.name),
+    ]
+
+  def get_postings(self, record):
+    """Get a set of (term, type, key, property) postings for a record."""
+    return {
+        (term, record.type, record.key, prop)
+        for prop, value in record.properties.items()
+        if prop in self.SEARCHABLE_PROPERTIES
+        for content in value.values()
+        for term in tokenize(content)
+    }
+
+  def create_records(self, records, commit=True):
+    records = list(records)
+    super(InvertedIndexer, self).create_records(records, commit=False)
+    postings = set()
+    for record in records:
+      postings.update(self.get_postings(record))
+    table = self.terms_table
+    # Terms that differ only in case or accents, e.g. "resume" and "résumé",
+    # are the same key under the case insensitive collation of the table.
+    self._execute_chunked(
+        lambda chunk: table.insert().prefix_with("IGNORE").values([
+            {"term": term, "type": type_, "key": key, "property": prop}
+            for term, type_, key, prop in chunk
+        ]),
+        postings,
+    )
+    if commit:
+      db.session.commit()
+
+  def update_records(self, records, commit=True):
+    records = list(records)
+    obsolete = {(record.type, record.key, prop)
+                for record in records
+                for prop in record.properties
+                if prop in self.SEARCHABLE_PROPERTIES}
+    table = self.terms_table
+    self._execute_chunked(
+        lambda chunk: table.delete().where(
+            tuple_(table.c.type, table.c.key, table.c.property).in_(chunk)
+        ),
+        obsolete,
+    )
+    super(InvertedIndexer, self).update_records(records, commit=commit)
+
+  def delete_records(self, keys, commit=True):
+    keys = set(keys)
+    table = self.terms_table
+    self._execute_chunked(
+        lambda chunk: table.delete().where(
+            tuple_(table.c.type, table.c.key).in_(chunk)
+        ),
+        keys,
+    )
+    super(InvertedIndexer, self).delete_records(keys, commit=commit)
+
+  def delete_missing_records(self, type, existing_ids, commit=True):
+    # pylint: disable=redefined-builtin
+    table = self.terms_table
+    db.session.execute(table.delete().where(and_(
+        table.c.type == type,
+        ~table.c.key.in_(existing_ids),
+    )))
+    super(InvertedIndexer, self).delete_missing_records(
+        type, existing_ids, commit=commit)
+
+  def delete_all_records(self, commit=True):
+    db.session.execute(self.terms_table.delete())
+    super(InvertedIndexer, self).delete_all_records(commit=commit)
+
+  def delete_records_by_type(self, type, commit=True):
+    # pylint: disable=redefined-builtin
+    table = self.terms_table
+    db.session.execute(table.delete().where(table.c.type == type))
+    super(InvertedIndexer, self).delete_records_by_type(type, commit=commit)
+
+  def get_candidates_query(self, words):
+    """Get a select of (type, key) of objects matching all words.
+
+    Every word is matched as a prefix of a token of any searchable property
+    and the postings of all words are intersected.
+    """
+    terms = [self.terms_table.alias("terms_{}".format(i))
+             for i in range(len(words))]
+    first = terms[0]
+    joined = first
+    for term in terms[1:]:
+      joined = joined.join(term, and_(term.c.type == first.c.type,
+                                      term.c.key == first.c.key))
+    return select([first.c.type, first.c.key]).select_from(joined).where(
+        and_(*[
+            term.c.term.like(_escape_like(word) + "%", escape=LIKE_ESCAPE)
+            for term, word in zip(terms, words)
+        ])
+    ).distinct()
+
+  def _get_filter_query(self, terms):
+    """Get filter on full text records that match the search terms.
+
+    Candidate objects are selected from the posting table first, so the
+    permission filter of the search only runs on matching records.
+    """
+    words = sorted(tokenize(terms), key=len, reverse=True)
+    if not words:
+      return super(InvertedIndexer, self)._get_filter_query(terms)
+    whitelist = MysqlRecordProperty.property.in_(self.SEARCHABLE_PROPERTIES)
+    return and_(
+        whitelist,
+        tuple_(MysqlRecordProperty.type, MysqlRecordProperty.key).in_(
+            self.get_candidates_query(words)),
+    )
+
+
+Indexer = InvertedIndexer
@@ -0,0 +1,203 @@
+# Copyright (C) 2017 Google Inc.
+# Licensed under http://www.apache.org/licenses/LICENSE-2.0 <see LICENSE file>
+
+"""Change journal for incremental full text indexing.
+
+Requests that modify indexed objects only append the (type, key) of the
+affected full text records to the ``fulltext_index_journal`` table in the same
+transaction as the change. The journal is drained by a worker that reindexes
+the objects in batches. Repeated changes of the same object within a batch
+are coalesced into a single reindex.
+"""
+
+from logging import getLogger
+
+from sqlalchemy import func
+from sqlalchemy import orm
+
+from ggrc import db
+from ggrc.fulltext import get_indexer
+from ggrc.fulltext.recordbuilder import fts_record_for
+from ggrc.fulltext.recordbuilder import model_is_indexed
+from ggrc.models import all_models
+from ggrc.models.mixins.customattributable import CustomAttributable
+from ggrc.snapshotter import indexer as snapshot_indexer
+from ggrc.snapshotter.datastructures import Pair
+from ggrc.utils import benchmark
+
+
+# pylint: disable=invalid-name
+logger = getLogger(__name__)
+
+# Number of journal entries processed in a single transaction.
+BATCH_SIZE = 500
+
+
+class IndexJournalEntry(db.Model):
+  """A full text record that has to be reindexed."""
+  # pylint: disable=too-few-public-methods
+  __tablename__ = 'fulltext_index_journal'
+
+  id = db.Column(db.Integer, primary_key=True)
+  type = db.Column(db.String(64), nullable=False)
+  key = db.Column(db.Integer, nullable=False)
+  created_at = db.Column(db.DateTime, nullable=False,
+                         default=db.text('current_timestamp'))
+
+
+def get_record_key(obj):
+  """Get (type, key) of the full text record that holds data of `obj`.
+
+  Custom attribute values are indexed as properties of their attributable
+  object. None is returned for objects that are not indexed.
+  """
+  if isinstance(obj, all_models.CustomAttributeValue):
+    return obj.attributable_type, obj.attributable_id
+  if model_is_indexed(obj.__class__) or isinstance(obj, all_models.Snapshot):
+    return obj.__class__.__name__, obj.id
+  return None
+
+
+def append(objects):
+  """Add full text records of modified objects to the journal.
+
+  The entries are not committed, so they are stored in the same transaction
+  as the changes of the objects.
+
+  Args:
+    objects: An iterable of new, modified or deleted model instances.
+  """
+  keys = {get_record_key(obj) for obj in objects}
+  keys.discard(None)
+  append_keys(keys)
+
+
+def append_keys(keys):
+  """Add (type, key) pairs of full text records to the journal.
+
+  Used for objects that are not loaded into the session, such as objects
+  created with bulk inserts.
+
+  Args:
+    keys: A set of (type, key) tuples.
+  """
+  if keys:
+    db.session.execute(IndexJournalEntry.__table__.insert(), [
+        {"type": type_, "key": key} for type_, key in keys
+    ])
+
+
+def _get_model_records(model, ids):
+  """Get full text records of existing objects of a single model."""
+  if model is all_models.Snapshot:
+    columns = db.session.query(
+        model.parent_type,
+        model.parent_id,
+        model.child_type,
+        model.child_id,
+    ).filter(model.id.in_(ids))
+    _, records = snapshot_indexer.get_records(
+        {Pair.from_4tuple(row) for row in columns})
+    return records
+
+  # pylint: disable=protected-access
+  mapper_class = model._sa_class_manager.mapper.base_mapper.class_
+  query = model.query.filter(model.id.in_(ids)).options(
+      orm.undefer_group(mapper_class.__name__ + '_complete'),
+  )
+  if issubclass(model, CustomAttributable):
+    query = query.options(
+        orm.subqueryload('_custom_attribute_values')
+           .joinedload('custom_attribute')
+    )
+  records = []
+  for obj in query:
+    records.append(fts_record_for(obj))
+    if isinstance(obj, CustomAttributable):
+      records.extend(fts_record_for(cav)
+                     for cav in obj.custom_attribute_values)
+  return records
+
+
+def reindex_keys(keys):
+  """Rebuild full text records for the given (type, key) pairs.
+
+  Records of objects that no longer exist are removed.
+
+  Args:
+    keys: A set of (type, key) tuples.
+  """
+  ids_by_type = {}
+  for type_, key in keys:
+    ids_by_type.setdefault(type_, set()).add(key)
+
+  records = []
+  for type_, ids in ids_by_type.items():
+    model = getattr(all_models, type_, None)
+    if model is not None:
+      records.extend(_get_model_records(model, ids))
+
+  indexer = get_indexer()
+  indexer.delete_records(keys, commit=False)
+  indexer.create_records(records, commit=False)
+
+
+def drain_batch(batch_size=BATCH_SIZE):
+  """Reindex objects for a single batch of journal entries.
+
+  Returns:
+    Number of processed journal entries.
+  """
+  entries = db.session.query(
+      IndexJournalEntry.id,
+      IndexJournalEntry.type,
+      IndexJournalEntry.key,
+  ).order_by(IndexJournalEntry.id).limit(batch_size).with_for_update().all()
+  if not entries:
+    return 0
+  with benchmark("Fulltext journal: reindex batch"):
+    reindex_keys({(type_, key) for _, type_, key in entries})
+    db.session.execute(IndexJournalEntry.__table__.delete().where(
+        IndexJournalEntry.id.in_([id_ for id_, _, _ in entries])
+    ))
+    db.session.commit()
+  return len(entries)
+
+
+def drain(batch_size=BATCH_SIZE, max_batches=None):
+  """Process journal entries until the journal is empty.
+
+  Args:
+    batch_size: Number of entries processed in a single transaction.
+    max_batches: Optional limit of processed batches.
+  Returns:
+    Number of processed journal entries.
+  """
+  processed = 0
+  batches = 0
+  while max_batches is None or batches < max_batches:
+    count = drain_batch(batch_size)
+    if not count:
+      break
+    processed += count
+    batches += 1
+  logger.info("Processed %s full text journal entries, lag %s seconds.",
+              processed, get_freshness_lag())
+  return processed
+
+
+def get_freshness_lag():
+  """Get the age of the oldest unprocessed journal entry in seconds."""
+  oldest, now = db.session.query(
+      func.min(IndexJournalEntry.created_at), func.now()).one()
+  if oldest is None:
+    return 0
+  return max(int((now - oldest).total_seconds()), 0)
+
+
+def get_status():
+  """Get the number of pending journal entries and freshness lag."""
+  return {
+      "pending": IndexJournalEntry.query.count(),
+      "lag": get_freshness_lag(),
+  }
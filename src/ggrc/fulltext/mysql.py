@@ -8,7 +8,6 @@ from sqlalchemy import func
 from sqlalchemy import literal
 from sqlalchemy import or_
 from sqlalchemy import union
-from sqlalchemy.sql import false
 from sqlalchemy.ext.declarative import declared_attr
 from sqlalchemy.orm import aliased
 from sqlalchemy.sql.expression import select
@@ -16,7 +15,7 @@ from ggrc import db
 from ggrc.login import is_creator
 from ggrc.models import all_models
 from ggrc.utils import query_helpers
-from ggrc.rbac import context_query_filter
+from ggrc.utils.permission_filter import get_permission_filter
 from ggrc.fulltext.sql import SqlIndexer
 
 
@@ -41,13 +40,61 @@ class MysqlRecordProperty(db.Model):
     )
 
 
+# Table with the same structure as fulltext_record_properties. A full reindex
+# is built into this table and swapped with the live one when it is complete.
+MysqlRecordPropertyShadow = db.Table(
+    'fulltext_record_properties_shadow',
+    db.metadata,
+    *[column.copy() for column in MysqlRecordProperty.__table__.columns]
+)
+
+
 class MysqlIndexer(SqlIndexer):
   record_type = MysqlRecordProperty
+  shadow_table = MysqlRecordPropertyShadow
+
+  # Properties that are matched by search terms.
+  SEARCHABLE_PROPERTIES = ['title', 'name', 'email', 'notes', 'description',
+                           'slug']
+
+  def get_shadow_indexer(self):
+    """Get an indexer that writes into the shadow records table."""
+    return self.__class__(None, table=self.shadow_table)
+
+  def _get_shadow_tables(self):
+    """Get a list of (live table name, shadow table name) pairs."""
+    return [(self.record_type.__tablename__, self.shadow_table.name)]
+
+  def clear_shadow(self):
+    """Remove all entries from the shadow tables.
+
+    TRUNCATE implicitly commits the current transaction in MySQL.
+    """
+    db.session.commit()
+    for _, shadow_name in self._get_shadow_tables():
+      db.session.execute("TRUNCATE TABLE {}".format(shadow_name))
+    db.session.commit()
+
+  def swap_shadow(self):
+    """Atomically replace the live tables with the shadow tables.
+
+    The previous live tables become the new shadow tables.
+    """
+    renames = []
+    for live_name, shadow_name in self._get_shadow_tables():
+      tmp_name = live_name + "_tmp"
+      renames.extend([
+          "{} TO {}".format(live_name, tmp_name),
+          "{} TO {}".format(shadow_name, live_name),
+          "{} TO {}".format(tmp_name, shadow_name),
+      ])
+    db.session.commit()
+    db.session.execute("RENAME TABLE {}".format(", ".join(renames)))
+    db.session.commit()
 
   def _get_filter_query(self, terms):
     """Get the whitelist of fields to filter in full text table."""
-    whitelist = MysqlRecordProperty.property.in_(
-        ['title', 'name', 'email', 'notes', 'description', 'slug'])
+    whitelist = MysqlRecordProperty.property.in_(self.SEARCHABLE_PROPERTIES)
 
     if not terms:
       return whitelist
@@ -61,26 +108,16 @@ class MysqlIndexer(SqlIndexer):
     """
     type_queries = []
     for model_name in model_names:
-      contexts, resources = query_helpers.get_context_resource(
-          model_name=model_name,
+      type_query = get_permission_filter(
+          model_name,
+          MysqlRecordProperty.key,
+          MysqlRecordProperty.context_id,
           permission_type=permission_type,
-          permission_model=permission_model
+          permission_model=permission_model,
       )
-      if contexts is not None:
-        if resources:
-          resource_sql = and_(
-              MysqlRecordProperty.type == model_name,
-              MysqlRecordProperty.key.in_(resources))
-        else:
-          resource_sql = false()
-
-        type_query = or_(
-            and_(
-                MysqlRecordProperty.type == model_name,
-                context_query_filter(MysqlRecordProperty.context_id, contexts)
-            ),
-            resource_sql)
-        type_queries.append(type_query)
+      if type_query is not None:
+        type_queries.append(and_(
+            MysqlRecordProperty.type == model_name, type_query))
 
     return and_(
         MysqlRecordProperty.type.in_(model_names),
@@ -176,6 +213,60 @@ class MysqlIndexer(SqlIndexer):
     return db.session.execute(
         select([all_queries.c.key, all_queries.c.type]).distinct())
 
+  def search_with_counts(self, terms, types=None, permission_type='read',
+                         permission_model=None, contact_id=None,
+                         extra_params={}, extra_columns={}):
+    """Get search results and counted objects from one candidate set.
+
+    All matching objects are selected with a single query, so search results
+    and counts for every type can be built without scanning the full text
+    table twice.
+
+    Returns:
+      Result set of (extra_column, type, key) rows ordered like search
+      results. Extra column is an empty string for search results and the
+      name of the extra column for objects that are only counted in it.
+    """
+    # pylint: disable=too-many-arguments,dangerous-default-value
+    def candidates_query(model_names, alias, owner_types):
+      query = db.session.query(
+          literal(alias).label('extra_column'),
+          self.record_type.type.label('type'),
+          self.record_type.key.label('key'),
+          self.record_type.content.label('content'),
+          case(
+              [(self.record_type.property == 'title', literal(0))],
+              else_=literal(1)).label('sort_key'),
+      )
+      query = query.filter(self.get_permissions_query(
+          model_names, permission_type, permission_model))
+      query = query.filter(self._get_filter_query(terms))
+      return self.search_get_owner_query(query, owner_types, contact_id)
+
+    model_names = self._get_grouped_types(types, extra_params)
+    unions = [candidates_query(model_names, "", types)]
+
+    all_model_names = self._get_grouped_types(types)
+    for k, v in extra_params.iteritems():
+      if k not in all_model_names:
+        continue
+      unions.append(self._add_extra_params_query(
+          candidates_query([k], "", [k]), k, v))
+    for k, v in extra_columns.iteritems():
+      unions.append(self._add_extra_params_query(
+          candidates_query([v], k, [v]), v, extra_params.get(k)))
+
+    all_queries = union(*unions).alias()
+    columns = all_queries.c
+    query = select([columns.extra_column, columns.type, columns.key]).group_by(
+        columns.extra_column, columns.type, columns.key
+    ).order_by(
+        func.min(columns.sort_key),
+        func.min(case([(columns.sort_key == 0, columns.content)])),
+        func.min(columns.content),
+    )
+    return db.session.execute(query)
+
   def counts(self, terms, types=None, contact_id=None,
              extra_params={}, extra_columns={}):
     """Prepare the search query, but return only count for each of
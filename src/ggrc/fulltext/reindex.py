@@ -0,0 +1,302 @@
+# Copyright (C) 2017 Google Inc.
+# Licensed under http://www.apache.org/licenses/LICENSE-2.0 <see LICENSE file>
+
+"""Parallel and resumable full text reindex.
+
+The reindex is split into shards, each covering an id range of one indexed
+model. Shards are stored in the ``fulltext_reindex_shards`` table and every
+shard is indexed into the shadow records table in a single transaction
+together with its checkpoint, so a failed run can be resumed by processing
+only the shards that are still pending.
+
+When all shards are done, the shadow table is swapped with the live records
+table and the objects changed during the rebuild are reindexed in the live
+table. Search keeps using the old records until the swap. A marker record
+is added to the shadow table before the swap, so a resumed run can tell
+whether the swap already happened.
+"""
+
+import multiprocessing
+from logging import getLogger
+
+from ggrc import db
+from ggrc import settings
+from ggrc.fulltext import get_indexer
+from ggrc.fulltext.recordbuilder import fts_record_for
+from ggrc.fulltext.recordbuilder import model_is_indexed
+from ggrc.models import all_models
+from ggrc.snapshotter import indexer as snapshot_indexer
+from ggrc.snapshotter.datastructures import Pair
+from ggrc.utils import benchmark
+from ggrc.utils import generate_query_chunks
+
+
+# pylint: disable=invalid-name
+logger = getLogger(__name__)
+
+# Number of object ids covered by a single shard.
+SHARD_SIZE = 5000
+
+# Type of the record that marks the rebuilt records table.
+SWAP_MARKER_TYPE = "ReindexShard"
+
+
+class ReindexShard(db.Model):
+  """Checkpoint of a single id range of the full text reindex."""
+  # pylint: disable=too-few-public-methods
+  __tablename__ = 'fulltext_reindex_shards'
+
+  PENDING = "Pending"
+  DONE = "Done"
+
+  id = db.Column(db.Integer, primary_key=True)
+  model_name = db.Column(db.String(64), nullable=False)
+  min_id = db.Column(db.Integer, nullable=False)
+  max_id = db.Column(db.Integer, nullable=False)
+  status = db.Column(db.String(16), nullable=False, default=PENDING)
+  records = db.Column(db.Integer, nullable=False, default=0)
+  created_at = db.Column(db.DateTime, nullable=False,
+                         default=db.text('current_timestamp'))
+  updated_at = db.Column(db.DateTime, nullable=False,
+                         default=db.text('current_timestamp'),
+                         onupdate=db.text('current_timestamp'))
+
+
+def get_indexed_models():
+  """Get models whose records are created by the full text reindex."""
+  # Remove model base classes and non searchable objects
+  excluded_models = {
+      all_models.Directive,
+      all_models.Option,
+      all_models.SystemOrProcess,
+      all_models.Role,
+  }
+  indexed_models = {model for model in all_models.all_models
+                    if model_is_indexed(model)}
+  return indexed_models - excluded_models
+
+
+def _get_shard_models():
+  """Get a dict of model name -> model for all sharded models."""
+  models = {model.__name__: model for model in get_indexed_models()}
+  models[all_models.Snapshot.__name__] = all_models.Snapshot
+  return models
+
+
+def _get_model_query(model):
+  """Get query for indexed instances of a model with all fields loaded."""
+  # pylint: disable=protected-access
+  mapper_class = model._sa_class_manager.mapper.base_mapper.class_
+  return model.query.options(
+      db.undefer_group(mapper_class.__name__ + '_complete'),
+  )
+
+
+def create_shards():
+  """Split all indexed models into id range shards.
+
+  Returns:
+    Number of created shards.
+  """
+  shards = []
+  for name, model in _get_shard_models().items():
+    min_id, max_id = db.session.query(
+        db.func.min(model.id), db.func.max(model.id)).one()
+    if min_id is None:
+      continue
+    for start in range(min_id, max_id + 1, SHARD_SIZE):
+      shards.append({
+          "model_name": name,
+          "min_id": start,
+          "max_id": start + SHARD_SIZE - 1,
+          "status": ReindexShard.PENDING,
+          "records": 0,
+      })
+  if shards:
+    db.session.execute(ReindexShard.__table__.insert(), shards)
+  return len(shards)
+
+
+def _get_shard_records(model, min_id, max_id):
+  """Generate full text records for all objects in a shard."""
+  if model is all_models.Snapshot:
+    columns = db.session.query(
+        model.parent_type,
+        model.parent_id,
+        model.child_type,
+        model.child_id,
+    ).filter(model.id.between(min_id, max_id))
+    pairs = {Pair.from_4tuple(row) for row in columns}
+    _, records = snapshot_indexer.get_records(pairs)
+    return records
+  query = _get_model_query(model).filter(model.id.between(min_id, max_id))
+  return [fts_record_for(instance)
+          for query_chunk in generate_query_chunks(query)
+          for instance in query_chunk]
+
+
+def process_shard(shard_id):
+  """Index a single shard into the shadow table and mark it as done.
+
+  Records and the shard checkpoint are committed in the same transaction, so
+  a shard that fails is left pending and nothing is written for it.
+
+  Args:
+    shard_id: Id of a ReindexShard entry.
+  Returns:
+    Number of records created for the shard.
+  """
+  shard = ReindexShard.query.get(shard_id)
+  if shard.status == ReindexShard.DONE:
+    return shard.records
+  model = _get_shard_models()[shard.model_name]
+  with benchmark("Reindex shard {}".format(shard_id)):
+    records = _get_shard_records(model, shard.min_id, shard.max_id)
+    get_indexer().get_shadow_indexer().create_records(records, commit=False)
+  shard.status = ReindexShard.DONE
+  shard.records = len(records)
+  db.session.commit()
+  return shard.records
+
+
+def _init_worker():
+  """Drop database connections inherited from the parent process."""
+  db.engine.dispose()
+
+
+def _process_shard_in_worker(shard_id):
+  """Process a shard inside a worker process of the reindex pool."""
+  from ggrc.app import app
+  with app.app_context():
+    try:
+      return process_shard(shard_id)
+    finally:
+      db.session.remove()
+
+
+def _get_processes():
+  """Get the number of worker processes for the reindex."""
+  if getattr(settings, "APP_ENGINE", False):
+    return 1
+  processes = getattr(settings, "FULLTEXT_REINDEX_PROCESSES", 1)
+  return processes or multiprocessing.cpu_count()
+
+
+def _run_shards(shard_ids, processes, task=None):
+  """Process all given shards and report progress to the task."""
+  total = len(shard_ids)
+  if processes > 1 and total > 1:
+    db.session.remove()
+    db.engine.dispose()
+    pool = multiprocessing.Pool(processes, _init_worker)
+    try:
+      results = pool.imap_unordered(_process_shard_in_worker, shard_ids)
+      _report_results(results, total, task)
+    finally:
+      pool.close()
+      pool.join()
+  else:
+    _report_results((process_shard(id_) for id_ in shard_ids), total, task)
+
+
+def _report_results(results, total, task):
+  """Consume shard results and store progress on the background task."""
+  for done, _ in enumerate(results, 1):
+    if task is not None:
+      task.set_progress(shards_done=done, shards_total=total)
+
+
+def _catch_up(indexer, since):
+  """Reindex objects modified while the shadow table was being built.
+
+  Args:
+    indexer: Indexer for the live records table.
+    since: Datetime when the reindex run started.
+  """
+  for name, model in _get_shard_models().items():
+    if model is all_models.Snapshot:
+      columns = db.session.query(
+          model.parent_type,
+          model.parent_id,
+          model.child_type,
+          model.child_id,
+      ).filter(model.updated_at >= since)
+      snapshot_indexer.reindex_pairs(
+          {Pair.from_4tuple(row) for row in columns})
+    else:
+      query = _get_model_query(model).filter(model.updated_at >= since)
+      for query_chunk in generate_query_chunks(query):
+        indexer.update_records(
+            [fts_record_for(instance) for instance in query_chunk],
+            commit=False)
+    if model is not all_models.CustomAttributeValue:
+      # Custom attribute values are indexed as properties of their parents.
+      indexer.delete_missing_records(name, db.session.query(model.id),
+                                     commit=False)
+    db.session.commit()
+
+
+def _add_swap_marker(indexer):
+  """Add the marker record to the shadow table."""
+  db.session.execute(indexer.shadow_table.insert().prefix_with("IGNORE"), {
+      "key": 0,
+      "type": SWAP_MARKER_TYPE,
+      "context_id": None,
+      "tags": "",
+      "property": "",
+      "subproperty": "",
+      "content": "",
+  })
+  db.session.commit()
+
+
+def _is_swapped(indexer):
+  """Check if the live table holds the marker record of the rebuild."""
+  record = indexer.record_type
+  return db.session.query(record.query.filter(
+      record.type == SWAP_MARKER_TYPE).exists()).scalar()
+
+
+def _delete_swap_marker(indexer):
+  record = indexer.record_type
+  db.session.execute(record.__table__.delete().where(
+      record.__table__.c.type == SWAP_MARKER_TYPE))
+
+
+def reindex(task=None):
+  """Rebuild the full text index.
+
+  If a previous run did not finish, only its pending shards are processed.
+  If all shards of the previous run are done, the run continues with the
+  swap, or with the catch up if the tables were already swapped.
+
+  Args:
+    task: Optional BackgroundTask used to report progress.
+  """
+  indexer = get_indexer()
+  if not db.session.query(ReindexShard.query.exists()).scalar():
+    with benchmark("Reindex: create shards"):
+      indexer.clear_shadow()
+      create_shards()
+      db.session.commit()
+  else:
+    logger.info("Resuming unfinished full text reindex.")
+
+  shard_ids = [id_ for id_, in db.session.query(ReindexShard.id).filter(
+      ReindexShard.status == ReindexShard.PENDING)]
+  since = db.session.query(db.func.min(ReindexShard.created_at)).scalar()
+
+  with benchmark("Reindex: process shards"):
+    _run_shards(shard_ids, _get_processes(), task)
+
+  if not _is_swapped(indexer):
+    with benchmark("Reindex: swap shadow table"):
+      _add_swap_marker(indexer)
+      indexer.swap_shadow()
+  if since is not None:
+    with benchmark("Reindex: catch up with modified objects"):
+      _catch_up(indexer, since)
+  _delete_swap_marker(indexer)
+  db.session.execute(ReindexShard.__table__.delete())
+  db.session.commit()
+  indexer.clear_shadow()
@@ -1,53 +1,158 @@
 # Copyright (C) 2017 Google Inc.
 # Licensed under http://www.apache.org/licenses/LICENSE-2.0 <see LICENSE file>
 
+"""Generic SQL full text indexer.
+
+Records are written with multi-row INSERT statements and removed with
+tuple based DELETE statements so that indexing many objects does not create
+an ORM instance for every indexed property.
+"""
+
+from sqlalchemy import and_
+from sqlalchemy.sql.expression import tuple_
+
 from ggrc import db
 from ggrc.fulltext import Indexer
 from ggrc.utils import benchmark
 
 
 class SqlIndexer(Indexer):
-  def create_record(self, record, commit=True):
-    with benchmark("Add fulltext records: create_record -> submit to db"):
-      for prop, value in record.properties.items():
-        for subproperty, content in value.items():
-          db.session.add(self.record_type(
-              key=record.key,
-              type=record.type,
-              context_id=record.context_id,
-              tags=record.tags,
-              property=prop,
-              subproperty=subproperty,
-              content=content,
-          ))
+  """Full text indexer that stores records in a SQL table."""
+
+  # Number of rows written by a single INSERT statement or number of keys
+  # used in a single DELETE statement.
+  CHUNK_SIZE = 1000
+
+  def __init__(self, settings, table=None):
+    super(SqlIndexer, self).__init__(settings)
+    self._table = table
+
+  @property
+  def table(self):
+    """Table that holds the records of this indexer."""
+    if self._table is not None:
+      return self._table
+    return self.record_type.__table__
+
+  @staticmethod
+  def _chunks(items, chunk_size):
+    """Split a list into chunks of `chunk_size` items."""
+    for start in range(0, len(items), chunk_size):
+      yield items[start:start + chunk_size]
+
+  @staticmethod
+  def get_payload(record):
+    """Get a list of table rows for a single record."""
+    return [
+        {
+            "key": record.key,
+            "type": record.type,
+            "context_id": record.context_id,
+            "tags": record.tags,
+            "property": prop,
+            "subproperty": subproperty,
+            "content": content,
+        }
+        for prop, value in record.properties.items()
+        for subproperty, content in value.items()
+    ]
+
+  def _execute_chunked(self, statement_for, items):
+    """Execute statements returned by `statement_for` on chunks of items."""
+    for chunk in self._chunks(list(items), self.CHUNK_SIZE):
+      db.session.execute(statement_for(chunk))
+
+  def create_records(self, records, commit=True):
+    """Insert records into the full text table with multi-row INSERTs.
+
+    Args:
+      records: An iterable of Record objects.
+      commit: Commit the session after inserting the records.
+    """
+    with benchmark("Add fulltext records: create_records -> submit to db"):
+      payload = [row for record in records
+                 for row in self.get_payload(record)]
+      table = self.table
+      self._execute_chunked(lambda chunk: table.insert().values(chunk),
+                            payload)
     if commit:
       db.session.commit()
 
+  def create_record(self, record, commit=True):
+    self.create_records([record], commit=commit)
+
+  def update_records(self, records, commit=True):
+    """Replace indexed properties of the given records.
+
+    Only the properties present in the given records are removed before the
+    new entries are inserted.
+
+    Args:
+      records: An iterable of Record objects.
+      commit: Commit the session after updating the records.
+    """
+    records = list(records)
+    with benchmark("Update fulltext records: remove obsolete entries"):
+      obsolete = {(record.type, record.key, prop)
+                  for record in records
+                  for prop in record.properties}
+      table = self.table
+      self._execute_chunked(
+          lambda chunk: table.delete().where(
+              tuple_(table.c.type, table.c.key, table.c.property).in_(chunk)
+          ),
+          obsolete,
+      )
+    self.create_records(records, commit=commit)
+
   def update_record(self, record, commit=True):
-    # remove the obsolete index entries
-    if record.properties:
-      db.session.query(self.record_type).filter(
-          self.record_type.key == record.key,
-          self.record_type.type == record.type,
-          self.record_type.property.in_(list(record.properties.keys())),
-      ).delete(synchronize_session="fetch")
-    # add new index entries
-    self.create_record(record, commit=commit)
+    self.update_records([record], commit=commit)
+
+  def delete_records(self, keys, commit=True):
+    """Remove all entries of the given objects from the full text table.
+
+    Args:
+      keys: An iterable of (type, key) tuples.
+      commit: Commit the session after removing the records.
+    """
+    with benchmark("Delete fulltext records: delete_records"):
+      table = self.table
+      self._execute_chunked(
+          lambda chunk: table.delete().where(
+              tuple_(table.c.type, table.c.key).in_(chunk)
+          ),
+          set(keys),
+      )
+    if commit:
+      db.session.commit()
 
   def delete_record(self, key, type, commit=True):
-    db.session.query(self.record_type).filter(
-        self.record_type.key == key,
-        self.record_type.type == type).delete()
+    # pylint: disable=redefined-builtin
+    self.delete_records([(type, key)], commit=commit)
+
+  def delete_missing_records(self, type, existing_ids, commit=True):
+    """Remove entries of a type whose keys are not in `existing_ids`.
+
+    Args:
+      type: Type of the records.
+      existing_ids: Query returning ids of all existing objects of the type.
+      commit: Commit the session after removing the records.
+    """
+    # pylint: disable=redefined-builtin
+    db.session.execute(self.table.delete().where(and_(
+        self.table.c.type == type,
+        ~self.table.c.key.in_(existing_ids),
+    )))
     if commit:
       db.session.commit()
 
   def delete_all_records(self, commit=True):
-    db.session.query(self.record_type).delete()
+    db.session.execute(self.table.delete())
     if commit:
       db.session.commit()
 
   def delete_records_by_type(self, type, commit=True):
-    db.session.query(self.record_type).filter(
-        self.record_type.type == type).delete()
+    # pylint: disable=redefined-builtin
+    db.session.execute(self.table.delete().where(self.table.c.type == type))
     if commit:
       db.session.commit()
@@ -0,0 +1,46 @@
+# Copyright (C) 2017 Google Inc.
+# Licensed under http://www.apache.org/licenses/LICENSE-2.0 <see LICENSE file>
+
+"""
+Add fulltext reindex shards and shadow records tables
+
+Create Date: 2017-03-09 10:10:10.584133
+"""
+# disable Invalid constant name pylint warning for mandatory Alembic variables.
+# pylint: disable=invalid-name
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "2f1cee67bd4d"
+down_revision = "19a4d5cfc0b8"
+
+
+def upgrade():
+  """Add tables used by the parallel full text reindex."""
+  op.create_table(
+      "fulltext_reindex_shards",
+      sa.Column("id", sa.Integer(), nullable=False),
+      sa.Column("model_name", sa.String(length=64), nullable=False),
+      sa.Column("min_id", sa.Integer(), nullable=False),
+      sa.Column("max_id", sa.Integer(), nullable=False),
+      sa.Column("status", sa.String(length=16), nullable=False),
+      sa.Column("records", sa.Integer(), nullable=False, server_default="0"),
+      sa.Column("created_at", sa.DateTime(), nullable=False),
+      sa.Column("updated_at", sa.DateTime(), nullable=False),
+      sa.PrimaryKeyConstraint("id"),
+  )
+  op.create_index("ix_fulltext_reindex_shards_status",
+                  "fulltext_reindex_shards", ["status"], unique=False)
+  op.execute("""
+      CREATE TABLE fulltext_record_properties_shadow
+      LIKE fulltext_record_properties
+  """)
+
+
+def downgrade():
+  """Drop tables used by the parallel full text reindex."""
+  op.drop_table("fulltext_record_properties_shadow")
+  op.drop_table("fulltext_reindex_shards")
@@ -0,0 +1,35 @@
+# Copyright (C) 2017 Google Inc.
+# Licensed under http://www.apache.org/licenses/LICENSE-2.0 <see LICENSE file>
+
+"""
+Add fulltext index journal table
+
+Create Date: 2017-03-10 09:30:00.271035
+"""
+# disable Invalid constant name pylint warning for mandatory Alembic variables.
+# pylint: disable=invalid-name
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "4d0f2a9c61e5"
+down_revision = "2f1cee67bd4d"
+
+
+def upgrade():
+  """Add table for objects waiting to be reindexed."""
+  op.create_table(
+      "fulltext_index_journal",
+      sa.Column("id", sa.Integer(), nullable=False),
+      sa.Column("type", sa.String(length=64), nullable=False),
+      sa.Column("key", sa.Integer(), nullable=False),
+      sa.Column("created_at", sa.DateTime(), nullable=False),
+      sa.PrimaryKeyConstraint("id"),
+  )
+
+
+def downgrade():
+  """Drop table for objects waiting to be reindexed."""
+  op.drop_table("fulltext_index_journal")
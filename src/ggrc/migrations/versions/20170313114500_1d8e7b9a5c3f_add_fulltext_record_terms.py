@@ -0,0 +1,42 @@
+# Copyright (C) 2017 Google Inc.
+# Licensed under http://www.apache.org/licenses/LICENSE-2.0 <see LICENSE file>
+
+"""
+Add fulltext record terms table for the inverted token indexer
+
+Create Date: 2017-03-13 11:45:00.418261
+"""
+# disable Invalid constant name pylint warning for mandatory Alembic variables.
+# pylint: disable=invalid-name
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "1d8e7b9a5c3f"
+down_revision = "4d0f2a9c61e5"
+
+
+def upgrade():
+  """Add posting tables for the inverted token indexer."""
+  op.create_table(
+      "fulltext_record_terms",
+      sa.Column("term", sa.String(length=64), nullable=False),
+      sa.Column("type", sa.String(length=64), nullable=False),
+      sa.Column("key", sa.Integer(), nullable=False),
+      sa.Column("property", sa.String(length=64), nullable=False),
+      sa.PrimaryKeyConstraint("term", "type", "key", "property"),
+  )
+  op.create_index("ix_fulltext_record_terms_type_key",
+                  "fulltext_record_terms", ["type", "key"], unique=False)
+  op.execute("""
+      CREATE TABLE fulltext_record_terms_shadow
+      LIKE fulltext_record_terms
+  """)
+
+
+def downgrade():
+  """Drop posting tables for the inverted token indexer."""
+  op.drop_table("fulltext_record_terms_shadow")
+  op.drop_table("fulltext_record_terms")
@@ -0,0 +1,40 @@
+# Copyright (C) 2017 Google Inc.
+# Licensed under http://www.apache.org/licenses/LICENSE-2.0 <see LICENSE file>
+
+"""
+Add permission filter entries table
+
+Create Date: 2017-03-15 10:30:00.518204
+"""
+# disable Invalid constant name pylint warning for mandatory Alembic variables.
+# pylint: disable=invalid-name
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "3a7c9e2d41b6"
+down_revision = "1d8e7b9a5c3f"
+
+
+def upgrade():
+  """Add table for materialized permission sets."""
+  op.create_table(
+      "permission_filter_entries",
+      sa.Column("person_id", sa.Integer(), autoincrement=False,
+                nullable=False),
+      sa.Column("action", sa.String(length=16), nullable=False),
+      sa.Column("resource_type", sa.String(length=128), nullable=False),
+      sa.Column("version", sa.String(length=32), nullable=False),
+      sa.Column("entry_type", sa.String(length=16), nullable=False),
+      sa.Column("entry_id", sa.Integer(), autoincrement=False,
+                nullable=False),
+      sa.PrimaryKeyConstraint("person_id", "action", "resource_type",
+                              "version", "entry_type", "entry_id"),
+  )
+
+
+def downgrade():
+  """Drop table for materialized permission sets."""
+  op.drop_table("permission_filter_entries")
@@ -0,0 +1,27 @@
+# Copyright (C) 2017 Google Inc.
+# Licensed under http://www.apache.org/licenses/LICENSE-2.0 <see LICENSE file>
+
+"""
+Add index for latest revision lookups
+
+Create Date: 2017-03-20 10:15:00.241903
+"""
+# disable Invalid constant name pylint warning for mandatory Alembic variables.
+# pylint: disable=invalid-name
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "4b2d8f0c6a19"
+down_revision = "3a7c9e2d41b6"
+
+
+def upgrade():
+  """Add an index that covers grouped MAX(id) lookups by action."""
+  op.create_index("ix_revisions_resource_action", "revisions",
+                  ["resource_type", "resource_id", "action"], unique=False)
+
+
+def downgrade():
+  """Drop the latest revision lookup index."""
+  op.drop_index("ix_revisions_resource_action", table_name="revisions")
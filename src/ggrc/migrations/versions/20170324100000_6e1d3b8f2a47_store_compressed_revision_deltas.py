@@ -0,0 +1,89 @@
+# Copyright (C) 2017 Google Inc.
+# Licensed under http://www.apache.org/licenses/LICENSE-2.0 <see LICENSE file>
+
+"""
+Store compressed revision contents and deltas
+
+Create Date: 2017-03-24 10:00:00.000000
+"""
+# disable Invalid constant name pylint warning for mandatory Alembic variables.
+# pylint: disable=invalid-name
+
+import json
+
+import sqlalchemy as sa
+from sqlalchemy.dialects import mysql
+
+from alembic import op
+
+from ggrc.models.types import CompressedJsonType
+from ggrc.utils import json_delta
+
+
+# revision identifiers, used by Alembic.
+revision = "6e1d3b8f2a47"
+down_revision = "4b2d8f0c6a19"
+
+
+CHUNK_SIZE = 1000
+
+revisions_table = sa.sql.table(
+    "revisions",
+    sa.sql.column("id", sa.Integer),
+    sa.sql.column("base_revision_id", sa.Integer),
+    sa.sql.column("content", CompressedJsonType),
+)
+
+
+def upgrade():
+  """Make revision content binary and add keyframe references.
+
+  Existing contents are kept as plain text, they are compressed and encoded
+  as deltas by ggrc.utils.revisions.compact_revisions.
+  """
+  op.alter_column("revisions", "content",
+                  existing_type=mysql.LONGTEXT(),
+                  type_=mysql.LONGBLOB(),
+                  existing_nullable=False)
+  op.add_column("revisions",
+                sa.Column("base_revision_id", sa.Integer(), nullable=True))
+  op.create_index("ix_revisions_base_revision_id", "revisions",
+                  ["base_revision_id"], unique=False)
+
+
+def _expand_contents(connection):
+  """Store full content of all revisions as plain text."""
+  last_id = 0
+  while True:
+    rows = connection.execute(
+        sa.select([revisions_table]).where(
+            revisions_table.c.id > last_id
+        ).order_by(revisions_table.c.id).limit(CHUNK_SIZE)
+    ).fetchall()
+    if not rows:
+      break
+    last_id = rows[-1].id
+    base_ids = {row.base_revision_id for row in rows
+                if row.base_revision_id is not None}
+    bases = dict(connection.execute(
+        sa.select([revisions_table.c.id, revisions_table.c.content]).where(
+            revisions_table.c.id.in_(base_ids))
+    ).fetchall()) if base_ids else {}
+    for row in rows:
+      content = row.content
+      if row.base_revision_id is not None:
+        content = json_delta.patch(bases[row.base_revision_id], content)
+      connection.execute(
+          sa.text("UPDATE revisions SET content = :content WHERE id = :id"),
+          content=json.dumps(content), id=row.id)
+
+
+def downgrade():
+  """Store full plain text revision content and drop keyframe references."""
+  _expand_contents(op.get_bind())
+  op.drop_index("ix_revisions_base_revision_id", table_name="revisions")
+  op.drop_column("revisions", "base_revision_id")
+  op.alter_column("revisions", "content",
+                  existing_type=mysql.LONGBLOB(),
+                  type_=mysql.LONGTEXT(),
+                  existing_nullable=False)
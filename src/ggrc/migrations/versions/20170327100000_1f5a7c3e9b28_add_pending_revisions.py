@@ -0,0 +1,40 @@
+# Copyright (C) 2017 Google Inc.
+# Licensed under http://www.apache.org/licenses/LICENSE-2.0 <see LICENSE file>
+
+"""
+Add pending revisions table
+
+Create Date: 2017-03-27 10:00:00.000000
+"""
+# disable Invalid constant name pylint warning for mandatory Alembic variables.
+# pylint: disable=invalid-name
+
+import sqlalchemy as sa
+from sqlalchemy.dialects import mysql
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "1f5a7c3e9b28"
+down_revision = "6e1d3b8f2a47"
+
+
+def upgrade():
+  """Add table for revisions waiting to be computed by the worker."""
+  op.create_table(
+      "pending_revisions",
+      sa.Column("id", sa.Integer(), nullable=False),
+      sa.Column("event_id", sa.Integer(), nullable=False),
+      sa.Column("modified_by_id", sa.Integer(), nullable=True),
+      sa.Column("action", sa.Enum(u"created", u"modified"), nullable=False),
+      sa.Column("resource_type", sa.String(length=250), nullable=False),
+      sa.Column("resource_id", sa.Integer(), nullable=False),
+      sa.Column("content", mysql.LONGBLOB(), nullable=True),
+      sa.Column("created_at", sa.DateTime(), nullable=False),
+      sa.PrimaryKeyConstraint("id"),
+  )
+
+
+def downgrade():
+  """Drop table for revisions waiting to be computed by the worker."""
+  op.drop_table("pending_revisions")
@@ -1,10 +1,15 @@
 # Copyright (C) 2017 Google Inc.
 # Licensed under http://www.apache.org/licenses/LICENSE-2.0 <see LICENSE file>
 
+import importlib
+import json
+import multiprocessing
+import threading
 from logging import getLogger
 from functools import wraps
 from time import time
 
+import flask_login
 from flask import request
 from flask.wrappers import Response
 from werkzeug.datastructures import Headers
@@ -21,6 +26,10 @@ from ggrc.models.types import CompressedType
 # pylint: disable=invalid-name
 logger = getLogger(__name__)
 
+# Process pool for background tasks when there is no task queue service.
+_worker_pool = None
+_worker_pool_lock = threading.Lock()
+
 
 class BackgroundTask(Base, Stateful, db.Model):
   __tablename__ = 'background_tasks'
@@ -53,6 +62,21 @@ class BackgroundTask(Base, Stateful, db.Model):
     db.session.add(self)
     db.session.commit()
 
+  def set_progress(self, **progress):
+    """Store progress of a running task so it can be polled by the client.
+
+    The progress is returned as the task response until the task finishes.
+    It is written in a separate transaction, so uncommitted changes of the
+    task, for example of an import dry run, are not committed with it.
+    """
+    result = {'content': json.dumps(progress),
+              'status_code': 202,
+              'headers': [('Content-Type', 'application/json')]}
+    table = self.__table__
+    with db.engine.begin() as connection:
+      connection.execute(table.update().where(
+          table.c.id == self.id).values(result=result))
+
   def finish(self, status, result):
     # Ensure to not commit any not-yet-committed changes
     db.session.rollback()
@@ -78,8 +102,50 @@ class BackgroundTask(Base, Stateful, db.Model):
                               self.result['headers']))
 
 
-def create_task(name, url, queued_callback=None, parameters=None):
+def _init_worker():
+  """Drop database connections inherited from the parent process."""
+  db.engine.dispose()
+
+
+def _get_worker_pool():
+  """Get the process pool for running background tasks locally."""
+  global _worker_pool  # pylint: disable=global-statement
+  with _worker_pool_lock:
+    if _worker_pool is None:
+      _worker_pool = multiprocessing.Pool(
+          settings.BACKGROUND_TASK_PROCESSES, _init_worker)
+  return _worker_pool
 
+
+def _run_in_worker(module_name, callback_name, task_id):
+  """Run a queued task callback inside a worker process.
+
+  The callback runs as the user that created the task.
+  """
+  from ggrc.app import app
+  from ggrc.login import get_login_module
+  callback = getattr(importlib.import_module(module_name), callback_name)
+  with app.test_request_context():
+    try:
+      task = BackgroundTask.query.get(task_id)
+      if get_login_module() and task.modified_by is not None:
+        flask_login.login_user(task.modified_by)
+      callback(task)
+    except:  # pylint: disable=bare-except
+      logger.exception("Background task %s failed", task_id)
+    finally:
+      db.session.remove()
+
+
+def create_task(name, url, queued_callback=None, parameters=None,
+                use_worker=False):
+  """Create a background task and schedule its execution.
+
+  On App Engine the task is added to the task queue and runs as a request to
+  `url`. Otherwise `queued_callback` is called with the task, in a local
+  worker process if `use_worker` is set and BACKGROUND_TASK_PROCESSES is not
+  0, or directly in the current request.
+  """
   # task name must be unique
   if not parameters:
     parameters = {}
@@ -101,6 +167,10 @@ def create_task(name, url, queued_callback=None, parameters=None):
         params={'task_id': task.id},
         method=request.method,
         headers=headers)
+  elif queued_callback and use_worker and \
+          getattr(settings, 'BACKGROUND_TASK_PROCESSES', 0):
+    _get_worker_pool().apply_async(_run_in_worker, (
+        queued_callback.__module__, queued_callback.__name__, task.id))
   elif queued_callback:
     queued_callback(task)
   return task
@@ -5,6 +5,9 @@ class Cache:
   """
   Tracks modified objects in the session distinguished by
   type of modification: new, dirty and deleted.
+
+  Objects created with bulk inserts are not present in the session and are
+  tracked by their (type, id) in bulk_new together with their log JSON.
   """
   def __init__(self):
     self.clear()
@@ -43,10 +46,12 @@ class Cache:
     self.new = {}
     self.dirty = {}
     self.deleted = {}
+    self.bulk_new = {}
 
   def copy(self):
     copied_cache = Cache()
     copied_cache.new = dict(self.new)
     copied_cache.dirty = dict(self.dirty)
     copied_cache.deleted = dict(self.deleted)
+    copied_cache.bulk_new = dict(self.bulk_new)
     return copied_cache
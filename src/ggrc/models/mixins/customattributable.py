@@ -4,6 +4,8 @@
 """Module containing custom attributable mixin."""
 
 import collections
+import threading
+from contextlib import contextmanager
 from logging import getLogger
 
 from sqlalchemy import and_
@@ -24,6 +26,24 @@ from ggrc.models.reflection import AttributeInfo
 # pylint: disable=invalid-name
 logger = getLogger(__name__)
 
+# Custom attribute definitions by id, preloaded for log_json of many objects.
+_log_definitions = threading.local()
+
+
+@contextmanager
+def preloaded_log_definitions(definitions):
+  """Use preloaded custom attribute definitions in log_json.
+
+  Args:
+    definitions: dict of id -> custom attribute definition, that must contain
+      the definitions of all values of the logged objects.
+  """
+  _log_definitions.by_id = definitions
+  try:
+    yield
+  finally:
+    _log_definitions.by_id = None
+
 
 # pylint: disable=attribute-defined-outside-init; CustomAttributable is a mixin
 class CustomAttributable(object):
@@ -416,15 +436,21 @@ class CustomAttributable(object):
     if self.custom_attribute_values:
       res["custom_attribute_values"] = [
           value.log_json() for value in self.custom_attribute_values]
-      # fetch definitions form database because `self.custom_attribute`
-      # may not be populated
-      defs = CustomAttributeDefinition.query.filter(
-          CustomAttributeDefinition.definition_type == self._inflector.table_singular,  # noqa # pylint: disable=protected-access
-          CustomAttributeDefinition.id.in_([
-              value.custom_attribute_id
-              for value in self.custom_attribute_values
-          ])
-      )
+      definition_type = self._inflector.table_singular
+      definition_ids = {value.custom_attribute_id
+                        for value in self.custom_attribute_values}
+      preloaded = getattr(_log_definitions, "by_id", None)
+      if preloaded is not None:
+        defs = [preloaded.get(id_) for id_ in sorted(definition_ids)]
+        defs = [definition for definition in defs if definition and
+                definition.definition_type == definition_type]
+      else:
+        # fetch definitions form database because `self.custom_attribute`
+        # may not be populated
+        defs = CustomAttributeDefinition.query.filter(
+            CustomAttributeDefinition.definition_type == definition_type,
+            CustomAttributeDefinition.id.in_(list(definition_ids)),
+        ).order_by(CustomAttributeDefinition.id)
       # also log definitions to freeze field names in time
       res["custom_attribute_definitions"] = [
           definition.log_json() for definition in defs]
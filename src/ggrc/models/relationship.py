@@ -130,9 +130,16 @@ class Relationship(Base, db.Model):
   ]
   attrs.publish_raw = True
 
+  @staticmethod
+  def _format_display_name(source_type, source_id,
+                           destination_type, destination_id):
+    return "{}:{} <-> {}:{}".format(source_type, source_id,
+                                    destination_type, destination_id)
+
   def _display_name(self):
-    return "{}:{} <-> {}:{}".format(self.source_type, self.source_id,
-                                    self.destination_type, self.destination_id)
+    return self._format_display_name(self.source_type, self.source_id,
+                                     self.destination_type,
+                                     self.destination_id)
 
   def log_json(self):
     json = super(Relationship, self).log_json()
@@ -140,6 +147,23 @@ class Relationship(Base, db.Model):
     json["attrs"] = self.attrs.copy()  # copy in order to detach from orm
     return json
 
+  @classmethod
+  def row_log_json(cls, row):
+    """Get log_json content of a relationship row inserted without the ORM.
+
+    Rows inserted in bulk have no relationship attributes. People columns get
+    their stubs the same way as in Base.log_json.
+    """
+    json = {column.name: row[column.name] for column in cls.__table__.columns}
+    json["display_name"] = cls._format_display_name(
+        row.source_type, row.source_id,
+        row.destination_type, row.destination_id)
+    for attr in cls._people_log_mappings:
+      if attr in json:
+        json[attr[:-3]] = cls._person_stub(json[attr]) if json[attr] else None
+    json["attrs"] = {}
+    return json
+
 event.listen(Relationship, 'before_insert', Relationship.validate_attrs)
 event.listen(Relationship, 'before_update', Relationship.validate_attrs)
 
@@ -275,6 +275,44 @@ class RelationshipHelper(object):
 
     return query
 
+  @classmethod
+  def _relationship_mappings(cls, object_type, related_type, related_ids):
+    """Get queries for ids of objects mapped with relationships.
+
+    Neighbors of a list of related objects are read from the relationship
+    adjacency cache, and only the ids of mapped objects are queried.
+    """
+    from ggrc.cache import adjacency
+    model = getattr(all_models, object_type, None)
+    stubs = None
+    if model is not None and isinstance(related_ids, (list, set, tuple)):
+      try:
+        stubs = [(related_type, int(id_)) for id_ in related_ids]
+      except (TypeError, ValueError):
+        stubs = None
+    if stubs is not None:
+      neighbors = adjacency.get_neighbors(stubs, types={object_type})
+      ids = {id_ for mapped in neighbors.itervalues() for _, id_ in mapped}
+      if not ids:
+        return []
+      return [db.session.query(model.id).filter(model.id.in_(ids))]
+
+    destination_ids = db.session.query(Relationship.destination_id).filter(
+        and_(
+            Relationship.destination_type == object_type,
+            Relationship.source_type == related_type,
+            Relationship.source_id.in_(related_ids),
+        )
+    )
+    source_ids = db.session.query(Relationship.source_id).filter(
+        and_(
+            Relationship.source_type == object_type,
+            Relationship.destination_type == related_type,
+            Relationship.destination_id.in_(related_ids),
+        )
+    )
+    return [destination_ids, source_ids]
+
   @classmethod
   def get_ids_related_to(cls, object_type, related_type, related_ids=None):
     """ get ids of objects
@@ -299,22 +337,8 @@ class RelationshipHelper(object):
       return cls._parent_object_mappings(
           object_type, related_type, related_ids)
 
-    destination_ids = db.session.query(Relationship.destination_id).filter(
-        and_(
-            Relationship.destination_type == object_type,
-            Relationship.source_type == related_type,
-            Relationship.source_id.in_(related_ids),
-        )
-    )
-    source_ids = db.session.query(Relationship.source_id).filter(
-        and_(
-            Relationship.source_type == object_type,
-            Relationship.destination_type == related_type,
-            Relationship.destination_id.in_(related_ids),
-        )
-    )
-
-    queries = [destination_ids, source_ids]
+    queries = cls._relationship_mappings(
+        object_type, related_type, related_ids)
     queries.extend(cls.get_extension_mappings(
         object_type, related_type, related_ids))
     queries.extend(cls.get_special_mappings(
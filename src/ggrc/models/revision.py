@@ -3,23 +3,53 @@
 
 """Defines a Revision model for storing snapshots."""
 
+import json
+
+from sqlalchemy import func
+from sqlalchemy import tuple_
+from sqlalchemy.ext.hybrid import hybrid_property
+
 from ggrc import db
+from ggrc import utils
 from ggrc.models.computed_property import computed_property
 from ggrc.models.mixins import Base
-from ggrc.models.types import LongJsonType
+from ggrc.models.types import CompressedJsonType
+from ggrc.utils import json_delta
 
 
 class Revision(Base, db.Model):
-  """Revision object holds a JSON snapshot of the object at a time."""
+  """Revision object holds a JSON snapshot of the object at a time.
+
+  The content is stored compressed, either in full (a keyframe) or as a delta
+  against the latest keyframe of the same object, see encode_deltas. Full
+  content is reconstructed on read by the content property and by
+  load_contents.
+  """
 
   __tablename__ = 'revisions'
 
+  # Number of objects in a single latest revision lookup query.
+  LATEST_IDS_CHUNK_SIZE = 1000
+  # Maximal number of revisions stored as deltas against a single keyframe.
+  KEYFRAME_INTERVAL = 20
+  # Maximal size of a stored delta relative to the size of the full content.
+  MAX_DELTA_RATIO = 0.5
+
   resource_id = db.Column(db.Integer, nullable=False)
   resource_type = db.Column(db.String, nullable=False)
   event_id = db.Column(db.Integer, db.ForeignKey('events.id'), nullable=False)
   action = db.Column(db.Enum(u'created', u'modified', u'deleted'),
                      nullable=False)
-  content = db.Column(LongJsonType, nullable=False)
+  _content = db.Column("content", CompressedJsonType, nullable=False)
+  # id of the keyframe revision that _content is a delta against
+  base_revision_id = db.Column(db.Integer, nullable=True)
+  base = db.relationship(
+      "Revision",
+      primaryjoin="Revision.id == foreign(Revision.base_revision_id)",
+      remote_side="Revision.id",
+      uselist=False,
+      viewonly=True,
+  )
 
   resource_slug = db.Column(db.String, nullable=True)
   source_type = db.Column(db.String, nullable=True)
@@ -36,7 +66,166 @@ class Revision(Base, db.Model):
         db.Index("fk_revisions_destination",
                  "destination_type", "destination_id"),
         db.Index('ix_revisions_resource_slug', 'resource_slug'),
+        db.Index("ix_revisions_resource_action",
+                 "resource_type", "resource_id", "action"),
+        db.Index("ix_revisions_base_revision_id", "base_revision_id"),
+    )
+
+  @hybrid_property
+  def content(self):
+    """Full content of the revision, reconstructed from a delta if needed."""
+    if self.base_revision_id is None:
+      return self._content
+    full_content = getattr(self, "_full_content", None)
+    if full_content is None:
+      full_content = json_delta.patch(self.base.content, self._content)
+      self._full_content = full_content
+    return full_content
+
+  @content.setter
+  def content(self, value):
+    self._content = value
+    self.base_revision_id = None
+    self._full_content = None
+
+  @content.expression
+  def content(cls):  # pylint: disable=no-self-argument
+    """Stored content, that is a delta for revisions with a base revision."""
+    return cls._content
+
+  @classmethod
+  def latest_ids(cls, stubs, filters=None):
+    """Get ids of the latest revisions of the given objects.
+
+    The latest revisions are selected with a grouped MAX(id) query that is
+    covered by the resource indexes, so older revisions are never fetched.
+
+    Args:
+      stubs: iterable of (resource_type, resource_id) tuples.
+      filters: optional list of predicates on revisions, e.g. on action.
+
+    Returns:
+      dict of (resource_type, resource_id) -> id of the latest revision for
+      all objects that have a matching revision.
+    """
+    stubs = list(set(stubs))
+    latest = {}
+    for start in range(0, len(stubs), cls.LATEST_IDS_CHUNK_SIZE):
+      chunk = stubs[start:start + cls.LATEST_IDS_CHUNK_SIZE]
+      query = db.session.query(
+          func.max(cls.id),
+          cls.resource_type,
+          cls.resource_id,
+      ).filter(
+          tuple_(cls.resource_type, cls.resource_id).in_(chunk)
+      )
+      for filter_ in filters or []:
+        query = query.filter(filter_)
+      query = query.group_by(cls.resource_type, cls.resource_id)
+      latest.update(((resource_type, resource_id), revision_id)
+                    for revision_id, resource_type, resource_id in query)
+    return latest
+
+  @classmethod
+  def load_contents(cls, ids):
+    """Load full contents of revisions without loading revision objects.
+
+    Args:
+      ids: iterable of revision ids.
+
+    Returns:
+      dict of revision id -> full revision content.
+    """
+    def load_stored(revision_ids):
+      revision_ids = list(revision_ids)
+      for start in range(0, len(revision_ids), cls.LATEST_IDS_CHUNK_SIZE):
+        query = db.session.query(
+            cls.id,
+            cls.base_revision_id,
+            cls._content,
+        ).filter(
+            cls.id.in_(
+                revision_ids[start:start + cls.LATEST_IDS_CHUNK_SIZE])
+        )
+        stored.update((id_, (base_id, content))
+                      for id_, base_id, content in query)
+
+    ids = set(ids)
+    stored = {}
+    load_stored(ids)
+    load_stored({base_id for base_id, _ in stored.values()
+                 if base_id is not None and base_id not in stored})
+    contents = {}
+    for id_ in ids & set(stored):
+      base_id, content = stored[id_]
+      if base_id is not None:
+        content = json_delta.patch(stored[base_id][1], content)
+      contents[id_] = content
+    return contents
+
+  @classmethod
+  def get_delta(cls, keyframe, content):
+    """Get the delta for storing revision content against a keyframe.
+
+    Args:
+      keyframe: full content of the keyframe revision.
+      content: full content of the revision as loaded from JSON.
+
+    Returns:
+      delta of the content or None if the delta is too big to be stored.
+    """
+    delta = json_delta.diff(keyframe, content)
+    if len(utils.as_json(delta)) > \
+       cls.MAX_DELTA_RATIO * len(utils.as_json(content)):
+      return None
+    return delta
+
+  @classmethod
+  def encode_deltas(cls, revisions):
+    """Store contents of new revisions as deltas against keyframes.
+
+    A revision is stored as a delta against the latest keyframe of its object
+    if the keyframe has less than KEYFRAME_INTERVAL deltas and the delta is
+    small enough compared to the full content, otherwise it is a keyframe.
+
+    Args:
+      revisions: list of unflushed revisions with full content.
+    """
+    if not revisions:
+      return
+    keyframe_ids = cls.latest_ids(
+        ((revision.resource_type, revision.resource_id)
+         for revision in revisions),
+        filters=[cls.base_revision_id.is_(None)],
     )
+    if not keyframe_ids:
+      return
+    counts = dict(db.session.query(
+        cls.base_revision_id,
+        func.count(cls.id),
+    ).filter(
+        cls.base_revision_id.in_(keyframe_ids.values())
+    ).group_by(
+        cls.base_revision_id
+    ))
+    keyframe_ids = {key: id_ for key, id_ in keyframe_ids.iteritems()
+                    if counts.get(id_, 0) < cls.KEYFRAME_INTERVAL}
+    keyframes = cls.load_contents(keyframe_ids.values())
+    for revision in revisions:
+      keyframe_id = keyframe_ids.get(
+          (revision.resource_type, revision.resource_id))
+      if keyframe_id is None or counts.get(keyframe_id, 0) >= \
+         cls.KEYFRAME_INTERVAL:
+        continue
+      content = json.loads(utils.as_json(revision.content))
+      delta = cls.get_delta(keyframes[keyframe_id], content)
+      if delta is None:
+        continue
+      # pylint: disable=protected-access
+      revision.base_revision_id = keyframe_id
+      revision._content = delta
+      revision._full_content = content
+      counts[keyframe_id] = counts.get(keyframe_id, 0) + 1
 
   _publish_attrs = [
       'resource_id',
@@ -58,6 +247,7 @@ class Revision(Base, db.Model):
     return query.options(
         orm.subqueryload('modified_by'),
         orm.subqueryload('event'),  # used in description
+        orm.subqueryload('base'),  # used in content
     )
 
   def __init__(self, obj, modified_by_id, action, content):
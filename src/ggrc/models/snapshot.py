@@ -11,7 +11,6 @@ from sqlalchemy import orm
 from sqlalchemy import event
 from sqlalchemy import inspect
 from sqlalchemy.orm.session import Session
-from sqlalchemy import func
 from sqlalchemy.sql.expression import tuple_
 
 from ggrc import db
@@ -94,8 +93,9 @@ class Snapshot(relationship.Relatable, mixins.Base, db.Model):
   def eager_query(cls):
     query = super(Snapshot, cls).eager_query()
     return cls.eager_inclusions(query, Snapshot._include_links).options(
-        orm.subqueryload('revision'),
-        orm.subqueryload('revisions'),
+        # base revisions are used in content of delta revisions
+        orm.subqueryload('revision').subqueryload('base'),
+        orm.subqueryload('revisions').subqueryload('base'),
     )
 
   @hybrid_property
@@ -237,8 +237,10 @@ def _ensure_program_relationships(objects):
 
 def _insert_program_relationships(program, missing_pairs):
   """Insert missing obj-program relationships."""
+  from ggrc.cache import adjacency
   if not missing_pairs:
     return
+  adjacency.invalidate(missing_pairs | {program})
   current_user_id = get_current_user_id()
   now = datetime.now()
   # We are doing an INSERT IGNORE INTO here to mitigate a race condition
@@ -274,21 +276,8 @@ def _set_latest_revisions(objects):
   Args:
     objects: list of snapshot objects with child_id and child_type set.
   """
-  pairs = [(o.child_type, o.child_id) for o in objects]
-  query = db.session.query(
-      func.max(revision.Revision.id, name="id", identifier="id"),
-      revision.Revision.resource_type,
-      revision.Revision.resource_id,
-  ).filter(
-      tuple_(
-          revision.Revision.resource_type,
-          revision.Revision.resource_id,
-      ).in_(pairs)
-  ).group_by(
-      revision.Revision.resource_type,
-      revision.Revision.resource_id,
-  )
-  id_map = {(r_type, r_id): id_ for id_, r_type, r_id in query}
+  id_map = revision.Revision.latest_ids(
+      (o.child_type, o.child_id) for o in objects)
   for o in objects:
     o.revision_id = id_map.get((o.child_type, o.child_id))
 
@@ -8,6 +8,8 @@ Add Json and Compressed type declaration for use in ORM models.
 
 import json
 import pickle
+import zlib
+
 import sqlalchemy.types as types
 from ggrc import utils
 from ggrc.models import exceptions
@@ -39,6 +41,39 @@ class LongJsonType(types.TypeDecorator):
     return value
 
 
+class CompressedJsonType(types.TypeDecorator):
+  # pylint: disable=W0223
+  """Custom compressed Json data type.
+
+  Custom type for storing Json objects in our database as zlib compressed
+  serialized text. Values stored as plain serialized text, e.g. before the
+  column type was changed, are still read.
+  """
+  MAX_BINARY_LENGTH = 4294967295
+  impl = types.LargeBinary(length=MAX_BINARY_LENGTH)
+
+  def process_result_value(self, value, dialect):
+    if value is not None:
+      try:
+        value = zlib.decompress(value)
+      except zlib.error:
+        pass
+      value = json.loads(value)
+    return value
+
+  def process_bind_param(self, value, dialect):
+    if value is None:
+      return value
+    if not isinstance(value, basestring):
+      value = utils.as_json(value)
+    if isinstance(value, unicode):
+      value = value.encode('utf-8')
+    value = zlib.compress(value)
+    if len(value) > self.MAX_BINARY_LENGTH:
+      raise exceptions.ValidationError("Log record content too long")
+    return value
+
+
 class JsonType(types.TypeDecorator):
   # pylint: disable=W0223
   """ Custom Json data type
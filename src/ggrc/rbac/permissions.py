@@ -1,7 +1,10 @@
 # Copyright (C) 2017 Google Inc.
 # Licensed under http://www.apache.org/licenses/LICENSE-2.0 <see LICENSE file>
 
+from collections import Counter
+
 from flask import g
+from flask import has_request_context
 from flask.ext.login import current_user
 from ggrc.extensions import get_extension_instance
 
@@ -26,6 +29,50 @@ def get_user():
   return None
 
 
+def record_checks(name, count=1):
+  """Add to a counter of the permission check profile of the request."""
+  if has_request_context():
+    if not hasattr(g, "_permission_check_profile"):
+      g._permission_check_profile = Counter()
+    g._permission_check_profile[name] += count
+
+
+def get_check_profile():
+  """Get the number of permission checks made by the current request.
+
+  Returns:
+    dict with the numbers of single checks, batches, checks made in batches,
+    instances loaded for conditions and condition evaluations.
+  """
+  if not has_request_context():
+    return {}
+  return dict(getattr(g, "_permission_check_profile", {}))
+
+
+def allowed_mask(action, resources):
+  """Check a permission for a list of (type, id, context_id) tuples.
+
+  The permission sets are evaluated once for the whole list.
+
+  Returns:
+    list of booleans, one for every resource.
+  """
+  return permissions_for(get_user()).allowed_mask(action, resources)
+
+
+def allowed_mask_for(action, resources):
+  """Check a permission including its conditions for a list of
+  (type, id, context_id) tuples.
+
+  Instances needed to evaluate conditions are loaded with a single query per
+  type.
+
+  Returns:
+    list of booleans, one for every resource.
+  """
+  return permissions_for(get_user()).allowed_mask_for(action, resources)
+
+
 def is_allowed_create(resource_type, resource_id, context_id):
   """Whether or not the user is allowed to create a resource of the specified
   type in the context.
@@ -5,8 +5,10 @@ from collections import namedtuple
 from flask import g
 from flask.ext.login import current_user
 from .user_permissions import UserPermissions
+from .user_permissions import load_instances
 from ggrc.rbac.permissions import permissions_for as find_permissions
 from ggrc.rbac.permissions import is_allowed_create
+from ggrc.rbac.permissions import record_checks
 from ggrc.models import get_model
 from ggrc.models import Person
 
@@ -260,6 +262,139 @@ class DefaultUserPermissions(UserPermissions):
       return True
     return self._check_conditions(instance, action, conditions)
 
+  def _get_allowed_check(self, action, resource_type, permissions):
+    """Get a function that checks a permission for resources of a type.
+
+    The returned function takes a resource id and a context id and gives the
+    same result as ``_is_allowed``, but the permission lists are converted
+    to sets only once.
+    """
+    admin = self.ADMIN_PERMISSION
+    if self._permission_match(admin, permissions):
+      return lambda resource_id, context_id: True
+
+    def get_ids(action_name, type_name, key):
+      return set(permissions.get(action_name, {})
+                 .get(type_name, {})
+                 .get(key, []))
+
+    type_contexts = get_ids(action, resource_type, 'contexts')
+    if None in type_contexts:
+      return lambda resource_id, context_id: True
+    resources = get_ids(action, resource_type, 'resources')
+    contexts = type_contexts | get_ids(action, admin.resource_type,
+                                       'contexts')
+    admin_contexts = get_ids(admin.action, admin.resource_type, 'contexts')
+    # Access to objects without a context gives access in all contexts,
+    # except for the admin pages.
+    all_contexts = None in contexts and resource_type != '/admin'
+
+    def check(resource_id, context_id):
+      return (all_contexts and bool(context_id) or
+              resource_id in resources or
+              context_id in contexts or
+              context_id in admin_contexts)
+    return check
+
+  def allowed_mask(self, action, resources):
+    """Check a permission for a list of (type, id, context_id) tuples.
+
+    The result for every resource is equal to ``is_allowed_<action>``.
+    """
+    permissions = self._permissions()
+    checks = {}
+    mask = []
+    for resource_type, resource_id, context_id in resources:
+      if resource_type not in checks:
+        checks[resource_type] = self._get_allowed_check(
+            action, resource_type, permissions)
+      mask.append(checks[resource_type](resource_id, context_id))
+    record_checks("batches")
+    record_checks("batched", len(mask))
+    return mask
+
+  def _check_without_instance(self, action, resource, permissions):
+    """Check a permission like ``_is_allowed_for`` without the instance.
+
+    Returns:
+      True or False if the permission can be checked without conditions,
+      None if the conditions must be checked on the instance.
+    """
+    resource_type, resource_id, context_id = resource
+    admin = self.ADMIN_PERMISSION
+    if self._permission_match(admin, permissions):
+      return None if permissions[admin.action]\
+          .get(admin.resource_type, {})\
+          .get("conditions", {})\
+          .get(None) else True
+    type_permissions = permissions.get(action, {}).get(resource_type)
+    if not type_permissions:
+      return False
+    if resource_id in type_permissions.get('resources', []):
+      return True
+    conditions = type_permissions.get('conditions', {})
+    if conditions.get(None) or conditions.get(context_id):
+      return None
+    contexts = type_permissions.get('contexts', [])
+    return None in contexts or context_id in contexts
+
+  @staticmethod
+  def _prefetch_relationship_objects(instances):
+    """Load objects mapped by relationship instances and their contexts.
+
+    Objects are loaded with a single query per type, so evaluating
+    relationship conditions does not load them one by one.
+    """
+    from sqlalchemy.orm.attributes import set_committed_value
+    from ggrc.models.relationship import Relationship
+    relationships = [instance for instance in instances
+                     if isinstance(instance, Relationship)]
+    stubs = set()
+    for relationship in relationships:
+      stubs.add((relationship.source_type, relationship.source_id))
+      stubs.add((relationship.destination_type, relationship.destination_id))
+    objects = load_instances(stubs)
+    for relationship in relationships:
+      for side in ('source', 'destination'):
+        obj = objects.get((getattr(relationship, side + '_type'),
+                           getattr(relationship, side + '_id')))
+        attr = getattr(relationship, side + '_attr')
+        if obj is not None and hasattr(Relationship, attr) and \
+           attr not in relationship.__dict__:
+          set_committed_value(relationship, attr, obj)
+    # Contexts are loaded by primary key, so the session identity map is
+    # used when the context attributes are accessed.
+    load_instances(('Context', obj.context_id)
+                   for obj in list(objects.values()) + list(instances)
+                   if getattr(obj, 'context_id', None) is not None)
+
+  def allowed_mask_for(self, action, resources):
+    """Check a permission for a list of (type, id, context_id) tuples.
+
+    The result for every resource is equal to ``is_allowed_<action>_for``.
+    Resources that can be checked without conditions are not loaded, the
+    rest are loaded with a single query per type and their conditions are
+    checked one by one.
+    """
+    permissions = self._permissions()
+    mask = [self._check_without_instance(action, resource, permissions)
+            for resource in resources]
+    pending = [resource for resource, allowed in zip(resources, mask)
+               if allowed is None]
+    if pending:
+      instances = load_instances(pending)
+      self._prefetch_relationship_objects(instances.values())
+      record_checks("instances", len(instances))
+      record_checks("conditions", len(pending))
+      for index, allowed in enumerate(mask):
+        if allowed is None:
+          instance = instances.get(resources[index][:2])
+          mask[index] = instance is not None and \
+              bool(self._is_allowed_for(instance, action))
+    record_checks("batches")
+    record_checks("batched", len(mask))
+    return mask
+
   def is_allowed_create(self, resource_type, resource_id, context_id):
     """Whether or not the user is allowed to create a resource of the specified
     type in the context."""
@@ -273,11 +408,13 @@ class DefaultUserPermissions(UserPermissions):
   def is_allowed_read(self, resource_type, resource_id, context_id):
     """Whether or not the user is allowed to read a resource of the specified
     type in the context."""
+    record_checks("single")
     return self._is_allowed(
         Permission('read', resource_type, resource_id, context_id))
 
   def is_allowed_read_for(self, instance):
     """Whether or not the user is allowed to read the given instance"""
+    record_checks("single")
     return self._is_allowed_for(instance, 'read')
 
   def is_allowed_update(self, resource_type, resource_id, context_id):
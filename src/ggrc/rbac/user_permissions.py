@@ -1,6 +1,39 @@
 # Copyright (C) 2017 Google Inc.
 # Licensed under http://www.apache.org/licenses/LICENSE-2.0 <see LICENSE file>
 
+from collections import defaultdict
+
+
+# Number of instances of a single type loaded with a single query.
+LOAD_CHUNK_SIZE = 500
+
+
+def load_instances(resources):
+  """Load instances of resources with a single query per type.
+
+  Args:
+    resources: iterable of tuples starting with (resource_type, resource_id).
+  Returns:
+    dict of (resource_type, resource_id) -> instance for all found instances.
+  """
+  from ggrc.models import get_model
+  ids_by_type = defaultdict(set)
+  for resource in resources:
+    ids_by_type[resource[0]].add(resource[1])
+  instances = {}
+  for resource_type, ids in ids_by_type.iteritems():
+    model = get_model(resource_type)
+    if model is None:
+      continue
+    ids = list(ids)
+    for start in range(0, len(ids), LOAD_CHUNK_SIZE):
+      query = model.query.filter(
+          model.id.in_(ids[start:start + LOAD_CHUNK_SIZE]))
+      for instance in query:
+        instances[(resource_type, instance.id)] = instance
+  return instances
+
+
 class UserPermissions(object):
   """Interface required for extensions providing user rights information for
   role-based access control.
@@ -51,6 +84,39 @@ class UserPermissions(object):
     """
     raise NotImplementedError()
 
+  def allowed_mask(self, action, resources):
+    """Check a permission for multiple resources at once.
+
+    Args:
+      action: One of create, read, update or delete.
+      resources: list of (resource_type, resource_id, context_id) tuples.
+    Returns:
+      list of booleans, True for every resource the user has the permission
+      for, as returned by ``is_allowed_<action>``.
+    """
+    check = getattr(self, "is_allowed_{}".format(action))
+    return [check(*resource) for resource in resources]
+
+  def allowed_mask_for(self, action, resources):
+    """Check a permission for multiple resource instances at once.
+
+    This is the batch version of ``is_allowed_<action>_for``. Instances are
+    loaded with a single query per type and missing instances are not
+    allowed.
+
+    Args:
+      action: One of create, read, update or delete.
+      resources: list of (resource_type, resource_id, context_id) tuples.
+    Returns:
+      list of booleans, one for every resource.
+    """
+    check = getattr(self, "is_allowed_{}_for".format(action))
+    instances = load_instances(resources)
+    return [
+        instance is not None and bool(check(instance))
+        for instance in (instances.get(resource[:2]) for resource in resources)
+    ]
+
   def create_contexts_for(self, resource_type):
     """All contexts in which the user has create permission."""
     raise NotImplementedError()
@@ -6,6 +6,7 @@
 resources.
 """
 
+import base64
 import datetime
 import hashlib
 import itertools
@@ -19,6 +20,7 @@ from urllib import urlencode
 
 from blinker import Namespace
 from flask import url_for, request, current_app, g, has_request_context
+from flask import stream_with_context
 from flask.views import View
 from flask.ext.sqlalchemy import Pagination
 import sqlalchemy.orm.exc
@@ -33,12 +35,14 @@ from ggrc import db, utils
 from ggrc.utils import as_json, benchmark
 from ggrc.fulltext import get_indexer
 from ggrc.fulltext.recordbuilder import fts_record_for
+from ggrc.fulltext.recordbuilder import model_is_indexed
 from ggrc.login import get_current_user_id, get_current_user
 from ggrc.models.cache import Cache
 from ggrc.models.event import Event
-from ggrc.models.revision import Revision
 from ggrc.models.exceptions import ValidationError, translate_message
 from ggrc.rbac import permissions, context_query_filter
+from ggrc.rbac.user_permissions import load_instances
+from ggrc.services import revision_writer
 from ggrc.services.attribute_query import AttributeQueryBuilder
 from ggrc.models.background_task import BackgroundTask, create_task
 from ggrc import settings
@@ -170,6 +174,30 @@ def memcache_mark_for_deletion(context, objects_to_mark):
           get_related_keys_for_expiration(context, o))
 
 
+def memcache_mark_stubs_for_deletion(context, objects_to_mark):
+  """
+  Mark objects created with bulk inserts for deletion from memcache
+
+  Args:
+    context: application context
+    objects_to_mark: A list of ((type, id), log json) pairs
+
+  Returns:
+    None
+  """
+  for (type_, id_), content in objects_to_mark:
+    if type_ not in context.cache_manager.supported_classes:
+      continue
+    context.cache_manager.marked_for_delete.append(get_cache_key((type_, id_)))
+    mappings = context.cache_manager.supported_mappings.get(type_, [])
+    for _, attr, polymorph in mappings:
+      if polymorph:
+        context.cache_manager.marked_for_delete.append(get_cache_key(
+            None,
+            type=content.get('{0}_type'.format(attr)),
+            id=content.get('{0}_id'.format(attr))))
+
+
 def update_memcache_before_commit(context, modified_objects, expiry_time):
   """
   Preparing the memccache entries to be updated before DB commit
@@ -200,6 +228,12 @@ def update_memcache_before_commit(context, modified_objects, expiry_time):
     if len(modified_objects.deleted) > 0:
       memcache_mark_for_deletion(context, modified_objects.deleted.items())
 
+    if len(modified_objects.bulk_new) > 0:
+      memcache_mark_stubs_for_deletion(context,
+                                       modified_objects.bulk_new.items())
+
+  from ggrc.cache.representation import invalidate_local
+  invalidate_local(context.cache_manager.marked_for_delete)
   status_entries = {}
   for key in context.cache_manager.marked_for_delete:
     build_cache_status(status_entries, 'DeleteOp:' + key,
@@ -250,6 +284,10 @@ def update_memcache_after_commit(context):
     #            currently we log errors
     if delete_result is not True:
       logger.error("CACHE: Failed to remove collection from cache")
+    from ggrc.cache.representation import bump_generation
+    from ggrc.cache.representation import invalidate_local
+    invalidate_local(cache_manager.marked_for_delete)
+    bump_generation(cache_manager.cache_object)
 
   status_entries = []
   for key in cache_manager.marked_for_delete:
@@ -261,7 +299,6 @@ def update_memcache_after_commit(context):
     if delete_result is not True:
       logger.error("CACHE: Failed to remove status entries from cache")
 
-  clear_permission_cache()
   cache_manager.clear_cache()
 
 
@@ -310,65 +347,99 @@ def get_modified_objects(session):
     return None
 
 
+def _update_index_sync(cache):
+  """Write fulltext index records for cached objects immediately."""
+  indexer = get_indexer()
+  indexer.create_records(
+      [fts_record_for(obj) for obj in cache.new], commit=False)
+  indexer.update_records(
+      [fts_record_for(obj) for obj in cache.dirty], commit=False)
+  indexer.delete_records(
+      [(obj.__class__.__name__, obj.id) for obj in cache.deleted],
+      commit=False)
+
+
+def _get_bulk_index_keys(cache):
+  """Get full text record keys of indexed objects created in bulk."""
+  keys = set()
+  for type_, id_ in cache.bulk_new:
+    model = ggrc.models.get_model(type_)
+    if model is not None and model_is_indexed(model):
+      keys.add((type_, id_))
+  return keys
+
+
 def update_index(session, cache):
-  """Update fulltext index records for cached objects."""
+  """Update fulltext index records for cached objects.
+
+  Modified objects are added to the fulltext change journal and indexed later
+  by the journal worker, unless FULLTEXT_INDEX_SYNC setting is enabled.
+  """
   if cache:
-    indexer = get_indexer()
-    for obj in cache.new:
-      indexer.create_record(fts_record_for(obj), commit=False)
-    for obj in cache.dirty:
-      indexer.update_record(fts_record_for(obj), commit=False)
-    for obj in cache.deleted:
-      indexer.delete_record(obj.id, obj.__class__.__name__, commit=False)
+    from ggrc.fulltext import journal
+    bulk_keys = _get_bulk_index_keys(cache)
+    if getattr(settings, "FULLTEXT_INDEX_SYNC", False):
+      _update_index_sync(cache)
+      if bulk_keys:
+        journal.reindex_keys(bulk_keys)
+    else:
+      journal.append(itertools.chain(cache.new, cache.dirty, cache.deleted))
+      journal.append_keys(bulk_keys)
     session.commit()
 
 
-def _revision_generator(user_id, action, objects):
-  for obj in objects:
-    yield Revision(obj, user_id, action, obj.log_json())
+def _log_bulk_revisions(event, user_id, objects):
+  """Insert "created" revisions for objects created with bulk inserts.
+
+  Args:
+    event: Flushed event the revisions belong to
+    user_id: ID of the user performing operation
+    objects: dict of (type, id) -> log json of the created objects
+  """
+  revision_writer.insert_rows([
+      revision_writer.get_content_row(
+          event.id, user_id, "created", type_, id_, content)
+      for (type_, id_), content in objects.iteritems()
+  ])
 
 
-def _get_log_revisions(current_user_id, obj=None, force_obj=False):
-  """Generate and return revisions for all cached objects."""
-  revisions = []
+def _get_log_objects(obj=None, force_obj=False):
+  """Get (action, object) pairs of all cached objects that need revisions."""
   cache = get_cache()
   if not cache:
-    return revisions
+    return []
+  log_objects = []
   all_edited_objects = itertools.chain(cache.new, cache.dirty, cache.deleted)
   owner_modified_objects = [o.ownable for o in all_edited_objects
                             if o.type == "ObjectOwner" and o.ownable]
-  revisions.extend(_revision_generator(
-      current_user_id, "created", cache.new
-  ))
-  revisions.extend(_revision_generator(
-      current_user_id, "modified", cache.dirty
-  ))
-  revisions.extend(_revision_generator(
-      current_user_id, "modified", owner_modified_objects
-  ))
+  log_objects.extend(("created", o) for o in cache.new)
+  log_objects.extend(("modified", o) for o in cache.dirty)
+  log_objects.extend(("modified", o) for o in owner_modified_objects)
   if force_obj and obj is not None and obj not in cache.dirty:
     # If the ``obj`` has been updated, but only its custom attributes have
     # been changed, then this object will not be added into
     # ``cache.dirty set``. So that its revision will not be created.
     # The ``force_obj`` flag solves the issue, but in a bit dirty way.
-    revision = Revision(obj, current_user_id, 'modified', obj.log_json())
-    revisions.append(revision)
-  revisions.extend(_revision_generator(
-      current_user_id, "deleted", cache.deleted
-  ))
-  return revisions
+    log_objects.append(("modified", obj))
+  log_objects.extend(("deleted", o) for o in cache.deleted)
+  return log_objects
 
 
 def log_event(session, obj=None, current_user_id=None, flush=True,
-              force_obj=False):
+              force_obj=False, deferred=False):
   """Logs an event on object `obj`.
 
+  Revisions are inserted with revision_writer right away, so the event is
+  flushed.
+
   Args:
     session: Current SQLAlchemy session (db.session)
     obj: object on which some operation took place
     current_user_id: ID of the user performing operation
     flush: If set to true, flush the session at the start
     force_obj: Used in case of custom attribute changes to force revision write
+    deferred: If set, revisions of created and modified objects are computed
+      after the commit by the revision writer worker
   Returns:
     Uncommitted models.Event instance
   """
@@ -377,7 +448,9 @@ def log_event(session, obj=None, current_user_id=None, flush=True,
     session.flush()
   if current_user_id is None:
     current_user_id = get_current_user_id()
-  revisions = _get_log_revisions(current_user_id, obj=obj, force_obj=force_obj)
+  log_objects = _get_log_objects(obj=obj, force_obj=force_obj)
+  cache = get_cache()
+  bulk_new = cache.bulk_new if cache else {}
   if obj is None:
     resource_id = 0
     resource_type = None
@@ -388,35 +461,34 @@ def log_event(session, obj=None, current_user_id=None, flush=True,
     resource_type = str(obj.__class__.__name__)
     action = request.method
     context_id = obj.context_id
-  if revisions:
+  if log_objects or bulk_new:
     event = Event(
         modified_by_id=current_user_id,
         action=action,
         resource_id=resource_id,
         resource_type=resource_type,
         context_id=context_id)
-    event.revisions = revisions
     session.add(event)
+    session.flush()
+    logged_json = {}
+    if cache:
+      logged_json.update(cache.new)
+      logged_json.update(cache.dirty)
+    revision_writer.write(event, current_user_id, log_objects,
+                          deferred=deferred, logged_json=logged_json)
+    if bulk_new:
+      _log_bulk_revisions(event, current_user_id, bulk_new)
   return event
 
 
-def clear_permission_cache():
-  if not getattr(settings, 'MEMCACHE_MECHANISM', False):
-    return
-  cache = _get_cache_manager().cache_object.memcache_client
-  cached_keys_set = cache.get('permissions:list') or set()
-  cached_keys_set.add('permissions:list')
-  # We delete all the cached user permissions as well as
-  # the permissions:list value itself
-  cache.delete_multi(cached_keys_set)
-
-
 class ModelView(View):
   """Basic view handler for all models"""
   # pylint: disable=protected-access
   # access to _sa_class_manager is needed for fetching the right mapper
   DEFAULT_PAGE_SIZE = 20
   MAX_PAGE_SIZE = 100
+  # Number of objects published at once in streamed collection responses.
+  COLLECTION_CHUNK_SIZE = 100
   pk = 'id'
   pk_type = 'int'
 
@@ -562,12 +634,12 @@ class ModelView(View):
       query = query.filter(filter_)
 
     if filter_by_contexts:
-      contexts = permissions.read_contexts_for(self.model.__name__)
+      from ggrc.utils.permission_filter import get_permission_filter
+      filter_expr = get_permission_filter(
+          self.model.__name__, self.model.id, self.model.context_id)
+      if filter_expr is not None:
+        query = query.filter(filter_expr)
       resources = permissions.read_resources_for(self.model.__name__)
-      filter_expr = context_query_filter(self.model.context_id, contexts)
-      if resources:
-        filter_expr = or_(filter_expr, self.model.id.in_(resources))
-      query = query.filter(filter_expr)
       for j in joinlist:
         j_class = j.property.mapper.class_
         j_contexts = permissions.read_contexts_for(j_class.__name__)
@@ -1066,10 +1138,44 @@ class Resource(ModelView):
     }
     return matches, collection_extras
 
+  def apply_cursor_paging(self, matches_query):
+    """Get the page of matches after the position of the `__cursor` argument.
+
+    Matches are ordered by id and the page is selected with `id > last_id`
+    instead of OFFSET, so every page costs the same regardless of its
+    position, and no count query is needed. An empty `__cursor` selects the
+    first page. The `next` link holds the cursor of the following page and
+    is omitted on the last page.
+    """
+    if '__sort' in request.args or '__limit' in request.args:
+      raise BadRequest(
+          'The __cursor query parameter can not be used with __sort or '
+          '__limit.')
+    page_size = min(
+        int(request.args.get('__page_size', self.DEFAULT_PAGE_SIZE)),
+        self.MAX_PAGE_SIZE)
+    last_id = decode_cursor(request.args['__cursor'])
+    query = matches_query.order_by(None).order_by(self.model.id)
+    if last_id is not None:
+      query = query.filter(self.model.id > last_id)
+    # One extra match is selected to check if there is a next page.
+    matches = query.limit(page_size + 1).all()
+    paging = {}
+    if len(matches) > page_size:
+      matches = matches[:page_size]
+      args = dict([(k, unicode(v)) for k, v in request.args.items()])
+      args['__cursor'] = encode_cursor(matches[-1][0])
+      paging['next'] = self.url_for() + '?' + urlencode(
+          utils.encoded_dict(args))
+    return matches, {'paging': paging}
+
   def get_matched_resources(self, matches):
     cache_objs = {}
     if self.has_cache():
+      from ggrc.cache.representation import RepresentationCache
       self.request.cache_manager = _get_cache_manager()
+      self.request.representation_cache = RepresentationCache(
+          self.request.cache_manager.cache_object)
       with benchmark("Query cache for resources"):
         cache_objs = self.get_resources_from_cache(matches)
       database_matches = [m for m in matches if m not in cache_objs]
@@ -1078,7 +1184,7 @@ class Resource(ModelView):
 
     database_objs = {}
     if len(database_matches) > 0:
-      database_objs = self.get_resources_from_database(matches)
+      database_objs = self.get_resources_from_database(database_matches)
       if self.has_cache():
         with benchmark("Add resources to cache"):
           self.add_resources_to_cache(database_objs)
@@ -1106,103 +1212,166 @@ class Resource(ModelView):
       matches_query = self.get_collection_matches(
           self.model, filter_by_contexts)
     with benchmark("dispatch_request > collection_get > Query Data"):
-      if '__page' in request.args or '__page_only' in request.args:
+      if '__cursor' in request.args:
+        with benchmark("Query matches with cursor paging"):
+          matches, extras = self.apply_cursor_paging(matches_query)
+      elif '__page' in request.args or '__page_only' in request.args:
         with benchmark("Query matches with paging"):
           matches, extras = self.apply_paging(matches_query)
       else:
         with benchmark("Query matches"):
           matches = matches_query.all()
           extras = {}
-    with benchmark("dispatch_request > collection_get > Matched resources"):
-      cache_op = None
-      if '__stubs_only' in request.args:
-        objs = [{
-            'id': m[0],
-            'type': m[1],
-            'href': utils.url_for(m[1], id=m[0]),
-            'context_id': m[2]
-        } for m in matches]
+    with benchmark("dispatch_request > collection_get > Create Response"):
+      collection_etag = self.collection_etag(matches, extras)
+      if self.request.headers.get('If-None-Match') == collection_etag:
+        return current_app.make_response((
+            '', 304, [('Etag', collection_etag)]))
+      headers = [
+          ('Last-Modified',
+           self.http_timestamp(self.collection_last_modified())),
+          ('Etag', collection_etag),
+          ('Content-Type', 'application/json'),
+      ]
+      objects = self.generate_collection_objects(matches)
+      # The first chunk is published before the response is started, so
+      # errors of permission checks, queries and publishing are reported
+      # with an error status instead of a truncated 200 response.
+      first_chunk = list(itertools.islice(objects,
+                                          self.COLLECTION_CHUNK_SIZE))
+      return current_app.response_class(
+          stream_with_context(self.generate_collection_json(
+              itertools.chain(first_chunk, objects), extras=extras)),
+          200,
+          headers,
+      )
 
-      else:
-        cache_objs, database_objs = self.get_matched_resources(matches)
+  def collection_etag(self, matches, extras=None):
+    """Get the ETag of a collection response without building its body.
+
+    The ETag is derived from the latest updated_at and the number of the
+    matched objects, and a fingerprint of the request made of the query
+    arguments, the paging extras and the current user, whose permissions
+    filter the published objects.
+    """
+    last_updated = max([getattr(match, 'updated_at', None)
+                        for match in matches] or [None])
+    fingerprint = (
+        self.model.__name__,
+        sorted(request.args.items(multi=True)),
+        as_json(extras or {}, sort_keys=True),
+        get_current_user_id(),
+    )
+    return etag((last_updated, len(matches), fingerprint))
+
+  def generate_collection_objects(self, matches):
+    """Generate published and permission filtered objects for matches.
+
+    Matches are published in chunks, so only the objects of a single chunk
+    are held in memory.
+    """
+    if '__stubs_only' in request.args:
+      for match in matches:
+        yield {
+            'id': match[0],
+            'type': match[1],
+            'href': utils.url_for(match[1], id=match[0]),
+            'context_id': match[2]
+        }
+      return
+    # Return custom fields specified via `__fields=id,title,description` etc.
+    # TODO this can be optimized by filter_resource() not retrieving
+    # the other fields to being with
+    custom_fields = None
+    if '__fields' in request.args:
+      custom_fields = request.args['__fields'].split(',')
+    resource_filter = ResourceFilter()
+    for start in range(0, len(matches), self.COLLECTION_CHUNK_SIZE):
+      chunk = matches[start:start + self.COLLECTION_CHUNK_SIZE]
+      with benchmark("Matched resources for a chunk"):
+        cache_objs, database_objs = self.get_matched_resources(chunk)
         objs = {}
         objs.update(cache_objs)
         objs.update(database_objs)
+        objs = [objs[m] for m in chunk if m in objs]
+      with benchmark("Filter resources based on permissions"):
+        objs = resource_filter.filter(objs)
+      for obj in objs:
+        if custom_fields is not None:
+          obj = {f: obj[f] for f in custom_fields if f in obj}
+        yield obj
 
-        objs = [objs[m] for m in matches if m in objs]
-        with benchmark("Filter resources based on permissions"):
-          objs = filter_resource(objs)
+  def generate_collection_json(self, objects, extras=None):
+    """Generate the JSON of a collection response piece by piece.
 
-        cache_op = 'Hit' if len(cache_objs) > 0 else 'Miss'
-    with benchmark("dispatch_request > collection_get > Create Response"):
-      # Return custom fields specified via `__fields=id,title,description` etc.
-      # TODO this can be optimized by filter_resource() not retrieving
-      # the other fields to being with
-      if '__fields' in request.args:
-        custom_fields = request.args['__fields'].split(',')
-        objs = [{f: o[f] for f in custom_fields if f in o} for o in objs]
-      with benchmark("Serialize collection"):
-        collection = self.build_collection_representation(
-            objs, extras=extras)
-
-      if 'If-None-Match' in self.request.headers and \
-         self.request.headers['If-None-Match'] == etag(collection):
-        return current_app.make_response((
-            '', 304, [('Etag', etag(collection))]))
+    Every object is serialized as soon as it is published. If publishing
+    fails after the response was started, the collection is closed without
+    extras and the response gets a top level "error" member instead, so
+    clients can tell the incomplete collection from a complete one.
 
-      with benchmark("Make response"):
-        return self.json_success_response(
-            collection, self.collection_last_modified(), cache_op=cache_op)
+    Args:
+      objects: iterable of published objects, see
+        generate_collection_objects.
+      extras: dict of additional collection members, e.g. paging links.
+    """
+    table_plural = self.model._inflector.table_plural
+    collection_name = '{0}_collection'.format(table_plural)
+    yield '{{{0}: {{"selfLink": {1}, {2}: ['.format(
+        self.as_json(collection_name),
+        self.as_json(self.url_for_preserving_querystring()),
+        self.as_json(table_plural),
+    )
+    separator = ''
+    try:
+      for obj in objects:
+        yield separator + self.as_json(obj)
+        separator = ', '
+    except Exception:  # pylint: disable=broad-except
+      logger.exception("Failed to stream the %s collection", table_plural)
+      yield ']}, "error": {"status": 500, "message": "Internal Server Error"}}'
+      return
+    yield ']'
+    for key, value in (extras or {}).items():
+      yield ', {0}: {1}'.format(self.as_json(key), self.as_json(value))
+    yield '}}'
+
+  @staticmethod
+  def _get_cache_keys(matches):
+    """Get a dict of cache key -> (match, updated_at) for matches."""
+    return {
+        get_cache_key(None, id=match[0], type=match[1]):
+            (match, getattr(match, 'updated_at', None))
+        for match in matches
+    }
 
   def get_resources_from_cache(self, matches):
     """Get resources from cache for specified matches"""
-    resources = {}
     # Disable caching for background tasks
     # Setting background task status circumvents our memcache
     # invalidation logic so we have to disabling memcache.
     if self.model.__name__ == 'BackgroundTask':
-      return resources
-    # Skip right to memcache
-    memcache_client = self.request.cache_manager.cache_object.memcache_client
-    key_matches = {}
-    keys = []
-    for match in matches:
-      key = get_cache_key(None, id=match[0], type=match[1])
-      key_matches[key] = match
-      keys.append(key)
-    while len(keys) > 0:
-      slice_keys = keys[:32]
-      keys = keys[32:]
-      result = memcache_client.get_multi(slice_keys)
-      for key in result:
-        if 'selfLink' in result[key]:
-          resources[key_matches[key]] = result[key]
-    return resources
+      return {}
+    from ggrc.cache.representation import get_include_key
+    key_matches = self._get_cache_keys(matches)
+    result = self.request.representation_cache.get(
+        self.model.__name__,
+        {key: updated_at for key, (_, updated_at) in key_matches.items()},
+        get_include_key(request.args.get('__include')),
+    )
+    return {key_matches[key][0]: obj for key, obj in result.items()}
 
   def add_resources_to_cache(self, match_obj_pairs):
     """Add resources to cache if they are not blocked by DeleteOp entries"""
-    # Skip right to memcache
-    memcache_client = self.request.cache_manager.cache_object.memcache_client
-    key_objs = {}
-    key_blockers = {}
-    keys = []
-    for match, obj in match_obj_pairs.items():
-      key = get_cache_key(None, id=match[0], type=match[1])
-      delete_op_key = "DeleteOp:{}".format(key)
-      keys.append(key)
-      key_objs[key] = obj
-      key_blockers[key] = delete_op_key
-    while len(keys) > 0:
-      slice_keys = keys[:32]
-      keys = keys[32:]
-      blocker_keys = [key_blockers[slice_key] for slice_key in slice_keys]
-      result = memcache_client.get_multi(blocker_keys)
-      # Reduce `slice_keys` to only unblocked keys
-      slice_keys = [
-          slice_key for slice_key in slice_keys
-          if key_blockers[slice_key] not in result]
-      memcache_client.add_multi(
-          {key: key_objs[key] for key in slice_keys})
+    if self.model.__name__ == 'BackgroundTask':
+      return
+    from ggrc.cache.representation import get_include_key
+    key_matches = self._get_cache_keys(match_obj_pairs.keys())
+    self.request.representation_cache.add(
+        {key: updated_at for key, (_, updated_at) in key_matches.items()},
+        {key: match_obj_pairs[match]
+         for key, (match, _) in key_matches.items()},
+        get_include_key(request.args.get('__include')),
+    )
 
   def json_create(self, obj, src):
     ggrc.builder.json.create(obj, src)
@@ -1581,19 +1750,6 @@ class Resource(ModelView):
       ggrc.builder.json.publish_representation(resources)
     return resources
 
-  def build_collection_representation(self, objs, extras=None):
-    table_plural = self.model._inflector.table_plural
-    collection_name = '{0}_collection'.format(table_plural)
-    resource = {
-        collection_name: {
-            'selfLink': self.url_for_preserving_querystring(),
-            table_plural: objs,
-        }
-    }
-    if extras:
-      resource[collection_name].update(extras)
-    return resource
-
   def object_for_json(self, obj, model_name=None, properties_to_include=None):
     model_name = model_name or self.model._inflector.table_singular
     json_obj = ggrc.builder.json.publish(
@@ -1646,85 +1802,178 @@ class ReadOnlyResource(Resource):
       raise NotImplementedError()
 
 
-def filter_resource(resource, depth=0, user_permissions=None):  # noqa
-  """
-  Returns:
-     The subset of resources which are readable based on user_permissions
+def _get_context_id(resource):
+  """Get the context id of a published resource or False if it has none."""
+  if 'context' in resource:
+    if resource['context'] is None:
+      return None
+    return resource['context']['id']
+  return resource.get('context_id', False)
+
+
+def _typed_values(resource):
+  """Get keys and values of typed sub-resources of a published resource."""
+  # Explicitly allow `context` objects to pass through
+  return [(key, value) for key, value in resource.items()
+          if key != 'context' and isinstance(value, dict) and 'type' in value]
+
+
+class ResourceFilter(object):
+  """Read permission filter for published resources.
+
+  The read permissions of all objects in the resources are checked in a
+  single batch before the resources are filtered, instead of checking the
+  objects one by one while walking the resources.
+
+  Args:
+    user_permissions: Permissions to check, the permissions of the current
+      user by default.
   """
 
-  if user_permissions is None:
-    user_permissions = permissions.permissions_for(get_current_user())
-
-  if isinstance(resource, (list, tuple)):
-    filtered = []
-    for sub_resource in resource:
-      filtered_sub_resource = filter_resource(
-          sub_resource, depth=depth + 1, user_permissions=user_permissions)
-      if filtered_sub_resource is not None:
-        filtered.append(filtered_sub_resource)
-    return filtered
-  elif isinstance(resource, dict) and 'type' in resource:
-    # First check current level
-    context_id = False
-    if 'context' in resource:
-      if resource['context'] is None:
-        context_id = None
+  def __init__(self, user_permissions=None):
+    if user_permissions is None:
+      user_permissions = permissions.permissions_for(get_current_user())
+    self.user_permissions = user_permissions
+    self.is_creator = _is_creator()
+    # id of a published object -> whether it can be read
+    self._allowed = {}
+    # type -> (context ids, resource ids) readable by the user
+    self._read_sets = {}
+
+  def _collect(self, resource, nodes):
+    """Collect all published objects of resources."""
+    if isinstance(resource, (list, tuple)):
+      for sub_resource in resource:
+        self._collect(sub_resource, nodes)
+    elif isinstance(resource, dict) and 'type' in resource:
+      nodes.append(resource)
+      for _, value in _typed_values(resource):
+        self._collect(value, nodes)
+
+  def _check_revisions(self, revisions):
+    """Check read permissions for the objects of revisions."""
+    # Revision stubs do not contain the revisioned object and are not shown.
+    keys = {id(revision): (revision.get('resource_type'),
+                           revision.get('resource_id'))
+            for revision in revisions}
+    instances = load_instances(key for key in keys.itervalues()
+                               if key[0] is not None)
+    stubs = [(key[0], key[1], getattr(instance, 'context_id', None))
+             for key, instance in instances.iteritems()]
+    allowed = dict(zip(
+        [stub[:2] for stub in stubs],
+        self.user_permissions.allowed_mask_for('read', stubs)))
+    for node_id, key in keys.iteritems():
+      self._allowed[node_id] = allowed.get(key, False)
+
+  def _check(self, nodes):
+    """Check read permissions of all published objects in a batch."""
+    # Results are stored by ids of the dicts, which are only unique while
+    # the checked resources exist.
+    self._allowed = {}
+    revisions = []
+    objects = []
+    for node in nodes:
+      if self.is_creator and node['type'] == "Relationship":
+        # Checked when the resources are filtered, see _can_read_relationship
+        continue
+      elif self.is_creator and node['type'] == "Revision":
+        revisions.append(node)
+      elif _get_context_id(node) is not False:
+        objects.append(node)
+    mask = self.user_permissions.allowed_mask('read', [
+        (node['type'], node['id'], _get_context_id(node)) for node in objects
+    ])
+    for node, allowed in zip(objects, mask):
+      self._allowed[id(node)] = allowed
+    if revisions:
+      self._check_revisions(revisions)
+
+  def _get_read_sets(self, resource_type):
+    """Get contexts and resources of a type the user can read.
+
+    Returns:
+      tuple of context ids and resource ids or None if the user can read all
+      objects of the type.
+    """
+    if resource_type not in self._read_sets:
+      contexts = permissions.read_contexts_for(resource_type)
+      if contexts is None:
+        # read_contexts_for returns None if the user has access to all the
+        # objects of this type. If the user doesn't have access to any object
+        # an empty list ([]) will be returned
+        self._read_sets[resource_type] = None
       else:
-        context_id = resource['context']['id']
-    elif 'context_id' in resource:
-      context_id = resource['context_id']
-    assert context_id is not False, "No context found for object"
-
-    # In order to avoid loading full instances and using is_allowed_read_for,
-    # we are making a special test for the Creator here. Creator can only
-    # see relationship objects where he has read access on both source and
-    # destination. This is defined in Creator.py:220 file, but is_allowed_read
-    # can not check conditions without the full instance
-    if resource['type'] == "Relationship" and _is_creator():
-      # Make a check for relationship objects that are a special case
-      can_read = True
-      for name in ('source', 'destination'):
-        inst = resource[name]
-        if not inst:
-          # If object was deleted but relationship still exists
-          continue
-        contexts = permissions.read_contexts_for(inst['type'])
-        if contexts is None:
-          # read_contexts_for returns None if the user has access to all the
-          # objects of this type. If the user doesn't have access to any object
-          # an empty list ([]) will be returned
-          continue
-        resources = permissions.read_resources_for(inst['type']) or []
-        if inst['context_id'] in contexts or inst['id'] in resources:
-          continue
-        can_read = False
-      if not can_read:
-        return None
-    elif resource['type'] == "Revision" and _is_creator():
-      # Make a check for revision objects that are a special case
-      res_model = getattr(ggrc.models.all_models, resource['resource_type'])
-      instance = res_model.query.get(resource['resource_id'])
-      if instance is None or\
-         not user_permissions.is_allowed_read_for(instance):
+        resources = permissions.read_resources_for(resource_type) or []
+        self._read_sets[resource_type] = (set(contexts), set(resources))
+    return self._read_sets[resource_type]
+
+  def _can_read_relationship(self, resource):
+    """Check if a Creator can read a relationship.
+
+    In order to avoid loading full instances and using is_allowed_read_for,
+    we are making a special test for the Creator here. Creator can only see
+    relationship objects where he has read access on both source and
+    destination. This is defined in Creator.py:220 file, but is_allowed_read
+    can not check conditions without the full instance
+    """
+    for name in ('source', 'destination'):
+      inst = resource[name]
+      if not inst:
+        # If object was deleted but relationship still exists
+        continue
+      read_sets = self._get_read_sets(inst['type'])
+      if read_sets is None:
+        continue
+      contexts, resources = read_sets
+      if inst['context_id'] in contexts or inst['id'] in resources:
+        continue
+      return False
+    return True
+
+  def _filter(self, resource):
+    """Remove objects that can not be read from checked resources."""
+    if isinstance(resource, (list, tuple)):
+      filtered = []
+      for sub_resource in resource:
+        filtered_sub_resource = self._filter(sub_resource)
+        if filtered_sub_resource is not None:
+          filtered.append(filtered_sub_resource)
+      return filtered
+    elif isinstance(resource, dict) and 'type' in resource:
+      # First check current level
+      assert _get_context_id(resource) is not False, \
+          "No context found for object"
+      if self.is_creator and resource['type'] == "Relationship":
+        if not self._can_read_relationship(resource):
+          return None
+      elif not self._allowed.get(id(resource)):
         return None
+      # Then, filter any typed keys
+      for key, value in _typed_values(resource):
+        resource[key] = self._filter(value)
+      return resource
     else:
-      if not user_permissions.is_allowed_read(resource['type'],
-                                              resource['id'], context_id):
-        return None
-    # Then, filter any typed keys
-    for key, value in resource.items():
-      if key == 'context':
-        # Explicitly allow `context` objects to pass through
-        pass
-      else:
-        # Apply filtering to sub-resources
-        if isinstance(value, dict) and 'type' in value:
-          resource[key] = filter_resource(
-              value, depth=depth + 1, user_permissions=user_permissions)
+      assert False, "Non-object passed to filter_resource"
 
-    return resource
-  else:
-    assert False, "Non-object passed to filter_resource"
+  def filter(self, resource):
+    """Get the subset of resources which are readable.
+
+    Args:
+      resource: Published object or a list of published objects.
+    """
+    nodes = []
+    self._collect(resource, nodes)
+    self._check(nodes)
+    return self._filter(resource)
+
+
+def filter_resource(resource, user_permissions=None):
+  """
+  Returns:
+     The subset of resources which are readable based on user_permissions
+  """
+  return ResourceFilter(user_permissions).filter(resource)
 
 
 def _is_creator():
@@ -1747,3 +1996,21 @@ def etag(last_modified):
       the same etag due to two updates performed in rapid succession.
   """
   return '"{0}"'.format(hashlib.sha1(str(last_modified)).hexdigest())
+
+
+def encode_cursor(last_id):
+  """Get an opaque collection cursor pointing after the given id."""
+  return base64.urlsafe_b64encode("id:{}".format(last_id))
+
+
+def decode_cursor(cursor):
+  """Get the last id of a collection cursor or None for an empty cursor."""
+  if not cursor:
+    return None
+  try:
+    prefix, last_id = base64.urlsafe_b64decode(str(cursor)).split(":", 1)
+    if prefix != "id":
+      raise ValueError(prefix)
+    return int(last_id)
+  except (TypeError, ValueError):
+    raise BadRequest("Invalid __cursor value.")
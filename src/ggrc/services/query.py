@@ -9,11 +9,13 @@ from wsgiref.handlers import format_date_time
 from flask import request
 from flask import current_app
 from werkzeug.exceptions import BadRequest
+from werkzeug.exceptions import Forbidden
 
 from ggrc.converters.query_helper import BadQueryException
 from ggrc.services.query_helper import QueryAPIQueryHelper
 from ggrc.login import login_required
 from ggrc.models.inflector import get_model
+from ggrc.rbac import permissions
 from ggrc.services.common import etag
 from ggrc.utils import as_json
 
@@ -56,17 +58,25 @@ def http_timestamp(timestamp):
 
 
 def get_objects_by_query():
-  """Return objects corresponding to a POST'ed query list."""
+  """Return objects corresponding to a POST'ed query list.
+
+  With the "explain" request argument the generated SQL and the timings of
+  each query are added to the results. Explain mode is available to admins
+  only.
+  """
   query = request.json
+  explain = bool(request.args.get("explain"))
+  if explain and not permissions.is_admin():
+    raise Forbidden()
 
-  query_helper = QueryAPIQueryHelper(query, ca_disabled=True)
+  query_helper = QueryAPIQueryHelper(query, ca_disabled=True, explain=explain)
   results = query_helper.get_results()
 
   last_modified_list = [result["last_modified"] for result in results
                         if result["last_modified"]]
   last_modified = max(last_modified_list) if last_modified_list else None
   collections = []
-  collection_fields = ["ids", "values", "count", "total"]
+  collection_fields = ["ids", "values", "count", "total", "explain"]
 
   for result in results:
     if last_modified is None:
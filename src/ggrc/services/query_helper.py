@@ -3,8 +3,16 @@
 
 """This module contains special query helper class for query API."""
 
+import time
+
+import sqlalchemy as sa
+from sqlalchemy.orm.attributes import InstrumentedAttribute
+from sqlalchemy.orm.properties import ColumnProperty
+
+from ggrc import db
 from ggrc.builder import json
 from ggrc.converters.query_helper import QueryHelper
+from ggrc.models.reflection import AttributeInfo
 from ggrc.utils import benchmark
 
 
@@ -31,7 +39,20 @@ class QueryAPIQueryHelper(QueryHelper):
       ids: [ ids of filtered objects ] (present if type is "ids")
       count: the number of objects filtered, after "limit" is applied
       total: the number of objects filtered, before "limit" is applied
+      explain: the executed SQL and timings (present in explain mode)
+    }
+  ]
+
+  "count" queries select only the number of objects. "values" queries with
+  "fields" that are all published columns select only those columns instead
+  of loading and publishing whole objects.
   """
+
+  def __init__(self, query, ca_disabled=False, explain=False):
+    super(QueryAPIQueryHelper, self).__init__(query, ca_disabled, explain)
+    # (count, total) of batched count queries, by id() of the object query
+    self._batched_counts = {}
+
   def get_results(self):
     """Filter the objects and get their information.
 
@@ -47,8 +68,24 @@ class QueryAPIQueryHelper(QueryHelper):
       if query_type not in {"values", "ids", "count"}:
         raise NotImplementedError("Only 'values', 'ids' and 'count' queries "
                                   "are supported now")
+    self._batch_counts()
+    self._batch_ids()
+    for object_query in self.query:
+      query_type = object_query.get("type", "values")
       model = self.object_map[object_query["object_name"]]
-      if query_type == "values":
+      columns = self._get_field_columns(model, object_query.get("fields"))
+      if query_type == "count":
+        with benchmark("Get result set: get_results -> _get_count"):
+          object_query["count"] = self._get_count(object_query)
+        object_query["last_modified"] = None  # synonymous to now()
+      elif query_type == "values" and columns is not None:
+        with benchmark("Get result set: get_results > _get_field_values"):
+          values, last_modified = self._get_field_values(
+              object_query, model, columns)
+        object_query["count"] = len(values)
+        object_query["last_modified"] = last_modified
+        object_query["values"] = values
+      elif query_type == "values":
         with benchmark("Get result set: get_results > _get_objects"):
           objects = self._get_objects(object_query)
         object_query["count"] = len(objects)
@@ -65,10 +102,130 @@ class QueryAPIQueryHelper(QueryHelper):
           ids = self._get_ids(object_query)
         object_query["count"] = len(ids)
         object_query["last_modified"] = None  # synonymous to now()
-        if query_type == "ids":
-          object_query["ids"] = ids
+        object_query["ids"] = ids
     return self.query
 
+  def _is_batchable(self, object_query):
+    """Count queries are batched separately by _batch_counts."""
+    return (object_query.get("type", "values") != "count" and
+            super(QueryAPIQueryHelper, self)._is_batchable(object_query))
+
+  def _is_countable(self, object_query):
+    """Check if a count query can be counted with other count queries."""
+    expression = object_query.get("filters", {}).get("expression")
+    return (object_query.get("type", "values") == "count" and
+            expression is not None and
+            self._is_independent(expression))
+
+  def _get_limited_count(self, object_query, total):
+    """Get the number of objects in the limit window of an object query."""
+    limit = object_query.get("limit")
+    if not limit:
+      return total
+    first, last = self._parse_limit(limit)
+    return max(0, min(last, total) - first)
+
+  def _batch_counts(self):
+    """Count objects of all independent count queries with one statement.
+
+    Every count is a scalar subquery of a single SELECT.
+    """
+    batch = [object_query for object_query in self.query
+             if self._is_countable(object_query)]
+    if len(batch) < 2:
+      return
+    counts = []
+    build_times = []
+    for index, object_query in enumerate(batch):
+      start = time.time()
+      counts.append(self._count_query(object_query).as_scalar().label(
+          "count_{}".format(index)))
+      build_times.append(time.time() - start)
+      self._clear_similar_objects_query()
+    statement = sa.select(counts)
+    start = time.time()
+    with benchmark("Get batched counts: _batch_counts"):
+      totals = db.session.execute(statement).first()
+    execution_time = time.time() - start
+    for object_query, total, build_time in zip(batch, totals, build_times):
+      self._batched_counts[id(object_query)] = total
+      self._explain(object_query, statement, build_time, execution_time,
+                    batch_size=len(batch))
+
+  def _get_count(self, object_query):
+    """Get the number of objects of a count query with a single COUNT.
+
+    Sets "total" of the object query to the number of objects before "limit"
+    is applied and returns the number of objects after it is applied.
+    """
+    total = self._batched_counts.pop(id(object_query), None)
+    if total is None:
+      start = time.time()
+      query = self._count_query(object_query)
+      build_time = time.time() - start
+      if query is None:
+        return 0
+      start = time.time()
+      total = query.scalar()
+      self._explain(object_query, query.statement, build_time,
+                    time.time() - start)
+      self._clear_similar_objects_query()
+    object_query["total"] = total
+    return self._get_limited_count(object_query, total)
+
+  @staticmethod
+  def _get_field_columns(model, fields):
+    """Get published columns of the requested fields.
+
+    Returns:
+      dict of field name -> column attribute, where "type" maps to None, or
+      None if any field is not a published column of the model.
+    """
+    if not fields or model.__mapper__.polymorphic_on is not None:
+      return None
+    published = {getattr(attr, "attr_name", attr)
+                 for attr in AttributeInfo.gather_publish_attrs(model)}
+    columns = {}
+    for field in fields:
+      if field == "type" and field in published:
+        columns[field] = None
+        continue
+      attr = getattr(model, field, None) if field in published else None
+      if not isinstance(attr, InstrumentedAttribute) or \
+         not isinstance(attr.property, ColumnProperty) or attr.key != field:
+        # hybrid properties, like Revision.content, publish computed values
+        return None
+      columns[field] = attr
+    return columns
+
+  def _get_field_values(self, object_query, model, columns):
+    """Select requested fields of filtered objects without loading them.
+
+    Returns:
+      (values, last_modified) tuple of field dicts ordered as the ids of the
+      objects and the time of the last update of an object.
+    """
+    ids = self._get_ids(object_query)
+    if not ids:
+      return [], None
+    names = [name for name, column in columns.iteritems()
+             if column is not None and name != "id"]
+    if hasattr(model, "updated_at") and "updated_at" not in names:
+      names.append("updated_at")
+    query = db.session.query(
+        model.id, *[getattr(model, name) for name in names]
+    ).filter(model.id.in_(ids))
+    rows = {row[0]: dict(zip(names, row[1:]), id=row[0]) for row in query}
+    rows = [rows[id_] for id_ in ids]
+    last_modified = None
+    if rows and "updated_at" in names:
+      last_modified = max(row["updated_at"] for row in rows)
+    values = [{
+        field: model.__name__ if field == "type" else row[field]
+        for field in columns
+    } for row in rows]
+    return values, last_modified
+
   @staticmethod
   def _transform_to_json(objects, fields=None):
     """Make a JSON representation of objects from the list."""
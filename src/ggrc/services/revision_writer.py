@@ -0,0 +1,304 @@
+# Copyright (C) 2017 Google Inc.
+# Licensed under http://www.apache.org/licenses/LICENSE-2.0 <see LICENSE file>
+
+"""Bulk writer of revisions for logged events.
+
+The log JSON of modified objects is serialized in batches. Deferred columns,
+relationships and custom attribute definitions used by log_json are loaded
+with a few queries per batch instead of lazily for every object. Revisions
+are inserted with executemany in chunks instead of flushing Revision objects
+through the unit of work.
+
+In deferred mode created and modified revisions are only recorded in the
+pending revisions journal, and a worker computes and inserts them after the
+commit. Pending revisions of deleted objects are inserted before their
+deleted revisions, so the deleted revision stays the latest one.
+"""
+
+from collections import defaultdict
+from logging import getLogger
+
+from sqlalchemy.sql.expression import tuple_
+
+from ggrc import db
+from ggrc.models.custom_attribute_definition import CustomAttributeDefinition
+from ggrc.models.mixins.customattributable import CustomAttributable
+from ggrc.models.mixins.customattributable import preloaded_log_definitions
+from ggrc.models.revision import Revision
+from ggrc.models.types import CompressedJsonType
+from ggrc.utils import benchmark
+
+
+# pylint: disable=invalid-name
+logger = getLogger(__name__)
+
+# Number of objects serialized with a single preload.
+BATCH_SIZE = 500
+# Number of revision rows in a single executemany statement.
+CHUNK_SIZE = 1000
+
+
+class PendingRevision(db.Model):
+  """A revision that has to be computed and inserted by the worker.
+
+  The content holds the log JSON recorded before the flush, that is used if
+  the object does not exist anymore when the revision is computed.
+  """
+  # pylint: disable=too-few-public-methods
+  __tablename__ = 'pending_revisions'
+
+  id = db.Column(db.Integer, primary_key=True)
+  event_id = db.Column(db.Integer, nullable=False)
+  modified_by_id = db.Column(db.Integer, nullable=True)
+  action = db.Column(db.Enum(u'created', u'modified'), nullable=False)
+  resource_type = db.Column(db.String(250), nullable=False)
+  resource_id = db.Column(db.Integer, nullable=False)
+  content = db.deferred(db.Column(CompressedJsonType, nullable=True))
+  created_at = db.Column(db.DateTime, nullable=False,
+                         default=db.text('current_timestamp'))
+
+
+def _preload(objects):
+  """Load data used by log_json of objects with a few queries per model.
+
+  Objects already in the session get their unloaded deferred columns and
+  relationships populated by the eager queries.
+
+  Returns:
+    (loaded, definitions) tuple, where loaded holds the loaded instances so
+    they stay in the session and definitions is a dict of id -> custom
+    attribute definition used by the custom attribute values of objects.
+  """
+  ids_by_model = defaultdict(set)
+  for obj in objects:
+    if hasattr(obj.__class__, "eager_query") and obj.id is not None:
+      ids_by_model[obj.__class__].add(obj.id)
+  loaded = []
+  for model, ids in ids_by_model.iteritems():
+    loaded.extend(model.eager_query().filter(model.id.in_(list(ids))).all())
+  definition_ids = {value.custom_attribute_id
+                    for obj in objects if isinstance(obj, CustomAttributable)
+                    for value in obj.custom_attribute_values}
+  definition_ids.discard(None)
+  definitions = {}
+  if definition_ids:
+    cad = CustomAttributeDefinition
+    definitions = {definition.id: definition for definition in
+                   cad.query.filter(cad.id.in_(list(definition_ids)))}
+  return loaded, definitions
+
+
+def serialize(objects):
+  """Get log JSON of objects, serializing them in preloaded batches.
+
+  Args:
+    objects: list of model instances.
+
+  Returns:
+    list of log JSON of the objects, in the same order.
+  """
+  contents = []
+  for start in range(0, len(objects), BATCH_SIZE):
+    batch = objects[start:start + BATCH_SIZE]
+    with benchmark("Revision writer: preload"):
+      _, definitions = _preload(batch)
+    with benchmark("Revision writer: log_json"):
+      with preloaded_log_definitions(definitions):
+        contents.extend(obj.log_json() for obj in batch)
+  return contents
+
+
+def build_revisions(user_id, log_objects):
+  """Build unflushed revisions with the log JSON of objects.
+
+  Args:
+    user_id: id of the user performing the operation.
+    log_objects: list of (action, object) tuples.
+
+  Returns:
+    list of revisions, in the same order as log_objects.
+  """
+  contents = serialize([obj for _, obj in log_objects])
+  return [Revision(obj, user_id, action, content)
+          for (action, obj), content in zip(log_objects, contents)]
+
+
+def get_row(event_id, revision):
+  """Get the insert parameters of an unflushed revision."""
+  # pylint: disable=protected-access
+  return {
+      "event_id": event_id,
+      "modified_by_id": revision.modified_by_id,
+      "action": revision.action,
+      "resource_type": revision.resource_type,
+      "resource_id": revision.resource_id,
+      "resource_slug": revision.resource_slug,
+      "source_type": revision.source_type,
+      "source_id": revision.source_id,
+      "destination_type": revision.destination_type,
+      "destination_id": revision.destination_id,
+      "base_revision_id": revision.base_revision_id,
+      "content": revision._content,
+  }
+
+
+def get_content_row(event_id, user_id, action, type_, id_, content):
+  """Get the insert parameters of a revision of an object not in session."""
+  return {
+      "event_id": event_id,
+      "modified_by_id": user_id,
+      "action": action,
+      "resource_type": type_,
+      "resource_id": id_,
+      "resource_slug": content.get("slug"),
+      "source_type": content.get("source_type"),
+      "source_id": content.get("source_id"),
+      "destination_type": content.get("destination_type"),
+      "destination_id": content.get("destination_id"),
+      "base_revision_id": None,
+      "content": content,
+  }
+
+
+def insert_rows(rows):
+  """Insert revision rows with executemany in chunks."""
+  for start in range(0, len(rows), CHUNK_SIZE):
+    db.session.execute(Revision.__table__.insert(),
+                       rows[start:start + CHUNK_SIZE])
+
+
+def write(event, user_id, log_objects, deferred=False, logged_json=None):
+  """Insert revisions of logged objects for a flushed event.
+
+  Args:
+    event: flushed event the revisions belong to.
+    user_id: id of the user performing the operation.
+    log_objects: list of (action, object) tuples.
+    deferred: if set, created and modified revisions are computed and
+      inserted after the commit by drain. Their content is the log JSON of
+      the objects at that time.
+    logged_json: optional dict of object -> log JSON recorded before the
+      flush, used for deferred revisions of objects deleted before they are
+      computed.
+  """
+  pending = []
+  if deferred:
+    pending = [(action, obj) for action, obj in log_objects
+               if action != "deleted"]
+    log_objects = [(action, obj) for action, obj in log_objects
+                   if action == "deleted"]
+  _insert_pending_of({(obj.__class__.__name__, obj.id)
+                      for action, obj in log_objects if action == "deleted"})
+  with benchmark("Revision writer: build revisions"):
+    revisions = build_revisions(user_id, log_objects)
+    Revision.encode_deltas(revisions)
+  with benchmark("Revision writer: insert revisions"):
+    insert_rows([get_row(event.id, revision) for revision in revisions])
+    if pending:
+      logged_json = logged_json or {}
+      db.session.execute(PendingRevision.__table__.insert(), [{
+          "event_id": event.id,
+          "modified_by_id": user_id,
+          "action": action,
+          "resource_type": obj.__class__.__name__,
+          "resource_id": obj.id,
+          "content": dict(logged_json.get(obj) or {}, id=obj.id),
+      } for action, obj in pending])
+
+
+def _get_objects(keys):
+  """Load objects by (type, id) keys, skipping objects that do not exist."""
+  from ggrc.models import all_models
+  ids_by_type = defaultdict(set)
+  for type_, id_ in keys:
+    ids_by_type[type_].add(id_)
+  objects = {}
+  for type_, ids in ids_by_type.iteritems():
+    model = getattr(all_models, type_, None)
+    if model is None:
+      logger.warning("Pending revisions of unknown model %s", type_)
+      continue
+    objects.update(((type_, obj.id), obj) for obj in model.eager_query(
+    ).filter(model.id.in_(list(ids))))
+  return objects
+
+
+def _insert_pending(entries):
+  """Compute and insert revisions of pending entries and remove them."""
+  with benchmark("Revision writer: compute pending revisions"):
+    objects = _get_objects((entry.resource_type, entry.resource_id)
+                           for entry in entries)
+    existing = [entry for entry in entries
+                if (entry.resource_type, entry.resource_id) in objects]
+    existing_objects = [objects[entry.resource_type, entry.resource_id]
+                        for entry in existing]
+    revisions = [
+        Revision(obj, entry.modified_by_id, entry.action, content)
+        for entry, obj, content in zip(
+            existing, existing_objects, serialize(existing_objects))
+    ]
+    Revision.encode_deltas(revisions)
+    rows = [get_row(entry.event_id, revision)
+            for entry, revision in zip(existing, revisions)]
+    rows.extend(get_content_row(
+        entry.event_id, entry.modified_by_id, entry.action,
+        entry.resource_type, entry.resource_id, entry.content,
+    ) for entry in entries
+        if (entry.resource_type, entry.resource_id) not in objects)
+    insert_rows(rows)
+    db.session.execute(PendingRevision.__table__.delete().where(
+        PendingRevision.id.in_([entry.id for entry in entries])
+    ))
+
+
+def _query_pending():
+  return PendingRevision.query.options(
+      db.undefer("content"),
+  ).order_by(PendingRevision.id).with_for_update()
+
+
+def _insert_pending_of(keys):
+  """Insert pending revisions of objects with (type, id) keys."""
+  keys = list(keys)
+  for start in range(0, len(keys), CHUNK_SIZE):
+    entries = _query_pending().filter(tuple_(
+        PendingRevision.resource_type,
+        PendingRevision.resource_id,
+    ).in_(keys[start:start + CHUNK_SIZE])).all()
+    if entries:
+      _insert_pending(entries)
+
+
+def drain_batch(batch_size=BATCH_SIZE):
+  """Compute and insert a single batch of pending revisions.
+
+  Returns:
+    Number of processed pending revisions.
+  """
+  entries = _query_pending().limit(batch_size).all()
+  if not entries:
+    return 0
+  _insert_pending(entries)
+  db.session.commit()
+  return len(entries)
+
+
+def drain(batch_size=BATCH_SIZE, max_batches=None):
+  """Compute and insert pending revisions until there are none left.
+
+  Args:
+    batch_size: Number of pending revisions processed in one transaction.
+    max_batches: Optional limit of processed batches.
+  Returns:
+    Number of processed pending revisions.
+  """
+  processed = 0
+  batches = 0
+  while max_batches is None or batches < max_batches:
+    count = drain_batch(batch_size)
+    if not count:
+      break
+    processed += count
+    batches += 1
+  logger.info("Inserted %s pending revisions.", processed)
+  return processed
@@ -25,6 +25,14 @@ def search():
   should_group_by_type = should_group_by_type.lower() == 'true'
   should_just_count = request.args.get('counts_only', '')
   should_just_count = should_just_count.lower() == 'true'
+  should_count = request.args.get('with_counts', '')
+  should_count = should_count.lower() == 'true'
+  limit = request.args.get('limit')
+  if limit is not None:
+    try:
+      limit = int(limit)
+    except ValueError:
+      raise BadRequest('Query parameter "limit" must be an integer.')
 
   types = request.args.get('types', '')
   types = [t.strip() for t in types.split(',') if len(t.strip()) > 0]
@@ -32,35 +40,18 @@ def search():
     types = None
 
   contact_id = request.args.get('contact_id')
-  extra_params = request.args.get('extra_params', {})
-  extra_columns = request.args.get('extra_columns', {})
-
-  relevant_objects = request.args.get('relevant_objects', None)
-
-  if extra_params:
-    # Parse t1:a=b,c=d;t2:e=f into dict {t1:{a:b,c:d},t2:{e:f}}
-    extra_params = {
-        k: {
-            kk: vv for kk, vv in (x.split('=') for x in v.split(','))
-        } for k, v in (x.split(':') for x in extra_params.split(';'))
-    }
-  else:
-    extra_params = {}
-
-  if extra_columns:
-    # Parse a=b,c=d into dict {a:b,c:d}
-    extra_columns = {k: v for k, v in
-                     (x.split('=') for x in extra_columns.split(','))}
-
-  else:
-    extra_columns = {}
-
-  if relevant_objects is not None:
-    relevant_objects = [tuple(obj.split(':'))
-                        for obj in relevant_objects.split(',')]
+  extra_params = _parse_extra_params(request.args.get('extra_params'))
+  extra_columns = _parse_extra_columns(request.args.get('extra_columns'))
+  relevant_objects = _parse_relevant_objects(
+      request.args.get('relevant_objects'))
 
   if should_just_count:
-    return do_counts(terms, types, contact_id, extra_params, extra_columns)
+    return do_counts(terms, types, contact_id, extra_params, extra_columns,
+                     relevant_objects)
+  if should_count:
+    return search_with_counts(terms, types, permission_type, permission_model,
+                              contact_id, extra_params, extra_columns,
+                              relevant_objects, limit)
   if should_group_by_type:
     return group_by_type_search(terms, types, contact_id, extra_params,
                                 relevant_objects)
@@ -71,25 +62,63 @@ def search():
   )
 
 
+def _parse_extra_params(extra_params):
+  """Parse t1:a=b,c=d;t2:e=f into dict {t1:{a:b,c:d},t2:{e:f}}."""
+  if not extra_params:
+    return {}
+  return {
+      k: {
+          kk: vv for kk, vv in (x.split('=') for x in v.split(','))
+      } for k, v in (x.split(':') for x in extra_params.split(';'))
+  }
+
+
+def _parse_extra_columns(extra_columns):
+  """Parse a=b,c=d into dict {a:b,c:d}."""
+  if not extra_columns:
+    return {}
+  return {k: v for k, v in (x.split('=') for x in extra_columns.split(','))}
+
+
+def _parse_relevant_objects(relevant_objects):
+  """Parse t1:1,t2:2 into list [(t1, 1), (t2, 2)] or None if not given."""
+  if relevant_objects is None:
+    return None
+  return [tuple(obj.split(':')) for obj in relevant_objects.split(',')]
+
+
 def do_counts(terms, types=None, contact_id=None,
-              extra_params={}, extra_columns={}):
+              extra_params={}, extra_columns={}, relevant_objects=None):
+  """Get the number of search results for each type.
+
+  Objects relevant to relevant_objects can not be counted in SQL, so with
+  relevant objects the counts are taken from the candidates of
+  search_with_counts with the same filter.
+  """
   # FIXME: ? This would make the query more efficient, but will also prune
   #   objects the user is allowed to read in other contexts.
   # Remove types that the user can't read
   # types = [type for type in types if permissions.is_allowed_read(type, None)]
 
   indexer = get_indexer()
-  with benchmark("Counts"):
-    results = indexer.counts(terms, types=types, contact_id=contact_id,
-                             extra_params=extra_params,
-                             extra_columns=extra_columns)
-
-  results = [(r[2] if r[2] != "" else r[0], r[1]) for r in results]
+  if relevant_objects is not None:
+    with benchmark("Counts of relevant objects"):
+      results = indexer.search_with_counts(
+          terms, types=types, contact_id=contact_id,
+          extra_params=extra_params, extra_columns=extra_columns)
+      counts, _ = _count_results(
+          results, _build_relevant_filter(types, relevant_objects), limit=0)
+  else:
+    with benchmark("Counts"):
+      results = indexer.counts(terms, types=types, contact_id=contact_id,
+                               extra_params=extra_params,
+                               extra_columns=extra_columns)
+    counts = dict((r[2] if r[2] != "" else r[0], r[1]) for r in results)
   return current_app.make_response((
       json.dumps({
           'results': {
               'selfLink': request.url,
-              'counts': dict(results)
+              'counts': counts,
           }
       }, cls=GrcEncoder),
       200,
@@ -189,3 +218,64 @@ def group_by_type_search(terms, types=None, contact_id=None, extra_params={},
   do_search(terms, list_for_type, types, contact_id=contact_id,
             extra_params=extra_params, relevant_objects=relevant_objects)
   return make_search_result(entries)
+
+
+def _count_results(results, related_filter, limit=None):
+  """Count candidates of search_with_counts that pass the relevant filter.
+
+  Returns:
+    (counts, entries) tuple, where counts is a dict of type or extra column
+    name -> number of results and entries is a dict of type -> the first
+    `limit` result entries.
+  """
+  entries = {}
+  counts = {}
+  for extra_column, model_type, id_ in results:
+    if not related_filter((model_type, id_)):
+      continue
+    count_key = extra_column or model_type
+    counts[count_key] = counts.get(count_key, 0) + 1
+    if extra_column:
+      continue
+    entries_list = entries.setdefault(model_type, [])
+    if limit is None or len(entries_list) < limit:
+      entries_list.append({
+          'id': id_,
+          'type': model_type,
+          'href': url_for(model_type, id=id_),
+      })
+  return counts, entries
+
+
+def search_with_counts(terms, types=None, permission_type='read',
+                       permission_model=None, contact_id=None,
+                       extra_params=None, extra_columns=None,
+                       relevant_objects=None, limit=None):
+  """Get the first `limit` search results and total count for each type.
+
+  Results and counts are built from a single candidate set, so the full text
+  table is scanned only once.
+  """
+  # pylint: disable=too-many-arguments
+  indexer = get_indexer()
+  with benchmark("Search with counts"):
+    results = indexer.search_with_counts(
+        terms, types=types, permission_type=permission_type,
+        permission_model=permission_model, contact_id=contact_id,
+        extra_params=extra_params or {}, extra_columns=extra_columns or {}
+    )
+
+  counts, entries = _count_results(
+      results, _build_relevant_filter(types, relevant_objects), limit)
+
+  return current_app.make_response((
+      json.dumps({
+          'results': {
+              'selfLink': request.url,
+              'entries': entries,
+              'counts': counts,
+          }
+      }, cls=GrcEncoder),
+      200,
+      [('Content-Type', 'application/json')],
+  ))
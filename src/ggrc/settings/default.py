@@ -69,6 +69,21 @@ SQLALCHEMY_DATABASE_URI = os.environ.get('GGRC_DATABASE_URI', '')
 SECRET_KEY = os.environ.get('GGRC_SECRET_KEY', 'Replace-with-something-secret')
 
 MEMCACHE_MECHANISM = True
+# Client class of the shared cache, App Engine memcache client if not set
+MEMCACHE_CLIENT = None
+# Size and TTL in seconds of the in-process object representation cache
+REPRESENTATION_CACHE_SIZE = int(
+    os.environ.get('GGRC_REPRESENTATION_CACHE_SIZE', '10000'))
+REPRESENTATION_CACHE_TTL = int(
+    os.environ.get('GGRC_REPRESENTATION_CACHE_TTL', '30'))
+# Size and TTL in seconds of the in-process relationship adjacency cache
+ADJACENCY_CACHE_SIZE = int(
+    os.environ.get('GGRC_ADJACENCY_CACHE_SIZE', '50000'))
+ADJACENCY_CACHE_TTL = int(
+    os.environ.get('GGRC_ADJACENCY_CACHE_TTL', '300'))
+# Log the number of permission checks made by every request
+PERMISSION_CHECK_PROFILE = bool(
+    os.environ.get('GGRC_PERMISSION_CHECK_PROFILE', ''))
 
 # AppEngine Email
 APPENGINE_EMAIL = os.environ.get('APPENGINE_EMAIL', '')
@@ -93,6 +108,31 @@ USE_APP_ENGINE_ASSETS_SUBDOMAIN = False
 
 BACKGROUND_COLLECTION_POST_SLEEP = 0
 
+# Write full text records in the request that modified the objects instead of
+# adding them to the change journal that is processed by the journal worker.
+FULLTEXT_INDEX_SYNC = False
+
+# Number of worker processes used for full text reindex. 0 means one process
+# per CPU. Reindex always runs in a single process on App Engine.
+FULLTEXT_REINDEX_PROCESSES = int(
+    os.environ.get('GGRC_FULLTEXT_REINDEX_PROCESSES', '0'))
+
+# Number of local worker processes for background tasks such as asynchronous
+# imports and exports. Not used on App Engine, where tasks run through the
+# task queue. 0 runs the tasks in the request that created them.
+BACKGROUND_TASK_PROCESSES = int(
+    os.environ.get('GGRC_BACKGROUND_TASK_PROCESSES', '2'))
+
+# Number of worker processes that start recurring workflow cycles in the
+# nightly cron job. Cycles always start in a single process on App Engine.
+WORKFLOW_CYCLE_PROCESSES = int(
+    os.environ.get('GGRC_WORKFLOW_CYCLE_PROCESSES', '4'))
+
+# Permission sets with at least this many context and resource ids are stored
+# in the permission_filter_entries table and selected from it in queries
+# instead of being inlined into the SQL text.
+PERMISSION_FILTER_THRESHOLD = 1000
+
 
 LOGGING_HANDLER = {
     "class": "logging.StreamHandler",
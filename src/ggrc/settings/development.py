@@ -20,6 +20,7 @@ ENABLE_JASMINE = True
 # DEBUG_ASSETS = True
 USE_APP_ENGINE_ASSETS_SUBDOMAIN = False
 MEMCACHE_MECHANISM = False
+FULLTEXT_INDEX_SYNC = True
 APPENGINE_EMAIL = "user@example.com"
 
 LOGGING_FORMATTER = {
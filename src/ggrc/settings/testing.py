@@ -14,3 +14,8 @@ FULLTEXT_INDEXER = 'ggrc.fulltext.mysql.MysqlIndexer'
 LOGIN_MANAGER = 'ggrc.login.noop'
 # SQLALCHEMY_ECHO = True
 MEMCACHE_MECHANISM = False
+MEMCACHE_CLIENT = 'ggrc.cache.fakememcache.Client'
+FULLTEXT_REINDEX_PROCESSES = 1
+FULLTEXT_INDEX_SYNC = True
+BACKGROUND_TASK_PROCESSES = 0
+WORKFLOW_CYCLE_PROCESSES = 1
@@ -73,41 +73,12 @@ class SnapshotGenerator(object):
     self.context_cache[parent] = parent_object.context_id
 
   def _fetch_neighborhood(self, parent_object, objects):
+    from ggrc.cache import adjacency
     with benchmark("Snapshot._fetch_object_neighborhood"):
-      query_pairs = set()
-
-      for obj in objects:
-        for snd_obj in self.rules.rules[parent_object.type]["snd"]:
-          query_pairs.add((obj.type, obj.id, snd_obj))
-
-      columns = db.session.query(
-          models.Relationship.source_type,
-          models.Relationship.source_id,
-          models.Relationship.destination_type,
-          models.Relationship.destination_id)
-
-      relationships = columns.filter(
-          tuple_(
-              models.Relationship.destination_type,
-              models.Relationship.destination_id,
-              models.Relationship.source_type,
-          ).in_(query_pairs)).union(
-          columns.filter(tuple_(
-              models.Relationship.source_type,
-              models.Relationship.source_id,
-              models.Relationship.destination_type,
-          ).in_(query_pairs)))
-
-      neighborhood = set()
-      for (stype, sid, dtype, did) in relationships:
-        source = Stub(stype, sid)
-        destination = Stub(dtype, did)
-
-        if source in objects:
-          neighborhood.add(destination)
-        else:
-          neighborhood.add(source)
-      return neighborhood
+      neighbors = adjacency.get_neighbors(
+          objects, types=self.rules.rules[parent_object.type]["snd"])
+      return {Stub(*stub)
+              for stubs in neighbors.itervalues() for stub in stubs}
 
   def _get_snapshottable_objects(self, obj):
     """Get snapshottable objects from parent object's neighborhood."""
@@ -410,6 +381,12 @@ class SnapshotGenerator(object):
           relationship_payload += [relationship]
 
       with benchmark("Snapshot._create.write relationships to database"):
+        if not self.dry_run:
+          from ggrc.cache import adjacency
+          adjacency.invalidate(
+              stub for rel in relationship_payload
+              for stub in ((rel["source_type"], rel["source_id"]),
+                           (rel["destination_type"], rel["destination_id"])))
         self._execute(models.Relationship.__table__.insert(),
                       relationship_payload)
 
@@ -484,6 +461,12 @@ class SnapshotGenerator(object):
           "user_id": get_current_user_id(),
           "parent_id": parent.id
       })
+    if self.parents:
+      from ggrc.cache import adjacency
+      snapshot_ids = db.session.query(models.Snapshot.id).filter(
+          models.Snapshot.parent_id.in_([parent.id for parent in self.parents])
+      )
+      adjacency.invalidate(("Snapshot", id_) for id_, in snapshot_ids)
 
 
 def create_snapshots(objs, event, revisions=None, _filter=None, dry_run=False):
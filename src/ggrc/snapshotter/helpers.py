@@ -3,7 +3,6 @@
 
 """Various simple helper functions for snapshot generator"""
 
-import collections
 from logging import getLogger
 
 from sqlalchemy.sql.expression import tuple_
@@ -11,7 +10,6 @@ from sqlalchemy.sql.expression import tuple_
 from ggrc import db
 from ggrc import models
 from ggrc.snapshotter.datastructures import Stub
-from ggrc.snapshotter.datastructures import Pair
 from ggrc.utils import benchmark
 
 logger = getLogger(__name__)  # pylint: disable=invalid-name
@@ -20,8 +18,10 @@ logger = getLogger(__name__)  # pylint: disable=invalid-name
 def get_revisions(pairs, revisions, filters=None):
   """Retrieve revision ids for pairs
 
-  If revisions dictionary is provided it will validate that the selected
-  revision exists in the objects revision history.
+  Latest revisions of children are looked up with a grouped MAX query, so
+  only a single revision id is fetched per child. If revisions dictionary is
+  provided it will validate that the selected revision exists in the objects
+  revision history.
 
   Args:
     pairs: set([(parent_1, child_1), (parent_2, child_2), ...])
@@ -32,42 +32,38 @@ def get_revisions(pairs, revisions, filters=None):
     revision_id_cache = dict()
 
     if pairs:
-      with benchmark("get_revisions.create caches"):
-        child_stubs = {pair.child for pair in pairs}
-
-        with benchmark("get_revisions.create child -> parents cache"):
-          parents_cache = collections.defaultdict(set)
-          for parent, child in pairs:
-            parents_cache[child].add(parent)
-
-      with benchmark("get_revisions.retrieve revisions"):
-        query = db.session.query(
-            models.Revision.id,
-            models.Revision.resource_type,
-            models.Revision.resource_id).filter(
-            tuple_(
-                models.Revision.resource_type,
-                models.Revision.resource_id).in_(child_stubs)
-        ).order_by(models.Revision.id.desc())
-        if filters:
-          for _filter in filters:
-            query = query.filter(_filter)
+      with benchmark("get_revisions.retrieve latest revisions"):
+        latest_ids = models.Revision.latest_ids(
+            {pair.child for pair in pairs if pair not in revisions},
+            filters=filters)
+
+      with benchmark("get_revisions.retrieve specified revisions"):
+        specified_ids = {revisions[pair] for pair in pairs
+                         if pair in revisions}
+        specified = {}
+        if specified_ids:
+          query = db.session.query(
+              models.Revision.id,
+              models.Revision.resource_type,
+              models.Revision.resource_id).filter(
+              models.Revision.id.in_(specified_ids))
+          if filters:
+            for _filter in filters:
+              query = query.filter(_filter)
+          specified = {revid: Stub(restype, resid)
+                       for revid, restype, resid in query}
 
       with benchmark("get_revisions.create revision_id cache"):
-        for revid, restype, resid in query:
-          child = Stub(restype, resid)
-          for parent in parents_cache[child]:
-            key = Pair(parent, child)
-            if key in revisions:
-              if revid == revisions[key]:
-                revision_id_cache[key] = revid
-              else:
-                logger.warning(
-                    "Specified revision for object %s but couldn't find the"
-                    "revision '%s' in object history", key, revisions[key])
+        for pair in pairs:
+          if pair in revisions:
+            if specified.get(revisions[pair]) == pair.child:
+              revision_id_cache[pair] = revisions[pair]
             else:
-              if key not in revision_id_cache:
-                revision_id_cache[key] = revid
+              logger.warning(
+                  "Specified revision for object %s but couldn't find the"
+                  "revision '%s' in object history", pair, revisions[pair])
+          elif pair.child in latest_ids:
+            revision_id_cache[pair] = latest_ids[pair.child]
     return revision_id_cache
 
 
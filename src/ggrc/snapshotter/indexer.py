@@ -3,11 +3,19 @@
 
 """Manage indexing for snapshotter service"""
 
+import hashlib
+import json
+
+import flask
+from sqlalchemy import and_
+from sqlalchemy import func
+from sqlalchemy.sql import select
 from sqlalchemy.sql.expression import tuple_
 
 from ggrc import db
 from ggrc import models
-from ggrc.fulltext.mysql import MysqlRecordProperty as Record
+from ggrc.fulltext import get_indexer
+from ggrc.fulltext import Record
 from ggrc.models.reflection import AttributeInfo
 from ggrc.utils import generate_query_chunks
 
@@ -15,6 +23,17 @@ from ggrc.snapshotter.rules import Types
 from ggrc.snapshotter.datastructures import Pair
 
 
+# Full text property that holds the revision id a snapshot record was built
+# from and a key of the custom attribute titles it was built with. It is used
+# to skip unchanged snapshots and is excluded from searches.
+REVISION_PROPERTY = "__revision_id"
+
+# Number of snapshots reindexed at once.
+CHUNK_SIZE = 1000
+
+_CLASS_PROPERTIES = {}
+
+
 def _get_tag(pair):
   return u"{parent_type}-{parent_id}-{child_type}".format(
       parent_type=pair.parent.type,
@@ -52,68 +71,97 @@ def _get_columns():
   revision_columns = db.session.query(
       models.Revision.id,
       models.Revision.resource_type,
-      models.Revision.content
   )
   return snapshot_columns, revision_columns
 
 
-def _get_model_properties():
+def _get_class_properties():
   """Get indexable properties for all snapshottable objects
 
-  Args:
-    None
   Returns:
-    tuple(class_properties dict, custom_attribute_definitions dict) - Tuple of
-        dictionaries, first one representing a list of searchable attributes
-        for every model and second one representing dictionary of custom
-        attribute definition attributes.
+    dict of model name -> list of searchable attributes of the model.
   """
-  # pylint: disable=protected-access
   from ggrc.models import all_models
-  class_properties = dict()
-  klass_names = Types.all
+  if not _CLASS_PROPERTIES:
+    for klass_name in Types.all:
+      _CLASS_PROPERTIES[klass_name] = AttributeInfo.gather_attrs(
+          getattr(all_models, klass_name), '_fulltext_attrs')
+  return _CLASS_PROPERTIES
 
+
+def _get_cad_titles():
+  """Get titles of custom attribute definitions of snapshottable objects
+
+  The map is cached for the current request and reloaded only when the
+  definitions change.
+
+  Returns:
+    tuple(dict of custom attribute definition id -> title, key of the titles).
+  """
+  # pylint: disable=protected-access
+  from ggrc.models import all_models
+  cad = models.CustomAttributeDefinition
   cadef_klass_names = {
       getattr(all_models, klass)._inflector.table_singular
-      for klass in klass_names
+      for klass in Types.all
   }
+  type_filter = cad.definition_type.in_(cadef_klass_names)
+  version = db.session.query(
+      func.count(cad.id),
+      func.max(cad.id),
+      func.max(cad.updated_at),
+  ).filter(type_filter).one()
+
+  cached = getattr(flask.g, "snapshot_cad_titles", None)
+  if cached is None or cached[0] != version:
+    cad_titles = dict(db.session.query(cad.id, cad.title).filter(type_filter))
+    cad_key = hashlib.sha1(
+        json.dumps(sorted(cad_titles.items()))).hexdigest()[:12]
+    flask.g.snapshot_cad_titles = cached = (version, cad_titles, cad_key)
+  return cached[1], cached[2]
+
+
+def _get_revision_marker(revision_id, cad_key):
+  """Get content of the REVISION_PROPERTY record of a snapshot.
+
+  Renamed custom attributes change the key, so snapshots indexed with the old
+  titles are not skipped.
+  """
+  return u"{}:{}".format(revision_id, cad_key)
 
-  cad_query = db.session.query(
-      models.CustomAttributeDefinition.id,
-      models.CustomAttributeDefinition.title,
-  ).filter(
-      models.CustomAttributeDefinition.definition_type.in_(cadef_klass_names)
-  )
 
-  for klass_name in klass_names:
-    model_attributes = AttributeInfo.gather_attrs(
-        getattr(all_models, klass_name), '_fulltext_attrs')
-    class_properties[klass_name] = model_attributes
+def _get_model_properties():
+  """Get indexable properties for all snapshottable objects
 
-  return class_properties, cad_query.all()
+  Args:
+    None
+  Returns:
+    tuple(class_properties dict, custom_attribute_definitions dict) - Tuple of
+        dictionaries, first one representing a list of searchable attributes
+        for every model and second one representing dictionary of custom
+        attribute definition titles.
+  """
+  return _get_class_properties(), _get_cad_titles()[0]
 
 
-def get_searchable_attributes(attributes, cad_list, content):
+def get_searchable_attributes(attributes, cad_titles, content):
   """Get all searchable attributes for a given object that should be indexed
 
   Args:
     attributes: Attributes that should be extracted from some model
-    cad_keys: IDs of custom attribute definitions
-    ca_definitions: Dictionary of "CAD ID" -> "CAD title"
+    cad_titles: Dictionary of "CAD ID" -> "CAD title"
     content: dictionary (JSON) representation of an object
   Return:
     Dict of "key": "value" from objects revision
   """
   searchable_values = {attr: content.get(attr) for attr in attributes}
 
-  cad_map = {cad.id: cad for cad in cad_list}
-
   cav_list = content.get("custom_attributes", [])
 
   for cav in cav_list:
-    cad = cad_map.get(cav["custom_attribute_id"])
-    if cad:
-      searchable_values[cad.title] = cav["attribute_value"]
+    title = cad_titles.get(cav["custom_attribute_id"])
+    if title:
+      searchable_values[title] = cav["attribute_value"]
   return searchable_values
 
 
@@ -127,7 +175,7 @@ def reindex():
   )
   for query_chunk in generate_query_chunks(columns):
     pairs = {Pair.from_4tuple(p) for p in query_chunk}
-    reindex_pairs(pairs)
+    reindex_pairs(pairs, force=True)
     db.session.commit()
 
 
@@ -138,88 +186,150 @@ def delete_records(snapshot_ids):
         be deleted.
   """
   to_delete = {("Snapshot", _id) for _id in snapshot_ids}
-  db.session.query(Record).filter(
-      tuple_(Record.type, Record.key).in_(to_delete)
-  ).delete(synchronize_session=False)
+  get_indexer().delete_records(to_delete, commit=False)
   db.session.commit()
 
 
-def insert_records(payload):
+def insert_records(records):
   """Insert records to full text table.
 
   Args:
-    payload: List of dictionaries that represent records entries.
+    records: List of fulltext Record objects for snapshots.
   """
-  engine = db.engine
-  engine.execute(Record.__table__.insert(), payload)
+  get_indexer().create_records(records, commit=False)
   db.session.commit()
 
 
-def reindex_pairs(pairs):
-  """Reindex selected snapshots.
+def _get_indexed_markers(snapshot_ids):
+  """Get revision markers of the current records of snapshots.
 
   Args:
-    pairs: A list of parent-child pairs that uniquely represent snapshot
-    object whose properties should be reindexed.
+    snapshot_ids: An iterable of snapshot IDs.
+  Returns:
+    dict of snapshot id -> content of its REVISION_PROPERTY record.
   """
+  table = get_indexer().table
+  snapshot_ids = list(snapshot_ids)
+  indexed = {}
+  for start in range(0, len(snapshot_ids), CHUNK_SIZE):
+    query = select([table.c.key, table.c.content]).where(and_(
+        table.c.type == "Snapshot",
+        table.c.property == REVISION_PROPERTY,
+        table.c.key.in_(snapshot_ids[start:start + CHUNK_SIZE]),
+    ))
+    indexed.update(db.session.execute(query))
+  return indexed
+
+
+def _get_snapshots(pairs):
+  """Get id, context id and revision id of snapshots for pairs."""
+  snapshot_columns, _ = _get_columns()
+  snapshot_query = snapshot_columns.filter(tuple_(
+      models.Snapshot.parent_type,
+      models.Snapshot.parent_id,
+      models.Snapshot.child_type,
+      models.Snapshot.child_id,
+  ).in_({pair.to_4tuple() for pair in pairs}))
 
-  # pylint: disable=too-many-locals
   snapshots = dict()
+  for _id, ctx_id, ptype, pid, ctype, cid, revid in snapshot_query:
+    pair = Pair.from_4tuple((ptype, pid, ctype, cid))
+    snapshots[pair] = [_id, ctx_id, revid]
+  return snapshots
+
+
+def _build_records(snapshots):
+  """Build full text records for snapshots.
+
+  Only the searchable attributes are kept from revision contents, and the
+  content of a revision shared by several snapshots is processed once.
+
+  Args:
+    snapshots: dict of pair -> [snapshot id, context id, revision id].
+  Returns:
+    list of full text Record objects.
+  """
   revisions = dict()
-  snap_to_sid_cache = dict()
   search_payload = list()
+  object_properties, cad_titles = _get_model_properties()
+  _, cad_key = _get_cad_titles()
+  _, revision_columns = _get_columns()
 
-  object_properties, cad_list = _get_model_properties()
-
-  snapshot_columns, revision_columns = _get_columns()
-
-  snapshot_query = snapshot_columns
-  if pairs:
-    pairs_filter = tuple_(
-        models.Snapshot.parent_type,
-        models.Snapshot.parent_id,
-        models.Snapshot.child_type,
-        models.Snapshot.child_id,
-    ).in_({pair.to_4tuple() for pair in pairs})
-    snapshot_query = snapshot_columns.filter(pairs_filter)
-
-    for _id, ctx_id, ptype, pid, ctype, cid, revid in snapshot_query:
-      pair = Pair.from_4tuple((ptype, pid, ctype, cid))
-      snapshots[pair] = [_id, ctx_id, revid]
-      snap_to_sid_cache[pair] = _id
-
-    revision_ids = {revid for _, _, revid in snapshots.values()}
-    revision_query = revision_columns.filter(
-        models.Revision.id.in_(revision_ids)
-    )
-    for _id, _type, content in revision_query:
-      revisions[_id] = get_searchable_attributes(
-          object_properties[_type], cad_list, content)
-
-    snapshot_ids = set()
-    for pair in snapshots:
-      snapshot_id, ctx_id, revision_id = snapshots[pair]
-      snapshot_ids.add(snapshot_id)
-
-      properties = revisions[revision_id]
-      properties.update({
-          "parent": _get_parent_property(pair),
-          "child": _get_child_property(pair),
-          "child_type": pair.child.type,
-          "child_id": pair.child.id
-      })
-
-      for prop, val in properties.items():
-        if prop and val:
-          data = {
-              "key": snapshot_id,
-              "type": "Snapshot",
-              "context_id": ctx_id,
-              "tags": _get_tag(pair),
-              "property": prop,
-              "content": val,
-          }
-          search_payload += [data]
-
-    delete_records(snapshot_ids)
-    insert_records(search_payload)
+  revision_ids = {revid for _, _, revid in snapshots.values()}
+  revision_query = revision_columns.filter(
+      models.Revision.id.in_(revision_ids)
+  )
+  contents = models.Revision.load_contents(revision_ids)
+  for _id, _type in revision_query:
+    revisions[_id] = get_searchable_attributes(
+        object_properties[_type], cad_titles, contents[_id])
+
+  for pair in snapshots:
+    snapshot_id, ctx_id, revision_id = snapshots[pair]
+
+    properties = dict(revisions[revision_id])
+    properties.update({
+        "parent": _get_parent_property(pair),
+        "child": _get_child_property(pair),
+        "child_type": pair.child.type,
+        "child_id": pair.child.id,
+        REVISION_PROPERTY: _get_revision_marker(revision_id, cad_key),
+    })
+
+    search_payload.append(Record(
+        snapshot_id,
+        "Snapshot",
+        ctx_id,
+        {prop: {"": val} for prop, val in properties.items()
+         if prop and val},
+        tags=_get_tag(pair),
+    ))
+  return search_payload
+
+
+def get_records(pairs):
+  """Build full text records for selected snapshots.
+
+  Args:
+    pairs: A list of parent-child pairs that uniquely represent snapshot
+    object whose properties should be indexed.
+  Returns:
+    tuple(snapshot_ids set, records list) - IDs of all found snapshots and
+        the full text records for them.
+  """
+  if not pairs:
+    return set(), list()
+  snapshots = _get_snapshots(pairs)
+  snapshot_ids = {snapshot_id for snapshot_id, _, _ in snapshots.values()}
+  return snapshot_ids, _build_records(snapshots)
+
+
+def reindex_pairs(pairs, force=False):
+  """Reindex selected snapshots.
+
+  Snapshots whose records were built from their current revision are
+  skipped unless `force` is set. Changed snapshots are reindexed in chunks.
+
+  Args:
+    pairs: A list of parent-child pairs that uniquely represent snapshot
+    object whose properties should be reindexed.
+    force: Reindex snapshots even if their revision did not change.
+  """
+  if not pairs:
+    return
+  pairs = list(pairs)
+  for start in range(0, len(pairs), CHUNK_SIZE):
+    snapshots = _get_snapshots(pairs[start:start + CHUNK_SIZE])
+    if not force:
+      _, cad_key = _get_cad_titles()
+      indexed = _get_indexed_markers(
+          snapshot_id for snapshot_id, _, _ in snapshots.values())
+      snapshots = {
+          pair: values for pair, values in snapshots.items()
+          if indexed.get(values[0]) !=
+          _get_revision_marker(values[2], cad_key)
+      }
+    if not snapshots:
+      continue
+    delete_records(snapshot_id for snapshot_id, _, _ in snapshots.values())
+    insert_records(_build_records(snapshots))
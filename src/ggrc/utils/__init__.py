@@ -301,8 +301,37 @@ def convert_date_format(date, format_from, format_to):
   return datetime.datetime.strptime(date, format_from).strftime(format_to)
 
 
-def generate_query_chunks(query, chunk_size=1000):
-  """Make a generator splitting `query` into chunks of size `chunk_size`."""
-  count = query.count()
-  for offset in range(0, count, chunk_size):
-    yield query.order_by('id').limit(chunk_size).offset(offset).all()
+def generate_query_chunks(query, chunk_size=1000, id_column=None):
+  """Make a generator splitting `query` into chunks of size `chunk_size`.
+
+  Chunks are ordered by `id_column` and every chunk continues after the last
+  id of the previous one (`id > last_id`) instead of using OFFSET, so every
+  chunk costs the same regardless of its position. Rows of queries with
+  multiple columns are returned as plain tuples.
+
+  Args:
+    query: Query for instances or columns of a single model.
+    chunk_size: Maximum number of rows in a single chunk.
+    id_column: Unique column used for ordering. Defaults to the id of the
+      first entity in the query.
+  """
+  if id_column is None:
+    id_column = query.column_descriptions[0]["entity"].id
+  single_entity = len(query.column_descriptions) == 1
+  keyed_query = query.add_columns(id_column).order_by(None).order_by(
+      id_column)
+  last_id = None
+  while True:
+    chunk_query = keyed_query
+    if last_id is not None:
+      chunk_query = chunk_query.filter(id_column > last_id)
+    rows = chunk_query.limit(chunk_size).all()
+    if not rows:
+      return
+    last_id = rows[-1][-1]
+    if single_entity:
+      yield [row[0] for row in rows]
+    else:
+      yield [tuple(row[:-1]) for row in rows]
+    if len(rows) < chunk_size:
+      return
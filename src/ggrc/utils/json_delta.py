@@ -0,0 +1,84 @@
+# Copyright (C) 2017 Google Inc.
+# Licensed under http://www.apache.org/licenses/LICENSE-2.0 <see LICENSE file>
+
+"""Compact deltas between JSON documents.
+
+A delta is a JSON object in one of the following forms:
+
+  {"v": value}                  - the document is replaced with value,
+  {"d": {key: delta}, "r": [key]} - keys of an object are patched or removed,
+  {"l": {"index": delta}}       - items of a list of the same length are
+                                  patched.
+
+Empty parts of object deltas are omitted, so an empty delta {} means that the
+documents are equal.
+"""
+
+import copy
+
+
+def diff(old, new):
+  """Compute the delta that transforms the old document into the new one.
+
+  Args:
+    old: JSON serializable base document.
+    new: JSON serializable target document.
+
+  Returns:
+    delta as described in the module docstring.
+  """
+  if isinstance(old, dict) and isinstance(new, dict):
+    changed = {}
+    for key, value in new.iteritems():
+      if key not in old:
+        changed[key] = {"v": value}
+      elif old[key] != value:
+        changed[key] = diff(old[key], value)
+    removed = [key for key in old if key not in new]
+    delta = {}
+    if changed:
+      delta["d"] = changed
+    if removed:
+      delta["r"] = removed
+    return delta
+  if (isinstance(old, list) and isinstance(new, list) and
+          len(old) == len(new)):
+    changed = {str(index): diff(old_item, new_item)
+               for index, (old_item, new_item) in enumerate(zip(old, new))
+               if old_item != new_item}
+    return {"l": changed} if changed else {}
+  if old == new:
+    return {}
+  return {"v": new}
+
+
+def _apply(doc, delta):
+  """Apply the delta to a document that may be modified in place."""
+  if "v" in delta:
+    return copy.deepcopy(delta["v"])
+  if "l" in delta:
+    for index, item_delta in delta["l"].iteritems():
+      index = int(index)
+      doc[index] = _apply(doc[index], item_delta)
+    return doc
+  for key, value_delta in delta.get("d", {}).iteritems():
+    doc[key] = _apply(doc.get(key), value_delta)
+  for key in delta.get("r", ()):
+    doc.pop(key, None)
+  return doc
+
+
+def patch(base, delta):
+  """Reconstruct a document from its base document and a delta.
+
+  The base document is not modified and the result shares no mutable values
+  with the base or the delta.
+
+  Args:
+    base: JSON serializable base document.
+    delta: delta computed by diff from the base document.
+
+  Returns:
+    the reconstructed document.
+  """
+  return _apply(copy.deepcopy(base), delta)
@@ -0,0 +1,200 @@
+# Copyright (C) 2017 Google Inc.
+# Licensed under http://www.apache.org/licenses/LICENSE-2.0 <see LICENSE file>
+
+"""Permission filters shared by all query builders.
+
+Permission filters restrict queries to objects in contexts the user can
+access or to objects the user has explicit access to. For users with large
+permission sets the context and resource id lists are materialized into the
+``permission_filter_entries`` table, keyed by the user and a version hash of
+the permission sets, and queries select from that table instead of inlining
+thousands of ids into the SQL text.
+
+The permission sets for each type are computed once per request.
+"""
+
+import hashlib
+from collections import namedtuple
+
+from flask import g
+from flask import has_request_context
+from sqlalchemy import and_
+from sqlalchemy import false
+from sqlalchemy import or_
+from sqlalchemy import select
+
+from ggrc import db
+from ggrc import settings
+from ggrc.login import get_current_user_id
+from ggrc.utils import benchmark
+from ggrc.utils.query_helpers import get_context_resource
+
+
+class PermissionFilterEntry(db.Model):
+  """Allowed context or resource id of a user for a single type."""
+  # pylint: disable=too-few-public-methods
+  __tablename__ = 'permission_filter_entries'
+
+  CONTEXT = "context"
+  RESOURCE = "resource"
+  # Marker entry present for every materialized version.
+  VERSION = "version"
+
+  person_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+  action = db.Column(db.String(16), primary_key=True)
+  resource_type = db.Column(db.String(128), primary_key=True)
+  version = db.Column(db.String(32), primary_key=True)
+  entry_type = db.Column(db.String(16), primary_key=True)
+  entry_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+
+
+PermissionSets = namedtuple("PermissionSets", [
+    "null_context",  # True if objects without context are allowed
+    "has_contexts",
+    "contexts",  # list of context ids or a select of materialized ids
+    "has_resources",
+    "resources",  # list of resource ids or a select of materialized ids
+])
+
+
+def _get_version(contexts, resources):
+  """Get a hash that changes whenever the permission sets change."""
+  return hashlib.md5(repr((sorted(contexts), sorted(resources)))).hexdigest()
+
+
+def _get_entries_select(key, version, entry_type):
+  """Get a select of materialized ids of a single entry type."""
+  person_id, action, resource_type = key
+  table = PermissionFilterEntry.__table__
+  return select([table.c.entry_id]).where(and_(
+      table.c.person_id == person_id,
+      table.c.action == action,
+      table.c.resource_type == resource_type,
+      table.c.version == version,
+      table.c.entry_type == entry_type,
+  ))
+
+
+def _is_materialized(key, version):
+  """Check if the permission sets are visible in the current transaction."""
+  marker = _get_entries_select(key, version, PermissionFilterEntry.VERSION)
+  return db.session.execute(marker.limit(1)).first() is not None
+
+
+def _materialize(key, version, contexts, resources):
+  """Store permission sets of a user and remove their older versions.
+
+  The entries are written in a separate transaction, so they are stored even
+  if the current request is rolled back.
+  """
+  person_id, action, resource_type = key
+  table = PermissionFilterEntry.__table__
+  entries = [(PermissionFilterEntry.VERSION, 0)]
+  entries.extend((PermissionFilterEntry.CONTEXT, id_) for id_ in contexts)
+  entries.extend((PermissionFilterEntry.RESOURCE, id_) for id_ in resources)
+  with db.engine.begin() as connection:
+    connection.execute(table.delete().where(and_(
+        table.c.person_id == person_id,
+        table.c.action == action,
+        table.c.resource_type == resource_type,
+        table.c.version != version,
+    )))
+    connection.execute(table.insert().prefix_with("IGNORE"), [{
+        "person_id": person_id,
+        "action": action,
+        "resource_type": resource_type,
+        "version": version,
+        "entry_type": entry_type,
+        "entry_id": entry_id,
+    } for entry_type, entry_id in entries])
+
+
+def _get_permission_sets(model_name, permission_type, permission_model):
+  """Get allowed contexts and resources of the current user.
+
+  Returns:
+    PermissionSets or None if access to the type is not restricted.
+  """
+  contexts, resources = get_context_resource(
+      model_name=model_name,
+      permission_type=permission_type,
+      permission_model=permission_model,
+  )
+  if contexts is None:
+    return None
+  context_ids = {id_ for id_ in contexts if id_ is not None}
+  resources = set(resources or [])
+  sets = PermissionSets(
+      null_context=None in contexts,
+      has_contexts=bool(context_ids),
+      contexts=list(context_ids),
+      has_resources=bool(resources),
+      resources=list(resources),
+  )
+  person_id = get_current_user_id()
+  threshold = getattr(settings, "PERMISSION_FILTER_THRESHOLD", None)
+  if (person_id is None or threshold is None or
+          len(context_ids) + len(resources) < threshold):
+    return sets
+
+  resource_type = model_name
+  if permission_model:
+    resource_type = "{}:{}".format(model_name, permission_model)
+  key = (person_id, permission_type, resource_type)
+  version = _get_version(context_ids, resources)
+  with benchmark("Permission filter: materialize"):
+    if not _is_materialized(key, version):
+      # Entries written now are not visible to reads in the current
+      # transaction, so the ids are inlined until the next request.
+      _materialize(key, version, context_ids, resources)
+      return sets
+  return sets._replace(
+      contexts=_get_entries_select(
+          key, version, PermissionFilterEntry.CONTEXT),
+      resources=_get_entries_select(
+          key, version, PermissionFilterEntry.RESOURCE),
+  )
+
+
+def _get_memoized_permission_sets(model_name, permission_type,
+                                  permission_model):
+  """Get permission sets of a type, computed once per request."""
+  if not has_request_context():
+    return _get_permission_sets(model_name, permission_type, permission_model)
+  if not hasattr(g, "_permission_sets"):
+    g._permission_sets = {}
+  key = (model_name, permission_type, permission_model)
+  if key not in g._permission_sets:
+    g._permission_sets[key] = _get_permission_sets(
+        model_name, permission_type, permission_model)
+  return g._permission_sets[key]
+
+
+def get_permission_filter(model_name, id_column, context_column,
+                          permission_type='read', permission_model=None):
+  """Get filter for objects of a type the current user can access.
+
+  Args:
+    model_name: Name of the filtered model.
+    id_column: Column holding ids of the filtered objects.
+    context_column: Column holding context ids of the filtered objects.
+    permission_type: One of create, read, update or delete.
+    permission_model: Optional model whose permissions are checked instead
+      of the permissions of model_name.
+  Returns:
+    Filter expression or None if access to the type is not restricted.
+  """
+  sets = _get_memoized_permission_sets(
+      model_name, permission_type, permission_model)
+  if sets is None:
+    return None
+  filters = []
+  if sets.null_context:
+    filters.append(context_column.is_(None))
+  if sets.has_contexts:
+    filters.append(context_column.in_(sets.contexts))
+  if sets.has_resources:
+    filters.append(id_column.in_(sets.resources))
+  if not filters:
+    return false()
+  return or_(*filters)
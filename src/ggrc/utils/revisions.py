@@ -6,13 +6,17 @@
 from logging import getLogger
 
 from sqlalchemy.sql import select
+from sqlalchemy import bindparam
 from sqlalchemy import func
 from sqlalchemy import literal
 
 from ggrc import db
 from ggrc.utils import benchmark
+from ggrc.utils import generate_query_chunks
+from ggrc.utils import json_delta
 from ggrc.login import get_current_user_id
 from ggrc.models import all_models
+from ggrc.models.types import CompressedJsonType
 from ggrc.snapshotter.rules import Types
 
 logger = getLogger(__name__)  # pylint: disable=invalid-name
@@ -28,20 +32,17 @@ def _get_revisions_by_type(type_):
     dict with object_id as key and revision_id of the latest revision as value.
   """
 
-  revisions = db.session.execute(
-      """
-      SELECT * FROM (
-          SELECT id, resource_id
-          FROM revisions
-          WHERE resource_type = :type
-          ORDER BY resource_id, id DESC
-      ) AS revs
-      GROUP BY resource_id
-      """,
-      [{"type": type_}]
+  revision = all_models.Revision
+  revisions = db.session.query(
+      func.max(revision.id),
+      revision.resource_id,
+  ).filter(
+      revision.resource_type == type_
+  ).group_by(
+      revision.resource_id
   )
 
-  return {row.resource_id: row.id for row in revisions}
+  return {resource_id: revision_id for revision_id, resource_id in revisions}
 
 
 def _fix_type_revisions(event, type_, obj_rev_map):
@@ -57,12 +58,7 @@ def _fix_type_revisions(event, type_, obj_rev_map):
                    "skipped", type_)
     return
 
-  chunk = 1000
-  all_objects = model.eager_query().order_by(model.id)
-  all_objects_count = model.query.count()
-
-  for i in range(all_objects_count // chunk + 1):
-    objects_chunk = all_objects.limit(chunk).offset(i * chunk)
+  for objects_chunk in generate_query_chunks(model.eager_query()):
     chunk_with_revisions = [
         obj for obj in objects_chunk if obj.id in obj_rev_map]
     chunk_without_revisions = [
@@ -93,11 +89,12 @@ def _update_existing_revisions(objects, revisions_table, obj_rev_map):
   """
   for obj in objects:
     rev_id = obj_rev_map.pop(obj.id)
-    # Update revisions_table.content to the latest object's json
+    # Update revisions_table.content to the latest object's json, the latest
+    # revision is never a keyframe of other revisions
     db.session.execute(
         revisions_table.update()
         .where(revisions_table.c.id == rev_id)
-        .values(content=obj.log_json())
+        .values(content=obj.log_json(), base_revision_id=None)
     )
 
 
@@ -172,20 +169,19 @@ def _recover_create_revisions(revisions_table, event, object_type,
 def set_resource_slugs():
   with benchmark("set revision resource_slug content"):
     revisions_table = all_models.Revision.__table__
-    rows = db.session.execute(select([
+    ids = [row.id for row in db.session.execute(select([
         revisions_table.c.id,
-        revisions_table.c.content,
     ]).where(
         revisions_table.c.resource_type.in_(Types.all)
     ).where(
         revisions_table.c.resource_slug.is_(None)
-    ))
-    for row in rows:
-      if row.content.get("slug"):
+    ))]
+    for id_, content in all_models.Revision.load_contents(ids).iteritems():
+      if content.get("slug"):
         db.session.execute(
             revisions_table.update()
-            .where(revisions_table.c.id == row.id)
-            .values(resource_slug=row.content.get("slug"))
+            .where(revisions_table.c.id == id_)
+            .values(resource_slug=content.get("slug"))
         )
     db.session.commit()
 
@@ -203,3 +199,129 @@ def do_refresh_revisions():
   for type_ in sorted(Types.all | {"Assessment"}):
     logger.info("Updating revisions for: %s", type_)
     _fix_type_revisions(event, type_, _get_revisions_by_type(type_))
+
+
+def _get_storage_size():
+  """Get the number of revisions and the size of their stored content."""
+  revisions_table = all_models.Revision.__table__
+  return db.session.execute(select([
+      func.count(),
+      func.coalesce(func.sum(func.length(revisions_table.c.content)), 0),
+  ]).select_from(
+      revisions_table
+  )).first()
+
+
+def _encode_object_revisions(rows):
+  """Encode all revisions of a single object as keyframes and deltas.
+
+  Args:
+    rows: list of (id, base_revision_id, content) tuples of the stored
+      revisions of an object, ordered by id.
+
+  Returns:
+    list of update parameters for all the revisions.
+  """
+  revision = all_models.Revision
+  # New revisions may be written against the latest keyframe while the
+  # revisions are compacted, so it is always kept as a keyframe.
+  latest_keyframe_id = max(id_ for id_, base_id, _ in rows if base_id is None)
+  contents = {}
+  params = []
+  keyframe_id = None
+  delta_count = 0
+  for id_, base_id, content in rows:
+    if base_id is not None:
+      content = json_delta.patch(contents[base_id], content)
+    contents[id_] = content
+    delta = None
+    if keyframe_id is not None and id_ != latest_keyframe_id and \
+       delta_count < revision.KEYFRAME_INTERVAL:
+      delta = revision.get_delta(contents[keyframe_id], content)
+    if delta is None:
+      keyframe_id = id_
+      delta_count = 0
+      params.append({"_id": id_, "_base_id": None, "_content": content})
+    else:
+      delta_count += 1
+      params.append({"_id": id_, "_base_id": keyframe_id, "_content": delta})
+  return params
+
+
+def _compact_type_revisions(type_, chunk_size):
+  """Compact revisions of all objects of a given type, chunk by chunk."""
+  revisions_table = all_models.Revision.__table__
+  update = revisions_table.update().where(
+      revisions_table.c.id == bindparam("_id")
+  ).values(
+      base_revision_id=bindparam("_base_id"),
+      content=bindparam("_content", type_=CompressedJsonType()),
+  )
+  last_id = None
+  while True:
+    ids_query = select([revisions_table.c.resource_id]).where(
+        revisions_table.c.resource_type == type_
+    ).distinct().order_by(revisions_table.c.resource_id).limit(chunk_size)
+    if last_id is not None:
+      ids_query = ids_query.where(revisions_table.c.resource_id > last_id)
+    resource_ids = [row.resource_id for row in db.session.execute(ids_query)]
+    if not resource_ids:
+      break
+    last_id = resource_ids[-1]
+    object_rows = {}
+    for row in db.session.execute(select([
+        revisions_table.c.resource_id,
+        revisions_table.c.id,
+        revisions_table.c.base_revision_id,
+        revisions_table.c.content,
+    ]).where(
+        revisions_table.c.resource_type == type_
+    ).where(
+        revisions_table.c.resource_id.in_(resource_ids)
+    ).order_by(revisions_table.c.id)):
+      object_rows.setdefault(row.resource_id, []).append(row[1:])
+    params = []
+    for rows in object_rows.itervalues():
+      params.extend(_encode_object_revisions(rows))
+    db.session.execute(update, params)
+    db.session.commit()
+
+
+def compact_revisions(chunk_size=100):
+  """Store the content of all revisions as compressed keyframes and deltas.
+
+  Revisions are processed and committed in chunks of objects, so a stopped
+  compaction keeps the chunks it committed. Running it again processes all
+  objects from the start.
+
+  Args:
+    chunk_size: number of objects whose revisions are compacted at once.
+
+  Returns:
+    dict with the number of revisions and the stored content size in bytes
+    before and after the compaction.
+  """
+  revisions_table = all_models.Revision.__table__
+  count_before, size_before = _get_storage_size()
+  types = [row.resource_type for row in db.session.execute(
+      select([revisions_table.c.resource_type]).distinct())]
+  for type_ in sorted(types):
+    with benchmark("compact revisions of {}".format(type_)):
+      _compact_type_revisions(type_, chunk_size)
+  count_after, size_after = _get_storage_size()
+  keyframes = db.session.execute(select([
+      func.count(),
+  ]).select_from(
+      revisions_table
+  ).where(
+      revisions_table.c.base_revision_id.is_(None)
+  )).scalar()
+  report = {
+      "revisions_before": count_before,
+      "revisions_after": count_after,
+      "keyframes": keyframes,
+      "size_before": int(size_before),
+      "size_after": int(size_after),
+  }
+  logger.info("Compacted revisions: %s", report)
+  return report
@@ -17,14 +17,13 @@ from werkzeug.exceptions import Forbidden
 from ggrc import models
 from ggrc import settings
 from ggrc.app import app
-from ggrc.app import db
 from ggrc.builder.json import publish
 from ggrc.builder.json import publish_representation
+from ggrc.cache import representation as representation_cache
 from ggrc.converters import get_importables, get_exportables
 from ggrc.extensions import get_extension_modules
-from ggrc.fulltext import get_indexer
-from ggrc.fulltext.recordbuilder import fts_record_for
-from ggrc.fulltext.recordbuilder import model_is_indexed
+from ggrc.fulltext import journal as fulltext_journal
+from ggrc.fulltext import reindex as fulltext_reindex
 from ggrc.login import get_current_user
 from ggrc.login import login_required
 from ggrc.models import all_models
@@ -37,7 +36,6 @@ from ggrc.services.common import as_json
 from ggrc.services.common import inclusion_filter
 from ggrc.services import query as services_query
 from ggrc.snapshotter import rules
-from ggrc.snapshotter.indexer import reindex as reindex_snapshots
 from ggrc.views import converters
 from ggrc.views import cron
 from ggrc.views import filters
@@ -46,7 +44,6 @@ from ggrc.views import notifications
 from ggrc.views.common import RedirectedPolymorphView
 from ggrc.views.registry import object_view
 from ggrc.utils import benchmark
-from ggrc.utils import generate_query_chunks
 from ggrc.utils import revisions
 
 
@@ -60,44 +57,30 @@ def refresh_revisions(_):
   return app.make_response(("success", 200, [("Content-Type", "text/html")]))
 
 
+@app.route("/_background_tasks/compact_revisions", methods=["POST"])
+@queued_task
+def compact_revisions(_):
+  """Web hook to compress revision contents and store them as deltas."""
+  report = revisions.compact_revisions()
+  return app.make_response((json.dumps(report), 200,
+                            [("Content-Type", "application/json")]))
+
+
 @app.route("/_background_tasks/reindex", methods=["POST"])
 @queued_task
-def reindex(_):
+def reindex(task):
   """Web hook to update the full text search index."""
-  do_reindex()
+  do_reindex(task)
   return app.make_response(("success", 200, [("Content-Type", "text/html")]))
 
 
-def do_reindex():
-  """Update the full text search index."""
-
-  indexer = get_indexer()
-  indexer.delete_all_records(False)
-
-  # Remove model base classes and non searchable objects
-  excluded_models = {
-      all_models.Directive,
-      all_models.Option,
-      all_models.SystemOrProcess,
-      all_models.Role,
-  }
-  indexed_models = {model for model in all_models.all_models
-                    if model_is_indexed(model)}
-
-  indexed_models -= excluded_models
-
-  for model in indexed_models:
-    # pylint: disable=protected-access
-    mapper_class = model._sa_class_manager.mapper.base_mapper.class_
-    query = model.query.options(
-        db.undefer_group(mapper_class.__name__ + '_complete'),
-    )
-    for query_chunk in generate_query_chunks(query):
-      for instance in query_chunk:
-        indexer.create_record(fts_record_for(instance), False)
-      db.session.commit()
+def do_reindex(task=None):
+  """Update the full text search index.
 
-  reindex_snapshots()
+  Args:
+    task: Optional BackgroundTask used to report reindex progress.
+  """
+  fulltext_reindex.reindex(task)
 
 
 def get_permissions_json():
@@ -291,6 +274,30 @@ def admin_reindex():
                          [('Content-Type', 'text/html')])))
 
 
+@app.route("/admin/fulltext_journal", methods=["GET"])
+@login_required
+def admin_fulltext_journal():
+  """Get the number of pending journal entries and the index freshness lag.
+  """
+  if not permissions.is_allowed_read("/admin", None, 1):
+    raise Forbidden()
+  return app.make_response((
+      json.dumps(fulltext_journal.get_status()), 200,
+      [('Content-Type', 'application/json')]))
+
+
+@app.route("/admin/representation_cache", methods=["GET"])
+@login_required
+def admin_representation_cache():
+  """Get hit ratio and lookup latency of the representation cache per model.
+  """
+  if not permissions.is_allowed_read("/admin", None, 1):
+    raise Forbidden()
+  return app.make_response((
+      json.dumps(representation_cache.get_report()), 200,
+      [('Content-Type', 'application/json')]))
+
+
 @app.route("/admin/refresh_revisions", methods=["POST"])
 @login_required
 def admin_refresh_revisions():
@@ -306,6 +313,25 @@ def admin_refresh_revisions():
                          [('Content-Type', 'text/html')])))
 
 
+@app.route("/admin/compact_revisions", methods=["POST"])
+@login_required
+def admin_compact_revisions():
+  """Calls a webhook that compacts revision contents.
+
+  The task result holds the number of revisions and their size before and
+  after the compaction.
+  """
+  admins = getattr(settings, "BOOTSTRAP_ADMIN_USERS", [])
+  if get_current_user().email not in admins:
+    raise Forbidden()
+
+  task_queue = create_task("compact_revisions", url_for(
+      compact_revisions.__name__), compact_revisions)
+  return task_queue.make_response(
+      app.make_response(("scheduled %s" % task_queue.name, 200,
+                         [('Content-Type', 'text/html')])))
+
+
 @app.route("/admin")
 @login_required
 def admin():
@@ -13,15 +13,19 @@ from flask import current_app
 from flask import request
 from flask import json
 from flask import render_template
+from flask import stream_with_context
+from flask import url_for
 from werkzeug.exceptions import BadRequest
 
 from ggrc.app import app
 from ggrc.converters.base import Converter
-from ggrc.converters.import_helper import generate_csv_string
+from ggrc.converters.import_helper import generate_csv_chunks
 from ggrc.converters.import_helper import read_csv_file
 from ggrc.converters.query_helper import BadQueryException
 from ggrc.converters.query_helper import QueryHelper
 from ggrc.login import login_required
+from ggrc.models.background_task import create_task
+from ggrc.models.background_task import queued_task
 from ggrc.utils import benchmark
 
 
@@ -52,22 +56,71 @@ def parse_export_request():
   return request.json
 
 
+def generate_export_csv(converter):
+  """Generate parts of the exported csv file and log export failures."""
+  try:
+    for chunk in generate_csv_chunks(converter.generate_csv_rows()):
+      yield chunk
+  except:  # pylint: disable=bare-except
+    logger.exception("Export failed")
+    raise
+
+
+def is_async_request():
+  """Check if the conversion should run as a background task."""
+  return "X-GGRC-BackgroundTask" in request.headers
+
+
+def make_scheduled_task_response(task):
+  """Get a response with the background task that runs the conversion.
+
+  The client polls /api/background_tasks/<id> for the task status and gets
+  the progress and the final result from /background_task/<id>.
+  """
+  response_json = json.dumps({
+      "background_task": {
+          "id": task.id,
+          "type": task.type,
+          "name": task.name,
+          "status": task.status,
+      },
+  })
+  headers = [("Content-Type", "application/json")]
+  return current_app.make_response((response_json, 202, headers))
+
+
+def get_export_headers(converter):
+  """Get response headers for the exported csv file."""
+  object_names = "_".join(converter.get_object_names())
+  filename = "{}.csv".format(object_names)
+  return [
+      ("Content-Type", "text/csv"),
+      ("Content-Disposition", "attachment; filename='{}'".format(filename)),
+  ]
+
+
 def handle_export_request():
+  """Export objects as a csv file that is streamed to the client.
+
+  The query and block converters are prepared before the response is sent, so
+  invalid requests still get an error response. Objects are loaded in chunks
+  while the response is written.
+  """
   try:
     data = parse_export_request()
+    if is_async_request():
+      task = create_task("export_csv", url_for(run_export_task.__name__),
+                         run_export_task, parameters={"data": data},
+                         use_worker=True)
+      return make_scheduled_task_response(task)
     query_helper = QueryHelper(data)
     converter = Converter(ids_by_type=query_helper.get_ids())
-    csv_data = converter.to_array()
-    csv_string = generate_csv_string(csv_data)
-
-    object_names = "_".join(converter.get_object_names())
-    filename = "{}.csv".format(object_names)
-
-    headers = [
-        ("Content-Type", "text/csv"),
-        ("Content-Disposition", "attachment; filename='{}'".format(filename)),
-    ]
-    return current_app.make_response((csv_string, 200, headers))
+    converter.block_converters_from_ids()
+    return current_app.response_class(
+        stream_with_context(generate_export_csv(converter)),
+        200,
+        get_export_headers(converter),
+    )
   except BadQueryException as exception:
     raise BadRequest(exception.message)
   except:  # pylint: disable=bare-except
@@ -75,6 +128,19 @@ def handle_export_request():
   raise BadRequest("Export failed due to server error.")
 
 
+@queued_task
+def run_export_task(task):
+  """Export objects as a csv file stored in the background task result."""
+  converter = Converter(
+      ids_by_type=QueryHelper(task.parameters["data"]).get_ids(),
+      task=task,
+  )
+  converter.block_converters_from_ids()
+  csv_string = "".join(generate_csv_chunks(converter.generate_csv_rows()))
+  return current_app.make_response(
+      (csv_string, 200, get_export_headers(converter)))
+
+
 def check_import_file():
   if "file" not in request.files or not request.files["file"]:
     raise BadRequest("Missing csv file")
@@ -97,20 +163,38 @@ def parse_import_request():
   return dry_run, csv_data
 
 
+def import_csv(dry_run, csv_data, task=None):
+  """Import csv data and get a response with the import info."""
+  converter = Converter(dry_run=dry_run, csv_data=csv_data, task=task)
+  converter.import_csv()
+  response_data = converter.get_info()
+  response_json = json.dumps(response_data)
+  headers = [("Content-Type", "application/json")]
+  return current_app.make_response((response_json, 200, headers))
+
+
 def handle_import_request():
   try:
     dry_run, csv_data = parse_import_request()
-    converter = Converter(dry_run=dry_run, csv_data=csv_data)
-    converter.import_csv()
-    response_data = converter.get_info()
-    response_json = json.dumps(response_data)
-    headers = [("Content-Type", "application/json")]
-    return current_app.make_response((response_json, 200, headers))
+    if is_async_request():
+      task = create_task("import_csv", url_for(run_import_task.__name__),
+                         run_import_task,
+                         parameters={"dry_run": dry_run, "csv_data": csv_data},
+                         use_worker=True)
+      return make_scheduled_task_response(task)
+    return import_csv(dry_run, csv_data)
   except:  # pylint: disable=bare-except
     logger.exception("Import failed")
   raise BadRequest("Import failed due to server error.")
 
 
+@queued_task
+def run_import_task(task):
+  """Import csv data stored in the background task parameters."""
+  parameters = task.parameters
+  return import_csv(parameters["dry_run"], parameters["csv_data"], task)
+
+
 def init_converter_views():
   """Initialize views for import and export."""
 
@@ -128,6 +212,12 @@ def init_converter_views():
     with benchmark("handle import request"):
       return handle_import_request()
 
+  # Needs to be secured as we are removing @login_required
+  app.add_url_rule("/_background_tasks/export_csv", run_export_task.__name__,
+                   run_export_task, methods=["POST"])
+  app.add_url_rule("/_background_tasks/import_csv", run_import_task.__name__,
+                   run_import_task, methods=["POST"])
+
   @app.route("/import")
   @login_required
   def import_view():
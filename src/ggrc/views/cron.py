@@ -37,7 +37,27 @@ def nightly_cron_endpoint():
   return 'Ok'
 
 
+def fulltext_journal_cron_endpoint():
+  """Index objects from the full text change journal."""
+  from ggrc.fulltext import journal
+  run_job(journal.drain)
+  return 'Ok'
+
+
+def revision_writer_cron_endpoint():
+  """Compute and insert revisions logged in deferred mode."""
+  from ggrc.services import revision_writer
+  run_job(revision_writer.drain)
+  return 'Ok'
+
+
 def init_cron_views(app):
   app.add_url_rule(
       "/nightly_cron_endpoint", "nightly_cron_endpoint",
       view_func=nightly_cron_endpoint)
+  app.add_url_rule(
+      "/fulltext_journal_cron_endpoint", "fulltext_journal_cron_endpoint",
+      view_func=fulltext_journal_cron_endpoint)
+  app.add_url_rule(
+      "/revision_writer_cron_endpoint", "revision_writer_cron_endpoint",
+      view_func=revision_writer_cron_endpoint)
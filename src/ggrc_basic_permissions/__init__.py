@@ -14,22 +14,28 @@ from sqlalchemy import or_
 from sqlalchemy.orm import aliased
 from flask import Blueprint
 from flask import g
+from flask import request
+from flask import url_for
+from werkzeug.exceptions import Forbidden
 
 from ggrc import db
 from ggrc import settings
 from ggrc.app import app
 from ggrc.login import get_current_user
+from ggrc.login import login_required
 from ggrc.models import all_models
+from ggrc.models.background_task import create_task
+from ggrc.models.background_task import queued_task
 from ggrc.models.audit import Audit
 from ggrc.models.program import Program
 from ggrc.models.object_owner import ObjectOwner
 from ggrc.rbac import permissions as rbac_permissions
 from ggrc.rbac.permissions_provider import DefaultUserPermissions
-from ggrc.services.common import _get_cache_manager
 from ggrc.services.common import Resource
 from ggrc.services.registry import service
 from ggrc.utils import benchmark
 from ggrc_basic_permissions import basic_roles
+from ggrc_basic_permissions import store
 from ggrc_basic_permissions.contributed_roles import lookup_role_implications
 from ggrc_basic_permissions.contributed_roles import BasicRoleDeclarations
 from ggrc_basic_permissions.contributed_roles import BasicRoleImplications
@@ -48,8 +54,6 @@ blueprint = Blueprint(
     static_url_path='/static/ggrc_basic_permissions',
 )
 
-PERMISSION_CACHE_TIMEOUT = 3600  # 60 minutes
-
 
 def get_public_config(_):
   """Expose additional permissions-dependent config to client.
@@ -243,37 +247,6 @@ def collect_permissions(src_permissions, context_id, permissions):
             })
 
 
-def query_memcache(key):
-  """Check if cached permissions are available
-
-  Args:
-      key (string): key of the stored permissions
-  Returns:
-      cache (memcache_client): memcache client or None if caching
-                               is not available
-      permissions_cache (dict): dict with all permissions or None if there
-                                was a cache miss
-  """
-  if not getattr(settings, 'MEMCACHE_MECHANISM', False):
-    return None, None
-
-  cache = _get_cache_manager().cache_object.memcache_client
-  cached_keys_set = cache.get('permissions:list') or set()
-  if key not in cached_keys_set:
-    # We set the permissions:list variable so that we are able to batch
-    # remove all permissions related keys from memcache
-    cached_keys_set.add(key)
-    cache.set('permissions:list', cached_keys_set, PERMISSION_CACHE_TIMEOUT)
-    return cache, None
-
-  permissions_cache = cache.get(key)
-  if permissions_cache:
-    # If the key is both in permissions:list and in memcache itself
-    # it is safe to return the cached permissions
-    return cache, permissions_cache
-  return cache, None
-
-
 def load_default_permissions(permissions):
   """Load default permissions for all users
 
@@ -616,28 +589,6 @@ def load_backlog_workflows(permissions):
             .append(wf_context_id)
 
 
-def store_results_into_memcache(permissions, cache, key):
-  """Load personal context for user
-
-  Args:
-      permissions (dict): dict where the permissions will be stored
-      cache (cache_manager): Cache manager that should be used for storing
-                             permissions
-      key (string): key of under which permissions should be stored
-  Returns:
-      None
-  """
-  if cache is None:
-    return
-
-  cached_keys_set = cache.get('permissions:list') or set()
-  if key in cached_keys_set:
-    # We only add the permissions to the cache if the
-    # key still exists in the permissions:list after
-    # the query has executed.
-    cache.set(key, permissions, PERMISSION_CACHE_TIMEOUT)
-
-
 def load_permissions_for(user):
   """Permissions is dictionary that can be exported to json to share with
   clients. Structure is:
@@ -655,14 +606,17 @@ def load_permissions_for(user):
     keys.
   'condition' is the string name of a conditional operator, such as 'contains'.
   'terms' are the arguments to the 'condition'.
+
+  Permissions are computed only if the stored permissions of the user are
+  outdated, see ggrc_basic_permissions.store.
   """
-  permissions = {}
-  key = 'permissions:{}'.format(user.id)
+  with benchmark("load_permissions > get stored permissions"):
+    return store.get_permissions(user, compute_permissions_for)
 
-  with benchmark("load_permissions > query memcache"):
-    cache, result = query_memcache(key)
-    if result:
-      return result
+
+def compute_permissions_for(user):
+  """Compute permissions of a user, see load_permissions_for."""
+  permissions = {}
 
   with benchmark("load_permissions > load default permissions"):
     load_default_permissions(permissions)
@@ -721,9 +675,6 @@ def load_permissions_for(user):
       set(permissions["delete"]["Relationship"]["resources"])
   )
 
-  with benchmark("load_permissions > store results into memcache"):
-    store_results_into_memcache(permissions, cache, key)
-
   return permissions
 
 
@@ -891,6 +842,41 @@ def handle_resource_deleted(sender, obj=None, service=None):
     # db.session.delete(obj.context)
 
 
+@queued_task
+def warm_permissions(task):
+  """Web hook to compute outdated stored permissions."""
+  person_ids = task.parameters.get("person_ids")
+  warmed = store.warm(compute_permissions_for, person_ids)
+  return app.make_response(("warmed permissions of {} users".format(warmed),
+                            200, [("Content-Type", "text/html")]))
+
+
+def admin_warm_permissions():
+  """Schedule computation of outdated stored permissions."""
+  if not rbac_permissions.is_allowed_read("/admin", None, 1):
+    raise Forbidden()
+  person_ids = request.json.get("person_ids") if request.json else None
+  task = create_task("warm_permissions", url_for(warm_permissions.__name__),
+                     warm_permissions, {"person_ids": person_ids})
+  return task.make_response(
+      app.make_response(("scheduled %s" % task.name, 200,
+                         [("Content-Type", "text/html")])))
+
+
+def init_extra_views(app_):
+  """Init views for computing stored permissions."""
+  app_.add_url_rule(
+      "/_background_tasks/warm_permissions", view_func=warm_permissions,
+      methods=["POST"])
+  app_.add_url_rule(
+      "/admin/warm_permissions",
+      view_func=login_required(admin_warm_permissions),
+      methods=["POST"])
+
+
+store.register_listeners()
+
+
 @app.context_processor
 def authorized_users_for():
   return {'authorized_users_for': UserRole.role_assignments_for}
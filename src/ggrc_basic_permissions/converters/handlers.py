@@ -156,6 +156,10 @@ class UserRoleColumnHandler(UserColumnHandler):
       ""
   ]
 
+  @classmethod
+  def get_lookup_keys(cls, raw_value, **options):
+    return []
+
   def parse_item(self):
     value = self.raw_value.lower()
     if value.title() not in self._allowed_roles:
@@ -0,0 +1,47 @@
+# Copyright (C) 2017 Google Inc.
+# Licensed under http://www.apache.org/licenses/LICENSE-2.0 <see LICENSE file>
+
+"""
+Add stored permissions
+
+Create Date: 2017-03-22 12:00:00.000000
+"""
+# disable Invalid constant name pylint warning for mandatory Alembic variables.
+# pylint: disable=invalid-name
+
+import sqlalchemy as sa
+from sqlalchemy.dialects import mysql
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '2f1c7a9d5e34'
+down_revision = '53831d153d8e'
+
+
+def upgrade():
+  """Upgrade database schema and/or data, creating a new revision."""
+  op.create_table(
+      'permission_versions',
+      sa.Column('name', sa.String(length=32), nullable=False),
+      sa.Column('version', sa.Integer(), nullable=False),
+      sa.PrimaryKeyConstraint('name'),
+  )
+  op.create_table(
+      'stored_permissions',
+      sa.Column('person_id', sa.Integer(), autoincrement=False,
+                nullable=False),
+      sa.Column('version', sa.Integer(), nullable=False),
+      sa.Column('computed_version', sa.Integer(), nullable=True),
+      sa.Column('global_version', sa.Integer(), nullable=True),
+      sa.Column('permissions', mysql.MEDIUMBLOB(), nullable=True),
+      sa.Column('updated_at', sa.DateTime(), nullable=True),
+      sa.PrimaryKeyConstraint('person_id'),
+  )
+
+
+def downgrade():
+  """Downgrade database schema and/or data back to the previous revision."""
+  op.drop_table('stored_permissions')
+  op.drop_table('permission_versions')
@@ -0,0 +1,622 @@
+# Copyright (C) 2017 Google Inc.
+# Licensed under http://www.apache.org/licenses/LICENSE-2.0 <see LICENSE file>
+
+"""Persisted user permissions with versioned invalidation.
+
+Permissions computed by ``load_permissions_for`` are stored for every user
+in the ``stored_permissions`` table together with the global version and the
+user version they were computed at. Stored permissions are used as long as
+both versions are current. They are also cached in memcache under keys that
+contain both versions and the fingerprint, so cached entries never have to be
+deleted.
+
+Changes of the data that permissions are computed from bump the versions in
+the same transaction:
+
+* role definitions, backlog workflows and bulk deletes of permission data
+  bump the global version, which invalidates the permissions of all users,
+* user roles, object owners, context implications, assignments and
+  relationships bump the user versions of the affected users only.
+
+Permissions also depend on role declarations and settings that are not
+stored in the database. Stored permissions record a fingerprint of these
+inputs, see ``get_fingerprint``, and are only used by processes with the same
+fingerprint and for at most ``STORED_TIMEOUT``.
+
+Stale permissions can be recomputed ahead of time with ``warm``.
+"""
+
+import datetime
+import hashlib
+import itertools
+import json
+from logging import getLogger
+
+import sqlalchemy as sa
+from sqlalchemy import and_
+from sqlalchemy import case
+from sqlalchemy import event
+from sqlalchemy import inspect
+from sqlalchemy import or_
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm.session import Session
+from sqlalchemy.sql.expression import tuple_
+
+from ggrc import db
+from ggrc import settings
+from ggrc.models import all_models
+from ggrc.models import get_model
+from ggrc.models.exceptions import ValidationError
+from ggrc.models.types import CompressedType
+from ggrc_basic_permissions.contributed_roles import get_declared_role
+from ggrc_basic_permissions.contributed_roles import lookup_declarations
+
+
+logger = getLogger(__name__)
+
+CACHE_TIMEOUT = 3600  # 60 minutes
+# Stored permissions are recomputed after this time even if no change of
+# their inputs was detected.
+STORED_TIMEOUT = datetime.timedelta(hours=24)
+# Seconds to wait for the row lock of a user when storing permissions.
+STORE_LOCK_TIMEOUT = 1
+
+# Number of objects or contexts resolved with a single query.
+CHUNK_SIZE = 500
+
+GLOBAL_VERSION = "global"
+
+# Types whose contexts grant access to all objects mapped to them, see
+# load_context_relationships.
+CONTEXT_OBJECT_TYPES = {"Program", "Audit"}
+
+# Tables whose bulk deletes and updates invalidate all users.
+BULK_TABLES = {
+    "context_implications",
+    "object_owners",
+    "relationship_attrs",
+    "relationships",
+    "roles",
+    "user_roles",
+}
+
+# Models whose changes can affect permissions, see _Changes.add_object.
+PERMISSION_MODELS = {
+    "ContextImplication",
+    "ObjectOwner",
+    "Person",
+    "RelationshipAttr",
+    "Role",
+    "UserRole",
+    "Workflow",
+}
+
+# session.info keys
+PENDING_USERS = "permissions_pending_users"
+PENDING_GLOBAL = "permissions_pending_global"
+SEEN_STUBS = "permissions_seen_stubs"
+
+
+class PermissionVersion(db.Model):
+  """Version counter of stored permissions."""
+  # pylint: disable=too-few-public-methods
+  __tablename__ = "permission_versions"
+
+  name = db.Column(db.String(32), primary_key=True)
+  version = db.Column(db.Integer, nullable=False, default=0)
+
+
+class StoredPermissions(db.Model):
+  """Permissions of a user and the versions they were computed at."""
+  # pylint: disable=too-few-public-methods
+  __tablename__ = "stored_permissions"
+
+  person_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+  # Current version of the permissions of the user
+  version = db.Column(db.Integer, nullable=False, default=0)
+  computed_version = db.Column(db.Integer, nullable=True)
+  global_version = db.Column(db.Integer, nullable=True)
+  fingerprint = db.Column(db.String(40), nullable=True)
+  permissions = db.deferred(db.Column(CompressedType, nullable=True))
+  updated_at = db.Column(db.DateTime, nullable=True)
+
+
+def _get_memcache():
+  if not getattr(settings, "MEMCACHE_MECHANISM", False):
+    return None
+  from ggrc.services.common import _get_cache_manager
+  return _get_cache_manager().cache_object.memcache_client
+
+
+_fingerprint = None
+
+
+def get_fingerprint():
+  """Get a fingerprint of the permission inputs declared in code and settings.
+
+  The fingerprint covers declared role permissions with their contributions,
+  declared role implications, enabled extensions and bootstrap admins.
+  """
+  global _fingerprint  # pylint: disable=global-statement
+  if _fingerprint is None:
+    from ggrc.extensions import get_extension_modules
+    roles = {}
+    for name in lookup_declarations():
+      role = get_declared_role(name)
+      roles[name] = [getattr(role, "scope", None), role.permissions]
+    implications = [
+        getattr(getattr(module, "ROLE_IMPLICATIONS", None),
+                "implications", None)
+        for module in get_extension_modules()
+    ]
+    inputs = {
+        "roles": roles,
+        "implications": [{repr(key): value for key, value in item.items()}
+                         for item in implications if item],
+        "extensions": getattr(settings, "EXTENSIONS", []),
+        "bootstrap_admins": sorted(
+            getattr(settings, "BOOTSTRAP_ADMIN_USERS", None) or []),
+    }
+    _fingerprint = hashlib.sha1(
+        json.dumps(inputs, sort_keys=True, default=repr)).hexdigest()
+  return _fingerprint
+
+
+def get_global_version():
+  return db.session.query(PermissionVersion.version).filter(
+      PermissionVersion.name == GLOBAL_VERSION).scalar() or 0
+
+
+def _get_stored_versions(person_id):
+  """Get current and computed versions of stored permissions of a user."""
+  return db.session.query(
+      StoredPermissions.version,
+      StoredPermissions.computed_version,
+      StoredPermissions.global_version,
+      StoredPermissions.fingerprint,
+      StoredPermissions.updated_at,
+  ).filter(StoredPermissions.person_id == person_id).first()
+
+
+def _is_current(row, global_version):
+  """Check if stored permissions in a row are up to date."""
+  return (row is not None and
+          row.computed_version == row.version and
+          row.global_version == global_version and
+          row.fingerprint == get_fingerprint() and
+          row.updated_at is not None and
+          row.updated_at > datetime.datetime.now() - STORED_TIMEOUT)
+
+
+def _has_pending_changes(person_id):
+  """Check if the current transaction changed permissions of a user.
+
+  Permissions computed from uncommitted changes are not stored, since the
+  changes might be rolled back.
+  """
+  info = db.session().info
+  return info.get(PENDING_GLOBAL, False) or \
+      person_id in info.get(PENDING_USERS, ())
+
+
+def _store(person_id, permissions, global_version, user_version):
+  """Store permissions computed at the given versions.
+
+  The permissions are written in a separate transaction, so they are stored
+  even if the current request is rolled back. The current version of the
+  user is not changed, so permissions of a user whose version was bumped
+  while they were computed are stale right away.
+
+  Stored permissions are only an optimization, so the write does not wait
+  for transactions that hold the row of the user and failed writes are only
+  logged.
+  """
+  statement = sa.text(
+      "INSERT INTO stored_permissions "
+      "(person_id, version, computed_version, global_version, fingerprint, "
+      "permissions, updated_at) "
+      "VALUES (:person_id, 0, :computed_version, :global_version, "
+      ":fingerprint, :permissions, :updated_at) "
+      "ON DUPLICATE KEY UPDATE "
+      "computed_version = VALUES(computed_version), "
+      "global_version = VALUES(global_version), "
+      "fingerprint = VALUES(fingerprint), "
+      "permissions = VALUES(permissions), "
+      "updated_at = VALUES(updated_at)"
+  ).bindparams(sa.bindparam("permissions", type_=CompressedType()))
+  try:
+    with db.engine.connect() as connection:
+      connection.execute(sa.text(
+          "SET SESSION innodb_lock_wait_timeout = :timeout"
+      ), timeout=STORE_LOCK_TIMEOUT)
+      try:
+        with connection.begin():
+          connection.execute(
+              statement,
+              person_id=person_id,
+              computed_version=user_version,
+              global_version=global_version,
+              fingerprint=get_fingerprint(),
+              permissions=permissions,
+              updated_at=datetime.datetime.now(),
+          )
+      finally:
+        connection.execute("SET SESSION innodb_lock_wait_timeout = DEFAULT")
+  except (SQLAlchemyError, ValidationError):
+    logger.exception("Failed to store permissions of user %s", person_id)
+
+
+def get_permissions(user, compute):
+  """Get stored permissions of a user or compute and store them.
+
+  Args:
+    user: Person whose permissions are loaded.
+    compute: Function that computes permissions of a user.
+  Returns:
+    dict with the permissions of the user.
+  """
+  if user.id is None:
+    return compute(user)
+  global_version = get_global_version()
+  versions = _get_stored_versions(user.id)
+  user_version = versions.version if versions else 0
+  key = "permissions:{}:{}:{}:{}".format(
+      user.id, global_version, user_version, get_fingerprint())
+
+  cache = _get_memcache()
+  if cache is not None:
+    permissions = cache.get(key)
+    if permissions is not None:
+      return permissions
+
+  permissions = None
+  if _is_current(versions, global_version):
+    permissions = db.session.query(StoredPermissions.permissions).filter(
+        StoredPermissions.person_id == user.id).scalar()
+  if permissions is None:
+    permissions = compute(user)
+    if _has_pending_changes(user.id):
+      return permissions
+    _store(user.id, permissions, global_version, user_version)
+  if cache is not None:
+    cache.set(key, permissions, CACHE_TIMEOUT)
+  return permissions
+
+
+def get_stale_person_ids():
+  """Get ids of users without stored permissions or with outdated ones."""
+  person = all_models.Person
+  stored = StoredPermissions
+  return [person_id for person_id, in db.session.query(person.id).outerjoin(
+      stored, stored.person_id == person.id
+  ).filter(or_(
+      stored.computed_version.is_(None),
+      stored.computed_version != stored.version,
+      stored.global_version != get_global_version(),
+      stored.fingerprint.is_(None),
+      stored.fingerprint != get_fingerprint(),
+      stored.updated_at < datetime.datetime.now() - STORED_TIMEOUT,
+  ))]
+
+
+def warm(compute, person_ids=None):
+  """Compute and store permissions of users with stale permissions.
+
+  Args:
+    compute: Function that computes permissions of a user.
+    person_ids: ids of users to warm, all users with outdated stored
+      permissions by default.
+  Returns:
+    number of users whose permissions were computed.
+  """
+  if person_ids is None:
+    person_ids = get_stale_person_ids()
+  global_version = get_global_version()
+  stored = {row.person_id: row for row in db.session.query(
+      StoredPermissions.person_id,
+      StoredPermissions.version,
+      StoredPermissions.computed_version,
+      StoredPermissions.global_version,
+      StoredPermissions.fingerprint,
+      StoredPermissions.updated_at,
+  ).filter(StoredPermissions.person_id.in_(person_ids))} if person_ids else {}
+  warmed = 0
+  for person in all_models.Person.query.filter(
+          all_models.Person.id.in_(person_ids)) if person_ids else []:
+    row = stored.get(person.id)
+    user_version = row.version if row else 0
+    if _is_current(row, global_version):
+      continue
+    permissions = compute(person)
+    # Computing permissions can create the personal context of the user.
+    db.session.commit()
+    _store(person.id, permissions, global_version, user_version)
+    warmed += 1
+  return warmed
+
+
+def _bump(session, person_ids=(), bump_global=False):
+  """Bump versions in the transaction of the session."""
+  info = session.info
+  connection = session.connection()
+  if bump_global and not info.get(PENDING_GLOBAL):
+    connection.execute(sa.text(
+        "INSERT INTO permission_versions (name, version) VALUES (:name, 1) "
+        "ON DUPLICATE KEY UPDATE version = version + 1"
+    ), name=GLOBAL_VERSION)
+    info[PENDING_GLOBAL] = True
+  pending = info.setdefault(PENDING_USERS, set())
+  # Ordered to avoid deadlocks between concurrent transactions.
+  person_ids = sorted(set(person_ids) - pending - {None})
+  if person_ids:
+    connection.execute(sa.text(
+        "INSERT INTO stored_permissions (person_id, version) "
+        "VALUES (:person_id, 1) "
+        "ON DUPLICATE KEY UPDATE version = version + 1"
+    ), [{"person_id": person_id} for person_id in person_ids])
+    pending.update(person_ids)
+
+
+def invalidate(person_ids=(), bump_global=False, session=None):
+  """Invalidate stored permissions of users changed with bulk statements.
+
+  Args:
+    person_ids: ids of users whose permissions changed.
+    bump_global: True to invalidate permissions of all users.
+    session: Session that made the changes, db.session by default.
+  """
+  if session is None:
+    session = db.session()
+  _bump(session, person_ids, bump_global)
+
+
+def _chunks(values):
+  values = list(values)
+  for start in range(0, len(values), CHUNK_SIZE):
+    yield values[start:start + CHUNK_SIZE]
+
+
+def _values(obj, attr):
+  """Get the current and the previous values of an attribute."""
+  history = inspect(obj).attrs[attr].history
+  return set(history.sum() or [getattr(obj, attr)])
+
+
+def _is_changed(session, obj, attrs=None):
+  """Check if a new, deleted or modified object changes an attribute."""
+  if obj in session.new or obj in session.deleted:
+    return True
+  state = inspect(obj)
+  if attrs is None:
+    return session.is_modified(obj, include_collections=False)
+  return any(state.attrs[attr].history.has_changes() for attr in attrs)
+
+
+class _Changes(object):
+  """Users and objects whose permissions might be affected by a flush."""
+  # pylint: disable=too-few-public-methods
+
+  def __init__(self):
+    self.bump_global = False
+    self.person_ids = set()
+    # Users with roles in these contexts are affected
+    self.context_ids = set()
+    # Users with roles in the contexts of these objects are affected
+    self.context_objects = set()
+    # Owners of these objects are affected
+    self.owned_objects = set()
+    # Users assigned to these objects are affected
+    self.assigned_objects = set()
+    self.relationship_ids = set()
+
+  def _add_user_role(self, session, obj):
+    if _is_changed(session, obj, ("person_id", "context_id", "role_id")):
+      self.person_ids.update(_values(obj, "person_id"))
+
+  def _add_object_owner(self, session, obj):
+    if _is_changed(session, obj):
+      self.person_ids.update(_values(obj, "person_id"))
+
+  def _add_context_implication(self, session, obj):
+    if _is_changed(session, obj):
+      self.context_ids.update(_values(obj, "source_context_id"))
+
+  def _add_relationship_attr(self, session, obj):
+    if _is_changed(session, obj) and \
+       "AssigneeType" in _values(obj, "attr_name"):
+      self.relationship_ids.update(_values(obj, "relationship_id"))
+
+  def _add_person(self, session, obj):
+    if obj not in session.new and _is_changed(session, obj, ("email",)):
+      self.person_ids.add(obj.id)
+
+  def _add_role(self, session, obj):
+    self.bump_global |= _is_changed(session, obj)
+
+  def _add_workflow(self, session, obj):
+    self.bump_global |= _is_changed(session, obj, ("kind",)) and \
+        "Backlog" in _values(obj, "kind")
+
+  _object_handlers = {
+      "ContextImplication": _add_context_implication,
+      "ObjectOwner": _add_object_owner,
+      "Person": _add_person,
+      "RelationshipAttr": _add_relationship_attr,
+      "Role": _add_role,
+      "UserRole": _add_user_role,
+      "Workflow": _add_workflow,
+  }
+
+  def add_object(self, session, obj):
+    """Record a changed object."""
+    handler = self._object_handlers.get(obj.__class__.__name__)
+    if handler is not None:
+      handler(self, session, obj)
+
+  def add_stubs(self, stubs):
+    """Record changed relationships of objects."""
+    stubs = set(stubs)
+    has_documents = any(type_ == "Document" for type_, _ in stubs)
+    for type_, id_ in stubs:
+      if type_ == "Person":
+        self.person_ids.add(id_)
+      elif type_ in CONTEXT_OBJECT_TYPES:
+        self.context_objects.add((type_, id_))
+      elif type_ == "Assessment" and has_documents:
+        # Users who can update an assessment can delete its relationships
+        # to documents.
+        self.context_objects.add((type_, id_))
+        self.owned_objects.add((type_, id_))
+      self.assigned_objects.add((type_, id_))
+
+  def _resolve_contexts(self):
+    """Get ids of contexts of the changed context objects."""
+    by_type = {}
+    for type_, id_ in self.context_objects:
+      by_type.setdefault(type_, set()).add(id_)
+    for type_, ids in by_type.iteritems():
+      model = get_model(type_)
+      if model is None or not hasattr(model, "context_id"):
+        continue
+      for chunk in _chunks(ids):
+        self.context_ids.update(
+            context_id for context_id, in db.session.query(
+                model.context_id).filter(model.id.in_(chunk)))
+
+  def _resolve_context_users(self):
+    """Get users with roles in the changed contexts or contexts implying
+    them."""
+    user_role = all_models.UserRole
+    implication = all_models.ContextImplication
+    if None in self.context_ids:
+      # Implications from the global context apply to all users
+      self.bump_global = True
+      return
+    context_ids = set(self.context_ids)
+    for chunk in _chunks(self.context_ids):
+      sources = {source for source, in db.session.query(
+          implication.source_context_id).filter(
+              implication.context_id.in_(chunk))}
+      if None in sources:
+        self.bump_global = True
+        return
+      context_ids.update(sources)
+    for chunk in _chunks(context_ids):
+      self.person_ids.update(person_id for person_id, in db.session.query(
+          user_role.person_id).filter(user_role.context_id.in_(chunk)))
+
+  def _resolve_assignees(self):
+    """Get users assigned to the changed objects, see
+    objects_via_assignable_query."""
+    rel = all_models.Relationship
+    attrs = all_models.RelationshipAttr
+    person_id = case([(rel.destination_type == "Person", rel.destination_id)],
+                     else_=rel.source_id)
+    assigned = db.session.query(person_id).join(attrs, and_(
+        attrs.relationship_id == rel.id,
+        attrs.attr_name == "AssigneeType",
+    ))
+    for chunk in _chunks(self.assigned_objects):
+      query = assigned.filter(
+          tuple_(rel.source_type, rel.source_id).in_(chunk)
+      ).union_all(assigned.filter(
+          tuple_(rel.destination_type, rel.destination_id).in_(chunk)
+      ))
+      self.person_ids.update(id_ for id_, in query)
+    for chunk in _chunks(self.relationship_ids):
+      for src_type, src_id, dst_type, dst_id in db.session.query(
+          rel.source_type, rel.source_id, rel.destination_type,
+          rel.destination_id,
+      ).filter(rel.id.in_(chunk)):
+        self.person_ids.update(
+            id_ for type_, id_ in ((src_type, src_id), (dst_type, dst_id))
+            if type_ == "Person")
+
+  def _resolve_owners(self):
+    owner = all_models.ObjectOwner
+    for chunk in _chunks(self.owned_objects):
+      self.person_ids.update(person_id for person_id, in db.session.query(
+          owner.person_id).filter(
+              tuple_(owner.ownable_type, owner.ownable_id).in_(chunk)))
+
+  def bump(self, session):
+    """Bump versions of all affected users."""
+    if not self.bump_global:
+      self._resolve_contexts()
+      self._resolve_context_users()
+    if not self.bump_global:
+      self._resolve_assignees()
+      self._resolve_owners()
+    _bump(session, self.person_ids, self.bump_global)
+
+
+def _get_new_stubs(session):
+  """Get objects with relationship changes not handled yet.
+
+  Relationship changes made through the ORM and with bulk statements are
+  both recorded by the adjacency cache invalidation.
+  """
+  info = session.info
+  if info.get("adjacency_pending_all", False):
+    return None
+  seen = info.setdefault(SEEN_STUBS, set())
+  stubs = info.get("adjacency_pending", set()) - seen
+  seen.update(stubs)
+  return stubs
+
+
+def _handle_changes(session, objects):
+  """Bump versions of users affected by changed objects and relationships.
+
+  Flushes without changes of permission models and relationships are
+  skipped without any queries.
+  """
+  objects = [obj for obj in objects
+             if obj.__class__.__name__ in PERMISSION_MODELS]
+  stubs = _get_new_stubs(session)
+  if not objects and stubs is not None and not stubs:
+    return
+  changes = _Changes()
+  for obj in objects:
+    changes.add_object(session, obj)
+  if stubs is None:
+    changes.bump_global = True
+  else:
+    changes.add_stubs(stubs)
+  changes.bump(session)
+
+
+def _handle_after_flush(session, flush_context):
+  # pylint: disable=unused-argument
+  if session.info.get(PENDING_GLOBAL):
+    return
+  _handle_changes(session, itertools.chain(
+      session.new, session.dirty, session.deleted))
+
+
+def _handle_before_commit(session):
+  """Handle relationships inserted with bulk statements."""
+  if session.info.get(PENDING_GLOBAL) or not session.is_active:
+    return
+  _handle_changes(session, ())
+
+
+def _handle_bulk_change(context):
+  table = getattr(context, "primary_table", None)
+  if table is not None and table.name in BULK_TABLES:
+    _bump(context.session, bump_global=True)
+
+
+def _clear_pending(session, *_):
+  for key in (PENDING_USERS, PENDING_GLOBAL, SEEN_STUBS):
+    session.info.pop(key, None)
+
+
+def register_listeners():
+  """Bump permission versions on changes of permission data."""
+  event.listen(Session, "after_flush", _handle_after_flush)
+  event.listen(Session, "before_commit", _handle_before_commit)
+  event.listen(Session, "after_bulk_delete", _handle_bulk_change)
+  event.listen(Session, "after_bulk_update", _handle_bulk_change)
+  event.listen(Session, "after_commit", _clear_pending)
+  event.listen(Session, "after_rollback", _clear_pending)
@@ -2,15 +2,20 @@
 # Licensed under http://www.apache.org/licenses/LICENSE-2.0 <see LICENSE file>
 
 from datetime import datetime, date
+from logging import getLogger
+import multiprocessing
+import time
+
 from flask import Blueprint
 from sqlalchemy import inspect, and_, orm
 
 from ggrc import db
-from ggrc.login import get_current_user
+from ggrc import settings
+from ggrc.login import get_current_user, get_current_user_id
 from ggrc.models import all_models
 from ggrc.models.relationship import Relationship
 from ggrc.rbac.permissions import is_allowed_update
-from ggrc.services.common import Resource, log_event
+from ggrc.services.common import Resource, get_cache, log_event
 from ggrc.services.registry import service
 from ggrc_workflows import models, notification
 from ggrc_workflows.models import relationship_helper
@@ -28,6 +33,13 @@ from ggrc_basic_permissions.contributed_roles import (
 )
 
 
+# pylint: disable=invalid-name
+logger = getLogger(__name__)
+
+# Number of workflows whose recurring cycles start in a single transaction.
+CYCLE_BATCH_SIZE = 20
+
+
 # Initialize Flask Blueprint for extension
 blueprint = Blueprint(
     'ggrc_workflows',
@@ -226,8 +238,61 @@ def _create_cycle_task(task_group_task, cycle, cycle_task_group,
   return cycle_task_group_object_task
 
 
+def _add_cycle_relationship(cycle_task, object_, relationships=None):
+  """Relate a cycle task to an object of its task group.
+
+  If relationships is given, the (task, object) pair is appended to it and
+  the relationship is inserted later by _insert_cycle_relationships.
+  """
+  if relationships is None:
+    db.session.add(Relationship(source=cycle_task, destination=object_))
+  else:
+    relationships.append((cycle_task, object_))
+
+
+def _insert_cycle_relationships(relationships):
+  """Insert relationships of flushed cycle tasks with a single INSERT.
+
+  The relationships are not loaded into the session. Their revision contents
+  are stored in the bulk collection of the cache, the same way as for
+  automappings.
+
+  Args:
+    relationships: list of (cycle task, object) tuples.
+  """
+  if not relationships:
+    return
+  now = datetime.now()
+  user_id = get_current_user_id()
+  table = Relationship.__table__
+  db.session.execute(table.insert(), [{
+      "modified_by_id": user_id,
+      "created_at": now,
+      "updated_at": now,
+      "source_id": task.id,
+      "source_type": task.type,
+      "destination_id": object_.id,
+      "destination_type": object_.type,
+      "context_id": None,
+  } for task, object_ in relationships])
+  from ggrc.cache import adjacency
+  adjacency.invalidate(
+      (obj.type, obj.id) for pair in relationships for obj in pair)
+  cache = get_cache(create=True)
+  if cache:
+    task_type = relationships[0][0].type
+    rows = db.session.execute(table.select().where(and_(
+        table.c.source_type == task_type,
+        table.c.source_id.in_({task.id for task, _ in relationships}),
+    )))
+    cache.bulk_new.update(
+        ((Relationship.__name__, row.id), Relationship.row_log_json(row))
+        for row in rows
+    )
+
+
 def create_old_style_cycle(cycle, task_group, cycle_task_group, current_user,
-                           base_date):
+                           base_date, relationships=None):
   """ This function preserves the old style of creating cycles, so each object
   gets its own task assigned to it.
   """
@@ -243,12 +308,21 @@ def create_old_style_cycle(cycle, task_group, cycle_task_group, current_user,
       cycle_task_group_object_task = _create_cycle_task(
           task_group_task, cycle, cycle_task_group,
           current_user, base_date)
-      db.session.add(Relationship(source=cycle_task_group_object_task,
-                                  destination=object_))
+      _add_cycle_relationship(cycle_task_group_object_task, object_,
+                              relationships)
+
 
+def build_cycle(cycle, current_user=None, base_date=None, relationships=None):
+  """Build a cycle with it's child objects
 
-def build_cycle(cycle, current_user=None, base_date=None):
-  """Build a cycle with it's child objects"""
+  Args:
+    cycle: new cycle to populate.
+    current_user: user creating the cycle, the workflow owner by default.
+    base_date: date relative task dates are computed from, today by default.
+    relationships: optional list that collects (cycle task, object) pairs
+      instead of adding relationships to the session, so that they can be
+      inserted in bulk by _insert_cycle_relationships after a flush.
+  """
 
   if not base_date:
     base_date = date.today()
@@ -288,16 +362,15 @@ def build_cycle(cycle, current_user=None, base_date=None):
     # gets its own cycle task
     if workflow.is_old_workflow:
       create_old_style_cycle(cycle, task_group, cycle_task_group, current_user,
-                             base_date)
+                             base_date, relationships)
     else:
       for task_group_task in task_group.task_group_tasks:
         cycle_task_group_object_task = _create_cycle_task(
             task_group_task, cycle, cycle_task_group, current_user, base_date)
 
         for task_group_object in task_group.task_group_objects:
-          object_ = task_group_object.object
-          db.session.add(Relationship(source=cycle_task_group_object_task,
-                                      destination=object_))
+          _add_cycle_relationship(cycle_task_group_object_task,
+                                  task_group_object.object, relationships)
 
   update_cycle_dates(cycle)
 
@@ -820,48 +893,166 @@ def init_extra_views(app):
   views.init_extra_views(app)
 
 
-def start_recurring_cycles():
-  # Get all workflows that should start a new cycle today
+def _start_workflow_cycle(workflow):
+  """Start and flush a new cycle of a workflow that is due today.
+
+  Relationships of the cycle tasks and objects are inserted in bulk.
+
+  Returns:
+    the new cycle.
+  """
+  cycle = models.Cycle()
+  cycle.workflow = workflow
+  cycle.calculator = workflow_cycle_calculator.get_cycle_calculator(workflow)
+  cycle.context = workflow.context
+  # We can do this because we selected only workflows with
+  # next_cycle_start_date = today
+  cycle.start_date = date.today()
+
+  # Flag the cycle to be saved
+  db.session.add(cycle)
+
+  if workflow.non_adjusted_next_cycle_start_date:
+    base_date = workflow.non_adjusted_next_cycle_start_date
+  else:
+    base_date = date.today()
+
+  # Create the cycle (including all child objects)
+  relationships = []
+  build_cycle(cycle, base_date=base_date, relationships=relationships)
+
+  # Update the workflow next_cycle_start_date to push it ahead based on the
+  # frequency.
+  adjust_next_cycle_start_date(cycle.calculator, workflow, move_forward=True)
+
+  db.session.add(workflow)
+
+  notification.handle_workflow_modify(None, workflow)
+  notification.handle_cycle_created(None, obj=cycle)
+
+  db.session.flush()
+  _insert_cycle_relationships(relationships)
+  return cycle
+
+
+def _get_due_workflows_query():
+  """Get the query of recurring workflows that should start a cycle today."""
   # The next_cycle_start_date is precomputed and stored when a cycle is created
-  today = date.today()
-  workflows = db.session.query(models.Workflow)\
-      .filter(
-      models.Workflow.next_cycle_start_date == today,
+  return db.session.query(models.Workflow).filter(
+      models.Workflow.next_cycle_start_date == date.today(),
       models.Workflow.recurrences == True  # noqa
-  ).all()
-
-  # For each workflow, start and save a new cycle.
-  for workflow in workflows:
-    cycle = models.Cycle()
-    cycle.workflow = workflow
-    cycle.calculator = workflow_cycle_calculator.get_cycle_calculator(workflow)
-    cycle.context = workflow.context
-    # We can do this because we selected only workflows with
-    # next_cycle_start_date = today
-    cycle.start_date = date.today()
-
-    # Flag the cycle to be saved
-    db.session.add(cycle)
+  ).order_by(models.Workflow.id)
 
-    if workflow.non_adjusted_next_cycle_start_date:
-      base_date = workflow.non_adjusted_next_cycle_start_date
-    else:
-      base_date = date.today()
 
-    # Create the cycle (including all child objects)
-    build_cycle(cycle, base_date=base_date)
+def start_cycles_batch(workflow_ids):
+  """Start cycles of due workflows in a single transaction.
 
-    # Update the workflow next_cycle_start_date to push it ahead based on the
-    # frequency.
-    adjust_next_cycle_start_date(cycle.calculator, workflow, move_forward=True)
+  Workflows that are no longer due, because their cycle was already started,
+  are skipped. If the transaction fails, every workflow of the batch is
+  retried in its own transaction, so a single failing workflow does not
+  prevent the others from starting.
 
-    db.session.add(workflow)
+  Args:
+    workflow_ids: ids of the workflows to process.
+
+  Returns:
+    list of report entries, dicts with workflow_id, cycle_id, status and
+    seconds spent on every processed workflow.
+  """
+  report = []
+  try:
+    workflows = _get_due_workflows_query().filter(
+        models.Workflow.id.in_(workflow_ids)).all()
+    for workflow in workflows:
+      start = time.time()
+      cycle = _start_workflow_cycle(workflow)
+      report.append({
+          "workflow_id": workflow.id,
+          "cycle_id": cycle.id,
+          "status": "started",
+          "seconds": time.time() - start,
+      })
+    log_event(db.session)
+    db.session.commit()
+  except Exception as error:  # pylint: disable=broad-except
+    db.session.rollback()
+    if len(workflow_ids) > 1:
+      return [entry for workflow_id in workflow_ids
+              for entry in start_cycles_batch([workflow_id])]
+    logger.exception("Failed to start a cycle of workflow %s",
+                     workflow_ids[0])
+    return [{
+        "workflow_id": workflow_ids[0],
+        "cycle_id": None,
+        "status": "failed",
+        "seconds": None,
+        "error": str(error),
+    }]
+  return report
+
+
+def _init_worker():
+  """Drop database connections inherited from the parent process."""
+  db.engine.dispose()
+
+
+def _start_cycles_batch_in_worker(workflow_ids):
+  """Start cycles of a batch of workflows inside a worker process."""
+  from ggrc.app import app
+  with app.test_request_context():
+    try:
+      return start_cycles_batch(workflow_ids)
+    finally:
+      db.session.remove()
+
+
+def _get_cycle_processes():
+  """Get the number of worker processes that start recurring cycles."""
+  if getattr(settings, "APP_ENGINE", False):
+    return 1
+  return getattr(settings, "WORKFLOW_CYCLE_PROCESSES", 1) or 1
+
+
+def start_recurring_cycles(batch_size=CYCLE_BATCH_SIZE):
+  """Start new cycles of all recurring workflows that are due today.
+
+  Workflows are processed in batches that are committed independently, on a
+  pool of worker processes if WORKFLOW_CYCLE_PROCESSES is more than 1. A
+  started cycle moves the next cycle start date of its workflow forward, so
+  running the job again after a failure only starts the remaining cycles.
 
-    notification.handle_workflow_modify(None, workflow)
-    notification.handle_cycle_created(None, obj=cycle)
+  Args:
+    batch_size: number of workflows processed in a single transaction.
 
-  log_event(db.session)
-  db.session.commit()
+  Returns:
+    list of report entries of all processed workflows, see start_cycles_batch.
+  """
+  workflow_ids = [id_ for id_, in _get_due_workflows_query().with_entities(
+      models.Workflow.id)]
+  batches = [workflow_ids[start:start + batch_size]
+             for start in range(0, len(workflow_ids), batch_size)]
+  processes = _get_cycle_processes()
+  start = time.time()
+  if processes > 1 and len(batches) > 1:
+    db.session.remove()
+    db.engine.dispose()
+    pool = multiprocessing.Pool(processes, _init_worker)
+    try:
+      results = pool.map(_start_cycles_batch_in_worker, batches)
+    finally:
+      pool.close()
+      pool.join()
+  else:
+    results = [start_cycles_batch(batch) for batch in batches]
+  report = [entry for result in results for entry in result]
+  failed = [entry["workflow_id"] for entry in report
+            if entry["status"] == "failed"]
+  logger.info("Started %s recurring cycles in %.3fs, failed workflows: %s",
+              len(report) - len(failed), time.time() - start, failed)
+  for entry in report:
+    logger.debug("Workflow %(workflow_id)s: cycle %(cycle_id)s %(status)s "
+                 "in %(seconds)ss", entry)
+  return report
 
 
 def get_cycles(workflow):
@@ -366,13 +366,19 @@ def get_cycle_task_dict(cycle_task):
   )
   deleted_relationships = deleted_relationships_sources.union(
       deleted_relationships_destinations).all()
-  for deleted_relationship in deleted_relationships:
-    removed_object_type, removed_object_id = _get_object_info_from_revision(
-        deleted_relationship, "CycleTaskGroupObjectTask")
-    object_data = db.session.query(Revision).filter(
-        Revision.resource_type == removed_object_type,
-        Revision.resource_id == removed_object_id,
-    ).order_by(Revision.id.desc()).first()
+  removed_objects = [
+      _get_object_info_from_revision(deleted_relationship,
+                                     "CycleTaskGroupObjectTask")
+      for deleted_relationship in deleted_relationships
+  ]
+  latest_ids = Revision.latest_ids(removed_objects)
+  latest_revisions = {}
+  if latest_ids:
+    revisions = db.session.query(Revision).filter(
+        Revision.id.in_(latest_ids.values()))
+    latest_revisions = {revision.id: revision for revision in revisions}
+  for removed_object in removed_objects:
+    object_data = latest_revisions[latest_ids[removed_object]]
 
     object_titles.append(
         u"{} [removed from task]".format(object_data.content["display_name"])
@@ -0,0 +1,93 @@
+# Copyright (C) 2017 Google Inc.
+# Licensed under http://www.apache.org/licenses/LICENSE-2.0 <see LICENSE file>
+
+"""
+ Benchmark automapping of a regulation with many objectives to a program
+
+ The script maps `num_objectives` objectives to a regulation and then maps
+ the regulation to a program, which automaps all objectives to the program.
+ It prints the time and the number of queries needed for generating the
+ automappings and for logging their revisions.
+
+ Prerequisite: The test database must be migrated. Created objects are not
+ removed.
+
+ Usage:
+   python benchmark_automapper.py [num_objectives]
+"""
+
+import sys
+import time
+import uuid
+
+from ggrc import db
+from ggrc.app import app
+from ggrc.automapper import AutomapperGenerator
+from ggrc.login import get_current_user
+from ggrc.login import noop
+from ggrc.models import all_models
+from ggrc.services.common import get_cache
+from ggrc.services.common import log_event
+from ggrc.utils import QueryCounter
+
+
+num_objectives = 1000
+
+
+def create_objects(count):
+  """Create a program and a regulation mapped to `count` objectives."""
+  suffix = uuid.uuid4().hex[:8]
+  program = all_models.Program(title="Program " + suffix,
+                               slug="PROGRAM-" + suffix)
+  regulation = all_models.Regulation(title="Regulation " + suffix,
+                                     slug="REGULATION-" + suffix)
+  objectives = [
+      all_models.Objective(title="Objective {} {}".format(suffix, i),
+                           slug="OBJECTIVE-{}-{}".format(suffix, i))
+      for i in range(count)
+  ]
+  db.session.add_all([program, regulation] + objectives)
+  db.session.flush()
+  user_id = get_current_user().id
+  db.session.execute(all_models.Relationship.__table__.insert(), [{
+      "modified_by_id": user_id,
+      "source_type": regulation.type,
+      "source_id": regulation.id,
+      "destination_type": objective.type,
+      "destination_id": objective.id,
+  } for objective in objectives])
+  db.session.commit()
+  return program, regulation
+
+
+def main():
+  count = int(sys.argv[1]) if len(sys.argv) > 1 else num_objectives
+  with app.app_context():
+    with app.test_request_context():
+      noop.login()
+      program, regulation = create_objects(count)
+      parent = all_models.Relationship(source=program, destination=regulation,
+                                       modified_by=get_current_user())
+      db.session.add(parent)
+      db.session.flush()
+
+      with QueryCounter() as counter:
+        start = time.time()
+        AutomapperGenerator(use_benchmark=False).generate_automappings(parent)
+        automap_time = time.time() - start
+        automap_queries = counter.get
+        edges = len(get_cache().bulk_new)
+        start = time.time()
+        log_event(db.session, flush=False)
+        log_time = time.time() - start
+        log_queries = counter.get - automap_queries
+      db.session.commit()
+
+      print "automapped {} edges".format(edges)
+      print "generate: {:.3f}s, {} queries".format(
+          automap_time, automap_queries)
+      print "log revisions: {:.3f}s, {} queries".format(log_time, log_queries)
+
+
+if __name__ == "__main__":
+  main()
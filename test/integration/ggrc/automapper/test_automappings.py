@@ -335,3 +335,36 @@ class TestAutomappings(TestCase):
         to_create=[(program, regulation), (regulation, assessment)],
         implied=[(program, assessment)]
     )
+
+  def test_automapping_revisions(self):
+    """Revisions of automappings are logged with the parent mapping event."""
+    program = self.create_object(models.Program, {
+        'title': make_name('Program')
+    })
+    regulation = self.create_object(models.Regulation, {
+        'title': make_name('Test PD Regulation')
+    })
+    objective = self.create_object(models.Objective, {
+        'title': make_name('Objective')
+    })
+    self.create_mapping(regulation, objective)
+    parent = self.create_mapping(program, regulation)
+
+    automapping = models.Relationship.find_related(program, objective)
+    self.assertEqual(automapping.automapping_id, parent.id)
+    revision = models.Revision.query.filter_by(
+        resource_type='Relationship',
+        resource_id=automapping.id,
+    ).one()
+    parent_revision = models.Revision.query.filter_by(
+        resource_type='Relationship',
+        resource_id=parent.id,
+    ).one()
+    self.assertEqual(revision.event_id, parent_revision.event_id)
+    self.assertEqual(revision.action, 'created')
+    self.assertEqual(revision.source_type, automapping.source_type)
+    self.assertEqual(revision.destination_id, automapping.destination_id)
+    self.assertEqual(revision.content['automapping_id'], parent.id)
+    self.assertEqual(revision.content['display_name'],
+                     automapping.display_name)
+    self.assertEqual(revision.content['attrs'], {})
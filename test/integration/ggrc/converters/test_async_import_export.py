@@ -0,0 +1,70 @@
+# Copyright (C) 2017 Google Inc.
+# Licensed under http://www.apache.org/licenses/LICENSE-2.0 <see LICENSE file>
+
+"""Tests for imports and exports running as background tasks."""
+
+import json
+from os.path import join
+
+from ggrc import models
+from integration.ggrc import TestCase
+
+
+class TestAsyncImportExport(TestCase):
+  """Test import and export requests with X-GGRC-BackgroundTask header."""
+
+  def setUp(self):
+    super(TestAsyncImportExport, self).setUp()
+    self.client.get("/login")
+
+  def _get_task_result(self, response):
+    """Get the result of a background task from its scheduled response."""
+    self.assertEqual(response.status_code, 202)
+    task = response.json["background_task"]
+    self.assertEqual(
+        models.BackgroundTask.query.get(task["id"]).status, "Success")
+    return self.client.get("/background_task/{}".format(task["id"]))
+
+  def _import_async(self, filename, dry_run):
+    data = {"file": (open(join(self.CSV_DIR, filename)), filename)}
+    headers = {
+        "X-test-only": "true" if dry_run else "false",
+        "X-requested-by": "GGRC",
+        "X-GGRC-BackgroundTask": "true",
+    }
+    response = self.client.post("/_service/import_csv", data=data,
+                                headers=headers)
+    return json.loads(self._get_task_result(response).data)
+
+  def test_async_import(self):
+    """Test dry run and import running as background tasks."""
+    filename = "policy_basic_import.csv"
+    dry_run_info = self._import_async(filename, dry_run=True)
+    self.assertEqual(models.Policy.query.count(), 0)
+
+    info = self._import_async(filename, dry_run=False)
+
+    self.assertEqual(dry_run_info, info)
+    self.assertEqual(models.Policy.query.count(), 3)
+
+  def test_async_export(self):
+    """Test export running as a background task."""
+    self.import_file("policy_basic_import.csv")
+    data = [{
+        "object_name": "Policy",
+        "filters": {"expression": {}},
+        "fields": "all",
+    }]
+    headers = {
+        "Content-Type": "application/json",
+        "X-requested-by": "GGRC",
+        "X-export-view": "blocks",
+        "X-GGRC-BackgroundTask": "true",
+    }
+    response = self.client.post("/_service/export_csv",
+                                data=json.dumps(data), headers=headers)
+
+    result = self._get_task_result(response)
+
+    self.assertEqual(result.data, self.export_csv(data).data)
+    self.assertIn("some weird policy", result.data)
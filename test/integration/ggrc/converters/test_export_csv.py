@@ -3,8 +3,12 @@
 
 from os.path import abspath, dirname, join
 from flask.json import dumps
+import mock
 
+from ggrc import db
 from ggrc.converters import get_importables
+from ggrc.converters.base_block import BlockConverter
+from ggrc.models import all_models
 from ggrc.models.reflection import AttributeInfo
 from integration.ggrc import TestCase
 
@@ -275,6 +279,44 @@ class TestExportSingleObject(TestCase):
       else:
         self.assertNotIn(title, response.data, "'{}' was found".format(title))
 
+  def test_chunked_export(self):
+    """Test that loading objects in chunks does not change the export."""
+    data = [{
+        "object_name": "Program",
+        "filters": {
+            "expression": {
+                "op": {"name": "relevant"},
+                "object_name": "Contract",
+                "slugs": ["contract-25", "contract-40"],
+            },
+        },
+        "fields": "all",
+    }]
+    response = self.export_csv(data)
+    with mock.patch.object(BlockConverter, "EXPORT_CHUNK_SIZE", 2):
+      chunked_response = self.export_csv(data)
+
+    self.assertEqual(chunked_response.status_code, 200)
+    self.assertEqual(chunked_response.data, response.data)
+
+  def test_chunked_export_order(self):
+    """Test that chunked exports keep the order of the export query."""
+    data = [{
+        "object_name": "Program",
+        "filters": {"expression": {}},
+        "order_by": [{"name": "title", "desc": True}],
+        "fields": ["slug", "title"],
+    }]
+    with mock.patch.object(BlockConverter, "EXPORT_CHUNK_SIZE", 2):
+      response = self.export_csv(data)
+
+    self.assertEqual(response.status_code, 200)
+    titles = [title for title, in db.session.query(
+        all_models.Program.title).order_by(all_models.Program.title.desc())]
+    positions = [response.data.index(",{},".format(title))
+                 for title in titles]
+    self.assertEqual(positions, sorted(positions))
+
   def test_multiple_relevant_query(self):
     data = [{
         "object_name": "Program",
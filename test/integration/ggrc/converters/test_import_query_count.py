@@ -0,0 +1,43 @@
+# Copyright (C) 2017 Google Inc.
+# Licensed under http://www.apache.org/licenses/LICENSE-2.0 <see LICENSE file>
+
+"""Check that object lookups in imports do not grow with the number of rows.
+"""
+
+import os
+import tempfile
+
+from ggrc.utils import QueryCounter
+from integration.ggrc import TestCase
+from integration.ggrc.models import factories
+
+
+class TestImportQueryCount(TestCase):
+  """Tests for bulk loading of objects referenced in imported rows."""
+
+  def setUp(self):
+    super(TestImportQueryCount, self).setUp()
+    self.client.get("/login")
+    factories.PolicyFactory(slug="policy-1")
+
+  def _count_lookups(self, rows):
+    """Import markets and count queries that look up single objects."""
+    with tempfile.NamedTemporaryFile(dir=self.CSV_DIR, suffix=".csv") as tmp:
+      tmp.write("Object type,,,,\n")
+      tmp.write("Market,Code*,Title*,Owner,map:policy\n")
+      for i in range(rows):
+        tmp.write(",market-{0},market {0},user@example.com,policy-1\n"
+                  .format(i))
+      tmp.seek(0)
+      with QueryCounter() as counter:
+        response = self._import_file(os.path.basename(tmp.name),
+                                     dry_run=True)
+    self.assertEqual(response[0]["created"], rows)
+    self.assertEqual(response[0]["row_warnings"], [])
+    return len([query for query in counter.queries
+                if "LIMIT" in query and
+                (".slug = %s" in query or ".email = %s" in query)])
+
+  def test_lookup_count(self):
+    """Slugs, emails and mapped objects are loaded for all rows at once."""
+    self.assertEqual(self._count_lookups(5), self._count_lookups(50))
@@ -0,0 +1,97 @@
+# Copyright (C) 2017 Google Inc.
+# Licensed under http://www.apache.org/licenses/LICENSE-2.0 <see LICENSE file>
+
+"""
+ Benchmark full text search with the LIKE and the inverted token indexers
+
+ The script fills the full text tables of the test database with
+ `num_objects` generated objects, builds the postings for the inverted
+ indexer and compares the time of search and counts calls of both indexers
+ for a few queries. With the default settings the records table contains
+ about 1M rows.
+
+ Prerequisite: The test database must be migrated. All full text records in
+ it are removed.
+
+ Usage:
+   python benchmark_search.py [num_objects]
+"""
+
+import random
+import sys
+import time
+
+from ggrc import db
+from ggrc.app import app
+from ggrc.fulltext import Record
+from ggrc.fulltext import inverted
+from ggrc.fulltext import mysql
+from ggrc.login import noop
+
+
+num_objects = 200000
+num_iterations = 5
+queries = ["revenue", "rev", "quarterly report", "nonexistingterm"]
+
+words = ["revenue", "report", "quarterly", "control", "market", "policy",
+         "access", "review", "system", "vendor", "process", "audit"]
+
+
+def generate_records(count):
+  for i in range(1, count + 1):
+    title = " ".join(random.sample(words, 3) + [str(i)])
+    yield Record(i, "Control", None, {
+        "title": {"": title},
+        "description": {"": " ".join(random.sample(words, 6))},
+        "slug": {"": "CONTROL-{}".format(i)},
+        "notes": {"": " ".join(random.sample(words, 4))},
+        "test_plan": {"": "plan {}".format(i)},
+    })
+
+
+def populate(indexer, count, chunk_size=5000):
+  indexer.delete_all_records()
+  chunk = []
+  for record in generate_records(count):
+    chunk.append(record)
+    if len(chunk) == chunk_size:
+      indexer.create_records(chunk)
+      chunk = []
+  indexer.create_records(chunk)
+
+
+def measure(indexer, query):
+  start = time.time()
+  for _ in range(num_iterations):
+    list(indexer.search(query, types=["Control"]))
+  search_time = (time.time() - start) / num_iterations
+  start = time.time()
+  for _ in range(num_iterations):
+    indexer.counts(query, types=["Control"])
+  counts_time = (time.time() - start) / num_iterations
+  return search_time, counts_time
+
+
+def main():
+  count = int(sys.argv[1]) if len(sys.argv) > 1 else num_objects
+  with app.app_context():
+    with app.test_request_context():
+      noop.login()
+      like_indexer = mysql.MysqlIndexer(None)
+      inverted_indexer = inverted.InvertedIndexer(None)
+      start = time.time()
+      populate(inverted_indexer, count)
+      print "populated {} rows in {:.1f}s".format(
+          db.session.query(mysql.MysqlRecordProperty).count(),
+          time.time() - start)
+      for query in queries:
+        like_search, like_counts = measure(like_indexer, query)
+        inv_search, inv_counts = measure(inverted_indexer, query)
+        print ("{:<20} search: like {:.4f}s inverted {:.4f}s | "
+               "counts: like {:.4f}s inverted {:.4f}s").format(
+                   query, like_search, inv_search, like_counts, inv_counts)
+      inverted_indexer.delete_all_records()
+
+
+if __name__ == "__main__":
+  main()
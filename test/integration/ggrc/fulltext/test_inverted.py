@@ -0,0 +1,76 @@
+# Copyright (C) 2017 Google Inc.
+# Licensed under http://www.apache.org/licenses/LICENSE-2.0 <see LICENSE file>
+
+"""Integration tests for inverted token full text indexer."""
+
+from ggrc import db
+from ggrc.fulltext import inverted
+from ggrc.fulltext import mysql
+from ggrc.fulltext import Record
+from integration.ggrc import TestCase
+
+
+class TestInvertedIndexer(TestCase):
+  """Tests for token postings and prefix search."""
+
+  def setUp(self):
+    super(TestInvertedIndexer, self).setUp()
+    self.indexer = inverted.InvertedIndexer(None)
+    self.indexer.create_records([
+        Record(1, "Market", None, {
+            "title": {"": u"Quarterly Revenue report"},
+            "my attribute": {"": u"hidden value"},
+        }),
+        Record(2, "Market", None, {"title": {"": u"Revenue forecast"}}),
+        Record(3, "Policy", None, {"description": {"": u"Report_2017"}}),
+    ])
+
+  def _search(self, terms):
+    return {(type_, key) for type_, key in db.session.query(
+        mysql.MysqlRecordProperty.type,
+        mysql.MysqlRecordProperty.key,
+    ).filter(self.indexer._get_filter_query(terms))}
+
+  def test_tokenize(self):
+    """Content is split into lower case word tokens."""
+    self.assertEqual(inverted.tokenize(u"Foo, bar-BAZ foo"),
+                     {u"foo", u"bar", u"baz"})
+    self.assertEqual(inverted.tokenize(42), {u"42"})
+    self.assertEqual(inverted.tokenize(None), set())
+
+  def test_postings(self):
+    """Only searchable properties are added to the posting table."""
+    terms = {term for term, in db.session.query(
+        inverted.MysqlRecordTerm.term).filter(
+            inverted.MysqlRecordTerm.key == 1)}
+    self.assertEqual(terms, {"quarterly", "revenue", "report"})
+
+  def test_prefix_search(self):
+    """Search words are matched as token prefixes."""
+    self.assertEqual(self._search("reve"), {("Market", 1), ("Market", 2)})
+    self.assertEqual(self._search("report_2"), {("Policy", 3)})
+    self.assertEqual(self._search("hidden"), set())
+
+  def test_multi_word_search(self):
+    """Postings of all words in a query are intersected."""
+    self.assertEqual(self._search("revenue rep"), {("Market", 1)})
+    self.assertEqual(self._search("forecast quarterly"), set())
+
+  def test_update_and_delete(self):
+    """Postings follow updated and deleted records."""
+    self.indexer.update_records([
+        Record(2, "Market", None, {"title": {"": u"Cost forecast"}}),
+    ])
+    self.assertEqual(self._search("revenue"), {("Market", 1)})
+    self.assertEqual(self._search("cost"), {("Market", 2)})
+    self.indexer.delete_records([("Market", 1)])
+    self.assertEqual(self._search("revenue"), set())
+
+  def test_collation_equal_terms(self):
+    """Terms equal under the table collation are indexed once."""
+    self.indexer.create_records([
+        Record(4, "Market", None, {"title": {"": u"Resume r\xe9sum\xe9"}}),
+    ])
+    self.assertEqual(db.session.query(inverted.MysqlRecordTerm).filter(
+        inverted.MysqlRecordTerm.key == 4).count(), 1)
+    self.assertEqual(self._search(u"r\xe9sum"), {("Market", 4)})
@@ -0,0 +1,71 @@
+# Copyright (C) 2017 Google Inc.
+# Licensed under http://www.apache.org/licenses/LICENSE-2.0 <see LICENSE file>
+
+"""Integration tests for full text change journal."""
+
+from ggrc import db
+from ggrc.fulltext import journal
+from ggrc.fulltext import mysql
+from integration.ggrc import TestCase
+from integration.ggrc.models import factories
+
+
+class TestJournal(TestCase):
+  """Tests for incremental indexing through the change journal."""
+
+  @staticmethod
+  def _get_properties(type_, key):
+    return {prop: content for prop, content in db.session.query(
+        mysql.MysqlRecordProperty.property,
+        mysql.MysqlRecordProperty.content,
+    ).filter(
+        mysql.MysqlRecordProperty.type == type_,
+        mysql.MysqlRecordProperty.key == key,
+    )}
+
+  def test_drain_coalesces_entries(self):
+    """Repeated changes of an object are indexed once."""
+    market = factories.MarketFactory(title="old title")
+    market.title = "new title"
+    journal.append([market])
+    journal.append([market])
+    db.session.commit()
+    self.assertEqual(journal.IndexJournalEntry.query.count(), 2)
+    self.assertGreaterEqual(journal.get_freshness_lag(), 0)
+
+    processed = journal.drain()
+
+    self.assertEqual(processed, 2)
+    self.assertEqual(journal.IndexJournalEntry.query.count(), 0)
+    self.assertEqual(journal.get_freshness_lag(), 0)
+    self.assertEqual(
+        self._get_properties("Market", market.id)["title"], "new title")
+
+  def test_custom_attribute_values(self):
+    """Custom attribute values are indexed with their attributable object."""
+    cad = factories.CustomAttributeDefinitionFactory(
+        title="my attribute", definition_type="market")
+    market = factories.MarketFactory()
+    cav = factories.CustomAttributeValueFactory(
+        custom_attribute=cad, attributable=market, attribute_value="value")
+    mysql.MysqlRecordProperty.query.delete()
+    journal.append([cav])
+    db.session.commit()
+
+    journal.drain()
+
+    properties = self._get_properties("Market", market.id)
+    self.assertEqual(properties["my attribute"], "value")
+    self.assertEqual(properties["title"], market.title)
+
+  def test_deleted_objects(self):
+    """Records of deleted objects are removed."""
+    market = factories.MarketFactory()
+    market_id = market.id
+    journal.append([market])
+    db.session.delete(market)
+    db.session.commit()
+
+    journal.drain()
+
+    self.assertEqual(self._get_properties("Market", market_id), {})
@@ -8,6 +8,7 @@ import sqlalchemy.exc
 from ggrc import db
 from ggrc import views
 from ggrc.fulltext import mysql
+from ggrc.fulltext import Record
 from integration.ggrc import TestCase
 from integration.ggrc.models import factories
 
@@ -73,3 +74,60 @@ class TestCAD(TestCase):
           property=u"\u5555" * 240 + u"2",
       ))
       db.session.commit()
+
+
+class TestBulkIndexing(TestCase):
+  """Tests for batched full text indexer API."""
+
+  def setUp(self):
+    super(TestBulkIndexing, self).setUp()
+    self.indexer = mysql.MysqlIndexer(None)
+
+  @staticmethod
+  def _rows():
+    return sorted(
+        (r.type, r.key, r.property, r.subproperty, r.content)
+        for r in mysql.MysqlRecordProperty.query
+    )
+
+  def test_create_records(self):
+    """Multiple records are inserted with their subproperties."""
+    self.indexer.create_records([
+        Record(1, "Market", None, {"title": {"": "m1"}}),
+        Record(2, "Market", None, {
+            "title": {"": "m2"},
+            "owner": {"name": "John", "email": "john@example.com"},
+        }),
+    ])
+    self.assertEqual(self._rows(), [
+        ("Market", 1, "title", "", "m1"),
+        ("Market", 2, "owner", "email", "john@example.com"),
+        ("Market", 2, "owner", "name", "John"),
+        ("Market", 2, "title", "", "m2"),
+    ])
+
+  def test_update_records(self):
+    """Only properties present in updated records are replaced."""
+    self.indexer.create_records([
+        Record(1, "Market", None, {"title": {"": "m1"}, "slug": {"": "M-1"}}),
+        Record(2, "Market", None, {"title": {"": "m2"}}),
+    ])
+    self.indexer.update_records([
+        Record(1, "Market", None, {"title": {"": "new m1"}}),
+        Record(2, "Market", None, {"title": {"": "new m2"}}),
+    ])
+    self.assertEqual(self._rows(), [
+        ("Market", 1, "slug", "", "M-1"),
+        ("Market", 1, "title", "", "new m1"),
+        ("Market", 2, "title", "", "new m2"),
+    ])
+
+  def test_delete_records(self):
+    """All entries of deleted objects are removed."""
+    self.indexer.create_records([
+        Record(1, "Market", None, {"title": {"": "m1"}, "slug": {"": "M-1"}}),
+        Record(1, "Policy", None, {"title": {"": "p1"}}),
+        Record(2, "Market", None, {"title": {"": "m2"}}),
+    ])
+    self.indexer.delete_records([("Market", 1), ("Market", 2)])
+    self.assertEqual(self._rows(), [("Policy", 1, "title", "", "p1")])
@@ -0,0 +1,111 @@
+# Copyright (C) 2017 Google Inc.
+# Licensed under http://www.apache.org/licenses/LICENSE-2.0 <see LICENSE file>
+
+"""Integration tests for sharded full text reindex."""
+
+import mock
+
+from ggrc import db
+from ggrc.fulltext import mysql
+from ggrc.fulltext import reindex
+from integration.ggrc import TestCase
+from integration.ggrc.models import factories
+
+
+class TestReindex(TestCase):
+  """Tests for resumable full text reindex."""
+
+  @staticmethod
+  def _get_titles(model_name):
+    return {content for content, in db.session.query(
+        mysql.MysqlRecordProperty.content
+    ).filter(
+        mysql.MysqlRecordProperty.type == model_name,
+        mysql.MysqlRecordProperty.property == "title",
+    )}
+
+  def test_full_reindex(self):
+    """Reindex rebuilds records and removes all shards."""
+    factories.MarketFactory(title="market 1")
+    factories.MarketFactory(title="market 2")
+    mysql.MysqlRecordProperty.query.delete()
+    db.session.commit()
+
+    reindex.reindex()
+
+    self.assertEqual(self._get_titles("Market"), {"market 1", "market 2"})
+    self.assertEqual(reindex.ReindexShard.query.count(), 0)
+    self.assertEqual(
+        db.session.query(mysql.MysqlRecordPropertyShadow).count(), 0)
+
+  def test_resume_reindex(self):
+    """Reindex resumes unfinished run and only processes pending shards."""
+    factories.MarketFactory(title="market")
+    factories.PolicyFactory(title="policy")
+    reindex.create_shards()
+    db.session.commit()
+    market_shard = reindex.ReindexShard.query.filter_by(
+        model_name="Market").one()
+    reindex.process_shard(market_shard.id)
+    policy_shard = reindex.ReindexShard.query.filter_by(
+        model_name="Policy").one()
+
+    reindex.reindex()
+
+    self.assertEqual(self._get_titles("Market"), {"market"})
+    self.assertEqual(self._get_titles("Policy"), {"policy"})
+    self.assertIsNone(reindex.ReindexShard.query.get(policy_shard.id))
+    self.assertEqual(reindex.ReindexShard.query.count(), 0)
+
+  def test_prune_deleted(self):
+    """Records of objects deleted during reindex are removed."""
+    market = factories.MarketFactory(title="deleted market")
+    reindex.create_shards()
+    db.session.commit()
+    market_shard = reindex.ReindexShard.query.filter_by(
+        model_name="Market").one()
+    reindex.process_shard(market_shard.id)
+    db.session.delete(market)
+    db.session.commit()
+
+    reindex.reindex()
+
+    self.assertEqual(self._get_titles("Market"), set())
+
+  def _process_all_shards(self):
+    reindex.create_shards()
+    db.session.commit()
+    for shard in reindex.ReindexShard.query.all():
+      reindex.process_shard(shard.id)
+
+  def test_resume_before_swap(self):
+    """Reindex with all shards done goes straight to the swap."""
+    factories.MarketFactory(title="market")
+    self._process_all_shards()
+    mysql.MysqlRecordProperty.query.delete()
+    db.session.commit()
+
+    with mock.patch.object(reindex, "create_shards") as create_shards:
+      reindex.reindex()
+
+    self.assertFalse(create_shards.called)
+    self.assertEqual(self._get_titles("Market"), {"market"})
+    self.assertEqual(reindex.ReindexShard.query.count(), 0)
+    self.assertEqual(mysql.MysqlRecordProperty.query.filter_by(
+        type=reindex.SWAP_MARKER_TYPE).count(), 0)
+
+  def test_resume_after_swap(self):
+    """Reindex does not swap the tables back after an interrupted swap."""
+    factories.MarketFactory(title="market")
+    self._process_all_shards()
+    indexer = reindex.get_indexer()
+    # pylint: disable=protected-access
+    reindex._add_swap_marker(indexer)
+    indexer.swap_shadow()
+
+    with mock.patch.object(indexer.__class__, "swap_shadow") as swap_shadow:
+      reindex.reindex()
+
+    self.assertFalse(swap_shadow.called)
+    self.assertEqual(self._get_titles("Market"), {"market"})
+    self.assertEqual(reindex.ReindexShard.query.count(), 0)
@@ -5,6 +5,8 @@
 
 import json
 
+from ggrc import db
+from ggrc.models import all_models
 from integration.ggrc import TestCase
 from integration.ggrc.models import factories
 
@@ -50,3 +52,19 @@ class TestRelationship(TestCase):
     """Can not create a Relationship with invalid attr value."""
     response = self._post_relationship("AssigneeType", "Monkey")
     self.assert400(response)
+
+  def test_row_log_json(self):
+    """Log JSON of a relationship row matches the ORM log JSON."""
+    relationship = factories.RelationshipFactory(
+        source=self.person, destination=self.assessment,
+        modified_by_id=self.person.id)
+    db.session.commit()
+    relationship = all_models.Relationship.query.get(relationship.id)
+    table = all_models.Relationship.__table__
+    row = db.session.execute(
+        table.select().where(table.c.id == relationship.id)).first()
+
+    self.assertEqual(all_models.Relationship.row_log_json(row),
+                     relationship.log_json())
+    self.assertEqual(relationship.log_json()["modified_by"]["id"],
+                     self.person.id)
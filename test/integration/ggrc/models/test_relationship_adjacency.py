@@ -0,0 +1,116 @@
+# Copyright (C) 2017 Google Inc.
+# Licensed under http://www.apache.org/licenses/LICENSE-2.0 <see LICENSE file>
+
+"""Tests for the relationship adjacency cache."""
+
+import mock
+
+from ggrc import db
+from ggrc.cache import adjacency
+from ggrc.cache import fakememcache
+from ggrc.models import all_models
+from integration.ggrc import TestCase
+from integration.ggrc.models import factories
+
+
+class TestRelationshipAdjacency(TestCase):
+  """Tests for cached neighbor sets of objects."""
+
+  def setUp(self):
+    super(TestRelationshipAdjacency, self).setUp()
+    fakememcache.Client().flush_all()
+    adjacency.invalidate_all()
+    self.market = factories.MarketFactory()
+    self.control = factories.ControlFactory()
+    self.objective = factories.ObjectiveFactory()
+    factories.RelationshipFactory(source=self.market,
+                                  destination=self.control)
+    factories.RelationshipFactory(source=self.objective,
+                                  destination=self.market)
+
+  @staticmethod
+  def stub(obj):
+    return (obj.type, obj.id)
+
+  def test_neighbors(self):
+    """Neighbors are returned in both directions and filtered by type."""
+    market, control, objective = (self.stub(self.market),
+                                  self.stub(self.control),
+                                  self.stub(self.objective))
+    self.assertEqual(adjacency.get_neighbors([market, control]), {
+        market: {control, objective},
+        control: {market},
+    })
+    self.assertEqual(adjacency.get_neighbors_of(market, types={"Control"}),
+                     {control})
+    self.assertEqual(adjacency.get_two_hop([control]), {control: {objective}})
+
+  def test_invalidation(self):
+    """Cached neighbors are removed on relationship changes."""
+    market, control = self.stub(self.market), self.stub(self.control)
+    self.assertEqual(adjacency.get_neighbors_of(control), {market})
+
+    relationship = all_models.Relationship.query.filter_by(
+        source_type="Market", destination_type="Control").one()
+    db.session.delete(relationship)
+    db.session.commit()
+    self.assertEqual(adjacency.get_neighbors_of(control), set())
+
+    factories.RelationshipFactory(source=self.control,
+                                  destination=self.market)
+    self.assertEqual(adjacency.get_neighbors_of(control), {market})
+
+  @mock.patch("ggrc.settings.MEMCACHE_MECHANISM", True)
+  def test_generation(self):
+    """Commits of relationship changes bump the shared generation."""
+    adjacency.get_neighbors_of(self.stub(self.market))
+    generation = fakememcache.Client().get(adjacency.GENERATION_KEY)
+    factories.RelationshipFactory(source=self.control,
+                                  destination=self.objective)
+    self.assertEqual(fakememcache.Client().get(adjacency.GENERATION_KEY),
+                     generation + 1)
+
+  def test_uncommitted_changes(self):
+    """Neighbors loaded with uncommitted changes are not cached."""
+    market, control = self.stub(self.market), self.stub(self.control)
+    relationship = all_models.Relationship.query.filter_by(
+        source_type="Market", destination_type="Control").one()
+    db.session.delete(relationship)
+    db.session.flush()
+
+    self.assertEqual(adjacency.get_neighbors_of(control), set())
+    # pylint: disable=protected-access
+    self.assertEqual(adjacency._get_local_cache().get_multi([control]), {})
+
+    db.session.rollback()
+    self.assertEqual(adjacency.get_neighbors_of(control), {market})
+    self.assertEqual(adjacency._get_local_cache().get_multi([control]),
+                     {control: frozenset([market])})
+
+  def test_transaction_snapshot(self):
+    """Neighbors loaded by transactions older than a change are not cached."""
+    market, control = self.stub(self.market), self.stub(self.control)
+    all_models.Market.query.get(self.market.id)
+    # pylint: disable=protected-access
+    # Another thread commits relationship changes
+    adjacency._count_invalidation()
+
+    self.assertEqual(adjacency.get_neighbors_of(control), {market})
+    self.assertEqual(adjacency._get_local_cache().get_multi([control]), {})
+
+    db.session.commit()
+    self.assertEqual(adjacency.get_neighbors_of(control), {market})
+    self.assertEqual(adjacency._get_local_cache().get_multi([control]),
+                     {control: frozenset([market])})
+
+  @mock.patch("ggrc.settings.MEMCACHE_MECHANISM", True)
+  def test_transaction_generation(self):
+    """Neighbors loaded before a generation change are not cached."""
+    market, control = self.stub(self.market), self.stub(self.control)
+    adjacency.get_neighbors_of(self.stub(self.objective))
+    # Another process commits relationship changes
+    fakememcache.Client().incr(adjacency.GENERATION_KEY)
+
+    self.assertEqual(adjacency.get_neighbors_of(control), {market})
+    # pylint: disable=protected-access
+    self.assertEqual(adjacency._get_local_cache().get_multi([control]), {})
@@ -3,8 +3,12 @@
 
 """ Tests for ggrc.models.Revision """
 
+import json
+
 import ggrc.models
 import integration.ggrc.generator
+from ggrc import db
+from ggrc.utils import QueryCounter
 from integration.ggrc import TestCase
 
 from integration.ggrc.models import factories
@@ -58,6 +62,39 @@ class TestRevisions(TestCase):
     actual = {(r.action, r.content["title"]) for r in revisions}
     self.assertEqual(actual, expected)
 
+  def test_latest_ids(self):
+    """Latest revision ids are looked up per object and action filter."""
+    cls = ggrc.models.DataAsset
+    name = cls._inflector.table_singular  # pylint: disable=protected-access
+    _, obj1 = self.gen.generate(cls, name, {name: {
+        "title": "latest v1",
+        "context": None,
+    }})
+    _, obj2 = self.gen.generate(cls, name, {name: {
+        "title": "other v1",
+        "context": None,
+    }})
+    _, obj1 = self.gen.modify(obj1, name, {name: {
+        "slug": obj1.slug,
+        "title": "latest v2",
+        "context": None,
+    }})
+    revisions = {obj: max(_get_revisions(obj), key=lambda r: r.id)
+                 for obj in (obj1, obj2)}
+    stubs = [("DataAsset", obj1.id), ("DataAsset", obj2.id),
+             ("DataAsset", 0)]
+
+    latest = ggrc.models.Revision.latest_ids(stubs)
+    self.assertEqual(latest, {
+        ("DataAsset", obj.id): revision.id
+        for obj, revision in revisions.items()
+    })
+
+    latest = ggrc.models.Revision.latest_ids(
+        stubs, filters=[ggrc.models.Revision.action == "created"])
+    self.assertNotEqual(latest[("DataAsset", obj1.id)], revisions[obj1].id)
+    self.assertEqual(latest[("DataAsset", obj2.id)], revisions[obj2].id)
+
   def test_relevant_revisions(self):
     """ Test revision creation for mapping to an object """
     cls = ggrc.models.DataAsset
@@ -125,3 +162,74 @@ class TestRevisions(TestCase):
     self.assertIsNotNone(revision)
     self.assertEqual(revision.content["title"], process.title)
     self.assertEqual(revision.content["description"], process.description)
+
+  def _modify_titles(self, titles):
+    """Create a data asset and modify its title for every given title."""
+    cls = ggrc.models.DataAsset
+    name = cls._inflector.table_singular  # pylint: disable=protected-access
+    _, obj = self.gen.generate(cls, name, {name: {
+        "title": titles[0],
+        "description": "d" * 1000,
+        "context": None,
+    }})
+    for title in titles[1:]:
+      _, obj = self.gen.modify(obj, name, {name: {
+          "slug": obj.slug,
+          "title": title,
+          "context": None,
+      }})
+    return obj
+
+  def test_delta_storage(self):
+    """Modified revisions are stored as deltas and read in full."""
+    titles = ["delta v{}".format(i) for i in range(3)]
+    obj = self._modify_titles(titles)
+    revisions = sorted(_get_revisions(obj), key=lambda r: r.id)
+
+    self.assertIsNone(revisions[0].base_revision_id)
+    for revision in revisions[1:]:
+      self.assertEqual(revision.base_revision_id, revisions[0].id)
+    self.assertEqual([r.content["title"] for r in revisions], titles)
+    contents = ggrc.models.Revision.load_contents(r.id for r in revisions)
+    self.assertEqual([contents[r.id] for r in revisions],
+                     [r.content for r in revisions])
+
+  def test_compact_revisions(self):
+    """Compaction keeps revision contents and reports storage size."""
+    from ggrc.utils import revisions as revisions_utils
+    obj = self._modify_titles(["compact v{}".format(i) for i in range(3)])
+    revision_ids = [r.id for r in _get_revisions(obj)]
+    expected = ggrc.models.Revision.load_contents(revision_ids)
+    # store full contents as plain text, as before the compaction
+    for id_, content in expected.iteritems():
+      db.session.execute(
+          "UPDATE revisions SET content = :content, base_revision_id = NULL "
+          "WHERE id = :id", {"content": json.dumps(content), "id": id_})
+    db.session.commit()
+
+    report = revisions_utils.compact_revisions()
+
+    self.assertEqual(report["revisions_before"], report["revisions_after"])
+    self.assertLess(report["size_after"], report["size_before"])
+    self.assertLess(report["keyframes"], report["revisions_after"])
+    self.assertEqual(ggrc.models.Revision.load_contents(revision_ids),
+                     expected)
+
+  def test_snapshot_eager_query(self):
+    """Snapshot eager query loads base revisions of delta revisions."""
+    obj = self._modify_titles(["eager v{}".format(i) for i in range(3)])
+    revisions = sorted(_get_revisions(obj), key=lambda r: r.id)
+    child_type, child_id = obj.type, obj.id
+    factories.SnapshotFactory(child_type=child_type, child_id=child_id,
+                              revision_id=revisions[-1].id)
+    db.session.expunge_all()
+
+    with QueryCounter() as counter:
+      snapshot = ggrc.models.Snapshot.eager_query().filter_by(
+          child_type=child_type, child_id=child_id).one()
+      queries = counter.get
+      self.assertEqual(snapshot.revision.content["title"], "eager v2")
+      self.assertEqual(
+          sorted(r.content["title"] for r in snapshot.revisions),
+          ["eager v{}".format(i) for i in range(3)])
+      self.assertEqual(counter.get, queries)
@@ -0,0 +1,88 @@
+# Copyright (C) 2017 Google Inc.
+# Licensed under http://www.apache.org/licenses/LICENSE-2.0 <see LICENSE file>
+
+"""
+ Benchmark OFFSET and keyset (__cursor) paging of collection queries
+
+ The script fills the markets table with `num_objects` rows and compares the
+ time of selecting page 1 and page 500 of the collection with LIMIT/OFFSET
+ and with an `id > last_id` cursor. It also prints the time of the first and
+ the last chunk of a full table walk with generate_query_chunks.
+
+ Prerequisite: The test database must be migrated. All markets in it are
+ removed.
+
+ Usage:
+   python benchmark_paging.py [num_objects]
+"""
+
+import sys
+import time
+
+from ggrc import db
+from ggrc.app import app
+from ggrc.models import all_models
+from ggrc.utils import generate_query_chunks
+
+
+num_objects = 200000
+num_iterations = 20
+page_size = 20
+pages = [1, 500]
+
+
+def populate(count, chunk_size=5000):
+  db.session.execute(all_models.Market.__table__.delete())
+  for start in range(0, count, chunk_size):
+    db.session.execute(all_models.Market.__table__.insert(), [{
+        "title": "Market {}".format(i),
+        "slug": "MARKET-{}".format(i),
+    } for i in range(start, min(start + chunk_size, count))])
+  db.session.commit()
+
+
+def get_query():
+  market = all_models.Market
+  return db.session.query(market.id, market.context_id, market.updated_at)
+
+
+def measure(select_page):
+  start = time.time()
+  for _ in range(num_iterations):
+    select_page()
+  return (time.time() - start) / num_iterations
+
+
+def main():
+  count = int(sys.argv[1]) if len(sys.argv) > 1 else num_objects
+  market_id = all_models.Market.id
+  with app.app_context():
+    populate(count)
+    for page in pages:
+      offset = (page - 1) * page_size
+      last_id = None
+      if offset:
+        last_id = get_query().order_by(market_id).offset(offset - 1).limit(
+            1).one().id
+      offset_time = measure(lambda: get_query().order_by(market_id).limit(
+          page_size).offset(offset).all())
+      cursor_query = get_query().order_by(market_id)
+      if last_id is not None:
+        cursor_query = cursor_query.filter(market_id > last_id)
+      cursor_time = measure(lambda: cursor_query.limit(page_size + 1).all())
+      print "page {:>4}: offset {:.4f}s cursor {:.4f}s".format(
+          page, offset_time, cursor_time)
+
+    chunk_times = []
+    start = time.time()
+    for _ in generate_query_chunks(get_query()):
+      chunk_times.append(time.time() - start)
+      start = time.time()
+    print "chunks: {} first {:.4f}s last {:.4f}s".format(
+        len(chunk_times), chunk_times[0], chunk_times[-1])
+    db.session.execute(all_models.Market.__table__.delete())
+    db.session.commit()
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,69 @@
+# Copyright (C) 2017 Google Inc.
+# Licensed under http://www.apache.org/licenses/LICENSE-2.0 <see LICENSE file>
+
+"""
+ Benchmark publishing of object attributes
+
+ The script publishes the attributes of `num_objects` in-memory controls with
+ the compiled publishers used by Builder.publish_attrs. It prints the time
+ per 1000 objects and the CPU profile. Objects are not loaded from the
+ database, so only the serialization time is measured.
+
+ Usage:
+   python benchmark_publish.py [num_objects]
+"""
+
+import cProfile
+import pstats
+import sys
+import time
+
+from ggrc.builder import json
+from ggrc.models import all_models
+
+
+num_objects = 10000
+num_stats = 15
+
+
+def make_objects(count):
+  return [all_models.Control(
+      id=i,
+      title="Control {}".format(i),
+      slug="CONTROL-{}".format(i),
+      description="description",
+      contact_id=i,
+      secondary_contact_id=i + 1,
+      kind_id=1,
+      context_id=i,
+  ) for i in range(count)]
+
+
+def publish_compiled(builder, objects, inclusions):
+  for obj in objects:
+    builder.publish_attrs(obj, {}, inclusions, None)
+
+
+def profile(name, publish, builder, objects, inclusions):
+  profiler = cProfile.Profile()
+  start = time.time()
+  profiler.runcall(publish, builder, objects, inclusions)
+  elapsed = time.time() - start
+  json.get_stub_collector().placements = []
+  print "{}: {:.4f}s per 1000 objects".format(
+      name, elapsed * 1000 / len(objects))
+  pstats.Stats(profiler).sort_stats("cumulative").print_stats(num_stats)
+
+
+def main():
+  count = int(sys.argv[1]) if len(sys.argv) > 1 else num_objects
+  objects = make_objects(count)
+  builder = json.get_json_builder(all_models.Control)
+  inclusions = tuple((attr,) for attr in builder._include_links)
+  # Compile the publisher and load lazy attributes before measuring.
+  publish_compiled(builder, objects, inclusions)
+  profile("compiled", publish_compiled, builder, objects, inclusions)
+
+
+if __name__ == "__main__":
+  main()
@@ -7,6 +7,7 @@ import json
 import time
 from urlparse import urlparse
 from wsgiref.handlers import format_date_time
+import mock
 from sqlalchemy import and_
 
 from integration.ggrc.services import TestCase
@@ -14,6 +15,7 @@ from integration.ggrc.api_helper import Api
 from integration.ggrc.generator import ObjectGenerator
 from ggrc.models import all_models
 from ggrc import db
+from ggrc.services.common import Resource
 
 
 COLLECTION_ALLOWED = ["HEAD", "GET", "POST", "OPTIONS"]
@@ -319,6 +321,76 @@ class TestServices(TestCase):
     self.assertStatus(response, 304)
     self.assertIn("Etag", response.headers)
 
+  def test_collection_get_streamed(self):
+    """Streamed collections are valid JSON and support If-None-Match."""
+    ids = [self.mock_model(foo="stream").id for _ in range(3)]
+    response = self.client.get(self.mock_url(), headers=self.headers())
+    self.assert200(response)
+    self.assert_required_headers(response)
+    collection = response.json["services_test_mock_models_collection"]
+    self.assertEqual(
+        sorted(obj["id"] for obj in collection["services_test_mock_models"]),
+        sorted(ids))
+    self.assertIn("selfLink", collection)
+
+    response = self.client.get(
+        self.mock_url(),
+        headers=self.headers(("If-None-Match", response.headers["Etag"])),
+    )
+    self.assertStatus(response, 304)
+
+    self.mock_model(foo="stream")
+    response = self.client.get(
+        self.mock_url(),
+        headers=self.headers(("If-None-Match", response.headers["Etag"])),
+    )
+    self.assert200(response)
+    collection = response.json["services_test_mock_models_collection"]
+    self.assertEqual(len(collection["services_test_mock_models"]), 4)
+
+  @mock.patch.object(Resource, "COLLECTION_CHUNK_SIZE", 1)
+  def test_collection_get_stream_error(self):
+    """Errors after the first chunk end the stream with an error member."""
+    for _ in range(3):
+      self.mock_model(foo="stream")
+    get_matched_resources = Resource.get_matched_resources
+    calls = []
+
+    def fail_second_chunk(service, chunk):
+      calls.append(chunk)
+      if len(calls) > 1:
+        raise ValueError("publishing failed")
+      return get_matched_resources(service, chunk)
+
+    with mock.patch.object(Resource, "get_matched_resources",
+                           fail_second_chunk):
+      response = self.client.get(self.mock_url(), headers=self.headers())
+    self.assert200(response)
+    self.assertEqual(response.json["error"]["status"], 500)
+    collection = response.json["services_test_mock_models_collection"]
+    self.assertEqual(len(collection["services_test_mock_models"]), 1)
+
+  def test_collection_cursor_paging(self):
+    """Collection pages are followed with __cursor next links."""
+    ids = sorted(self.mock_model(foo="cursor").id for _ in range(5))
+    url = self.mock_url() + "?__page_size=2&__cursor="
+    pages = []
+    while url:
+      response = self.client.get(url, headers=self.headers())
+      self.assert200(response)
+      collection = response.json.values()[0]
+      objects = [value for value in collection.values()
+                 if isinstance(value, list)][0]
+      pages.append([obj["id"] for obj in objects])
+      url = collection["paging"].get("next")
+    self.assertEqual([len(page) for page in pages], [2, 2, 1])
+    self.assertEqual(sum(pages, []), ids)
+
+  def test_collection_invalid_cursor(self):
+    response = self.client.get(self.mock_url() + "?__cursor=invalid",
+                               headers=self.headers())
+    self.assert400(response)
+
 
 class TestFilteringByRequest(TestCase):
   """Test filter query by request"""
@@ -499,6 +499,41 @@ class TestAdvancedQueryAPI(BaseQueryAPITestCase):
 
     self.assertEqual(programs_values["count"], programs_count["count"])
 
+  def test_query_count_limit(self):
+    """Count queries report the number of objects in the limit window."""
+    programs_values = self._get_first_result_set(
+        self._make_query_dict("Program", type_="values", limit=[3, 8],
+                              order_by=[{"name": "title"}]),
+        "Program",
+    )
+    programs_count = self._get_first_result_set(
+        self._make_query_dict("Program", type_="count", limit=[3, 8],
+                              order_by=[{"name": "title"}]),
+        "Program",
+    )
+
+    self.assertEqual(programs_values["count"], programs_count["count"])
+    self.assertEqual(programs_values["total"], programs_count["total"])
+
+  def test_query_values_fields(self):
+    """Selected columns are the same as fields of published objects."""
+    fields = ["id", "type", "title", "description", "slug", "updated_at"]
+    published = self._get_first_result_set(
+        dict(self._make_query_dict("Program", type_="values"),
+             fields=fields + ["owners"]),
+        "Program", "values",
+    )
+    selected = self._get_first_result_set(
+        dict(self._make_query_dict("Program", type_="values"),
+             fields=fields),
+        "Program", "values",
+    )
+
+    self.assertEqual(
+        selected,
+        [{field: obj[field] for field in fields} for obj in published],
+    )
+
   def test_query_ids(self):
     """The ids are the same for "values" and "ids" queries."""
     programs_values = self._get_first_result_set(
@@ -571,6 +606,37 @@ class TestAdvancedQueryAPI(BaseQueryAPITestCase):
 
     self.assertEqual(response_multiple_posts, response_single_post)
 
+  def test_explain(self):
+    """Independent queries are batched and explained in explain mode."""
+    data_list = [
+        self._make_query_dict("Program", type_="ids"),
+        self._make_query_dict("Program", type_="values",
+                              expression=["title", "~", "1"]),
+        self._make_query_dict("Program", type_="count"),
+        self._make_query_dict("Program", type_="count",
+                              expression=["title", "~", "1"]),
+        self._make_query_dict("Program", type_="ids",
+                              limit=[0, 2], order_by=[{"name": "title"}]),
+    ]
+    response = self.client.post(
+        "/query?explain=1", data=json.dumps(data_list),
+        headers={"Content-Type": "application/json"})
+    self.assert200(response)
+    explained = [result["Program"]["explain"]
+                 for result in json.loads(response.data)]
+
+    self.assertEqual([explain["batch_size"] for explain in explained],
+                     [2, 2, 2, 2, 1])
+    self.assertIn("UNION ALL", explained[0]["sql"])
+    self.assertIn("count", explained[2]["sql"])
+    self.assertNotIn("ORDER BY", explained[2]["sql"])
+    self.assertNotIn("UNION ALL", explained[4]["sql"])
+    response_single_post = json.loads(self._post(data_list).data)
+    for result, single_result in zip(json.loads(response.data),
+                                     response_single_post):
+      del result["Program"]["explain"]
+      self.assertEqual(result, single_result)
+
 
 class TestQueryWithCA(BaseQueryAPITestCase):
   """Test query API with custom attributes."""
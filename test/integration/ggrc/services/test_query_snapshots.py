@@ -15,6 +15,8 @@ from ggrc import app
 from ggrc import views
 from ggrc import models
 from ggrc import db
+from ggrc.fulltext.mysql import MysqlRecordProperty as Record
+from ggrc.snapshotter.indexer import REVISION_PROPERTY
 
 from integration.ggrc import TestCase
 from integration.ggrc.models import factories
@@ -363,6 +365,33 @@ class TestAuditSnapshotQueries(TestCase):
                      "Invalid related Control count for '{}'."
                      "Expected {}, got {}".format(title, expected, count))
 
+  def _text_search_count(self, text):
+    result = self._post([
+        {
+            "object_name": "Snapshot",
+            "filters": {
+                "expression": {
+                    "left": self._get_model_expression(),
+                    "op": {"name": "AND"},
+                    "right": {"op": {"name": "text_search"}, "text": text},
+                },
+                "keys": [],
+                "order_by": {"keys": [], "order": "", "compare": None}
+            }
+        }
+    ])
+    return len(result.json[0]["Snapshot"]["values"])
+
+  def test_revision_marker_search(self):
+    """Text search does not match revision markers of snapshots."""
+    market_title = models.Market.query.first().title
+    marker = db.session.query(Record.content).filter(
+        Record.type == "Snapshot",
+        Record.property == REVISION_PROPERTY,
+    ).first()[0]
+    self.assertEqual(self._text_search_count(market_title), 1)
+    self.assertEqual(self._text_search_count(marker), 0)
+
   def test_audit_empty_queries(self):
     """Test Audit relationship for irrelevant objects."""
     result = self._post([
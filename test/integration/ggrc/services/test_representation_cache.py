@@ -0,0 +1,71 @@
+# Copyright (C) 2017 Google Inc.
+# Licensed under http://www.apache.org/licenses/LICENSE-2.0 <see LICENSE file>
+
+"""Tests for the two tier object representation cache."""
+
+import mock
+
+from ggrc.cache import fakememcache
+from ggrc.cache import representation
+from ggrc.cache.localcache import LocalCache
+from ggrc.models import all_models
+from integration.ggrc import TestCase
+from integration.ggrc.api_helper import Api
+from integration.ggrc.models import factories
+
+
+@mock.patch("ggrc.settings.MEMCACHE_MECHANISM", True)
+class TestRepresentationCache(TestCase):
+  """Tests for caching of collection GET representations."""
+
+  def setUp(self):
+    super(TestRepresentationCache, self).setUp()
+    self.api = Api()
+    fakememcache.Client().flush_all()
+    representation.get_local_cache().clean()
+    representation.reset_report()
+
+  def get_titles(self, market):
+    response = self.api.get_collection(all_models.Market, market.id)
+    self.assert200(response)
+    return [obj["title"]
+            for obj in response.json["markets_collection"]["markets"]]
+
+  def test_cache_tiers(self):
+    """Representations are served from the local and the shared tier."""
+    market = factories.MarketFactory(title="cached title")
+
+    self.assertEqual(self.get_titles(market), ["cached title"])
+    self.assertEqual(self.get_titles(market), ["cached title"])
+    representation.get_local_cache().clean()
+    self.assertEqual(self.get_titles(market), ["cached title"])
+
+    report = representation.get_report()["Market"]
+    self.assertEqual(report["objects"], 3)
+    self.assertEqual(report["misses"], 1)
+    self.assertEqual(report["local_hits"], 1)
+    self.assertEqual(report["shared_hits"], 1)
+
+  def test_invalidation(self):
+    """Modified objects are removed from both tiers."""
+    market = factories.MarketFactory(title="old title")
+    key = "collection:markets:{}".format(market.id)
+    self.get_titles(market)
+    self.assertIn(key, representation.get_local_cache().get_multi([key]))
+
+    self.api.modify_object(market, {"title": "new title"})
+
+    self.assertEqual(representation.get_local_cache().get_multi([key]), {})
+    self.assertIsNone(fakememcache.Client().get(key))
+    market = all_models.Market.query.get(market.id)
+    self.assertEqual(self.get_titles(market), ["new title"])
+
+  def test_local_cache_eviction(self):
+    """The local tier evicts the least recently used entries."""
+    cache = LocalCache(size=2, ttl=60)
+    cache.add_multi({"a": 1, "b": 2})
+    cache.get_multi(["a"])
+    cache.add_multi({"c": 3})
+    self.assertEqual(cache.get_multi(["a", "b", "c"]), {"a": 1, "c": 3})
+    cache.add_multi({"d": 4}, expiration_time=-1)
+    self.assertEqual(cache.get_multi(["d"]), {})
@@ -0,0 +1,80 @@
+# Copyright (C) 2017 Google Inc.
+# Licensed under http://www.apache.org/licenses/LICENSE-2.0 <see LICENSE file>
+
+"""Tests for the bulk revision writer."""
+
+from ggrc import db
+from ggrc.app import app
+from ggrc.models import all_models
+from ggrc.services import revision_writer
+from ggrc.services.common import log_event
+from integration.ggrc import TestCase
+
+
+class TestRevisionWriter(TestCase):
+  """Test bulk and deferred revision writing."""
+
+  def _create_markets(self, count, deferred=False):
+    """Create markets and log their revisions."""
+    with app.test_request_context():
+      markets = [all_models.Market(title="writer {}".format(i),
+                                   slug="WRITER-{}".format(i))
+                 for i in range(count)]
+      db.session.add_all(markets)
+      log_event(db.session, deferred=deferred)
+      db.session.commit()
+      return {market.id: market.title for market in markets}
+
+  @staticmethod
+  def _get_titles():
+    revisions = all_models.Revision.query.filter_by(resource_type="Market")
+    return {revision.resource_id: revision.content["title"]
+            for revision in revisions}
+
+  def test_write(self):
+    """Revisions of all logged objects are inserted with the event."""
+    markets = self._create_markets(3)
+    self.assertEqual(self._get_titles(), markets)
+
+  def test_deferred(self):
+    """Deferred revisions are inserted by the worker."""
+    markets = self._create_markets(3, deferred=True)
+    self.assertEqual(self._get_titles(), {})
+    self.assertEqual(revision_writer.PendingRevision.query.count(), 3)
+
+    self.assertEqual(revision_writer.drain(), 3)
+
+    self.assertEqual(self._get_titles(), markets)
+    self.assertEqual(revision_writer.PendingRevision.query.count(), 0)
+
+  def test_deferred_deleted(self):
+    """Deferred revisions of deleted objects keep the logged content."""
+    markets = self._create_markets(2, deferred=True)
+    deleted_id = min(markets)
+    db.session.execute(all_models.Market.__table__.delete().where(
+        all_models.Market.id == deleted_id))
+    db.session.commit()
+
+    revision_writer.drain()
+
+    self.assertEqual(self._get_titles(), markets)
+
+  def test_deferred_before_deleted(self):
+    """Pending revisions are inserted before deleted revisions."""
+    markets = self._create_markets(2, deferred=True)
+    deleted_id = min(markets)
+    with app.test_request_context():
+      db.session.delete(all_models.Market.query.get(deleted_id))
+      log_event(db.session, deferred=True)
+      db.session.commit()
+    self.assertEqual(revision_writer.PendingRevision.query.filter_by(
+        resource_id=deleted_id).count(), 0)
+
+    revision_writer.drain()
+
+    latest_id = all_models.Revision.query.filter_by(
+        resource_type="Market", resource_id=deleted_id,
+    ).order_by(all_models.Revision.id.desc()).first().id
+    self.assertEqual(all_models.Revision.query.get(latest_id).action,
+                     "deleted")
+    self.assertEqual(self._get_titles(), markets)
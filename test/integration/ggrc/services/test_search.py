@@ -78,3 +78,30 @@ class TestResource(TestCase):
     self.assert400(response)
     self.assertEqual(response.json['message'], 'Query parameter "q" '
                      'specifying search terms must be provided.')
+
+  def test_search_with_counts(self):
+    """Test search returning limited entries and full counts."""
+    query = "/search?q=&types=Control&with_counts=true&limit=2"
+    results = self.api.tc.get(query).json["results"]
+    self.assertEqual(len(results["entries"]["Control"]), 2)
+    self.assertEqual(results["counts"], {"Control": 5})
+
+  def test_relevant_counts(self):
+    """Test relevant filter gives the same results with and without ids."""
+    relevant_objects = "Control:{}".format(self.objects[0].id)
+    query = "/search?q=&types=Control&relevant_objects={}&{}=true"
+    with_counts = self.api.tc.get(
+        query.format(relevant_objects, "with_counts")).json["results"]
+    counts_only = self.api.tc.get(
+        query.format(relevant_objects, "counts_only")).json["results"]
+    expected_ids = {self.objects[i].id for i in [1, 2]}
+
+    self.assertEqual(
+        {entry["id"] for entry in with_counts["entries"]["Control"]},
+        expected_ids)
+    self.assertEqual(
+        {entry["id"] for entry in self.search(
+            "Control", relevant_objects=relevant_objects)},
+        expected_ids)
+    self.assertEqual(with_counts["counts"], {"Control": 2})
+    self.assertEqual(counts_only["counts"], with_counts["counts"])
@@ -0,0 +1,87 @@
+# Copyright (C) 2017 Google Inc.
+# Licensed under http://www.apache.org/licenses/LICENSE-2.0 <see LICENSE file>
+
+"""
+ Benchmark the latest revision lookup used for snapshotting
+
+ The script fills the revisions table with `revisions_per_object` revisions
+ for each of `num_objects` controls, which is what snapshotting the scope of
+ a program with that many objects has to look up, and compares the time of
+ selecting all revisions ordered by id with the grouped MAX(id) query of
+ Revision.latest_ids.
+
+ Prerequisite: The test database must be migrated. All control revisions and
+ events in it are removed.
+
+ Usage:
+   python benchmark_revisions.py [num_objects] [revisions_per_object]
+"""
+
+import sys
+import time
+
+from sqlalchemy.sql.expression import tuple_
+
+from ggrc import db
+from ggrc.app import app
+from ggrc.models import all_models
+
+
+num_objects = 2000
+revisions_per_object = 100
+num_iterations = 5
+
+
+def populate(count, per_object, chunk_size=5000):
+  revision = all_models.Revision.__table__
+  db.session.execute(revision.delete().where(
+      revision.c.resource_type == "Control"))
+  db.session.execute(all_models.Event.__table__.delete())
+  event_id = db.session.execute(all_models.Event.__table__.insert().values(
+      action="BULK", resource_type="Control")).inserted_primary_key[0]
+  rows = [{
+      "event_id": event_id,
+      "action": "modified",
+      "resource_type": "Control",
+      "resource_id": i,
+      "content": '{"title": "Control %d"}' % i,
+  } for _ in range(per_object) for i in range(1, count + 1)]
+  for start in range(0, len(rows), chunk_size):
+    db.session.execute(revision.insert(), rows[start:start + chunk_size])
+  db.session.commit()
+
+
+def select_all(stubs):
+  revision = all_models.Revision
+  query = db.session.query(
+      revision.id, revision.resource_type, revision.resource_id,
+  ).filter(
+      tuple_(revision.resource_type, revision.resource_id).in_(stubs)
+  ).order_by(revision.id.desc())
+  latest = {}
+  for revid, restype, resid in query:
+    latest.setdefault((restype, resid), revid)
+  return latest
+
+
+def measure(lookup, stubs):
+  start = time.time()
+  for _ in range(num_iterations):
+    result = lookup(stubs)
+  return (time.time() - start) / num_iterations, result
+
+
+def main():
+  count = int(sys.argv[1]) if len(sys.argv) > 1 else num_objects
+  per_object = int(sys.argv[2]) if len(sys.argv) > 2 else revisions_per_object
+  with app.app_context():
+    populate(count, per_object)
+    stubs = [("Control", i) for i in range(1, count + 1)]
+    before, expected = measure(select_all, stubs)
+    after, result = measure(all_models.Revision.latest_ids, stubs)
+    assert result == expected
+    print "all revisions: {:.4f}s grouped max: {:.4f}s".format(before, after)
+
+
+if __name__ == "__main__":
+  main()
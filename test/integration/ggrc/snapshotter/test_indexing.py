@@ -3,13 +3,18 @@
 
 """Test for indexing of snapshotted objects"""
 
+import datetime
+
 from sqlalchemy.sql.expression import tuple_
 
 from ggrc import db
 from ggrc import models
 from ggrc.views import do_reindex
 from ggrc.fulltext.mysql import MysqlRecordProperty as Record
+from ggrc.snapshotter.datastructures import Pair
 from ggrc.snapshotter.indexer import delete_records
+from ggrc.snapshotter.indexer import reindex_pairs
+from ggrc.snapshotter.indexer import REVISION_PROPERTY
 
 from integration.ggrc.snapshotter import SnapshotterBaseTestCase
 from integration.ggrc.models import factories
@@ -339,3 +344,73 @@ class TestSnapshotIndexing(SnapshotterBaseTestCase):
     records = get_records(audit, snapshots)
 
     self.assertEqual(records.count(), 57)
+
+  def test_incremental_reindex(self):
+    """Only snapshots with changed revisions are reindexed by default"""
+    self._import_file("snapshotter_create.csv")
+    program = db.session.query(models.Program).filter(
+        models.Program.slug == "Prog-13211"
+    ).one()
+    self.create_audit(program)
+
+    snapshots = db.session.query(models.Snapshot).all()
+    changed, unchanged = snapshots[:2]
+
+    def get_title(snapshot):
+      return db.session.query(Record.content).filter(
+          Record.key == snapshot.id,
+          Record.type == "Snapshot",
+          Record.property == "title",
+      ).scalar()
+
+    titles = {s.id: get_title(s) for s in (changed, unchanged)}
+    db.session.query(Record).filter(
+        Record.key.in_([changed.id, unchanged.id]),
+        Record.type == "Snapshot",
+        Record.property == "title",
+    ).update({"content": "stale title"}, synchronize_session=False)
+    db.session.query(Record).filter(
+        Record.key == changed.id,
+        Record.type == "Snapshot",
+        Record.property == REVISION_PROPERTY,
+    ).update({"content": "0"}, synchronize_session=False)
+    db.session.commit()
+
+    pairs = {Pair.from_snapshot(s) for s in snapshots}
+    reindex_pairs(pairs)
+    self.assertEqual(get_title(changed), titles[changed.id])
+    self.assertEqual(get_title(unchanged), "stale title")
+
+    reindex_pairs(pairs, force=True)
+    self.assertEqual(get_title(unchanged), titles[unchanged.id])
+
+  def test_cad_rename_reindex(self):
+    """Renamed custom attributes reindex snapshots incrementally"""
+    self._import_file("snapshotter_create.csv")
+    program = db.session.query(models.Program).filter(
+        models.Program.slug == "Prog-13211"
+    ).one()
+    self.create_audit(program)
+    snapshots = db.session.query(models.Snapshot).all()
+    cad = factories.CustomAttributeDefinitionFactory(
+        title="old title",
+        definition_type="control",
+        attribute_type="Text",
+    )
+    pairs = {Pair.from_snapshot(s) for s in snapshots}
+    reindex_pairs(pairs, force=True)
+
+    def get_markers():
+      return dict(db.session.query(Record.key, Record.content).filter(
+          Record.type == "Snapshot",
+          Record.property == REVISION_PROPERTY,
+      ))
+
+    markers = get_markers()
+    cad.title = "new title"
+    cad.updated_at = cad.updated_at + datetime.timedelta(seconds=1)
+    db.session.commit()
+    reindex_pairs(pairs)
+    new_markers = get_markers()
+    self.assertEqual(set(new_markers), {s.id for s in snapshots})
+    self.assertFalse(set(markers.items()) & set(new_markers.items()))
@@ -242,16 +242,16 @@ class TestSnapshoting(SnapshotterBaseTestCase):
     audit = db.session.query(models.Audit).filter(
         models.Audit.title.like("%Snapshotable audit%")).one()
 
-    revision = db.session.query(
-        models.Revision.id,
-        models.Revision.resource_type,
-        models.Revision.resource_id,
-        models.Revision.content,
-    ).filter(
+    revision_ids = db.session.query(models.Revision.id).filter(
         models.Revision.resource_type == control.type,
         models.Revision.resource_id == control.id,
-        models.Revision.content.like("%Test Control Snapshot 1 EDIT 2%"),
-    ).one()
+    )
+    revision = [
+        id_ for id_, content in models.Revision.load_contents(
+            id_ for id_, in revision_ids).iteritems()
+        if content["title"] == "Test Control Snapshot 1 EDIT 2"
+    ]
+    self.assertEqual(len(revision), 1)
 
     audit = self.refresh_object(audit)
     self.api.modify_object(audit, {
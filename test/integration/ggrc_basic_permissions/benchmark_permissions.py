@@ -0,0 +1,84 @@
+# Copyright (C) 2017 Google Inc.
+# Licensed under http://www.apache.org/licenses/LICENSE-2.0 <see LICENSE file>
+
+"""
+ Benchmark cold and warm permission loads
+
+ The script creates a user that owns `num_objects` markets and compares the
+ time of loading the permissions of the user when they have to be computed
+ (cold) with loading the stored permissions (warm).
+
+ Prerequisite: The test database must be migrated. All markets, object owners
+ and stored permissions in it are removed.
+
+ Usage:
+   python benchmark_permissions.py [num_objects]
+"""
+
+import sys
+import time
+
+from ggrc import db
+from ggrc.app import app
+from ggrc.models import all_models
+from ggrc_basic_permissions import load_permissions_for
+from ggrc_basic_permissions import store
+
+
+num_objects = 10000
+num_iterations = 5
+
+EMAIL = "benchmark.permissions@example.com"
+
+
+def populate(count, chunk_size=5000):
+  """Create a user owning `count` markets."""
+  db.session.execute(all_models.ObjectOwner.__table__.delete())
+  db.session.execute(all_models.Market.__table__.delete())
+  db.session.execute(store.StoredPermissions.__table__.delete())
+  person = all_models.Person.query.filter_by(email=EMAIL).first()
+  if person is None:
+    person = all_models.Person(email=EMAIL, name="Benchmark")
+    db.session.add(person)
+    db.session.flush()
+  market = all_models.Market.__table__
+  rows = [{"title": "market {}".format(i), "slug": "MARKET-{}".format(i)}
+          for i in range(count)]
+  for start in range(0, len(rows), chunk_size):
+    db.session.execute(market.insert(), rows[start:start + chunk_size])
+  db.session.execute(
+      all_models.ObjectOwner.__table__.insert().from_select(
+          ["person_id", "ownable_id", "ownable_type"],
+          db.session.query(db.literal(person.id), market.c.id,
+                           db.literal("Market"))))
+  db.session.commit()
+  return person.id
+
+
+def measure(person_id, invalidate):
+  total = 0
+  for _ in range(num_iterations):
+    if invalidate:
+      store.invalidate([person_id])
+      db.session.commit()
+    person = all_models.Person.query.get(person_id)
+    start = time.time()
+    permissions = load_permissions_for(person)
+    total += time.time() - start
+    db.session.commit()
+  return total / num_iterations, permissions
+
+
+def main():
+  count = int(sys.argv[1]) if len(sys.argv) > 1 else num_objects
+  with app.app_context():
+    person_id = populate(count)
+    cold, expected = measure(person_id, invalidate=True)
+    warm, result = measure(person_id, invalidate=False)
+    assert result == expected
+    assert len(result["read"]["Market"]["resources"]) == count
+    print "cold: {:.4f}s warm: {:.4f}s".format(cold, warm)
+
+
+if __name__ == "__main__":
+  main()
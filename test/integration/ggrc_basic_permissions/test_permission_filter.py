@@ -0,0 +1,64 @@
+# Copyright (C) 2017 Google Inc.
+# Licensed under http://www.apache.org/licenses/LICENSE-2.0 <see LICENSE file>
+
+"""
+Test materialized permission filters
+"""
+
+import mock
+
+from ggrc import settings
+from ggrc.models import all_models
+from ggrc.utils.permission_filter import PermissionFilterEntry
+from integration.ggrc import TestCase
+from integration.ggrc.api_helper import Api
+from integration.ggrc.generator import ObjectGenerator
+
+
+class TestPermissionFilter(TestCase):
+  """Test collection filtering with materialized permission sets."""
+
+  def setUp(self):
+    super(TestPermissionFilter, self).setUp()
+    self.api = Api()
+    self.object_generator = ObjectGenerator()
+    self.users = {}
+    for name, role in (("creator", "Creator"), ("admin", "Administrator")):
+      _, self.users[name] = self.object_generator.generate_person(
+          data={"name": name}, user_role=role)
+
+  def _create_market(self, user, title):
+    self.api.set_user(self.users[user])
+    response = self.api.post(all_models.Market, {
+        "market": {
+            "title": title,
+            "context": None,
+            "contact": {"type": "Person", "id": self.users[user].id},
+        },
+    })
+    self.assert201(response)
+    return response.json["market"]["id"]
+
+  def _get_market_ids(self):
+    response = self.api.get_query(all_models.Market, "")
+    self.assert200(response)
+    return {market["id"]
+            for market in response.json["markets_collection"]["markets"]}
+
+  def test_materialized_filter(self):
+    """Materialized permission sets return the same objects."""
+    own_ids = {self._create_market("creator", "market {}".format(i))
+               for i in range(2)}
+    self._create_market("admin", "admin market")
+    self.api.set_user(self.users["creator"])
+
+    with mock.patch.object(settings, "PERMISSION_FILTER_THRESHOLD", 1):
+      first_ids = self._get_market_ids()
+      self.assertTrue(PermissionFilterEntry.query.filter_by(
+          person_id=self.users["creator"].id,
+          resource_type="Market",
+      ).count())
+      second_ids = self._get_market_ids()
+
+    self.assertEqual(first_ids, own_ids)
+    self.assertEqual(second_ids, own_ids)
@@ -0,0 +1,128 @@
+# Copyright (C) 2017 Google Inc.
+# Licensed under http://www.apache.org/licenses/LICENSE-2.0 <see LICENSE file>
+
+"""
+Test stored permissions with versioned invalidation
+"""
+
+import datetime
+
+import mock
+
+import ggrc_basic_permissions
+from ggrc import db
+from ggrc.models import all_models
+from ggrc_basic_permissions import store
+from integration.ggrc import TestCase
+from integration.ggrc.generator import ObjectGenerator
+from integration.ggrc.models import factories
+
+
+class TestPermissionsStore(TestCase):
+  """Test reuse and invalidation of stored permissions."""
+
+  def setUp(self):
+    super(TestPermissionsStore, self).setUp()
+    self.object_generator = ObjectGenerator()
+    self.users = {}
+    for name in ("first", "second"):
+      _, self.users[name] = self.object_generator.generate_person(
+          data={"name": name}, user_role="Creator")
+
+  def _load(self, name):
+    return ggrc_basic_permissions.load_permissions_for(
+        all_models.Person.query.get(self.users[name].id))
+
+  def _is_stale(self, name):
+    return self.users[name].id in store.get_stale_person_ids()
+
+  def _add_owner(self, name):
+    market = factories.MarketFactory()
+    db.session.add(all_models.ObjectOwner(
+        person_id=self.users[name].id,
+        ownable_id=market.id,
+        ownable_type="Market",
+    ))
+    db.session.commit()
+    return market
+
+  def test_stored_permissions_reused(self):
+    """Stored permissions are not computed again."""
+    permissions = self._load("first")
+    self.assertFalse(self._is_stale("first"))
+    with mock.patch.object(ggrc_basic_permissions,
+                           "compute_permissions_for") as compute:
+      self.assertEqual(self._load("first"), permissions)
+    self.assertFalse(compute.called)
+
+  def test_user_invalidation(self):
+    """Ownership changes invalidate the permissions of the owner only."""
+    self._load("first")
+    self._load("second")
+    market = self._add_owner("first")
+
+    self.assertTrue(self._is_stale("first"))
+    self.assertFalse(self._is_stale("second"))
+    permissions = self._load("first")
+    self.assertIn(market.id,
+                  permissions["update"]["Market"]["resources"])
+
+  def test_global_invalidation(self):
+    """Role changes invalidate the permissions of all users."""
+    self._load("first")
+    self._load("second")
+    role = all_models.Role.query.filter_by(name="Creator").one()
+    role.description = "changed description"
+    db.session.commit()
+    self.assertTrue(self._is_stale("first"))
+    self.assertTrue(self._is_stale("second"))
+
+  def test_warm(self):
+    """Warming computes the outdated permissions."""
+    self._load("first")
+    self._add_owner("first")
+    self.assertTrue(self._is_stale("first"))
+    self.assertTrue(self._is_stale("second"))
+
+    store.warm(ggrc_basic_permissions.compute_permissions_for)
+
+    self.assertFalse(self._is_stale("first"))
+    self.assertFalse(self._is_stale("second"))
+
+  def test_fingerprint_invalidation(self):
+    """Changed role declarations or settings invalidate all users."""
+    self._load("first")
+    with mock.patch.object(store, "_fingerprint", "changed"):
+      self.assertTrue(self._is_stale("first"))
+      with mock.patch.object(ggrc_basic_permissions,
+                             "compute_permissions_for") as compute:
+        compute.return_value = {}
+        self._load("first")
+      self.assertTrue(compute.called)
+      self.assertFalse(self._is_stale("first"))
+
+  def test_expiration(self):
+    """Stored permissions are recomputed after STORED_TIMEOUT."""
+    self._load("first")
+    db.session.query(store.StoredPermissions).filter_by(
+        person_id=self.users["first"].id,
+    ).update({"updated_at": datetime.datetime.now() -
+              store.STORED_TIMEOUT - datetime.timedelta(minutes=1)})
+    db.session.commit()
+    self.assertTrue(self._is_stale("first"))
+
+  def test_unrelated_flush(self):
+    """Flushes without permission changes do not bump versions."""
+    self._load("first")
+    with mock.patch.object(store, "_Changes") as changes:
+      factories.MarketFactory()
+    self.assertFalse(changes.called)
+    self.assertFalse(self._is_stale("first"))
+
+  def test_failed_store(self):
+    """Permissions are served when storing them fails."""
+    with mock.patch.object(store.CompressedType, "process_bind_param",
+                           side_effect=store.ValidationError("too long")):
+      permissions = self._load("first")
+    self.assertIn("read", permissions)
+    self.assertTrue(self._is_stale("first"))
@@ -0,0 +1,115 @@
+# Copyright (C) 2017 Google Inc.
+# Licensed under http://www.apache.org/licenses/LICENSE-2.0 <see LICENSE file>
+
+"""Tests for starting recurring cycles in independent batches."""
+
+from freezegun import freeze_time
+from mock import patch
+
+import ggrc_workflows
+from ggrc.models import Relationship, Revision
+from ggrc_workflows import models
+from ggrc_workflows import start_recurring_cycles
+from integration.ggrc_workflows.generator import WorkflowsGenerator
+from integration.ggrc.generator import ObjectGenerator
+from integration.ggrc import TestCase
+
+
+class TestRecurringCycles(TestCase):
+  """Tests for the start_recurring_cycles cron job."""
+
+  def setUp(self):
+    super(TestRecurringCycles, self).setUp()
+    self.wf_generator = WorkflowsGenerator()
+    self.object_generator = ObjectGenerator()
+    self.random_objects = self.object_generator.generate_random_objects()
+    _, self.person = self.object_generator.generate_person(
+        user_role="Administrator")
+    with freeze_time("2015-04-01"):
+      self.workflow_ids = []
+      for index in range(3):
+        _, workflow = self.wf_generator.generate_workflow(
+            self._get_workflow_dict(index))
+        self.wf_generator.activate_workflow(workflow)
+        self.workflow_ids.append(workflow.id)
+
+  def _get_workflow_dict(self, index):
+    """Get a monthly workflow with one task mapped to two objects."""
+    contact = {
+        "href": "/api/people/%d" % self.person.id,
+        "id": self.person.id,
+        "type": "Person",
+    }
+    return {
+        "title": "monthly workflow {}".format(index),
+        "description": "some test workflow",
+        "owners": [contact],
+        "frequency": "monthly",
+        "task_groups": [{
+            "title": "task group",
+            "contact": contact,
+            "task_group_tasks": [{
+                "title": "task",
+                "description": "some task",
+                "contact": contact,
+                "relative_start_day": 5,
+                "relative_end_day": 25,
+            }],
+            "task_group_objects": self.random_objects[:2]
+        }]
+    }
+
+  def _get_cycle_count(self, workflow_id):
+    return models.Cycle.query.filter_by(workflow_id=workflow_id).count()
+
+  @patch("ggrc.notifications.common.send_email")
+  def test_batches(self, mock_mail):  # pylint: disable=unused-argument
+    """Cycles of all workflows are started with bulk relationships."""
+    with freeze_time("2015-04-03"):
+      report = start_recurring_cycles(batch_size=2)
+
+    self.assertEqual(sorted(entry["workflow_id"] for entry in report),
+                     sorted(self.workflow_ids))
+    self.assertEqual({entry["status"] for entry in report}, {"started"})
+    for entry in report:
+      cycle = models.Cycle.query.get(entry["cycle_id"])
+      task = cycle.cycle_task_group_object_tasks[0]
+      relationships = Relationship.query.filter_by(
+          source_type=task.type, source_id=task.id).all()
+      self.assertEqual(len(relationships), 2)
+      self.assertEqual(Revision.query.filter(
+          Revision.resource_type == "Relationship",
+          Revision.resource_id.in_([rel.id for rel in relationships]),
+      ).count(), 2)
+
+  @patch("ggrc.notifications.common.send_email")
+  def test_failed_workflow(self, mock_mail):  # pylint: disable=unused-argument
+    """A failing workflow does not roll back cycles of other workflows."""
+    failing_id = self.workflow_ids[1]
+    # pylint: disable=protected-access
+    start_workflow_cycle = ggrc_workflows._start_workflow_cycle
+
+    def fail_workflow(workflow):
+      if workflow.id == failing_id:
+        raise ValueError("Failed workflow")
+      return start_workflow_cycle(workflow)
+
+    cycle_counts = {workflow_id: self._get_cycle_count(workflow_id)
+                    for workflow_id in self.workflow_ids}
+    with freeze_time("2015-04-03"):
+      with patch("ggrc_workflows._start_workflow_cycle", fail_workflow):
+        report = start_recurring_cycles(batch_size=3)
+      statuses = {entry["workflow_id"]: entry["status"] for entry in report}
+      self.assertEqual(statuses, {
+          self.workflow_ids[0]: "started",
+          self.workflow_ids[1]: "failed",
+          self.workflow_ids[2]: "started",
+      })
+
+      # the job resumes with the workflow that failed
+      report = start_recurring_cycles(batch_size=3)
+
+    self.assertEqual([(entry["workflow_id"], entry["status"])
+                      for entry in report], [(failing_id, "started")])
+    for workflow_id, count in cycle_counts.iteritems():
+      self.assertEqual(self._get_cycle_count(workflow_id), count + 1)
@@ -0,0 +1,245 @@
+# Copyright (C) 2017 Google Inc.
+# Licensed under http://www.apache.org/licenses/LICENSE-2.0 <see LICENSE file>
+
+"""Unit tests for resolving lazy stubs of published objects."""
+
+import unittest
+
+import mock
+
+from ggrc.builder import json
+from ggrc.builder.json import LazyStubRepresentation
+from ggrc.builder.json import StubCollector
+from ggrc.models import all_models
+
+
+def fake_load_stubs(type_, keys, vals):
+  return {(type_, keys, val): {"type": type_, "id": val[0]} for val in vals}
+
+
+def walk_representation(obj):
+  """Yield (value, key, container) of all leaf values of a representation."""
+  items = obj.items() if isinstance(obj, dict) else enumerate(obj)
+  for key, value in items:
+    if isinstance(value, (dict, list)):
+      for leaf in walk_representation(value):
+        yield leaf
+    else:
+      yield value, key, obj
+
+
+def walk_and_replace(obj, load):
+  """Resolve stubs by walking the representation twice, as a baseline."""
+  conditions = {}
+  for value, _, _ in walk_representation(obj):
+    if isinstance(value, LazyStubRepresentation):
+      conditions.setdefault((value.type, value.condition_key), set()).add(
+          value.condition_val)
+  stubs = {}
+  for (type_, keys), vals in conditions.items():
+    stubs.update(load(type_, keys, vals))
+  for value, key, container in walk_representation(obj):
+    if isinstance(value, LazyStubRepresentation):
+      container[key] = dict(stubs[value.stub_key])
+
+
+def publish_objects(collector, count, stubs_per_object):
+  """Build published objects with stubs registered in the collector."""
+  objects = []
+  for index in range(count):
+    obj = {"id": index, "title": "title", "description": "text",
+           "custom_attribute_values": [{"attribute_value": "value"}] * 5}
+    obj["contact"] = collector.place(
+        obj, "contact", LazyStubRepresentation("Person", index))
+    obj["owners"] = collector.place(obj, "owners", [
+        LazyStubRepresentation("Person", index + offset)
+        for offset in range(stubs_per_object)
+    ])
+    objects.append(obj)
+  return objects
+
+
+@mock.patch("ggrc.builder.json.load_stubs", side_effect=fake_load_stubs)
+class TestStubCollector(unittest.TestCase):
+  """Tests for StubCollector."""
+
+  def test_resolve(self, load_stubs):
+    """Stubs are replaced in place and loaded once per type."""
+    collector = StubCollector()
+    obj = {}
+    obj["contact"] = collector.place(
+        obj, "contact", LazyStubRepresentation("Person", 1))
+    obj["owners"] = collector.place(obj, "owners", [
+        LazyStubRepresentation("Person", 1),
+        LazyStubRepresentation("Person", 2),
+    ])
+    obj["program"] = collector.place(
+        obj, "program", LazyStubRepresentation("Program", 3))
+
+    collector.resolve()
+
+    self.assertEqual(obj, {
+        "contact": {"type": "Person", "id": 1},
+        "owners": [{"type": "Person", "id": 1}, {"type": "Person", "id": 2}],
+        "program": {"type": "Program", "id": 3},
+    })
+    self.assertIsNot(obj["contact"], obj["owners"][0])
+    self.assertEqual(sorted(call[0][0] for call in load_stubs.call_args_list),
+                     ["Person", "Program"])
+
+  def test_cache(self, load_stubs):
+    """Objects resolved once are not loaded again."""
+    collector = StubCollector()
+    first = {"a": LazyStubRepresentation("Person", 1)}
+    collector.place(first, "a", first["a"])
+    collector.resolve()
+    second = {"a": LazyStubRepresentation("Person", 1)}
+    collector.place(second, "a", second["a"])
+    collector.resolve()
+
+    self.assertEqual(first, second)
+    self.assertEqual(load_stubs.call_count, 1)
+    collector.clear_cache()
+    collector.place(second, "a", LazyStubRepresentation("Person", 1))
+    collector.resolve()
+    self.assertEqual(load_stubs.call_count, 2)
+
+  def test_publish_representation(self, _):
+    """publish_representation resolves stubs of the current collector."""
+    collector = StubCollector()
+    obj = {"a": LazyStubRepresentation("Person", 1)}
+    collector.place(obj, "a", obj["a"])
+    with mock.patch("ggrc.builder.json.get_stub_collector",
+                    return_value=collector):
+      self.assertEqual(json.publish_representation(obj),
+                       {"a": {"type": "Person", "id": 1}})
+
+  def test_thread_collector(self, _):
+    """Thread collectors are dropped after publishing the representation."""
+    collector = json.get_stub_collector()
+    obj = {"a": LazyStubRepresentation("Person", 1)}
+    collector.place(obj, "a", obj["a"])
+    self.assertIs(json.get_stub_collector(), collector)
+
+    json.publish_representation(obj)
+
+    self.assertEqual(obj, {"a": {"type": "Person", "id": 1}})
+    self.assertIsNot(json.get_stub_collector(), collector)
+    self.assertEqual(json.get_stub_collector().cache, {})
+
+  def test_many_objects(self, load_stubs):
+    """Stubs of many objects are resolved like walking the representation."""
+    count, stubs_per_object = 2000, 5
+    collector = StubCollector()
+    objects = publish_objects(collector, count, stubs_per_object)
+    collector.resolve()
+
+    baseline = publish_objects(StubCollector(), count, stubs_per_object)
+    walk_and_replace(baseline, fake_load_stubs)
+
+    self.assertEqual(objects, baseline)
+    self.assertEqual(load_stubs.call_count, 1)
+
+
+def normalize(value):
+  """Replace stubs with comparable keys."""
+  if isinstance(value, LazyStubRepresentation):
+    return value.stub_key
+  if isinstance(value, list):
+    return [normalize(item) for item in value]
+  return value
+
+
+def published_values(value):
+  """Get normalized published values that are not empty."""
+  return {key: normalize(item) for key, item in value.items()
+          if item not in (None, [], False)}
+
+
+@mock.patch("ggrc.builder.json.get_stub_collector",
+            side_effect=StubCollector)
+class TestCompiledPublishers(unittest.TestCase):
+  """Compiled publishers give the expected representations."""
+
+  def _publish(self, obj, inclusions=()):
+    json_obj = {}
+    json.get_json_builder(obj).publish_attrs(obj, json_obj, inclusions, None)
+    return json_obj
+
+  def test_publish_attrs(self, _):
+    """Compiled publishers publish stubs and values of attributes."""
+    market = all_models.Market(id=1, title="market", slug="MARKET-1",
+                               contact_id=3, modified_by_id=4, context_id=5)
+    self.assertEqual(published_values(self._publish(market)), {
+        "contact": ("Person", ("id",), (3,)),
+        "context": ("Context", ("id",), (5,)),
+        "id": 1,
+        "modified_by": ("Person", ("id",), (4,)),
+        "slug": "MARKET-1",
+        "title": "market",
+        "type": "Market",
+    })
+    control = all_models.Control(id=2, title="control", slug="CONTROL-2",
+                                 kind_id=6, secondary_contact_id=7)
+    self.assertEqual(published_values(self._publish(control)), {
+        "id": 2,
+        "kind": ("Option", ("id",), (6,)),
+        "secondary_contact": ("Person", ("id",), (7,)),
+        "slug": "CONTROL-2",
+        "title": "control",
+        "type": "Control",
+    })
+    program = all_models.Program(id=4, title="program", slug="PROGRAM-4")
+    self.assertEqual(published_values(self._publish(program)), {
+        "id": 4,
+        "slug": "PROGRAM-4",
+        "title": "program",
+        "type": "Program",
+    })
+
+  def test_polymorphic_attrs(self, _):
+    """Polymorphic links and raw association proxies are published."""
+    relationship = all_models.Relationship(
+        id=3, source_type="Market", source_id=1,
+        destination_type="Control", destination_id=2)
+    self.assertEqual(
+        {key: normalize(value)
+         for key, value in self._publish(relationship).items()},
+        {
+            "attrs": {},
+            "context": None,
+            "created_at": None,
+            "destination": ("Control", ("id",), (2,)),
+            "id": 3,
+            "modified_by": None,
+            "source": ("Market", ("id",), (1,)),
+            "type": "Relationship",
+            "updated_at": None,
+        })
+    snapshot = all_models.Snapshot(id=5, parent_type="Audit", parent_id=1,
+                                   child_type="Control", child_id=2)
+    self.assertEqual(published_values(self._publish(snapshot)), {
+        "child_id": 2,
+        "child_type": "Control",
+        "id": 5,
+        "parent": ("Audit", ("id",), (1,)),
+        "type": "Snapshot",
+    })
+
+  def test_publisher_cache(self, _):
+    """Publishers are compiled once per inclusion set."""
+    builder = json.get_json_builder(all_models.Market)
+    self.assertIs(builder.get_publisher([("owners",), ("contact",)]),
+                  builder.get_publisher([("contact",), ("owners",)]))
+    self.assertIsNot(builder.get_publisher([("contact",)]),
+                     builder.get_publisher([]))
+
+  def test_publisher_cache_size(self, _):
+    """Unpublished inclusions are ignored and the cache is bounded."""
+    builder = json.get_json_builder(all_models.Market)
+    self.assertIs(builder.get_publisher([("contact",), ("unknown",)]),
+                  builder.get_publisher([("contact",)]))
+    for index in range(json.PUBLISHER_CACHE_SIZE + 1):
+      builder.get_publisher([("contact", "attr_{}".format(index))])
+    # pylint: disable=protected-access
+    self.assertEqual(len(builder._publishers), json.PUBLISHER_CACHE_SIZE)
@@ -0,0 +1,78 @@
+# Copyright (C) 2017 Google Inc.
+# Licensed under http://www.apache.org/licenses/LICENSE-2.0 <see LICENSE file>
+
+"""Unit tests for the in-process tier of the representation cache."""
+
+import unittest
+
+from ggrc.cache import fakememcache
+from ggrc.cache import representation
+
+
+class TestRepresentationCache(unittest.TestCase):
+  """Tests for RepresentationCache without the shared tier."""
+
+  def setUp(self):
+    representation.get_local_cache().clean()
+    self.cache = representation.RepresentationCache()
+    self.keys = {"collection:markets:1": "2017-01-01T00:00:00"}
+
+  def test_modified_representations(self):
+    """Representations modified by callers do not change cached copies."""
+    market = {"id": 1, "title": "market", "owners": [{"id": 2}]}
+    self.cache.add(self.keys, {"collection:markets:1": market}, "")
+    market["owners"][0] = None
+
+    cached = self.cache.get("Market", self.keys, "")["collection:markets:1"]
+    self.assertEqual(cached["owners"], [{"id": 2}])
+    cached["owners"][0] = None
+    cached["title"] = "filtered"
+
+    cached = self.cache.get("Market", self.keys, "")["collection:markets:1"]
+    self.assertEqual(cached, {"id": 1, "title": "market",
+                              "owners": [{"id": 2}]})
+
+
+class FakeSharedCache(object):
+  """Shared tier backed by the fake memcache client."""
+
+  def __init__(self):
+    self.memcache_client = fakememcache.Client()
+
+  def get_multi(self, keys):
+    return self.memcache_client.get_multi(keys)
+
+  def add_multi(self, data):
+    self.memcache_client.add_multi(data)
+
+  def update_multi(self, data):
+    self.memcache_client.set_multi(data)
+
+
+class TestSharedRepresentationCache(unittest.TestCase):
+  """Tests for RepresentationCache with the shared tier."""
+
+  def setUp(self):
+    representation.get_local_cache().clean()
+    fakememcache.Client().flush_all()
+    self.shared = FakeSharedCache()
+    self.keys = {"collection:markets:1": "2017-01-01T00:00:00"}
+
+  def test_generation(self):
+    """Writes of other processes invalidate the in-process tier."""
+    market = {"id": 1, "title": "market"}
+    representation.RepresentationCache(self.shared).add(
+        self.keys, {"collection:markets:1": market}, "")
+    self.assertEqual(
+        representation.RepresentationCache(self.shared).get(
+            "Market", self.keys, ""),
+        {"collection:markets:1": market})
+
+    # Another process removes the shared entry and bumps the generation
+    self.shared.memcache_client.delete("collection:markets:1")
+    representation.bump_generation(self.shared)
+
+    self.assertEqual(
+        representation.RepresentationCache(self.shared).get(
+            "Market", self.keys, ""),
+        {})
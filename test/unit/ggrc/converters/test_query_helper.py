@@ -60,3 +60,29 @@ class TestQueryHelper(unittest.TestCase):
 
     for expected_result, expression in expressions:
       self.assertEqual(expected_result, helper._expression_keys(expression))
+
+  def test_is_batchable(self):
+    """Only independent queries without limit and ordering are batched."""
+    # pylint: disable=protected-access
+    helper = query_helper.QueryHelper(mock.MagicMock())
+    relevant = {
+        "object_name": "Program",
+        "op": {"name": "relevant"},
+        "ids": [1],
+    }
+    expression = {
+        "left": {"left": "title", "op": {"name": "="}, "right": "a"},
+        "op": {"name": "AND"},
+        "right": relevant,
+    }
+    query = {"object_name": "Control", "filters": {"expression": expression}}
+    self.assertTrue(helper._is_batchable(query))
+    self.assertFalse(helper._is_batchable(dict(query, limit=[0, 10])))
+    self.assertFalse(helper._is_batchable(
+        dict(query, order_by=[{"name": "title"}])))
+    self.assertFalse(helper._is_batchable({"object_name": "Control"}))
+
+    relevant["object_name"] = "__previous__"
+    self.assertFalse(helper._is_batchable(query))
+    relevant.update(object_name="Program", op={"name": "similar"})
+    self.assertFalse(helper._is_batchable(query))
@@ -0,0 +1,86 @@
+# Copyright (C) 2017 Google Inc.
+# Licensed under http://www.apache.org/licenses/LICENSE-2.0 <see LICENSE file>
+
+"""Unit tests for batched permission checks."""
+
+import itertools
+import unittest
+
+import mock
+
+# pylint: disable=unused-import
+from ggrc import models  # NOQA
+from ggrc.rbac.permissions_provider import DefaultUserPermissions
+
+
+class StaticUserPermissions(DefaultUserPermissions):
+  """User permissions with a fixed permission dict."""
+
+  def __init__(self, permissions):
+    self.permissions = permissions
+
+  def _permissions(self):
+    return self.permissions
+
+
+class TestAllowedMask(unittest.TestCase):
+  """Tests for allowed_mask and allowed_mask_for."""
+
+  PERMISSIONS = {
+      "read": {
+          "Market": {"contexts": [2], "resources": [5]},
+          "Control": {"contexts": [3], "resources": [],
+                      "conditions": {3: [{"condition": "is"}]}},
+          "__GGRC_ALL__": {"contexts": [4]},
+      },
+      "__GGRC_ADMIN__": {
+          "__GGRC_ALL__": {"contexts": [6]},
+      },
+  }
+
+  def test_mask_matches_single_checks(self):
+    """The mask is equal to checking the resources one by one."""
+    user_permissions = StaticUserPermissions(self.PERMISSIONS)
+    resources = list(itertools.product(
+        ["Market", "Control", "Objective", "/admin"],
+        [1, 5],
+        [None, 0, 1, 2, 3, 4, 6],
+    ))
+    expected = [user_permissions.is_allowed_read(*resource)
+                for resource in resources]
+    self.assertEqual(user_permissions.allowed_mask("read", resources),
+                     expected)
+
+  def test_global_context(self):
+    """Access without a context gives access in all contexts."""
+    user_permissions = StaticUserPermissions({
+        "read": {"__GGRC_ALL__": {"contexts": [None]}},
+    })
+    self.assertEqual(
+        user_permissions.allowed_mask("read", [
+            ("Market", 1, None), ("Market", 1, 7), ("/admin", 1, 7),
+        ]),
+        [True, True, False],
+    )
+
+  @mock.patch.object(DefaultUserPermissions, "_prefetch_relationship_objects")
+  @mock.patch("ggrc.rbac.permissions_provider.load_instances")
+  def test_mask_for_loads_conditional(self, load_instances, _):
+    """Only resources with conditions are loaded."""
+    user_permissions = StaticUserPermissions(self.PERMISSIONS)
+    instance = mock.MagicMock(id=1)
+    load_instances.return_value = {("Control", 1): instance}
+    with mock.patch.object(user_permissions, "_is_allowed_for",
+                           return_value=True) as is_allowed_for:
+      mask = user_permissions.allowed_mask_for("read", [
+          ("Market", 5, None),
+          ("Market", 1, 2),
+          ("Market", 1, 3),
+          ("Control", 1, 3),
+          ("Control", 2, 3),
+          ("Objective", 1, None),
+      ])
+    self.assertEqual(mask, [True, True, False, True, False, False])
+    load_instances.assert_called_once_with(
+        [("Control", 1, 3), ("Control", 2, 3)])
+    is_allowed_for.assert_called_once_with(instance, "read")
@@ -0,0 +1,48 @@
+# Copyright (C) 2017 Google Inc.
+# Licensed under http://www.apache.org/licenses/LICENSE-2.0 <see LICENSE file>
+
+"""Tests for JSON deltas."""
+
+import unittest
+
+from ddt import data, ddt, unpack
+
+from ggrc.utils import json_delta
+
+
+@ddt
+class TestJsonDelta(unittest.TestCase):
+  """Tests for computing and applying JSON deltas."""
+
+  @data(
+      ({}, {}),
+      ({"a": 1}, {"a": 2}),
+      ({"a": 1, "b": 2}, {"b": 2, "c": 3}),
+      ({"a": {"b": [1, {"c": 2}]}}, {"a": {"b": [1, {"c": 3, "d": None}]}}),
+      ({"a": [1, 2]}, {"a": [1, 2, 3]}),
+      ({"a": [1, 2]}, {"a": "b"}),
+      ([1, 2], [2, 1]),
+      ("a", None),
+  )
+  @unpack
+  def test_patch(self, old, new):
+    """Applying the delta of two documents reconstructs the new one."""
+    self.assertEqual(json_delta.patch(old, json_delta.diff(old, new)), new)
+
+  def test_compact(self):
+    """Only changed values are included in deltas."""
+    old = {"title": "a", "cavs": [{"id": i, "value": i} for i in range(100)]}
+    new = {"title": "a", "cavs": [{"id": i, "value": i} for i in range(100)]}
+    new["cavs"][50]["value"] = "changed"
+    self.assertEqual(json_delta.diff(old, old), {})
+    self.assertEqual(json_delta.diff(old, new), {
+        "d": {"cavs": {"l": {"50": {"d": {"value": {"v": "changed"}}}}}},
+    })
+
+  def test_patch_copies(self):
+    """Patched documents share no values with the base document."""
+    base = {"a": {"b": [1]}, "c": [2]}
+    result = json_delta.patch(base, json_delta.diff(base, {
+        "a": {"b": [1]}, "c": [3]}))
+    result["a"]["b"].append(4)
+    self.assertEqual(base, {"a": {"b": [1]}, "c": [2]})